@@ -0,0 +1,509 @@
+"""
+Offline audit of the installed packages against known advisories and a license policy.
+
+Advisories come from an OSV export such as the PyPI dump of osv.dev, imported once into a
+database in the cache directory: a JSON header line followed by zlib-compressed JSON mapping
+every affected project to the JSON text of its advisories. Loading parses only that mapping;
+the advisories of a project are decoded the first time it is audited, and their affected
+ranges are stored as (introduced, fixed, last_affected) intervals, so matching a version is a
+few comparisons. An environment of 1,000 packages is audited in well under a second, without
+network access.
+
+Licenses are read from the License-Expression, License and license classifier metadata of each
+package and checked against a list of disallowed licenses.
+"""
+import functools
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+import zlib
+from collections import namedtuple
+
+import inventory
+import tracing
+from inventory import normalize_name
+from paths import user_cache_dir
+from specs import parse_version
+
+
+OSV_PYPI_URL = "https://osv-vulnerabilities.storage.googleapis.com/PyPI/all.zip"
+FORMAT_VERSION = 1
+DOWNLOAD_TIMEOUT = (5, 120)  # Seconds to connect / per read
+# Comma separated licenses no package may use, e.g. "AGPL-3.0, GPL". An entry also matches its
+# variants: "GPL" matches "GPL-2.0-only" and "GPL-3.0-or-later", but not "LGPL-3.0"
+DISALLOWED_LICENSES = [entry.strip() for entry in os.environ.get("PIPMATE_DISALLOWED_LICENSES", "").split(",")
+                       if entry.strip()]
+
+LICENSE_OK = "ok"
+LICENSE_DISALLOWED = "disallowed"
+LICENSE_UNKNOWN = "unknown"
+
+# An advisory affecting an installed package; fixed_in is the lowest fixed version above the
+# installed one, or None when no fix is known
+Vulnerability = namedtuple("Vulnerability", ["name", "version", "id", "aliases", "summary", "severity", "fixed_in"])
+# The license of an installed package and whether the policy allows it
+LicenseCheck = namedtuple("LicenseCheck", ["name", "version", "license", "status"])
+# Result of an audit; database is the header of the advisory database, or None without one
+AuditReport = namedtuple("AuditReport", ["packages", "vulnerabilities", "licenses", "database"])
+
+# SPDX identifiers of the license classifiers (the part after "License :: ")
+_CLASSIFIER_LICENSES = {
+    "OSI Approved :: Academic Free License (AFL)": "AFL",
+    "OSI Approved :: Apache Software License": "Apache-2.0",
+    "OSI Approved :: BSD License": "BSD",
+    "OSI Approved :: Boost Software License 1.0 (BSL-1.0)": "BSL-1.0",
+    "OSI Approved :: Eclipse Public License 2.0 (EPL-2.0)": "EPL-2.0",
+    "OSI Approved :: GNU Affero General Public License v3": "AGPL-3.0-only",
+    "OSI Approved :: GNU Affero General Public License v3 or later (AGPLv3+)": "AGPL-3.0-or-later",
+    "OSI Approved :: GNU General Public License (GPL)": "GPL",
+    "OSI Approved :: GNU General Public License v2 (GPLv2)": "GPL-2.0-only",
+    "OSI Approved :: GNU General Public License v2 or later (GPLv2+)": "GPL-2.0-or-later",
+    "OSI Approved :: GNU General Public License v3 (GPLv3)": "GPL-3.0-only",
+    "OSI Approved :: GNU General Public License v3 or later (GPLv3+)": "GPL-3.0-or-later",
+    "OSI Approved :: GNU Lesser General Public License v2 (LGPLv2)": "LGPL-2.0-only",
+    "OSI Approved :: GNU Lesser General Public License v2 or later (LGPLv2+)": "LGPL-2.0-or-later",
+    "OSI Approved :: GNU Lesser General Public License v3 (LGPLv3)": "LGPL-3.0-only",
+    "OSI Approved :: GNU Lesser General Public License v3 or later (LGPLv3+)": "LGPL-3.0-or-later",
+    "OSI Approved :: GNU Library or Lesser General Public License (LGPL)": "LGPL",
+    "OSI Approved :: Historical Permission Notice and Disclaimer (HPND)": "HPND",
+    "OSI Approved :: ISC License (ISCL)": "ISC",
+    "OSI Approved :: MIT License": "MIT",
+    "OSI Approved :: MIT No Attribution License (MIT-0)": "MIT-0",
+    "OSI Approved :: Mozilla Public License 2.0 (MPL 2.0)": "MPL-2.0",
+    "OSI Approved :: Python Software Foundation License": "PSF-2.0",
+    "OSI Approved :: The Unlicense (Unlicense)": "Unlicense",
+    "OSI Approved :: Zope Public License": "ZPL",
+    "Other/Proprietary License": "Proprietary",
+    "Public Domain": "Public-Domain",
+    "Server Side Public License (SSPL)": "SSPL-1.0",
+}
+
+# SPDX identifiers of common free-text License values, by their lowercase form
+_LICENSE_ALIASES = {
+    "mit": "MIT", "mit license": "MIT", "the mit license": "MIT", "expat": "MIT",
+    "bsd": "BSD", "bsd license": "BSD", "new bsd": "BSD-3-Clause", "new bsd license": "BSD-3-Clause",
+    "3-clause bsd": "BSD-3-Clause", "bsd 3-clause": "BSD-3-Clause", "modified bsd": "BSD-3-Clause",
+    "2-clause bsd": "BSD-2-Clause", "simplified bsd": "BSD-2-Clause",
+    "apache": "Apache-2.0", "apache 2": "Apache-2.0", "apache 2.0": "Apache-2.0", "apache-2": "Apache-2.0",
+    "apache license": "Apache-2.0", "apache license 2.0": "Apache-2.0", "apache software license": "Apache-2.0",
+    "apache license, version 2.0": "Apache-2.0", "apache license version 2.0": "Apache-2.0",
+    "gpl": "GPL", "gplv2": "GPL-2.0-only", "gplv2+": "GPL-2.0-or-later", "gplv3": "GPL-3.0-only",
+    "gplv3+": "GPL-3.0-or-later", "lgpl": "LGPL", "lgplv3": "LGPL-3.0-only", "lgplv3+": "LGPL-3.0-or-later",
+    "agpl": "AGPL-3.0", "agplv3": "AGPL-3.0-only", "agplv3+": "AGPL-3.0-or-later",
+    "mpl 2.0": "MPL-2.0", "mpl-2": "MPL-2.0", "mozilla public license 2.0 (mpl 2.0)": "MPL-2.0",
+    "psf": "PSF-2.0", "psfl": "PSF-2.0", "python software foundation license": "PSF-2.0",
+    "isc": "ISC", "isc license": "ISC", "public domain": "Public-Domain", "unlicense": "Unlicense",
+}
+
+# Recognizes a license from the start of its full text, for packages that put the text in License
+_LICENSE_TEXTS = (
+    ("gnu affero general public license", "AGPL-3.0"),
+    ("gnu lesser general public license", "LGPL"),
+    ("gnu library general public license", "LGPL"),
+    ("gnu general public license", "GPL"),
+    ("mozilla public license", "MPL-2.0"),
+    ("apache license", "Apache-2.0"),
+    ("permission is hereby granted, free of charge", "MIT"),
+    ("mit license", "MIT"),
+    ("redistribution and use in source and binary forms", "BSD"),
+    ("bsd", "BSD"),
+)
+
+_spdx_token_re = re.compile(r"\(|\)|[^\s()]+")
+# Free-text GPL family names with a version: 'GPL v3', 'GPL version 3', 'LGPL-2', 'AGPL 3.0+'
+_gpl_version_re = re.compile(r"^((?:a|l)?gpl)[\s-]*(?:v|version)?\s*(\d)(?:\.(\d))?\s*(\+|or later)?$")
+# A single token that may be an SPDX identifier or a name the policy lists, e.g. 'MIT' or 'GPL-3.0'
+_license_id_re = re.compile(r"^[A-Za-z0-9][A-Za-z0-9.+-]*$")
+
+_database = None  # (mtime, AdvisoryDatabase) of the loaded database
+_database_lock = threading.Lock()
+
+
+def database_path():
+    """Returns the path of the imported advisory database."""
+    return os.path.join(user_cache_dir(), "advisories.db")
+
+
+@functools.lru_cache(maxsize=65536)
+def _version(text):
+    """Parses a version, cached since the same bounds are compared against many packages."""
+    return parse_version(text)
+
+
+def _intervals(events):
+    """
+    Turns the events of an OSV range into [introduced, fixed, last_affected] intervals.
+
+    Events are evaluated in version order, as the OSV schema specifies; if some version can't
+    be parsed, the order of the export is kept. "limit" events only bound git ranges.
+    """
+    def sort_key(event):
+        return _version(next(iter(event.values())))
+
+    if all(sort_key(event) is not None for event in events):
+        events = sorted(events, key=sort_key)
+
+    intervals = []
+    introduced = None
+    for event in events:
+        if "introduced" in event:
+            if introduced is None:
+                introduced = event["introduced"]
+        elif ("fixed" in event or "last_affected" in event) and introduced is not None:
+            intervals.append([introduced, event.get("fixed"), event.get("last_affected")])
+            introduced = None
+    if introduced is not None:
+        intervals.append([introduced, None, None])
+    return intervals
+
+
+def compact_advisory(advisory):
+    """
+    Returns {normalized project name: compact entry} for the PyPI packages an OSV advisory affects.
+
+    An entry keeps the id, aliases, summary, severity, the affected intervals and the explicitly
+    listed versions. The version lists are only kept when there are no version ranges, since the
+    PyPI exports enumerate every version inside the ranges as well.
+    """
+    if advisory.get("withdrawn"):
+        return {}
+    severity = (advisory.get("database_specific") or {}).get("severity")
+    if not severity and advisory.get("severity"):
+        severity = advisory["severity"][0].get("score")
+
+    entries = {}
+    for affected in advisory.get("affected") or []:
+        package = affected.get("package") or {}
+        if package.get("ecosystem") != "PyPI" or not package.get("name"):
+            continue
+        intervals = []
+        for affected_range in affected.get("ranges") or []:
+            if affected_range.get("type") in ("ECOSYSTEM", "SEMVER"):
+                intervals.extend(_intervals(affected_range.get("events") or []))
+        entry = entries.setdefault(normalize_name(package["name"]), {
+            "id": advisory["id"],
+            "aliases": advisory.get("aliases") or [],
+            "summary": advisory.get("summary") or (advisory.get("details") or "").strip().split("\n")[0][:200],
+            "severity": severity,
+            "ranges": [],
+            "versions": [],
+        })
+        entry["ranges"].extend(intervals)
+        if not intervals:
+            entry["versions"].extend(affected.get("versions") or [])
+    return entries
+
+
+def _read_advisories(source):
+    """Yields the advisories of an OSV export: a zip file, a directory or a single JSON file."""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for member in archive.namelist():
+                if member.endswith(".json"):
+                    yield json.loads(archive.read(member))
+    elif os.path.isdir(source):
+        for directory, _, files in os.walk(source):
+            for file_name in sorted(files):
+                if file_name.endswith(".json"):
+                    with open(os.path.join(directory, file_name), encoding="utf-8") as advisory_file:
+                        yield json.load(advisory_file)
+    else:
+        with open(source, encoding="utf-8") as advisory_file:
+            data = json.load(advisory_file)
+        yield from data if isinstance(data, list) else [data]
+
+
+def _download_export(url):
+    """Downloads an OSV export to the cache directory and returns its path."""
+    import pypi
+
+    path = os.path.join(user_cache_dir(), "osv-export.zip")
+    with tracing.span("advisory download", category="network", url=url):
+        response = pypi.get_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as export_file:
+            for chunk in response.iter_content(1 << 20):
+                export_file.write(chunk)
+                tracing.add("bytes_downloaded", len(chunk))
+        os.replace(temporary_path, path)
+    return path
+
+
+def import_database(source=OSV_PYPI_URL):
+    """
+    Imports an OSV export as the advisory database and returns its header.
+
+    source is the path of a zip file, a directory of advisories or a JSON file, or an http(s)
+    URL of a zip file to download first (osv.dev's PyPI export by default).
+    Raises OSError or ValueError if the export can't be read, and
+    requests.exceptions.RequestException if it can't be downloaded.
+    """
+    with tracing.span("advisory import", category="io", source=source) as span:
+        path = _download_export(source) if re.match(r"https?://", source) else source
+        by_name = {}
+        count = 0
+        for advisory in _read_advisories(path):
+            entries = compact_advisory(advisory)
+            for name, entry in entries.items():
+                by_name.setdefault(name, []).append(entry)
+            count += bool(entries)
+
+        header = {"format": FORMAT_VERSION, "source": source, "imported_at": time.time(),
+                  "advisories": count, "projects": len(by_name)}
+        # Every project's advisories stay a JSON string, so loading doesn't decode them all
+        body = json.dumps({name: json.dumps(entries, separators=(",", ":")) for name, entries in by_name.items()},
+                          separators=(",", ":"))
+        temporary_path = database_path() + ".tmp"
+        with open(temporary_path, "wb") as database_file:
+            database_file.write(json.dumps(header).encode("utf-8") + b"\n")
+            database_file.write(zlib.compress(body.encode("utf-8"), 6))
+        os.replace(temporary_path, database_path())
+        span.set(advisories=count, projects=len(by_name))
+    return header
+
+
+class AdvisoryDatabase:
+    """The imported advisories, looked up by normalized project name."""
+
+    def __init__(self, header, raw_entries):
+        self.header = header
+        self._raw_entries = raw_entries  # name -> JSON text of its advisories
+        self._entries = {}  # name -> decoded advisories, filled on first lookup
+
+    def __len__(self):
+        return self.header.get("advisories", 0)
+
+    def advisories(self, name):
+        """Returns the compact advisories of a project (see compact_advisory())."""
+        key = normalize_name(name)
+        entries = self._entries.get(key)
+        if entries is None:
+            raw = self._raw_entries.get(key)
+            entries = self._entries[key] = json.loads(raw) if raw else []
+        return entries
+
+    def check(self, name, version):
+        """Returns the Vulnerability tuples of the advisories affecting a version of a project."""
+        parsed = _version(version)
+        found = []
+        for entry in self.advisories(name):
+            if version in entry["versions"]:
+                affected = True
+            elif parsed is None:
+                affected = False  # Ranges can't be compared with a non-PEP 440 version
+            else:
+                affected = any(_in_interval(parsed, interval) for interval in entry["ranges"])
+            if affected:
+                found.append(Vulnerability(name, version, entry["id"], entry["aliases"], entry["summary"],
+                                           entry["severity"], _fixed_in(parsed, entry)))
+        return found
+
+
+def _in_interval(version, interval):
+    """Checks whether a parsed version lies in an [introduced, fixed, last_affected] interval."""
+    introduced, fixed, last_affected = interval
+    if introduced != "0":
+        lower = _version(introduced)
+        if lower is None or version < lower:
+            return False
+    if fixed is not None:
+        upper = _version(fixed)
+        if upper is not None and version >= upper:
+            return False
+    if last_affected is not None:
+        upper = _version(last_affected)
+        if upper is not None and version > upper:
+            return False
+    return True
+
+
+def _fixed_in(version, entry):
+    """Returns the lowest fixed version of an advisory above version, or None."""
+    if version is None:
+        return None
+    fixes = [_version(fixed) for _, fixed, _ in entry["ranges"] if fixed]
+    fixes = [fixed for fixed in fixes if fixed is not None and fixed > version]
+    return str(min(fixes)) if fixes else None
+
+
+def load_database():
+    """Returns the imported AdvisoryDatabase, or None if nothing has been imported yet."""
+    global _database
+
+    try:
+        mtime = os.stat(database_path()).st_mtime_ns
+    except OSError:
+        return None
+    with _database_lock:
+        if _database is not None and _database[0] == mtime:
+            return _database[1]
+        with tracing.span("advisory load", category="io"):
+            try:
+                with open(database_path(), "rb") as database_file:
+                    header = json.loads(database_file.readline())
+                    raw_entries = json.loads(zlib.decompress(database_file.read()))
+            except (OSError, ValueError, zlib.error):
+                return None
+        if header.get("format") != FORMAT_VERSION:
+            return None
+        database = AdvisoryDatabase(header, raw_entries)
+        _database = (mtime, database)
+        return database
+
+
+def _parse_spdx(expression):
+    """
+    Parses an SPDX license expression into alternatives: a list of sets of license identifiers,
+    any of which satisfies the expression ('MIT OR (Apache-2.0 AND BSD-3-Clause)' gives
+    [{'MIT'}, {'Apache-2.0', 'BSD-3-Clause'}]). Exceptions after WITH are dropped.
+    Raises ValueError if the expression is malformed.
+    """
+    tokens = _spdx_token_re.findall(expression)
+    position = 0
+
+    def peek():
+        return tokens[position].upper() if position < len(tokens) else None
+
+    def parse_or():
+        nonlocal position
+        alternatives = parse_and()
+        while peek() == "OR":
+            position += 1
+            alternatives = alternatives + parse_and()
+        return alternatives
+
+    def parse_and():
+        nonlocal position
+        alternatives = parse_license()
+        while peek() == "AND":
+            position += 1
+            right_alternatives = parse_license()
+            alternatives = [left | right for left in alternatives for right in right_alternatives]
+        return alternatives
+
+    def parse_license():
+        nonlocal position
+        if peek() is None or peek() in ("AND", "OR", "WITH", ")"):
+            raise ValueError(f"Unexpected end or operator in {expression!r}")
+        if peek() == "(":
+            position += 1
+            alternatives = parse_or()
+            if peek() != ")":
+                raise ValueError(f"Unbalanced parentheses in {expression!r}")
+            position += 1
+            return alternatives
+        identifier = tokens[position]
+        position += 1
+        if peek() == "WITH":
+            position += 1
+            if peek() is None or peek() in ("AND", "OR", "WITH", "(", ")"):
+                raise ValueError(f"Missing exception after WITH in {expression!r}")
+            position += 1
+        return [{identifier}]
+
+    alternatives = parse_or()
+    if position != len(tokens):
+        raise ValueError(f"Unexpected {tokens[position]!r} in {expression!r}")
+    return alternatives
+
+
+def _license_from_text(text):
+    """
+    Returns the license identifier a free-text License field names, or None.
+
+    Other free text than a single identifier-like token is only recognized through the known
+    aliases and license texts, so a spelling such as 'GPL v3' can't slip past a policy.
+    """
+    text = text.strip()
+    if not text or text.upper() in ("UNKNOWN", "NONE"):
+        return None
+    name = " ".join(text.lower().rstrip(".").split())
+    alias = _LICENSE_ALIASES.get(name)
+    if alias:
+        return alias
+    match = _gpl_version_re.match(name)
+    if match:
+        family, major, minor, later = match.groups()
+        return f"{family.upper()}-{major}.{minor or 0}-{'or-later' if later else 'only'}"
+    if _license_id_re.match(text):
+        return text  # Most likely an SPDX identifier or a name the policy may list
+    start = text[:300].lower()
+    return next((identifier for marker, identifier in _LICENSE_TEXTS if marker in start), None)
+
+
+def package_license(headers):
+    """
+    Returns (display text, alternatives) for the license of a package from its metadata headers.
+
+    Uses License-Expression when present, then the license classifiers (several of them mean
+    the package may be used under any one), then the License field. alternatives is a list of
+    sets of license identifiers as returned by _parse_spdx(); it is empty when unknown.
+    """
+    for expression in headers.get("license-expression", []):
+        try:
+            return expression, _parse_spdx(expression)
+        except ValueError:
+            pass
+
+    classifiers = [classifier[len("License :: "):] for classifier in headers.get("classifier", [])
+                   if classifier.startswith("License :: ")]
+    identifiers = [_CLASSIFIER_LICENSES.get(classifier, classifier.rsplit(" :: ", 1)[-1])
+                   for classifier in classifiers if classifier != "OSI Approved"]
+    if identifiers:
+        return " OR ".join(identifiers), [{identifier} for identifier in identifiers]
+
+    for text in headers.get("license", []):
+        if re.search(r"\s(AND|OR|WITH)\s", text) and "\n" not in text:
+            try:
+                return text, _parse_spdx(text)
+            except ValueError:
+                pass
+        identifier = _license_from_text(text)
+        if identifier:
+            return identifier, [{identifier}]
+    return "", []
+
+
+def is_disallowed(identifier, disallowed):
+    """Checks whether a license identifier is one of the disallowed licenses or a variant of one."""
+    identifier = identifier.lower().rstrip("+")
+    return any(identifier == entry.lower() or identifier.startswith(entry.lower() + "-") for entry in disallowed)
+
+
+def check_license(headers, disallowed):
+    """Returns (display text, LICENSE_* status) of a package's license under a policy."""
+    text, alternatives = package_license(headers)
+    if not alternatives:
+        return text, LICENSE_UNKNOWN
+    usable = [alternative for alternative in alternatives
+              if not any(is_disallowed(identifier, disallowed) for identifier in alternative)]
+    return text, LICENSE_OK if usable else LICENSE_DISALLOWED
+
+
+def audit(env_path=None, disallowed=None):
+    """
+    Audits every installed package of an environment. Returns an AuditReport.
+
+    vulnerabilities lists the advisories affecting the installed versions (empty without an
+    imported database) and licenses the LicenseCheck of every package. disallowed defaults to
+    DISALLOWED_LICENSES. Works offline.
+    """
+    disallowed = DISALLOWED_LICENSES if disallowed is None else disallowed
+    installed = inventory.get_inventory(env_path)
+    with tracing.span("audit", category="io", packages=len(installed)) as span:
+        database = load_database()
+        vulnerabilities = []
+        licenses = []
+        for key, distribution in sorted(installed.items()):
+            if database is not None:
+                vulnerabilities.extend(database.check(distribution.name, distribution.version))
+            headers = inventory.read_metadata_headers(inventory.metadata_file(distribution.metadata_path))
+            text, status = check_license(headers, disallowed)
+            licenses.append(LicenseCheck(distribution.name, distribution.version, text, status))
+        span.set(vulnerabilities=len(vulnerabilities),
+                 disallowed=sum(check.status == LICENSE_DISALLOWED for check in licenses))
+    return AuditReport(len(installed), vulnerabilities, licenses, database.header if database else None)
@@ -0,0 +1,235 @@
+"""
+Batch install, upgrade and uninstall of many packages in a single pip invocation.
+
+Specs are pre-filtered against the installed inventory so pip only sees the packages that
+actually need work, and the results for each package are reported while pip is still running.
+"""
+import os
+import re
+
+import inventory
+import process
+import snapshots
+import wheel_cache
+from specs import parse_requirement, parse_version, requirement_key, version_satisfies
+
+
+# Supported batch operations
+INSTALL = "install"
+UPGRADE = "upgrade"
+UNINSTALL = "uninstall"
+
+# Result statuses reported for each package
+STATUS_INSTALLED = "installed"
+STATUS_UNINSTALLED = "uninstalled"
+STATUS_SATISFIED = "already satisfied"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+_satisfied_re = re.compile(r"^Requirement already satisfied: ([A-Za-z0-9][A-Za-z0-9._-]*)")
+_not_found_re = re.compile(r"No matching distribution found for ([A-Za-z0-9][A-Za-z0-9._-]*)")
+_skipping_re = re.compile(r"^WARNING: Skipping ([A-Za-z0-9][A-Za-z0-9._-]*) as it is not installed")
+
+
+def parse_specs(text):
+    """
+    Parses a pasted block or requirements file content into a list of requirement specs.
+
+    Backslash continuations are joined first. Comments, blank lines, pip options (lines
+    starting with '-') and per-requirement options such as '--hash=...' are ignored.
+    A line holding several bare names separated by spaces or commas is split into one spec each.
+    """
+    specs = []
+    for line in re.sub(r"\\[ \t]*\r?\n", " ", text).splitlines():
+        line = line.split(" #", 1)[0].split(" --", 1)[0].strip()
+        if not line or line.startswith(("#", "-")):
+            continue
+
+        if parse_requirement(line) is not None:
+            specs.append(line)
+            continue
+
+        # Not a single requirement, so treat it as a list of separate specs
+        specs.extend(part for part in re.split(r"[\s,]+", line) if part)
+    return specs
+
+
+def read_requirements_file(path):
+    """
+    Reads a requirements file and returns its specs.
+
+    Nested '-r other.txt' includes are followed relative to the including file.
+    """
+    specs = []
+    with open(path, encoding="utf-8") as requirements_file:
+        content = requirements_file.read()
+
+    for line in content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith(("-r ", "--requirement ")):
+            nested = stripped.split(None, 1)[1].strip()
+            specs.extend(read_requirements_file(os.path.join(os.path.dirname(path), nested)))
+    specs.extend(parse_specs(content))
+    return specs
+
+
+def filter_specs(operation, specs, installed):
+    """
+    Splits the specs into the ones pip has to handle and the ones that can be skipped.
+
+    Returns a tuple (pending, skipped) where skipped is a list of (spec, status, reason).
+    Invalid specs are passed through to pip so it can report the error itself, and so are
+    installs and upgrades with extras, whose dependencies may not be installed yet.
+    """
+    pending = []
+    skipped = []
+    seen = set()
+
+    for spec in specs:
+        requirement = parse_requirement(spec)
+        if requirement is None:
+            pending.append(spec)
+            continue
+
+        key = requirement_key(requirement)
+        if key in seen:
+            skipped.append((spec, STATUS_SKIPPED, "duplicate entry"))
+            continue
+        seen.add(key)
+
+        distribution = installed.get(key)
+
+        if operation == UNINSTALL:
+            if distribution is None:
+                skipped.append((spec, STATUS_SKIPPED, "not installed"))
+            else:
+                pending.append(requirement.name)
+            continue
+
+        if distribution is None or requirement.extras:
+            pending.append(spec)
+            continue
+
+        specifier = requirement.specifier
+        if operation == INSTALL and version_satisfies(distribution.version, specifier):
+            skipped.append((spec, STATUS_SATISFIED, distribution.version))
+        elif operation == UPGRADE and _is_exact_pin(specifier, distribution.version):
+            skipped.append((spec, STATUS_SATISFIED, distribution.version))
+        else:
+            pending.append(spec)
+
+    return pending, skipped
+
+
+def _is_exact_pin(specifier, version):
+    """Checks whether the specifier pins exactly the given (installed) version."""
+    pins = [spec for spec in specifier if spec.operator in ("==", "===")]
+    if len(pins) != 1 or "*" in pins[0].version:
+        return False
+    return parse_version(pins[0].version) == parse_version(version)
+
+
+def build_command(operation, pip_command, specs):
+    """
+    Returns the single pip command line that performs the batch operation.
+
+    Installs and upgrades resolve from the wheelhouse only while offline installs are enabled.
+    """
+    if operation == UNINSTALL:
+        return [pip_command, "uninstall", "-y"] + list(specs)
+    if operation == UPGRADE:
+        return [pip_command, "install", "--upgrade"] + wheel_cache.install_options() + list(specs)
+    return [pip_command, "install"] + wheel_cache.install_options() + list(specs)
+
+
+def parse_output_line(line):
+    """
+    Extracts per-package results from a line of pip output.
+
+    Returns a list of (name, status, detail) tuples; the list is empty for progress lines.
+    """
+    line = line.strip()
+
+    if line.startswith("Successfully installed "):
+        results = []
+        for item in line[len("Successfully installed "):].split():
+            name, _, version = item.rpartition("-")
+            results.append((name, STATUS_INSTALLED, version))
+        return results
+
+    if line.startswith("Successfully uninstalled "):
+        name, _, version = line[len("Successfully uninstalled "):].rpartition("-")
+        return [(name, STATUS_UNINSTALLED, version)]
+
+    match = _satisfied_re.match(line)
+    if match:
+        return [(match.group(1), STATUS_SATISFIED, "")]
+
+    match = _not_found_re.search(line)
+    if match:
+        return [(match.group(1), STATUS_FAILED, "no matching distribution found")]
+
+    match = _skipping_re.match(line)
+    if match:
+        return [(match.group(1), STATUS_SKIPPED, "not installed")]
+
+    return []
+
+
+def run_batch(operation, specs, env_path, pip_command, on_result, on_line=None, cancel_event=None):
+    """
+    Runs a batch operation for the given specs with a single pip invocation.
+
+    on_result(name, status, detail) is called for every package as soon as its result is known,
+    including the ones skipped by the pre-filter. on_line(line) receives raw pip output, and
+    setting cancel_event terminates pip. A snapshot of the affected packages is taken before pip runs.
+    Returns True if pip succeeded (or had nothing to do), False otherwise.
+    """
+    pending, skipped = filter_specs(operation, specs, inventory.get_inventory(env_path))
+
+    for spec, status, detail in skipped:
+        on_result(spec, status, detail)
+
+    if not pending:
+        return True
+
+    # Lets the change be rolled back if pip fails halfway or pulls in a bad upgrade
+    try:
+        snapshots.take(env_path, pending, operation, with_dependencies=operation != UNINSTALL)
+    except OSError as e:
+        if on_line:
+            on_line(f"Couldn't take a snapshot before the {operation}: {e}\n")
+
+    reported = set()
+
+    def handle_line(line):
+        """Forwards a line of pip output and reports the package results it contains."""
+        if on_line:
+            on_line(line)
+        for name, status, detail in parse_output_line(line):
+            reported.add(inventory.normalize_name(name))
+            on_result(name, status, detail)
+
+    # Report results while pip is still running
+    returncode = process.stream_command(build_command(operation, pip_command, pending), handle_line,
+                                        cancel_event=cancel_event)
+
+    # Anything pip did not mention explicitly is resolved from the refreshed inventory
+    installed = inventory.get_inventory(env_path)
+    for spec in pending:
+        requirement = parse_requirement(spec)
+        name = requirement.name if requirement else spec
+        key = inventory.normalize_name(name)
+        if key in reported:
+            continue
+
+        distribution = installed.get(key)
+        if operation == UNINSTALL:
+            status = STATUS_FAILED if distribution else STATUS_UNINSTALLED
+        else:
+            succeeded = distribution and (requirement is None or
+                                          version_satisfies(distribution.version, requirement.specifier))
+            status = STATUS_SATISFIED if succeeded and returncode == 0 else STATUS_FAILED
+        on_result(name, status, distribution.version if distribution else "")
+
+    return returncode == 0
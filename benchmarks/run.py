@@ -0,0 +1,261 @@
+"""
+End to end benchmarks of PIP-MATE's core operations, without network access.
+
+A stub index (see stub_index.py) serves generated wheels through a PEP 503 simple index and a
+PyPI style JSON API on a loopback port; pip and PIP-MATE are pointed at it and all caches live
+in a temporary directory. Every benchmark reports its latency distribution and throughput, and
+results can be saved as a baseline and compared against later:
+
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json --fail-on-regression
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))  # The PIP-MATE modules
+
+from stub_index import StubIndex, project_name  # noqa: E402
+
+
+def configure_environment(work_dir, index):
+    """
+    Points pip and PIP-MATE at the stub index and isolates every cache in work_dir.
+
+    Must run before the PIP-MATE modules are imported, since some read their settings at import.
+    """
+    for name in ("PIP_EXTRA_INDEX_URL", "PIP_FIND_LINKS", "PIPMATE_OFFLINE", "PIPMATE_OFFLINE_INSTALL"):
+        os.environ.pop(name, None)
+    os.environ.update({
+        "PIP_CONFIG_FILE": os.devnull,  # Ignore pip.conf files that could add other indexes
+        "PIP_INDEX_URL": index.simple_url,
+        "PIP_CACHE_DIR": os.path.join(work_dir, "pip-cache"),
+        "PIP_DISABLE_PIP_VERSION_CHECK": "1",
+        "PIP_NO_INPUT": "1",
+        "PIPMATE_PYPI_URL": index.json_url,
+        "PIPMATE_CACHE_DIR": os.path.join(work_dir, "pipmate-cache"),
+        "PIPMATE_CONFIG_DIR": os.path.join(work_dir, "pipmate-config"),
+        "PIPMATE_VENV_MODE": "template",
+    })
+
+
+def describe(samples, items):
+    """Returns the latency distribution of a benchmark's samples (seconds) and its throughput."""
+    ordered = sorted(samples)
+    mean = statistics.fmean(ordered)
+    return {
+        "samples": len(ordered),
+        "min": ordered[0],
+        "mean": mean,
+        "p50": statistics.median(ordered),
+        "p95": ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)],
+        "max": ordered[-1],
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "items": items,
+        "throughput": items / mean if mean > 0 else 0.0,  # items per second
+    }
+
+
+def measure(operation, repeat, warmup, setup=None, items=1):
+    """
+    Times operation(state) repeat times after warmup untimed runs.
+
+    setup(iteration) prepares the state of each run outside of the timed region.
+    """
+    samples = []
+    for iteration in range(warmup + repeat):
+        state = setup(iteration) if setup else None
+        started = time.perf_counter()
+        operation(state)
+        elapsed = time.perf_counter() - started
+        if iteration >= warmup:
+            samples.append(elapsed)
+    return describe(samples, items)
+
+
+def run_benchmarks(args, work_dir):
+    """Runs the selected benchmarks and returns {name: distribution}."""
+    import core
+    import inventory
+    import pypi_cache
+
+    names = [project_name(index) for index in range(args.packages)]
+    envs_dir = os.path.join(work_dir, "envs")
+    env_counter = iter(range(10 ** 6))
+    results = {}
+
+    def new_env(_iteration=None):
+        """Creates an empty environment outside of the timed region."""
+        path = os.path.join(envs_dir, f"env-{next(env_counter)}")
+        core.create_virtualenv(path, os.environ["PIPMATE_VENV_MODE"])
+        return path
+
+    def check(outcome):
+        """Stops the benchmark if an operation failed, since its timing would be meaningless."""
+        if not outcome["ok"]:
+            raise RuntimeError(f"{outcome['operation']} failed: {outcome['results']}")
+
+    def selected(name):
+        """Checks whether a benchmark was selected with --only."""
+        return not args.only or name in args.only
+
+    # Building the template once is part of the setup, so environment creation is measured warm
+    started = time.perf_counter()
+    base_env = new_env()
+    print(f"setup: template environment built in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+    if selected("create_env"):
+        results["create_env"] = measure(lambda _: new_env(), args.repeat, args.warmup)
+
+    if selected("install"):
+        results["install"] = measure(lambda env: check(core.install(names, env)), args.repeat, args.warmup,
+                                     setup=new_env, items=len(names))
+
+    if selected("uninstall"):
+        def installed_env(_iteration):
+            """Creates an environment with every benchmark package installed."""
+            env = new_env()
+            check(core.install(names, env))
+            return env
+
+        results["uninstall"] = measure(lambda env: check(core.uninstall(names, env)), args.repeat, args.warmup,
+                                       setup=installed_env, items=len(names))
+
+    if selected("list_cold") or selected("list_warm"):
+        check(core.install(names, base_env))
+        if selected("list_cold"):
+            results["list_cold"] = measure(lambda _: core.list_installed(base_env), args.repeat, args.warmup,
+                                           setup=lambda _: inventory.invalidate_inventory(base_env),
+                                           items=len(names))
+        if selected("list_warm"):
+            results["list_warm"] = measure(lambda _: core.list_installed(base_env), args.repeat, args.warmup,
+                                           items=len(names))
+
+    def fetch_info(_state):
+        """Fetches the PyPI summary of every benchmark package."""
+        failed = [info for info in core.package_info(names) if "error" in info]
+        if failed:
+            raise RuntimeError(f"package_info failed: {failed[0]}")
+
+    if selected("info_cold"):
+        results["info_cold"] = measure(fetch_info, args.repeat, args.warmup, setup=lambda _: pypi_cache.clear(),
+                                       items=len(names))
+    if selected("info_warm"):
+        results["info_warm"] = measure(fetch_info, args.repeat, args.warmup, items=len(names))
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares the median of each benchmark with the baseline.
+
+    Returns a list of (name, baseline p50, current p50, ratio, verdict) and whether anything regressed.
+    """
+    rows = []
+    regressed = False
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            rows.append((name, None, current["p50"], None, "new"))
+            continue
+        ratio = current["p50"] / previous["p50"] if previous["p50"] else float("inf")
+        if ratio > 1 + threshold:
+            verdict = "REGRESSION"
+            regressed = True
+        elif ratio < 1 - threshold:
+            verdict = "faster"
+        else:
+            verdict = "unchanged"
+        rows.append((name, previous["p50"], current["p50"], ratio, verdict))
+    return rows, regressed
+
+
+def format_ms(seconds):
+    """Formats seconds as milliseconds for the report."""
+    return "-" if seconds is None else f"{seconds * 1000:9.1f}"
+
+
+def print_report(results, comparison=None):
+    """Prints the results (and the comparison with the baseline) as tables."""
+    print(f"{'benchmark':<12} {'n':>3} {'min ms':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"
+          f" {'stdev ms':>9} {'items/s':>9}")
+    for name, result in results.items():
+        print(f"{name:<12} {result['samples']:>3} {format_ms(result['min'])} {format_ms(result['mean'])}"
+              f" {format_ms(result['p50'])} {format_ms(result['p95'])} {format_ms(result['max'])}"
+              f" {format_ms(result['stdev'])} {result['throughput']:9.1f}")
+    if comparison:
+        print(f"\n{'benchmark':<12} {'base p50':>9} {'p50':>9} {'ratio':>7}  verdict")
+        for name, previous, current, ratio, verdict in comparison:
+            print(f"{name:<12} {format_ms(previous)} {format_ms(current)} "
+                  f"{'-' if ratio is None else f'{ratio:7.2f}'}  {verdict}")
+
+
+def main(argv=None):
+    """Entry point of the benchmark harness. Returns the process exit code."""
+    parser = argparse.ArgumentParser(description="Benchmark PIP-MATE operations against a local stub index.")
+    parser.add_argument("--packages", type=int, default=20, help="packages installed / listed / fetched per run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before the timed ones")
+    parser.add_argument("--payload-size", type=int, default=10 * 1024, help="bytes of data in each wheel")
+    parser.add_argument("--only", action="append", help="run only this benchmark (repeatable)",
+                        choices=("create_env", "install", "uninstall", "list_cold", "list_warm",
+                                 "info_cold", "info_warm"))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--save-baseline", metavar="FILE", help="store the results as the new baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results with a stored baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative p50 change reported (default 0.2)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with 1 if a benchmark regressed")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary directory for inspection")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="pipmate-bench-")
+    try:
+        with StubIndex(args.packages, args.payload_size) as index:
+            configure_environment(work_dir, index)
+            results = run_benchmarks(args, work_dir)
+            print(f"setup: stub index served {index.request_count} requests", file=sys.stderr)
+    finally:
+        if args.keep:
+            print(f"setup: kept {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": args.packages,
+        "payload_size": args.payload_size,
+        "results": results,
+    }
+
+    comparison, regressed = None, False
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("packages") != args.packages:
+            print(f"warning: baseline was recorded with --packages {baseline.get('packages')}", file=sys.stderr)
+        comparison, regressed = compare(results, baseline, args.threshold)
+
+    print_report(results, comparison)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+            output_file.write("\n")
+
+    return 1 if regressed and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
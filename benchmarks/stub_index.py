@@ -0,0 +1,158 @@
+"""
+Local package index serving generated wheels, for benchmarks that must not touch the network.
+
+Serves a PEP 503 simple index under /simple/, the wheel files under /files/ and a PyPI style
+JSON API under /pypi/<name>/json, all from memory on a loopback port.
+"""
+import base64
+import hashlib
+import io
+import json
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PROJECT_PREFIX = "pmbench-pkg"
+VERSION = "1.0.0"
+
+
+def project_name(index):
+    """Returns the name of the index-th generated project."""
+    return f"{PROJECT_PREFIX}-{index:04d}"
+
+
+def _record_hash(data):
+    """Returns the RECORD style hash of file content."""
+    digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=").decode("ascii")
+    return f"sha256={digest}"
+
+
+def build_wheel(name, version=VERSION, payload_size=10 * 1024, requires=()):
+    """
+    Builds a minimal pure Python wheel in memory and returns (filename, bytes).
+
+    The module carries payload_size bytes of data so downloads and installs have realistic sizes.
+    """
+    module = name.replace("-", "_")
+    dist_info = f"{module}-{version}.dist-info"
+    files = {
+        f"{module}/__init__.py": (f'__version__ = "{version}"\nDATA = "{"x" * payload_size}"\n').encode("utf-8"),
+        f"{dist_info}/METADATA": (
+            f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\nSummary: Benchmark package {name}\n"
+            f"Author: PIP-MATE benchmarks\nRequires-Python: >=3.7\n"
+            + "".join(f"Requires-Dist: {requirement}\n" for requirement in requires)
+        ).encode("utf-8"),
+        f"{dist_info}/WHEEL": b"Wheel-Version: 1.0\nGenerator: pipmate-benchmarks\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+    }
+    record = "".join(f"{path},{_record_hash(data)},{len(data)}\n" for path, data in files.items())
+    record += f"{dist_info}/RECORD,,\n"
+    files[f"{dist_info}/RECORD"] = record.encode("utf-8")
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for path, data in files.items():
+            archive.writestr(path, data)
+    return f"{module}-{version}-py3-none-any.whl", buffer.getvalue()
+
+
+class StubIndex:
+    """
+    An in-memory index of generated projects served over HTTP on 127.0.0.1.
+
+    Use as a context manager; simple_url and json_url point pip and PIP-MATE at it.
+    """
+
+    def __init__(self, project_count, payload_size=10 * 1024):
+        self.projects = {}  # name -> (filename, wheel bytes, sha256 hex)
+        for index in range(project_count):
+            name = project_name(index)
+            filename, data = build_wheel(name, payload_size=payload_size)
+            self.projects[name] = (filename, data, hashlib.sha256(data).hexdigest())
+        self.files = {filename: data for filename, data, _ in self.projects.values()}
+        self.request_count = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Returns the root URL of the running server."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def simple_url(self):
+        """Returns the URL of the PEP 503 simple index (for PIP_INDEX_URL)."""
+        return self.base_url + "/simple/"
+
+    @property
+    def json_url(self):
+        """Returns the base URL of the JSON API (for PIPMATE_PYPI_URL)."""
+        return self.base_url + "/pypi"
+
+    def _project_json(self, name):
+        """Returns the JSON API document of a project."""
+        filename, _, sha256 = self.projects[name]
+        file_info = {
+            "filename": filename,
+            "packagetype": "bdist_wheel",
+            "requires_python": ">=3.7",
+            "yanked": False,
+            "digests": {"sha256": sha256},
+            "url": f"{self.base_url}/files/{filename}",
+        }
+        return {
+            "info": {"name": name, "version": VERSION, "summary": f"Benchmark package {name}",
+                     "author": "PIP-MATE benchmarks", "project_urls": {}},
+            "urls": [file_info],
+            "releases": {VERSION: [file_info]},
+        }
+
+    def respond(self, path):
+        """Returns (status, content type, body) for a request path."""
+        self.request_count += 1
+        parts = [part for part in path.split("?", 1)[0].split("/") if part]
+
+        if parts == ["simple"]:
+            links = "".join(f'<a href="/simple/{name}/">{name}</a>\n' for name in sorted(self.projects))
+            return 200, "text/html", f"<!DOCTYPE html>\n<html><body>\n{links}</body></html>\n".encode("utf-8")
+        if len(parts) == 2 and parts[0] == "simple" and parts[1] in self.projects:
+            filename, _, sha256 = self.projects[parts[1]]
+            body = (f'<!DOCTYPE html>\n<html><body>\n<a href="/files/{filename}#sha256={sha256}" '
+                    f'data-requires-python="&gt;=3.7">{filename}</a>\n</body></html>\n')
+            return 200, "text/html", body.encode("utf-8")
+        if len(parts) == 2 and parts[0] == "files" and parts[1] in self.files:
+            return 200, "application/octet-stream", self.files[parts[1]]
+        if len(parts) in (3, 4) and parts[0] == "pypi" and parts[1] in self.projects and parts[-1] == "json":
+            return 200, "application/json", json.dumps(self._project_json(parts[1])).encode("utf-8")
+        return 404, "text/plain", b"not found"
+
+    def __enter__(self):
+        index = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Serves requests from the StubIndex."""
+
+            protocol_version = "HTTP/1.1"  # Keep-alive, like a real index
+
+            def do_GET(self):
+                """Handles a GET request."""
+                status, content_type, body = index.respond(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                """Keeps the benchmark output clean."""
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
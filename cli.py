@@ -0,0 +1,626 @@
+"""
+Headless command line interface of PIP-MATE.
+
+Runs the core operations without Tk, e.g. `python cli.py --json install requests`, so they can
+be scripted in CI. Only the modules needed by the chosen command are imported.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import core
+
+
+def _print_json(data):
+    """Writes data to stdout as JSON."""
+    json.dump(data, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+def _line_writer(args):
+    """
+    Returns the callback that receives pip output.
+
+    In JSON mode pip output goes to stderr so stdout stays machine readable.
+    """
+    if args.quiet:
+        return None
+    stream = sys.stderr if args.json else sys.stdout
+
+    def write_line(line):
+        """Forwards a line of pip output to the terminal."""
+        stream.write(line)
+        stream.flush()
+
+    return write_line
+
+
+def _collect_specs(args):
+    """Returns the specs given on the command line plus those of any requirements files."""
+    import batch
+
+    specs = list(args.specs)
+    for path in args.requirement or []:
+        specs.extend(batch.read_requirements_file(path))
+    return specs
+
+
+def _report_batch(args, outcome):
+    """Prints the outcome of an install / upgrade / uninstall and returns the exit code."""
+    if args.json:
+        _print_json(outcome)
+    else:
+        for result in outcome["results"]:
+            detail = f" ({result['detail']})" if result["detail"] else ""
+            print(f"{result['name']}: {result['status']}{detail}")
+    return 0 if outcome["ok"] else 1
+
+
+def command_batch(args):
+    """Handles the install, upgrade and uninstall commands."""
+    try:
+        specs = _collect_specs(args)
+    except OSError as e:
+        print(f"Error reading requirements file: {e}", file=sys.stderr)
+        return 2
+    if not specs:
+        print("Error: no packages given.", file=sys.stderr)
+        return 2
+    operation = {"install": core.install, "upgrade": core.upgrade, "uninstall": core.uninstall}[args.command]
+    try:
+        outcome = operation(specs, args.env, _line_writer(args))
+    except OSError as e:  # e.g. pip can't be started
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return _report_batch(args, outcome)
+
+
+def command_list(args):
+    """Handles the list command."""
+    packages = core.list_installed(args.env)
+    if args.json:
+        _print_json(packages)
+    else:
+        import inventory
+        sys.stdout.write(inventory.format_package_list(inventory.get_inventory(args.env)))
+    return 0
+
+
+def command_info(args):
+    """Handles the info command."""
+    results = core.package_info(args.packages, args.workers)
+    if args.json:
+        _print_json(results)
+    else:
+        for info in results:
+            if "error" in info:
+                print(f"{info['name']}: error fetching package details ({info['error']})")
+                continue
+            print(f"Package Name: {info['name']}\n"
+                  f"Version: {info['version']}\n"
+                  f"Description: {info['summary']}\n"
+                  f"Author: {info['author']}\n"
+                  f"Documentation: {info['documentation']}\n"
+                  f"Source: {info['source']}\n")
+    return 0 if all("error" not in info for info in results) else 1
+
+
+def command_outdated(args):
+    """Handles the outdated command."""
+    import inventory
+    import outdated
+
+    def report_failure(name, installed_version, newer_version, error):
+        """Reports lookups that failed, since those packages can't be checked."""
+        if error is not None:
+            print(f"{name}: error checking for updates ({error})", file=sys.stderr)
+
+    packages = outdated.check_outdated(inventory.get_inventory(args.env),
+                                       outdated.environment_python_version(args.env),
+                                       report_failure, args.workers or outdated.MAX_WORKERS)
+    if args.json:
+        _print_json([package._asdict() for package in packages])
+    else:
+        for package in packages:
+            print(f"{package.name} {package.installed} -> {package.latest}")
+    return 0
+
+
+def command_lock(args):
+    """Handles the lock command (export / sync)."""
+    import lockfile
+
+    if args.action == "export":
+        def report_missing(name, version, reason):
+            """Warns about packages locked without hashes."""
+            print(f"Warning: no hashes for {name} {version} ({reason})", file=sys.stderr)
+
+        count = lockfile.export_lockfile(args.path, args.env, not args.no_hashes, report_missing)
+        if args.json:
+            _print_json({"path": args.path, "packages": count})
+        else:
+            print(f"Locked {count} packages to {args.path}")
+        return 0
+
+    if not args.env and not args.dry_run and not args.allow_global:
+        print("Error: syncing the global environment uninstalls every package the lockfile doesn't list; "
+              "pass --allow-global to do it anyway", file=sys.stderr)
+        return 2
+    try:
+        to_install, to_remove = lockfile.sync(args.path, args.env, core.get_pip_command(args.env),
+                                              _line_writer(args) or (lambda line: None), args.dry_run,
+                                              allow_global=args.allow_global)
+    except (OSError, ValueError) as e:
+        print(f"Error reading lockfile: {e}", file=sys.stderr)
+        return 2
+    except subprocess.CalledProcessError as e:
+        print(f"Error syncing environment: {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        _print_json({"install": [f"{entry.name}=={entry.version}" for entry in to_install], "remove": to_remove})
+    else:
+        for entry in to_install:
+            print(f"install {entry.name}=={entry.version}")
+        for name in to_remove:
+            print(f"remove {name}")
+        if not to_install and not to_remove:
+            print("Environment already matches the lockfile.")
+    return 0
+
+
+def command_create_venv(args):
+    """Handles the create-venv command."""
+    try:
+        path = core.create_virtualenv(args.path, args.mode, tuple(args.base_packages or ()), _line_writer(args))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Error creating virtual environment: {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        _print_json({"path": path, "ok": True})
+    else:
+        print(f"Virtual environment created at {path}")
+    return 0
+
+
+def command_clear_cache(args):
+    """Handles the clear-cache command."""
+    try:
+        core.clear_cache(args.env, _line_writer(args))
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Error clearing pip cache: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        _print_json({"ok": True})
+    return 0
+
+
+def command_envs(args):
+    """Handles the envs command and its actions."""
+    import registry
+
+    if args.action == "add":
+        for path in args.paths:
+            if not registry.register_environment(path):
+                print(f"Error: invalid virtual environment path: {path}", file=sys.stderr)
+                return 1
+    elif args.action == "add-root":
+        for path in args.paths:
+            registry.add_root(path)
+        registry.discover()
+    elif args.action == "discover":
+        added = registry.discover(args.paths or None)
+        if not args.json:
+            print(f"Discovered {len(added)} new environment(s).")
+    elif args.action == "query":
+        if len(args.paths) != 1:
+            print("Error: query takes exactly one requirement, e.g. 'requests<2.31'.", file=sys.stderr)
+            return 2
+        try:
+            matches = registry.find_package(args.paths[0])
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+        if args.json:
+            _print_json([{"env": env_path, "name": dist.name, "version": dist.version} for env_path, dist in matches])
+        else:
+            for env_path, dist in matches:
+                print(f"{env_path}: {dist.name} {dist.version}")
+        return 0
+
+    environments = registry.list_environments()
+    if args.json:
+        _print_json(environments)
+    elif args.action == "list":
+        print("\n".join(environments))
+    return 0
+
+
+def command_cache(args):
+    """Handles the cache command and its actions."""
+    import wheel_cache
+    from inventory import format_size
+
+    if args.action in ("pin", "unpin"):
+        if not args.packages:
+            print(f"Error: {args.action} needs at least one package, e.g. 'numpy' or 'numpy==1.26.4'.", file=sys.stderr)
+            return 2
+        for package in args.packages:
+            project, _, version = package.partition("==")
+            (wheel_cache.pin if args.action == "pin" else wheel_cache.unpin)(project, version or None)
+        return 0
+
+    if args.action == "prewarm":
+        if not args.packages and not args.requirement:
+            print("Error: no packages given.", file=sys.stderr)
+            return 2
+        try:
+            wheel_cache.prewarm(args.packages, core.get_pip_command(args.env),
+                                _line_writer(args) or (lambda line: None), args.requirement or ())
+        except subprocess.CalledProcessError as e:
+            print(f"Error downloading packages: {e}", file=sys.stderr)
+            return 1
+        if args.json:
+            _print_json({"ok": True, "wheelhouse": wheel_cache.wheelhouse_dir()})
+        return 0
+
+    if args.action == "prune":
+        removed = wheel_cache.prune(args.max_size, dry_run=args.dry_run)
+        if args.json:
+            _print_json([{"path": entry.path, "project": entry.project, "version": entry.version, "size": entry.size}
+                         for entry in removed])
+        else:
+            freed = sum(entry.size for entry in removed)
+            print(f"{'Would remove' if args.dry_run else 'Removed'} {len(removed)} file(s), {format_size(freed)}.")
+        return 0
+
+    entries = wheel_cache.scan_cache()
+    usage = wheel_cache.usage_by_project(entries)
+    if args.json:
+        _print_json({
+            "cache_dir": wheel_cache.pip_cache_dir(),
+            "total": sum(entry.size for entry in entries),
+            "pins": sorted(wheel_cache.load_pins()),
+            "projects": [{"project": project, "version": version, "size": total, "files": count}
+                         for project, version, total, count in usage],
+        })
+    else:
+        for project, version, total, count in usage:
+            print(f"{project or '(other)'} {version or ''}: {format_size(total)} in {count} file(s)")
+        print(f"Total: {format_size(sum(entry.size for entry in entries))} in {wheel_cache.pip_cache_dir()}")
+    return 0
+
+
+def command_deps(args):
+    """Handles the deps command and its actions."""
+    import depgraph
+
+    graph = depgraph.get_graph(args.env)
+
+    if args.action == "check":
+        conflicts = graph.conflicts()
+        missing = graph.missing()
+        if args.json:
+            _print_json({
+                "conflicts": [{"package": dependent, "requirement": str(requirement), "installed": dist.version}
+                              for dependent, requirement, dist in conflicts],
+                "missing": [{"package": dependent, "requirement": str(requirement)}
+                            for dependent, requirement in missing],
+            })
+        else:
+            for dependent, requirement, dist in conflicts:
+                print(f"{dependent} requires {requirement}, but {dist.version} is installed.")
+            for dependent, requirement in missing:
+                print(f"{dependent} requires {requirement}, which is not installed.")
+        return 1 if conflicts or missing else 0
+
+    if not args.packages:
+        print(f"Error: {args.action} needs at least one package.", file=sys.stderr)
+        return 2
+
+    if args.action == "orphans":
+        result = sorted(graph.orphaned_by(args.packages))
+    else:
+        result = {}
+        for package in args.packages:
+            result[package] = {
+                "requires": sorted(graph.dependencies(package, args.recursive)),
+                "required_by": sorted(graph.dependents(package, args.recursive)),
+            }
+
+    if args.json:
+        _print_json(result)
+    elif args.action == "orphans":
+        print("\n".join(result))
+    else:
+        for package, edges in result.items():
+            print(f"{package}\n  requires: {', '.join(edges['requires']) or '-'}\n"
+                  f"  required by: {', '.join(edges['required_by']) or '-'}")
+    return 0
+
+
+def command_names(args):
+    """Handles the names command and its actions."""
+    import requests as rq
+
+    import name_index
+
+    try:
+        index = name_index.refresh(force=args.full) if args.action == "update" else name_index.load()
+    except rq.exceptions.RequestException as e:
+        print(f"Error downloading the project list: {e}", file=sys.stderr)
+        return 1
+    if index is None:
+        print("Error: no project list stored yet and the package index can't be reached.", file=sys.stderr)
+        return 1
+
+    if args.action == "update":
+        if args.json:
+            _print_json({"projects": len(index), "index_url": name_index.SIMPLE_INDEX_URL})
+        else:
+            print(f"{len(index)} project names from {name_index.SIMPLE_INDEX_URL}")
+        return 0
+
+    if not args.text:
+        print(f"Error: {args.action} needs at least one name.", file=sys.stderr)
+        return 2
+
+    if args.action == "search":
+        result = {text: index.suggest(text, args.limit) for text in args.text}
+        if args.json:
+            _print_json(result)
+        else:
+            for text, names in result.items():
+                print(f"{text}: {', '.join(names) or '-'}")
+        return 0
+
+    checks = [name_index.check_spec(spec, index) for spec in args.text]
+    if args.json:
+        _print_json([check._asdict() for check in checks])
+    else:
+        for spec, check in zip(args.text, checks):
+            hint = f" (did you mean {', '.join(check.suggestions)}?)" if check.suggestions else ""
+            print(f"{spec}: {check.status}{hint}")
+    failed = (name_index.NAME_INVALID, name_index.NAME_UNKNOWN)
+    return 1 if any(check.status in failed for check in checks) else 0
+
+
+def command_du(args):
+    """Handles the du command."""
+    import disk_usage
+    from inventory import format_size
+
+    if args.rescan:
+        disk_usage.clear_cache()
+    usages, total = disk_usage.environment_usage(args.env)
+    if args.top:
+        usages = usages[:args.top]
+    if args.json:
+        _print_json({"total": total, "packages": [usage._asdict() for usage in usages]})
+    else:
+        for usage in usages:
+            print(f"{format_size(usage.size) or 'no RECORD':>10}  {usage.name} {usage.version}")
+        print(f"{format_size(total):>10}  total")
+    return 0
+
+
+def command_snapshots(args):
+    """Handles the snapshots command and its actions."""
+    import time
+
+    import snapshots
+
+    stored = snapshots.list_snapshots(args.env)
+    if args.action == "list":
+        if args.json:
+            _print_json([{"id": snapshot.id, "label": snapshot.label, "created": snapshot.created,
+                          "packages": snapshot.packages} for snapshot in stored])
+        else:
+            for snapshot in stored:
+                created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot.created))
+                print(f"{snapshot.id}  {created}  {snapshot.label}: {', '.join(snapshot.packages) or '-'}")
+        return 0
+
+    if args.action == "delete":
+        if not args.id:
+            print("Error: delete needs a snapshot id.", file=sys.stderr)
+            return 2
+        snapshots.delete(args.env, args.id)
+        return 0
+
+    # Without an id, the latest snapshot undoes the last operation
+    snapshot_id = args.id or (stored[0].id if stored else None)
+    if snapshot_id is None:
+        print("Error: this environment has no snapshots.", file=sys.stderr)
+        return 1
+    try:
+        restored, removed = snapshots.rollback(args.env, snapshot_id, _line_writer(args))
+    except (OSError, ValueError) as e:
+        print(f"Error rolling back: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        _print_json({"snapshot": snapshot_id, "restored": restored, "removed": removed})
+    return 0
+
+
+def command_audit(args):
+    """Handles the audit command and its actions."""
+    import requests as rq
+
+    import audit
+
+    if args.action in ("import", "update"):
+        source = args.source if args.action == "import" else audit.OSV_PYPI_URL
+        if not source:
+            print("Error: import needs the path of an OSV export.", file=sys.stderr)
+            return 2
+        try:
+            header = audit.import_database(source)
+        except (OSError, ValueError, rq.exceptions.RequestException) as e:
+            print(f"Error importing advisories from {source}: {e}", file=sys.stderr)
+            return 1
+        if args.json:
+            _print_json(header)
+        else:
+            print(f"Imported {header['advisories']} advisories for {header['projects']} projects from {source}")
+        return 0
+
+    report = audit.audit(args.env, args.disallow)
+    disallowed = [check for check in report.licenses if check.status == audit.LICENSE_DISALLOWED]
+    if args.json:
+        _print_json({
+            "packages": report.packages,
+            "database": report.database,
+            "vulnerabilities": [vulnerability._asdict() for vulnerability in report.vulnerabilities],
+            "licenses": [check._asdict() for check in report.licenses],
+        })
+    else:
+        if report.database is None:
+            print("No advisory database imported yet (run `audit update` or `audit import FILE`); "
+                  "only licenses were checked.", file=sys.stderr)
+        for vulnerability in report.vulnerabilities:
+            fix = f"fixed in {vulnerability.fixed_in}" if vulnerability.fixed_in else "no fix known"
+            print(f"{vulnerability.name} {vulnerability.version}: {vulnerability.id} "
+                  f"[{vulnerability.severity or 'unrated'}] {vulnerability.summary} ({fix})")
+        for check in disallowed:
+            print(f"{check.name} {check.version}: disallowed license {check.license}")
+        unknown = sum(check.status == audit.LICENSE_UNKNOWN for check in report.licenses)
+        print(f"{report.packages} packages: {len(report.vulnerabilities)} advisories, "
+              f"{len(disallowed)} disallowed licenses, {unknown} unknown licenses")
+    return 1 if report.vulnerabilities or disallowed else 0
+
+
+def build_parser():
+    """Builds the argument parser of the CLI."""
+    parser = argparse.ArgumentParser(prog="pip-mate", description="Manage Python packages and virtual environments.")
+    parser.add_argument("--env", default=os.environ.get("PIPMATE_ENV"),
+                        help="virtual environment to operate on (default: the global environment)")
+    parser.add_argument("--json", action="store_true", help="print machine readable JSON to stdout")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't show pip output")
+    parser.add_argument("--trace", metavar="FILE", help="write the timings of the command to FILE")
+    parser.add_argument("--trace-format", choices=("chrome", "json"), default="chrome",
+                        help="Chrome trace events (chrome://tracing, Perfetto) or a plain list of spans")
+    parser.add_argument("--offline-install", action="store_true", default=None,
+                        help="install only from the wheelhouse (pip --no-index --find-links)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("install", "install packages"), ("upgrade", "upgrade packages"),
+                            ("uninstall", "uninstall packages")):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument("specs", nargs="*", help="requirement specs, e.g. 'requests>=2.31'")
+        subparser.add_argument("-r", "--requirement", action="append", help="read specs from a requirements file")
+        subparser.set_defaults(handler=command_batch)
+
+    subparser = subparsers.add_parser("list", help="list installed packages")
+    subparser.set_defaults(handler=command_list)
+
+    subparser = subparsers.add_parser("info", help="show PyPI information about packages")
+    subparser.add_argument("packages", nargs="+")
+    subparser.add_argument("--workers", type=int, default=None, help="number of concurrent requests")
+    subparser.set_defaults(handler=command_info)
+
+    subparser = subparsers.add_parser("outdated", help="list installed packages with newer releases on PyPI")
+    subparser.add_argument("--workers", type=int, default=None, help="number of concurrent requests")
+    subparser.set_defaults(handler=command_outdated)
+
+    subparser = subparsers.add_parser("lock", help="export the environment to a lockfile or sync it from one")
+    subparser.add_argument("action", choices=("export", "sync"))
+    subparser.add_argument("path", help="lockfile to write or read")
+    subparser.add_argument("--no-hashes", action="store_true", help="export pins without looking up hashes")
+    subparser.add_argument("--dry-run", action="store_true", help="only show what sync would change")
+    subparser.add_argument("--allow-global", action="store_true",
+                           help="let sync change the global environment (without --env)")
+    subparser.set_defaults(handler=command_lock)
+
+    subparser = subparsers.add_parser("create-venv", help="create a virtual environment")
+    subparser.add_argument("path")
+    subparser.add_argument("--mode", choices=("template", "without-pip", "venv"),
+                           default=os.environ.get("PIPMATE_VENV_MODE"), help="how to create the environment")
+    subparser.add_argument("--base-package", dest="base_packages", action="append",
+                           help="package to preinstall in the template environment")
+    subparser.set_defaults(handler=command_create_venv)
+
+    subparser = subparsers.add_parser("envs", help="manage the registry of known environments")
+    subparser.add_argument("action", choices=("list", "add", "add-root", "discover", "query"))
+    subparser.add_argument("paths", nargs="*", help="environment paths, root directories or a requirement")
+    subparser.set_defaults(handler=command_envs)
+
+    subparser = subparsers.add_parser("deps", help="query the dependency graph of the environment")
+    subparser.add_argument("action", choices=("show", "orphans", "check"),
+                           help="show: dependencies and dependents, orphans: what an uninstall leaves unused, "
+                                "check: unsatisfied requirements")
+    subparser.add_argument("packages", nargs="*")
+    subparser.add_argument("--recursive", action="store_true", help="include transitive dependencies / dependents")
+    subparser.set_defaults(handler=command_deps)
+
+    subparser = subparsers.add_parser("du", help="show the disk space each installed package takes")
+    subparser.add_argument("--top", type=int, default=None, help="only show the largest N packages")
+    subparser.add_argument("--rescan", action="store_true", help="measure every package again instead of using the cache")
+    subparser.set_defaults(handler=command_du)
+
+    subparser = subparsers.add_parser("snapshots", help="list, roll back to or delete pre-change snapshots")
+    subparser.add_argument("action", choices=("list", "rollback", "delete"))
+    subparser.add_argument("id", nargs="?", help="snapshot id (rollback defaults to the latest)")
+    subparser.set_defaults(handler=command_snapshots)
+
+    subparser = subparsers.add_parser("audit", help="check installed packages against known advisories and a license policy")
+    subparser.add_argument("action", nargs="?", choices=("run", "import", "update"), default="run",
+                           help="run: audit the environment (default), import: load an OSV export from a file, "
+                                "update: download osv.dev's PyPI export")
+    subparser.add_argument("source", nargs="?", help="OSV export to import: a zip file, directory or JSON file")
+    subparser.add_argument("--disallow", action="append", default=None, metavar="LICENSE",
+                           help="license no package may use (repeatable, default: PIPMATE_DISALLOWED_LICENSES)")
+    subparser.set_defaults(handler=command_audit)
+
+    subparser = subparsers.add_parser("cache", help="inspect, prune and pre-warm pip's cache")
+    subparser.add_argument("action", choices=("list", "prune", "pin", "unpin", "prewarm"))
+    subparser.add_argument("packages", nargs="*", help="projects to pin / unpin or specs to pre-warm")
+    subparser.add_argument("-r", "--requirement", action="append", help="pre-warm the specs of a requirements file")
+    subparser.add_argument("--max-size", type=int, default=None, help="size to prune the cache to, in bytes")
+    subparser.add_argument("--dry-run", action="store_true", help="only show what prune would remove")
+    subparser.set_defaults(handler=command_cache)
+
+    subparser = subparsers.add_parser("names", help="search and validate project names with the local name index")
+    subparser.add_argument("action", choices=("update", "search", "check"),
+                           help="update: refresh the stored project list, search: complete names, "
+                                "check: validate requirement specs")
+    subparser.add_argument("text", nargs="*", help="name prefixes to search or specs to check")
+    subparser.add_argument("--limit", type=int, default=10, help="maximum number of names per search")
+    subparser.add_argument("--full", action="store_true", help="download the whole list instead of the changes")
+    subparser.set_defaults(handler=command_names)
+
+    subparser = subparsers.add_parser("clear-cache", help="purge the pip cache")
+    subparser.set_defaults(handler=command_clear_cache)
+
+    return parser
+
+
+def main(argv=None):
+    """Entry point of the CLI. Returns the process exit code."""
+    args = build_parser().parse_args(argv)
+    if args.env and not core.is_valid_virtualenv(args.env):
+        print(f"Error: invalid virtual environment path: {args.env}", file=sys.stderr)
+        return 2
+    if args.offline_install:
+        import wheel_cache
+        wheel_cache.offline_install = True
+    if not args.trace:
+        return args.handler(args)
+
+    import tracing
+
+    try:
+        with tracing.span(args.command, category="command"):
+            return args.handler(args)
+    finally:
+        (tracing.export_chrome_trace if args.trace_format == "chrome" else tracing.export_json)(args.trace)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Importable core API of PIP-MATE.
+
+Every pip, virtualenv and PyPI operation is available here without any GUI, so the same code
+backs the Tk app, the headless CLI and scripts. Heavy modules (requests, packaging) are only
+imported by the operations that need them.
+"""
+import os
+
+import inventory
+import process
+
+
+def is_valid_virtualenv(path):
+    """
+    Checks if the given path contains a valid virtual environment.
+
+    A valid virtual environment should have the appropriate 'activate' script.
+    """
+    if not path or not os.path.exists(path):
+        return False
+
+    # Check for the presence of 'bin/activate' (Linux/Mac) or 'Scripts/activate' (Windows)
+    activate_script = os.path.join(path, "bin", "activate") if os.name != 'nt' else os.path.join(path, "Scripts",
+                                                                                                 "activate")
+    return os.path.exists(activate_script)
+
+
+def get_pip_command(env_path=None):
+    """
+    Returns the path to the pip executable of the given virtual environment.
+
+    If no environment is given, returns the system-wide pip command.
+    """
+    if env_path:
+        # Construct the pip path based on the operating system
+        return os.path.join(env_path, 'bin', 'pip') if os.name != 'nt' else os.path.join(env_path, 'Scripts', 'pip.exe')
+    return "pip"
+
+
+def _ignore_line(line):
+    """Default output callback that discards pip output."""
+
+
+def _run_batch(operation, specs, env_path, on_line, cancel_event):
+    """Runs a batch operation and collects the per-package results."""
+    import batch
+
+    results = []
+    succeeded = batch.run_batch(
+        operation, list(specs), env_path, get_pip_command(env_path),
+        lambda name, status, detail: results.append({"name": name, "status": status, "detail": detail}),
+        on_line or _ignore_line, cancel_event,
+    )
+    failed = any(result["status"] == batch.STATUS_FAILED for result in results)
+    return {"operation": operation, "ok": succeeded and not failed, "results": results}
+
+
+def install(specs, env_path=None, on_line=None, cancel_event=None):
+    """
+    Installs the given requirement specs with a single pip run.
+
+    Specs that are already satisfied are skipped without starting pip.
+    Returns a dict with 'ok' and the per-package 'results'.
+    """
+    return _run_batch("install", specs, env_path, on_line, cancel_event)
+
+
+def upgrade(specs, env_path=None, on_line=None, cancel_event=None):
+    """Upgrades the given packages with a single pip run. Returns the same dict as install()."""
+    return _run_batch("upgrade", specs, env_path, on_line, cancel_event)
+
+
+def uninstall(names, env_path=None, on_line=None, cancel_event=None):
+    """
+    Uninstalls the given packages with a single pip run.
+
+    Packages that are not installed are reported as skipped. Returns the same dict as install().
+    """
+    return _run_batch("uninstall", names, env_path, on_line, cancel_event)
+
+
+def list_installed(env_path=None):
+    """Returns the installed distributions as a list of dicts sorted by name."""
+    distributions = sorted(inventory.get_inventory(env_path).values(), key=lambda dist: dist.name.lower())
+    return [
+        {"name": dist.name, "version": dist.version, "location": dist.location}
+        for dist in distributions
+    ]
+
+
+def package_info(package_names, max_workers=None):
+    """
+    Fetches the PyPI summary of one or more packages concurrently.
+
+    Returns a list of dicts in the requested order; failed lookups carry an 'error' key.
+    """
+    import pypi
+
+    if isinstance(package_names, str):
+        package_names = [package_names]
+
+    results = {}
+    for name, data, error in pypi.fetch_many(package_names, max_workers or pypi.DEFAULT_MAX_WORKERS):
+        if error is not None:
+            results[name] = {"name": name, "error": str(error)}
+        else:
+            results[name] = dict(pypi.summarize(data), source=pypi.project_url(name))
+    return [results[name] for name in dict.fromkeys(package_names)]
+
+
+def create_virtualenv(env_path, mode=None, base_packages=(), on_line=None):
+    """
+    Creates a virtual environment at env_path.
+
+    Raises ValueError if a valid environment already exists there, and OSError or
+    CalledProcessError if creating it fails.
+    """
+    import venv_templates
+
+    if is_valid_virtualenv(env_path):
+        raise ValueError(f"A valid virtual environment already exists at {env_path}")
+    venv_templates.create_environment(env_path, mode or venv_templates.MODE_VENV,
+                                      base_packages=base_packages, on_line=on_line or _ignore_line)
+    return os.path.abspath(env_path)
+
+
+def clear_cache(env_path=None, on_line=None, cancel_event=None):
+    """Purges the pip cache. Raises CalledProcessError if pip fails."""
+    process.check_stream_command([get_pip_command(env_path), "cache", "purge"], on_line or _ignore_line,
+                                 cancel_event=cancel_event)
+
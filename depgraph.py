@@ -0,0 +1,255 @@
+"""
+In-memory dependency graph of the distributions installed in an environment.
+
+Built from the Requires-Dist metadata (requires.txt for egg-info installs) with forward and
+reverse adjacency indexes, so "what depends on X" and "what becomes orphaned if X is removed"
+are answered without rescanning. After an install or uninstall only the distributions that
+changed in the inventory are re-read.
+"""
+import os
+import threading
+
+import inventory
+from specs import marker_applies, parse_requirement, requirement_key, version_satisfies
+
+
+def _read_requires_txt(path):
+    """
+    Returns the requirement specs of an egg-info requires.txt file.
+
+    Sections such as '[socks]' or '[:python_version < "3.8"]' are turned into markers.
+    """
+    specs = []
+    section = ""
+    try:
+        with open(path, encoding="utf-8", errors="replace") as requires_file:
+            lines = requires_file.read().splitlines()
+    except OSError:
+        return specs
+
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1]
+            continue
+        extra, _, marker = section.partition(":")
+        conditions = [f"({marker})"] if marker else []
+        if extra:
+            conditions.append(f'extra == "{extra}"')
+        specs.append(line + ("; " + " and ".join(conditions) if conditions else ""))
+    return specs
+
+
+def read_requirements(distribution):
+    """Returns the parsed requirements declared by an installed distribution, markers included."""
+    if distribution.metadata_path.endswith(".dist-info"):
+        specs = inventory.read_metadata_headers(os.path.join(distribution.metadata_path, "METADATA")).get(
+            "requires-dist", [])
+    else:
+        specs = _read_requires_txt(os.path.join(distribution.metadata_path, "requires.txt"))
+
+    requirements = []
+    for spec in specs:
+        requirement = parse_requirement(spec)
+        if requirement is not None:
+            requirements.append(requirement)
+    return requirements
+
+
+class DependencyGraph:
+    """
+    Dependency graph of one environment.
+
+    requires maps a project to {dependency: Requirement} and required_by maps a project to the
+    set of projects depending on it; both are keyed by normalized name. Dependencies that aren't
+    installed still get a required_by entry, so they show up as missing. Markers are evaluated
+    against environment, the marker environment of the environment's interpreter (None for the
+    running interpreter).
+    """
+
+    def __init__(self, environment=None):
+        self.environment = environment
+        self.distributions = {}  # project -> Distribution
+        self.requirements = {}  # project -> every declared Requirement, markers not yet evaluated
+        self.requires = {}  # project -> {dependency: Requirement}
+        self.required_by = {}  # project -> set of dependents
+
+    def update(self, installed):
+        """
+        Brings the graph in line with an inventory (normalized name -> Distribution).
+
+        Only distributions that were added, removed or changed since the last update are re-read.
+        Returns the set of projects that changed.
+        """
+        changed = {key for key, dist in installed.items() if self.distributions.get(key) != dist}
+        removed = set(self.distributions) - set(installed)
+        if not changed and not removed:
+            return set()
+
+        # Projects whose requested extras may change because a dependent changed
+        pending = set(changed)
+        for key in removed:
+            pending.update(self.requires.get(key, ()))
+            del self.distributions[key]
+            del self.requirements[key]
+            self._set_edges(key, {})
+
+        for key in changed:
+            self.distributions[key] = installed[key]
+            self.requirements[key] = read_requirements(installed[key])
+
+        # Edges depend on the extras requested by dependents, so follow changes until stable
+        while pending:
+            key = pending.pop()
+            if key not in self.distributions:
+                continue
+            edges = self._compute_edges(key)
+            old_edges = self.requires.get(key, {})
+            if edges != old_edges or key in changed:
+                for dependency in set(edges) | set(old_edges):
+                    old, new = old_edges.get(dependency), edges.get(dependency)
+                    if (old and old.extras) or (new and new.extras):
+                        pending.add(dependency)
+                self._set_edges(key, edges)
+        return changed | removed
+
+    def copy(self):
+        """Returns an independent copy of the graph, which later updates of this one don't affect."""
+        graph = DependencyGraph(self.environment)
+        graph.distributions = dict(self.distributions)
+        graph.requirements = dict(self.requirements)
+        graph.requires = {key: dict(edges) for key, edges in self.requires.items()}
+        graph.required_by = {key: set(dependents) for key, dependents in self.required_by.items()}
+        return graph
+
+    def _requested_extras(self, key):
+        """Returns the extras of a project requested by the projects depending on it."""
+        extras = set()
+        for dependent in self.required_by.get(key, ()):
+            extras.update(self.requires[dependent][key].extras)
+        return extras
+
+    def _compute_edges(self, key):
+        """Returns {dependency: Requirement} of a project for the environment's interpreter."""
+        extras = self._requested_extras(key)
+        edges = {}
+        for requirement in self.requirements[key]:
+            dependency = requirement_key(requirement)
+            if dependency != key and marker_applies(requirement, extras, self.environment):
+                edges[dependency] = requirement
+        return edges
+
+    def _set_edges(self, key, edges):
+        """Replaces the outgoing edges of a project, keeping the reverse index in sync."""
+        old_edges = self.requires.pop(key, {})
+        for dependency in old_edges:
+            if dependency not in edges:
+                dependents = self.required_by.get(dependency)
+                if dependents is not None:
+                    dependents.discard(key)
+                    if not dependents:
+                        del self.required_by[dependency]
+        for dependency in edges:
+            self.required_by.setdefault(dependency, set()).add(key)
+        if edges:
+            self.requires[key] = edges
+
+    def dependencies(self, name, recursive=False):
+        """Returns the projects a project depends on (all of them, transitively, if recursive)."""
+        return self._walk(inventory.normalize_name(name), self.requires, recursive)
+
+    def dependents(self, name, recursive=False):
+        """Returns the projects depending on a project (transitively, if recursive)."""
+        return self._walk(inventory.normalize_name(name), self.required_by, recursive)
+
+    @staticmethod
+    def _walk(start, adjacency, recursive):
+        """Returns the nodes reachable from start in one step, or in any number of steps."""
+        found = set(adjacency.get(start, ()))
+        if not recursive:
+            return found
+        stack = list(found)
+        while stack:
+            for node in adjacency.get(stack.pop(), ()):
+                if node not in found and node != start:
+                    found.add(node)
+                    stack.append(node)
+        return found
+
+    def orphaned_by(self, names):
+        """
+        Returns the installed projects nothing would depend on anymore if names were uninstalled.
+
+        Projects that only become unused because another orphan is gone are included as well.
+        """
+        removed = {inventory.normalize_name(name) for name in names}
+        orphans = set()
+        stack = list(removed)
+        while stack:
+            for dependency in self.requires.get(stack.pop(), ()):
+                if dependency in removed or dependency in orphans or dependency not in self.distributions:
+                    continue
+                if self.required_by.get(dependency, set()) <= removed | orphans:
+                    orphans.add(dependency)
+                    stack.append(dependency)
+        return orphans
+
+    def missing(self):
+        """Returns (dependent, Requirement) for every dependency that isn't installed."""
+        return sorted(
+            ((dependent, self.requires[dependent][key]) for key, dependents in self.required_by.items()
+             if key not in self.distributions for dependent in dependents),
+            key=lambda item: (item[0], item[1].name),
+        )
+
+    def conflicts(self):
+        """
+        Returns the constraints the installed versions don't satisfy, like `pip check`.
+
+        Each item is (dependent, Requirement, installed Distribution).
+        """
+        found = []
+        for key, dependents in self.required_by.items():
+            distribution = self.distributions.get(key)
+            if distribution is None:
+                continue
+            for dependent in dependents:
+                requirement = self.requires[dependent][key]
+                if not version_satisfies(distribution.version, requirement.specifier):
+                    found.append((dependent, requirement, distribution))
+        return sorted(found, key=lambda item: (item[2].name.lower(), item[0]))
+
+    def roots(self):
+        """Returns the installed projects no other installed project depends on."""
+        return {key for key in self.distributions if not self.required_by.get(key)}
+
+
+# Per set of site-packages directories: [graph updated from the cached inventories, copy handed out]
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def get_graph(env_path=None):
+    """
+    Returns the dependency graph of an environment, updated to its current inventory.
+
+    The graph is kept between calls, so after an install or uninstall only the changed
+    distributions are re-read. The environment's interpreter is asked for its marker
+    environment once, when the graph is built. The returned graph is a copy that no later
+    update changes, so it can be read on any thread; callers must not modify it.
+    """
+    key = tuple(inventory.site_packages_dirs(env_path))
+    installed = inventory.get_inventory(env_path)
+    with _graphs_lock:
+        entry = _graphs.get(key)
+    if entry is None:
+        # Asking the interpreter takes a subprocess, so it happens outside the lock
+        entry = [DependencyGraph(inventory.marker_environment(env_path)), None]
+    with _graphs_lock:
+        entry = _graphs.setdefault(key, entry)
+        graph, published = entry
+        if graph.update(installed) or published is None:
+            entry[1] = published = graph.copy()
+        return published
@@ -0,0 +1,245 @@
+"""
+Disk usage of the distributions installed in an environment.
+
+Files are mapped to distributions through their RECORD files, and the parts of site-packages
+holding them are walked with os.scandir on a thread pool. Hardlinked files (e.g. environments
+cloned from a template) are counted once. Results are cached per distribution and keyed by
+the mtime of its dist-info directory, so repeated views only rescan changed packages.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import inventory
+import tracing
+from paths import user_cache_dir
+
+
+MAX_WORKERS = 8  # Directories scanned concurrently; stat() releases the GIL
+
+# Disk usage of one distribution; size is the allocated size in bytes (None without a RECORD),
+# and shared the part of it also linked from elsewhere, e.g. the template an environment was cloned from
+PackageUsage = namedtuple("PackageUsage", ["name", "version", "files", "size", "shared"])
+
+_cache = None  # metadata path -> cached usage, loaded from disk on first use
+_cache_lock = threading.Lock()
+
+
+def cache_path():
+    """Returns the path of the file holding the cached usage of every scanned distribution."""
+    return os.path.join(user_cache_dir(), "disk-usage.json")
+
+
+def _load_cache():
+    """Returns the in-memory cache, reading it from disk on first use."""
+    global _cache
+
+    if _cache is None:
+        try:
+            with open(cache_path(), encoding="utf-8") as cache_file:
+                _cache = json.load(cache_file)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _save_cache():
+    """Writes the cache to disk atomically."""
+    temporary_path = cache_path() + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as cache_file:
+        json.dump(_cache, cache_file, separators=(",", ":"))
+    os.replace(temporary_path, cache_path())
+
+
+def allocated_size(stat_result):
+    """Returns the bytes a file occupies on disk (its apparent size where blocks aren't reported)."""
+    blocks = getattr(stat_result, "st_blocks", None)
+    return blocks * 512 if blocks is not None else stat_result.st_size
+
+
+def _stamp(distribution):
+    """Returns the mtime of a distribution's metadata directory, or None if it is gone."""
+    try:
+        return os.stat(distribution.metadata_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _scan_directory(directory):
+    """Returns the (path, stat) of the files in a directory and the paths of its subdirectories."""
+    files, subdirs = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    else:
+                        files.append((entry.path, entry.stat(follow_symlinks=False)))
+                except OSError:
+                    continue  # Removed while walking
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def walk(roots, max_workers=MAX_WORKERS, cancel_event=None):
+    """
+    Yields (path, stat_result) for every file below the given roots, which may also be files.
+
+    Each directory is scanned as its own task on a thread pool, so large trees are walked in
+    parallel instead of one directory at a time. Symlinks are reported, not followed.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="disk-usage") as executor:
+        pending = set()
+        for root in roots:
+            try:
+                stat_result = os.stat(root, follow_symlinks=False)
+            except OSError:
+                continue
+            if os.path.isdir(root) and not os.path.islink(root):
+                pending.add(executor.submit(_scan_directory, root))
+            else:
+                yield root, stat_result
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if cancel_event is not None and cancel_event.is_set():
+                for future in pending:
+                    future.cancel()
+                return
+            for future in done:
+                files, subdirs = future.result()
+                yield from files
+                pending.update(executor.submit(_scan_directory, subdir) for subdir in subdirs)
+
+
+def _record_paths(distribution):
+    """Returns the normalized absolute paths listed in a distribution's RECORD."""
+    return [os.path.normpath(os.path.join(distribution.location, path))
+            for path, _ in inventory.read_record(distribution)]
+
+
+def _measure(distributions, others=(), cancel_event=None):
+    """
+    Walks the files of the given distributions and returns their cache entries by metadata path.
+
+    Files no RECORD lists (e.g. bytecode compiled after the install) are given to the
+    distribution owning the nearest directory above them. others are the distributions that
+    aren't measured; their files may share directories (namespace packages) and are skipped.
+    """
+    owners = {}  # path -> metadata path of the distribution listing it
+    directory_owners = {}  # directory -> metadata path of a distribution with files in it
+    site_dirs = {distribution.location for distribution in distributions}
+    roots = set()
+    for distribution in distributions:
+        for path in _record_paths(distribution):
+            owners[path] = distribution.metadata_path
+            if os.path.dirname(path) not in site_dirs:  # Loose files don't make site-packages theirs
+                directory_owners.setdefault(os.path.dirname(path), distribution.metadata_path)
+            relative = os.path.relpath(path, distribution.location)
+            top_level = relative.split(os.sep, 1)[0]
+            # Scripts live outside site-packages ('../../bin/...'), so those are visited one by one
+            roots.add(path if top_level == os.pardir else os.path.join(distribution.location, top_level))
+
+    listed_elsewhere = {path for distribution in others for path in _record_paths(distribution)}
+
+    entries = {distribution.metadata_path: {"files": 0, "size": 0, "linked": []} for distribution in distributions}
+    for path, stat_result in walk(roots, cancel_event=cancel_event):
+        owner = owners.get(path)
+        if owner is None:
+            if path in listed_elsewhere:
+                continue
+            directory = os.path.dirname(path)
+            while directory not in directory_owners and directory not in site_dirs:
+                parent = os.path.dirname(directory)
+                if parent == directory:
+                    break
+                directory = parent
+            owner = directory_owners.get(directory)
+            if owner is None:
+                continue
+
+        entry = entries[owner]
+        entry["files"] += 1
+        size = allocated_size(stat_result)
+        if stat_result.st_nlink > 1:
+            # Only files with several links can be counted twice, so only those keep their inode
+            entry["linked"].append([stat_result.st_dev, stat_result.st_ino, size])
+        else:
+            entry["size"] += size
+    return entries
+
+
+def environment_usage(env_path=None, cancel_event=None):
+    """
+    Returns (usages, total) for an environment: PackageUsage tuples sorted by size, largest
+    first, and the bytes all of them occupy together.
+
+    Only distributions whose dist-info directory changed since the last call are walked again.
+    """
+    installed = inventory.get_inventory(env_path)
+    with tracing.span("disk usage", category="io", distributions=len(installed)) as span:
+        stamps = {dist.metadata_path: _stamp(dist) for dist in installed.values()}
+        # The entries this call reports; the shared cache may be cleared while the walk runs
+        cached = {}
+        with _cache_lock:
+            cache = _load_cache()
+            for metadata_path, stamp in stamps.items():
+                entry = cache.get(metadata_path)
+                if entry is not None and entry.get("stamp") == stamp:
+                    cached[metadata_path] = entry
+        changed = [dist for dist in installed.values() if dist.metadata_path not in cached]
+        span.set(rescanned=len(changed))
+
+        if changed:
+            unchanged = [dist for dist in installed.values() if dist.metadata_path in cached]
+            measured = _measure(changed, unchanged, cancel_event)
+            if cancel_event is not None and cancel_event.is_set():
+                return [], 0
+            for metadata_path, entry in measured.items():
+                entry["stamp"] = stamps[metadata_path]
+            cached.update(measured)
+            with _cache_lock:
+                cache = _load_cache()  # Not the one read above if clear_cache() ran meanwhile
+                cache.update(measured)
+                # Forget distributions removed from the directories of this environment
+                dirs = tuple(directory + os.sep for directory in inventory.site_packages_dirs(env_path))
+                for metadata_path in [path for path in cache if path.startswith(dirs) and path not in stamps]:
+                    del cache[metadata_path]
+                _save_cache()
+
+        usages = []
+        seen = set()
+        total = 0
+        for key, dist in sorted(installed.items()):
+            entry = cached[dist.metadata_path]
+            if not entry["files"]:
+                usages.append(PackageUsage(dist.name, dist.version, 0, None, 0))
+                continue
+            size = entry["size"]
+            shared = 0
+            for device, inode, linked_size in entry["linked"]:
+                if (device, inode) not in seen:
+                    seen.add((device, inode))
+                    size += linked_size
+                    shared += linked_size
+            total += size
+            usages.append(PackageUsage(dist.name, dist.version, entry["files"], size, shared))
+
+    usages.sort(key=lambda usage: usage.size or 0, reverse=True)
+    return usages, total
+
+
+def clear_cache():
+    """Forgets every cached result, so the next call walks all distributions again."""
+    global _cache
+
+    with _cache_lock:
+        _cache = {}
+        try:
+            os.remove(cache_path())
+        except FileNotFoundError:
+            pass
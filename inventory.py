@@ -0,0 +1,365 @@
+"""
+In-process inventory of the distributions installed in an environment.
+
+Reads the *.dist-info / *.egg-info metadata straight from site-packages instead of
+spawning `pip list` / `pip show`, and only rescans when a site-packages directory changes.
+"""
+import csv
+import glob
+import json
+import os
+import re
+import site
+import subprocess
+import sys
+import threading
+from collections import namedtuple
+
+import tracing
+from pip_worker import interpreter_for
+
+
+# A single installed distribution as described by its metadata directory
+Distribution = namedtuple("Distribution", ["name", "version", "location", "metadata_path"])
+
+# Cached inventories keyed by the tuple of scanned site-packages directories
+_inventory_cache = {}
+_inventory_lock = threading.Lock()
+
+_normalize_re = re.compile(r"[-_.]+")
+
+INTERPRETER_TIMEOUT = 10  # Seconds an interpreter may take to describe itself
+
+# Runs in the environment's interpreter, which may be any Python 3 with nothing but the standard library
+_INTERPRETER_SCRIPT = r"""
+import json, os, platform, site, sys
+
+def full_version(info):
+    version = "%d.%d.%d" % (info.major, info.minor, info.micro)
+    if info.releaselevel != "final":
+        version += info.releaselevel[0] + str(info.serial)
+    return version
+
+json.dump({
+    "markers": {
+        "implementation_name": sys.implementation.name,
+        "implementation_version": full_version(sys.implementation.version),
+        "os_name": os.name,
+        "platform_machine": platform.machine(),
+        "platform_release": platform.release(),
+        "platform_system": platform.system(),
+        "platform_version": platform.version(),
+        "python_full_version": platform.python_version(),
+        "platform_python_implementation": platform.python_implementation(),
+        "python_version": ".".join(platform.python_version_tuple()[:2]),
+        "sys_platform": sys.platform,
+    },
+    "site_packages": site.getsitepackages() if hasattr(site, "getsitepackages") else [],
+    "user_site": site.getusersitepackages() if site.ENABLE_USER_SITE else None,
+}, sys.stdout)
+"""
+
+# Answers of _INTERPRETER_SCRIPT keyed by (interpreter path, modification time)
+_interpreter_cache = {}
+_global_pythons = {}  # PATH -> interpreter of the `pip` found on it
+_interpreter_lock = threading.Lock()
+
+
+def normalize_name(name):
+    """
+    Normalizes a project name according to PEP 503.
+
+    Runs of '-', '_' and '.' collapse to a single '-' and the result is lower-cased.
+    """
+    return _normalize_re.sub("-", name).lower()
+
+
+def site_packages_dirs(env_path=None):
+    """
+    Returns the site-packages directories of the given environment.
+
+    If no environment path is given, the directories of the interpreter the global `pip` runs
+    are returned (the running interpreter's if it can't be told), the user site first as on
+    sys.path.
+    """
+    if env_path:
+        if os.name == 'nt':
+            candidates = [os.path.join(env_path, "Lib", "site-packages")]
+        else:
+            candidates = glob.glob(os.path.join(env_path, "lib*", "python*", "site-packages"))
+    else:
+        python = environment_python()
+        info = None
+        if python is not None and os.path.realpath(python) != os.path.realpath(sys.executable):
+            info = interpreter_info(python)
+        if info is not None:
+            global_dirs, user_site = info["site_packages"], info["user_site"]
+        else:
+            global_dirs = list(site.getsitepackages()) if hasattr(site, "getsitepackages") else []
+            user_site = site.getusersitepackages() if site.ENABLE_USER_SITE else None
+        # The user site shadows the global site-packages, just like on sys.path
+        candidates = ([user_site] if user_site else []) + list(global_dirs)
+        if not candidates:
+            candidates = [path for path in sys.path if path.endswith("site-packages")]
+
+    # lib64 is usually a symlink to lib inside a venv, so drop duplicates by real path
+    dirs = []
+    seen = set()
+    for path in candidates:
+        real_path = os.path.realpath(path)
+        if os.path.isdir(real_path) and real_path not in seen:
+            seen.add(real_path)
+            dirs.append(real_path)
+    return dirs
+
+
+def environment_python(env_path=None):
+    """
+    Returns the interpreter that pip operates on in the given environment, or None if unknown.
+
+    For the global environment that is the interpreter running the `pip` found on PATH.
+    """
+    if env_path:
+        pip_command = os.path.join(env_path, "Scripts", "pip.exe") if os.name == 'nt' else os.path.join(
+            env_path, "bin", "pip")
+        python = os.path.join(env_path, "Scripts", "python.exe") if os.name == 'nt' else os.path.join(
+            env_path, "bin", "python")
+        return interpreter_for(pip_command) or (python if os.path.isfile(python) else None)
+
+    # Looked up once per PATH, since the inventory asks on every call
+    path = os.environ.get("PATH", "")
+    if path not in _global_pythons:
+        _global_pythons[path] = interpreter_for("pip")
+    return _global_pythons[path]
+
+
+def interpreter_info(python):
+    """
+    Returns what PIP-MATE needs to know about an interpreter, or None if it can't be asked.
+
+    The dict holds the 'markers' environment of PEP 508, the global 'site_packages' directories
+    and the 'user_site' directory (None when disabled). The interpreter is run once; the answer
+    is kept until its executable changes.
+    """
+    try:
+        key = (os.path.realpath(python), os.stat(python).st_mtime_ns)
+    except OSError:
+        return None
+    with _interpreter_lock:
+        if key in _interpreter_cache:
+            return _interpreter_cache[key]
+
+    with tracing.span("interpreter info", category="subprocess", python=python):
+        try:
+            result = subprocess.run([python, "-c", _INTERPRETER_SCRIPT], capture_output=True, text=True,
+                                    timeout=INTERPRETER_TIMEOUT)
+            info = json.loads(result.stdout) if result.returncode == 0 else None
+        except (OSError, subprocess.TimeoutExpired, ValueError):
+            info = None
+    with _interpreter_lock:
+        _interpreter_cache[key] = info
+    return info
+
+
+def marker_environment(env_path=None):
+    """
+    Returns the PEP 508 marker environment of the given environment's interpreter.
+
+    Returns None if the interpreter can't be asked, meaning the running interpreter's applies.
+    """
+    python = environment_python(env_path)
+    if python is None or os.path.realpath(python) == os.path.realpath(sys.executable):
+        return None
+    info = interpreter_info(python)
+    return info["markers"] if info else None
+
+
+def parse_metadata_headers(lines):
+    """
+    Parses the RFC 822 style headers of METADATA / PKG-INFO content given as lines.
+
+    Only the header block is parsed; the long description after the first blank line is skipped.
+    Repeated headers (e.g. Requires-Dist) are collected into lists.
+    """
+    headers = {}
+    last_key = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            break
+        if line[0] in " \t" and last_key:
+            # Continuation line of a folded header
+            headers[last_key][-1] += "\n" + line.strip()
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            continue
+        last_key = key.strip().lower()
+        headers.setdefault(last_key, []).append(value.strip())
+    return headers
+
+
+def read_metadata_headers(metadata_path):
+    """Reads the headers of a METADATA / PKG-INFO file, see parse_metadata_headers()."""
+    try:
+        with open(metadata_path, encoding="utf-8", errors="replace") as metadata_file:
+            return parse_metadata_headers(metadata_file)
+    except OSError:
+        return {}
+
+
+def metadata_file(entry_path):
+    """Returns the path of the metadata file belonging to a dist-info / egg-info entry."""
+    if entry_path.endswith(".dist-info"):
+        return os.path.join(entry_path, "METADATA")
+    if os.path.isdir(entry_path):
+        return os.path.join(entry_path, "PKG-INFO")
+    return entry_path  # A flat *.egg-info file holds the PKG-INFO content itself
+
+
+def _scan_directory(directory, inventory):
+    """Adds every distribution found in the given site-packages directory to the inventory."""
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+
+    for entry in entries:
+        if not entry.name.endswith((".dist-info", ".egg-info")):
+            continue
+
+        metadata_path = metadata_file(entry.path)
+        headers = read_metadata_headers(metadata_path)
+        name = headers.get("name", [None])[0]
+        version = headers.get("version", [None])[0]
+
+        if not name:
+            # Fall back to the '<name>-<version>.dist-info' directory naming scheme
+            stem = entry.name.rsplit(".", 1)[0]
+            name, _, version = stem.partition("-")
+            version = version.split("-", 1)[0] or None
+
+        key = normalize_name(name)
+        # The first directory on the path wins, just like the import system
+        if key not in inventory:
+            inventory[key] = Distribution(name, version or "Unknown", directory, entry.path)
+
+
+def _directory_stamp(dirs):
+    """Returns the modification stamp of the given directories used to validate the cache."""
+    stamp = []
+    for directory in dirs:
+        try:
+            stamp.append((directory, os.stat(directory).st_mtime_ns))
+        except OSError:
+            stamp.append((directory, None))
+    return tuple(stamp)
+
+
+def get_inventory(env_path=None):
+    """
+    Returns a mapping of normalized project name to Distribution for the given environment.
+
+    The result is cached and only rebuilt when the mtime of a site-packages directory changes,
+    which happens whenever a distribution is installed, upgraded or removed.
+    """
+    dirs = tuple(site_packages_dirs(env_path))
+    stamp = _directory_stamp(dirs)
+
+    with _inventory_lock:
+        cached = _inventory_cache.get(dirs)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+    inventory = {}
+    with tracing.span("inventory scan", category="io", directories=len(dirs)) as span:
+        for directory in dirs:
+            _scan_directory(directory, inventory)
+        span.set(distributions=len(inventory))
+
+    with _inventory_lock:
+        _inventory_cache[dirs] = (stamp, inventory)
+    return inventory
+
+
+def invalidate_inventory(env_path=None):
+    """
+    Drops the cached inventory of the given environment.
+
+    Useful when a change might not have touched the mtime of site-packages (e.g. coarse timestamps).
+    """
+    dirs = tuple(site_packages_dirs(env_path))
+    with _inventory_lock:
+        _inventory_cache.pop(dirs, None)
+
+
+def get_distribution(env_path, package_name):
+    """Returns the Distribution installed under the given name, or None if it is not installed."""
+    return get_inventory(env_path).get(normalize_name(package_name))
+
+
+def get_installed_version(env_path, package_name):
+    """Returns the installed version of the given package, or None if it is not installed."""
+    distribution = get_distribution(env_path, package_name)
+    return distribution.version if distribution else None
+
+
+def format_package_list(inventory):
+    """
+    Formats an inventory as a two column table in the style of `pip list`.
+
+    Packages are sorted case-insensitively by name.
+    """
+    distributions = sorted(inventory.values(), key=lambda dist: dist.name.lower())
+    name_width = max([len("Package")] + [len(dist.name) for dist in distributions])
+    version_width = max([len("Version")] + [len(dist.version) for dist in distributions])
+
+    lines = [
+        f"{'Package':<{name_width}} Version",
+        f"{'-' * name_width} {'-' * version_width}",
+    ]
+    lines.extend(f"{dist.name:<{name_width}} {dist.version}" for dist in distributions)
+    return "\n".join(lines) + "\n"
+
+
+def read_record(distribution):
+    """
+    Returns the (path, size) entries of a distribution's RECORD file.
+
+    Paths are relative to the site-packages directory the distribution lives in; size is None
+    for entries without one (e.g. the RECORD file itself). Returns an empty list if there is no RECORD.
+    """
+    record_path = os.path.join(distribution.metadata_path, "RECORD")
+    entries = []
+    try:
+        with open(record_path, encoding="utf-8", errors="replace", newline="") as record_file:
+            for row in csv.reader(record_file):
+                if not row:
+                    continue
+                size = row[2] if len(row) > 2 else ""
+                entries.append((row[0], int(size) if size.isdigit() else None))
+    except OSError:
+        return []
+    return entries
+
+
+def distribution_size(distribution):
+    """
+    Returns the installed size in bytes of a distribution according to its RECORD file.
+
+    Returns None if the distribution has no RECORD (e.g. legacy egg-info installs).
+    """
+    entries = read_record(distribution)
+    if not entries:
+        return None
+    return sum(size for _, size in entries if size)
+
+
+def format_size(size):
+    """Formats a size in bytes for display, e.g. '12.3 MB'."""
+    if size is None:
+        return ""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
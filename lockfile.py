@@ -0,0 +1,205 @@
+"""
+Lockfile export and minimal-diff sync of an environment.
+
+A lockfile is a requirements file with an exact pin and the sha256 hashes of every installed
+distribution, so plain `pip install --require-hashes -r` can use it as well. Syncing compares the
+lockfile with the cached inventory and only runs pip for the difference; a sync with nothing to
+do never starts pip.
+"""
+import os
+import tempfile
+import time
+from collections import namedtuple
+
+import inventory
+import process
+import snapshots
+import wheel_cache
+from specs import marker_applies, parse_requirement, parse_version
+
+
+# A pinned distribution in a lockfile; hashes is a tuple of "sha256:<hex>" strings and extras a
+# sorted tuple of the extras it was installed with
+LockEntry = namedtuple("LockEntry", ["name", "version", "hashes", "extras"], defaults=((),))
+
+# Never removed or replaced by a sync: pip can't reliably replace itself from a requirements file
+PROTECTED_PACKAGES = {"pip"}
+
+
+def _release_hashes(data, version):
+    """Returns the sha256 hashes of every file of a release in a project's JSON metadata."""
+    releases = data.get("releases") or {}
+    files = releases.get(version)
+    if files is None:
+        # The installed version string may be spelled differently (e.g. '1.0' vs '1.0.0')
+        wanted = parse_version(version)
+        files = next((files for release, files in releases.items()
+                      if wanted is not None and parse_version(release) == wanted), [])
+    return tuple(sorted(
+        f"sha256:{file_info['digests']['sha256']}" for file_info in files
+        if (file_info.get("digests") or {}).get("sha256")
+    ))
+
+
+def lock_environment(env_path=None, with_hashes=True, on_missing=None):
+    """
+    Returns the LockEntry list of an environment, sorted by name.
+
+    Hashes of all files of each installed release are looked up on PyPI concurrently (and cached).
+    on_missing(name, version, reason) is called for distributions no hashes were found for,
+    e.g. local or editable installs; they are locked without hashes.
+    """
+    installed = {key: dist for key, dist in inventory.get_inventory(env_path).items()
+                 if key not in PROTECTED_PACKAGES}
+    hashes = {}
+    if with_hashes:
+        import pypi
+
+        for key, data, error in pypi.fetch_many(list(installed)):
+            dist = installed[key]
+            hashes[key] = _release_hashes(data, dist.version) if data is not None else ()
+            if not hashes[key] and on_missing:
+                on_missing(dist.name, dist.version, str(error) if error else "no files on the index")
+
+    return [LockEntry(dist.name, dist.version, hashes.get(key, ()))
+            for key, dist in sorted(installed.items())]
+
+
+def format_lockfile(entries, python_version=None):
+    """Formats lock entries as a requirements file in the style of pip-compile."""
+    lines = ["# Generated by PIP-MATE; install with `pip install --no-deps -r <this file>`"]
+    if python_version:
+        lines.append(f"# python: {python_version}, created: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    for entry in entries:
+        extras = f"[{','.join(entry.extras)}]" if entry.extras else ""
+        line = f"{entry.name}{extras}=={entry.version}"
+        if entry.hashes:
+            line += " \\\n" + " \\\n".join(f"    --hash={digest}" for digest in entry.hashes)
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def export_lockfile(path, env_path=None, with_hashes=True, on_missing=None):
+    """Writes the lockfile of an environment to path. Returns the number of locked packages."""
+    from outdated import environment_python_version
+
+    entries = lock_environment(env_path, with_hashes, on_missing)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as lock_file:
+        lock_file.write(format_lockfile(entries, environment_python_version(env_path)))
+    os.replace(temporary_path, path)
+    return len(entries)
+
+
+def read_lockfile(path, environment=None):
+    """
+    Reads a lockfile (or any fully pinned requirements file) into normalized name -> LockEntry.
+
+    Entries whose environment marker doesn't hold for environment (a marker environment as
+    returned by inventory.marker_environment(); the running interpreter's by default) are left
+    out, like pip does. Raises ValueError for lines that aren't exact '==' pins, since those
+    can't be synced.
+    """
+    with open(path, encoding="utf-8") as lock_file:
+        content = lock_file.read().replace("\\\n", " ")  # Join continuation lines
+
+    entries = {}
+    for line_number, line in enumerate(content.splitlines(), 1):
+        line = line.split(" #", 1)[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        # Per-requirement options such as --hash follow the requirement, which may contain spaces
+        parts = line.split(" --", 1)
+        options = ("--" + parts[1]).split() if len(parts) > 1 else []
+        requirement = parse_requirement(parts[0])
+        if requirement is None:
+            raise ValueError(f"{path}:{line_number}: not a valid requirement: {parts[0]}")
+        pins = list(requirement.specifier)
+        if len(pins) != 1 or pins[0].operator not in ("==", "===") or pins[0].version.endswith("*"):
+            raise ValueError(f"{path}:{line_number}: not an exact pin: {parts[0]}")
+        if not marker_applies(requirement, environment=environment):
+            continue
+        hashes = tuple(option[len("--hash="):] for option in options if option.startswith("--hash="))
+        entries[inventory.normalize_name(requirement.name)] = LockEntry(
+            requirement.name, pins[0].version, hashes, tuple(sorted(requirement.extras)))
+    return entries
+
+
+def _same_version(installed_version, locked_version):
+    """Compares versions the way pip does, so '1.0' and '1.0.0' are the same."""
+    installed, locked = parse_version(installed_version), parse_version(locked_version)
+    if installed is None or locked is None:
+        return installed_version == locked_version
+    return installed == locked
+
+
+def diff(locked, installed):
+    """
+    Computes the changes that bring an inventory in line with a lockfile.
+
+    Returns (to_install, to_remove): the LockEntry list of missing or differing packages and the
+    names of installed packages the lockfile doesn't list.
+    """
+    to_install = [
+        entry for key, entry in sorted(locked.items())
+        if key not in PROTECTED_PACKAGES
+        and (key not in installed or not _same_version(installed[key].version, entry.version))
+    ]
+    to_remove = [
+        dist.name for key, dist in sorted(installed.items())
+        if key not in locked and key not in PROTECTED_PACKAGES
+    ]
+    return to_install, to_remove
+
+
+def sync(path, env_path, pip_command, on_line, dry_run=False, cancel_event=None, allow_global=False):
+    """
+    Makes an environment match a lockfile by changing only what differs.
+
+    Extra packages are removed with one `pip uninstall`, and missing or differing ones are
+    installed with one `pip install --no-deps -r` of just the delta, with hash checking when
+    the lockfile has hashes. A snapshot of the packages about to change is taken first.
+    Returns (to_install, to_remove).
+
+    Syncing the global environment (env_path None) would uninstall every system package the
+    lockfile doesn't list, so it is refused with ValueError unless allow_global is set; a dry
+    run is always allowed. Raises CalledProcessError if pip fails.
+    """
+    installed = inventory.get_inventory(env_path)
+    to_install, to_remove = diff(read_lockfile(path, inventory.marker_environment(env_path)), installed)
+    if dry_run or (not to_install and not to_remove):
+        return to_install, to_remove
+    if env_path is None and not allow_global:
+        raise ValueError("refusing to sync the global environment, which would uninstall "
+                         f"{len(to_remove)} packages the lockfile doesn't list")
+
+    # Only installed packages change (installs use --no-deps), so those are all a snapshot needs
+    changed = [entry.name for entry in to_install if inventory.normalize_name(entry.name) in installed]
+    try:
+        snapshots.take(env_path, changed + to_remove, "sync", with_dependencies=False)
+    except OSError as e:
+        on_line(f"Couldn't take a snapshot before the sync: {e}\n")
+
+    if to_remove:
+        process.check_stream_command([pip_command, "uninstall", "-y"] + to_remove, on_line,
+                                     cancel_event=cancel_event)
+
+    if to_install:
+        unhashed = [entry.name for entry in to_install if not entry.hashes]
+        if unhashed:
+            # pip refuses a requirements file where only some entries have hashes
+            on_line(f"No hashes locked for {', '.join(unhashed)}; installing without hash checking.\n")
+        delta = format_lockfile([entry if not unhashed else entry._replace(hashes=()) for entry in to_install])
+
+        delta_file = tempfile.NamedTemporaryFile("w", suffix=".txt", prefix="pipmate-sync-", delete=False,
+                                                 encoding="utf-8")
+        try:
+            with delta_file:
+                delta_file.write(delta)
+            process.check_stream_command(
+                [pip_command, "install", "--no-deps"] + wheel_cache.install_options() + ["-r", delta_file.name],
+                on_line, cancel_event=cancel_event,
+            )
+        finally:
+            os.remove(delta_file.name)
+    return to_install, to_remove
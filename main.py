@@ -1,21 +1,170 @@
 import os
+import queue
 from random import sample
 import subprocess
 import sys
 import threading
-from time import sleep
+import time
 
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # Run headless when a command is given, e.g. `python main.py --json install requests`.
+    # This happens before tkinter and the GUI modules are imported, so no display is needed
+    import cli
+    sys.exit(cli.main())
 
 import tkinter as tk
-from tkinter import messagebox, simpledialog
-
-import requests as rq
-from colorama import Fore, init
+from tkinter import filedialog, messagebox, simpledialog, ttk
+
+import audit
+import batch
+import core
+import depgraph
+import disk_usage
+import inventory
+import lockfile
+import name_index
+import outdated
+import pip_worker
+import process
+from package_table import PackageTable
+import registry
+from scheduler import JobScheduler
+import snapshots
+from specs import parse_requirement, requirement_key, version_satisfies
+import tracing
+import venv_templates
+import wheel_cache
 
 
 # Global variable to track the virtual environment status
 virtualenv_path = None
 
+# Output written by worker threads, drained into result_text by the Tk main loop
+OUTPUT_POLL_MS = 30  # How often the main loop drains the output queue
+OUTPUT_BATCH_SIZE = 500  # Maximum number of queued chunks inserted per drain
+output_queue = queue.Queue(maxsize=5000)
+_CLEAR_OUTPUT = object()  # Queue marker that clears the result_text widget
+
+# How new virtual environments are created: "venv" (plain `python -m venv`), or opt in to
+# "template" (hardlink clone) or "without-pip"
+VENV_CREATION_MODE = os.environ.get("PIPMATE_VENV_MODE", venv_templates.MODE_VENV)
+# Packages preinstalled into the template environment, e.g. "wheel setuptools"
+VENV_BASE_PACKAGES = tuple(os.environ.get("PIPMATE_TEMPLATE_PACKAGES", "").split())
+
+# Scheduler running every operation; mutating jobs are serialized per environment
+job_scheduler = JobScheduler(max_workers=4)
+JOB_LIST_REFRESH_MS = 500  # How often the job list window refreshes
+
+METRICS_REFRESH_MS = 1000  # How often the metrics window refreshes
+UI_SPAN_THRESHOLD = 0.005  # Output drains slower than this (seconds) are recorded as spans
+# Chrome trace written when the app exits, e.g. to compare runs across machines
+TRACE_FILE = os.environ.get("PIPMATE_TRACE_FILE")
+
+COMPLETION_ROWS = 8  # Names shown in the completion dropdown under the package entry
+COMPLETION_HIDE_DELAY_MS = 150  # Lets a click on the dropdown land before focus loss hides it
+
+
+def _queue_output(item):
+    """
+    Queues an item for drain_output().
+
+    Worker threads block while the queue is full, until the main loop catches up. The main
+    thread is the one draining the queue, so it must never wait for it: it makes room by
+    draining a batch into the widget right away, which also keeps the output in order.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        output_queue.put(item)
+        return
+    while True:
+        try:
+            output_queue.put_nowait(item)
+            return
+        except queue.Full:
+            _drain_queue()
+
+
+def write_output(text):
+    """
+    Queues text for the result_text widget.
+
+    Safe to call from any thread; worker threads block briefly if the main loop falls behind.
+    """
+    _queue_output(text)
+
+
+def clear_output():
+    """Queues a request to clear the result_text widget. Safe to call from any thread."""
+    _queue_output(_CLEAR_OUTPUT)
+
+
+def call_in_ui(func):
+    """
+    Queues func() to run on the Tk main thread after the output queued before it is shown.
+
+    Worker threads must use this instead of touching widgets or message boxes directly.
+    """
+    _queue_output(func)
+
+
+def ask_in_ui(func):
+    """
+    Runs func() on the Tk main thread and returns its result, e.g. the answer to a message box.
+
+    Blocks until the user has answered, so only worker threads may call it.
+    """
+    answer = queue.Queue(maxsize=1)
+    call_in_ui(lambda: answer.put(func()))
+    return answer.get()
+
+
+def drain_output():
+    """
+    Moves queued output into the result_text widget and reschedules itself.
+
+    Runs on the Tk main loop every OUTPUT_POLL_MS milliseconds and coalesces everything
+    queued since the last run into a single insert, so long pip runs don't flood the widget.
+    """
+    _drain_queue()
+    result_text.after(OUTPUT_POLL_MS, drain_output)
+
+
+def _drain_queue():
+    """Moves up to OUTPUT_BATCH_SIZE queued items into the result_text widget. Main thread only."""
+    started = time.perf_counter()
+    chunks = []
+    callbacks = []
+    cleared = False
+    for _ in range(OUTPUT_BATCH_SIZE):
+        try:
+            item = output_queue.get_nowait()
+        except queue.Empty:
+            break
+        if item is _CLEAR_OUTPUT:
+            chunks = []  # Anything queued before the clear would be removed anyway
+            cleared = True
+        elif callable(item):
+            callbacks.append(item)
+        else:
+            chunks.append(item)
+
+    if cleared or chunks:
+        result_text.config(state=tk.NORMAL)  # Enable text widget for modification
+        if cleared:
+            result_text.delete(1.0, tk.END)
+        if chunks:
+            result_text.insert(tk.END, "".join(chunks))
+            result_text.see(tk.END)
+        result_text.config(state=tk.DISABLED)  # Disable text widget after update
+
+        # Only slow updates are recorded, since this runs every OUTPUT_POLL_MS
+        finished = time.perf_counter()
+        if finished - started >= UI_SPAN_THRESHOLD:
+            tracing.record("update output", "ui", started, finished, chunks=len(chunks))
+
+    # Run UI callbacks (message boxes, ...) once the text they follow is visible
+    for callback in callbacks:
+        result_text.after(0, callback)
+
 
 def on_entry_click(event):
     """
@@ -38,20 +187,166 @@ def on_focus_out(event):
         entry_package_name.insert(0, "Enter package name...")  # Insert placeholder text
         entry_package_name.config(fg="#999")  # Change text color to placeholder color
 
+    def hide_unless_focused():
+        """Hides the completion dropdown if neither the entry nor the dropdown has the focus."""
+        if entry_package_name.focus_get() not in (entry_package_name, completion_list):
+            hide_completions()
+
+    entry_package_name.after(COMPLETION_HIDE_DELAY_MS, hide_unless_focused)
+
+
+def on_name_typed(event):
+    """
+    Asks for completions of the text in the package entry after each keystroke.
+
+    The lookup runs on the completer thread and the dropdown is filled when it is done, so
+    typing never waits for it. Navigation keys have their own bindings.
+    """
+    if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+        return
+    text = entry_package_name.get().strip()
+    if not name_index.is_project_name(text):
+        hide_completions()
+        return
+    name_completer.request(text)
+
+
+def show_completions(text, names):
+    """
+    Fills the completion dropdown with names looked up for text. Runs on the main thread.
+
+    Results for text the user has already typed past are dropped.
+    """
+    if entry_package_name.get().strip() != text:
+        return
+    if not names or names == [inventory.normalize_name(text)]:
+        hide_completions()
+        return
 
-def is_valid_virtualenv(path):
+    completion_list.delete(0, tk.END)
+    completion_list.insert(tk.END, *names)
+    completion_list.config(height=min(len(names), COMPLETION_ROWS))
+    # Drawn over the widgets below the entry instead of pushing them down
+    completion_list.place(in_=entry_package_name, x=0, rely=1.0, relwidth=1.0)
+    completion_list.lift()
+
+
+def hide_completions(event=None):
+    """Hides the completion dropdown."""
+    completion_list.place_forget()
+
+
+def move_completion(step):
+    """Moves the highlighted completion up or down. Bound to the arrow keys of the entry."""
+    if not completion_list.winfo_ismapped():
+        return "break"
+    selection = completion_list.curselection()
+    position = selection[0] + step if selection else (0 if step > 0 else completion_list.size() - 1)
+    position = max(0, min(position, completion_list.size() - 1))
+    completion_list.selection_clear(0, tk.END)
+    completion_list.selection_set(position)
+    completion_list.see(position)
+    return "break"
+
+
+def accept_completion(event=None):
+    """Puts the highlighted completion into the entry. Bound to Return and to clicks on the dropdown."""
+    selection = completion_list.curselection()
+    if not completion_list.winfo_ismapped() or not selection:
+        return None
+    entry_package_name.delete(0, tk.END)
+    entry_package_name.insert(0, completion_list.get(selection[0]))
+    entry_package_name.config(fg="#333")
+    entry_package_name.icursor(tk.END)
+    entry_package_name.focus_set()
+    hide_completions()
+    return "break"
+
+
+def confirm_package_name(spec):
     """
-    Checks if the given path contains a valid virtual environment.
+    Validates a requirement spec against the local name index before pip is started.
 
-    A valid virtual environment should have the appropriate 'activate' script.
+    Shows an error for specs pip couldn't parse, and asks before installing a project the index
+    doesn't list, suggesting close matches. Returns True if the install should go ahead.
+    Must be called on the main thread.
     """
-    if not os.path.exists(path):
+    check = name_index.check_spec(spec)
+    if check.status == name_index.NAME_INVALID:
+        messagebox.showerror("Error", f"'{spec}' is not a valid package name or requirement.")
         return False
+    if check.status == name_index.NAME_UNKNOWN:
+        hint = f"\n\nDid you mean: {', '.join(check.suggestions)}?" if check.suggestions else ""
+        return messagebox.askyesno(
+            "Unknown Package", f"{check.name} is not listed on the package index.{hint}\n\nInstall it anyway?"
+        )
+    return True
+
+
+def get_env_key(env_path):
+    """
+    Returns the key the scheduler uses to serialize mutating jobs on an environment.
+
+    The global environment (no active virtualenv) shares a single key.
+    """
+    return os.path.realpath(env_path) if env_path else "<global>"
+
+
+def submit_job(name, func, env_path, mutating=False):
+    """
+    Submits func(job) to the job scheduler.
+
+    Mutating jobs on the same environment run one after another; read-only jobs run in parallel.
+    Unexpected errors are reported in the result text box instead of being lost in the worker.
+    """
+    def run(job):
+        """Runs the job function in a span and reports unexpected errors."""
+        queued = job.started_at - job.submitted_at if job.started_at else 0
+        # Spans are grouped by the handler (install, fetch, ...) rather than by the package name
+        with tracing.span(name, category="job", operation=func.__name__, job_id=job.id, queued=round(queued, 6)):
+            try:
+                return func(job)
+            except Exception as e:
+                write_output(f"Unexpected error in '{name}': {str(e)}\n")
+                raise
+
+    return job_scheduler.submit(name, run, env_key=get_env_key(env_path), mutating=mutating)
+
+
+def take_snapshot(env_path, specs, label, with_dependencies=True):
+    """Snapshots what an operation on specs may change, on a worker thread. Returns the id or None."""
+    try:
+        return snapshots.take(env_path, specs, label, with_dependencies)
+    except OSError as e:
+        write_output(f"Couldn't take a snapshot: {e}\n")
+        return None
+
+
+def roll_back_snapshot(env_path, snapshot_id, on_done=None):
+    """Restores a snapshot as a job; on_done() is called on the UI thread afterwards."""
+    def roll_back(job):
+        """Puts the saved packages back and removes the ones installed since."""
+        clear_output()
+        write_output(f"Rolling back to snapshot {snapshot_id}...\n")
+        try:
+            snapshots.rollback(env_path, snapshot_id, write_output)
+            write_output("Rollback finished.\n")
+        except (OSError, ValueError) as e:
+            write_output(f"Couldn't roll back: {e}\n")
+            call_in_ui(lambda: messagebox.showerror("Error", f"Couldn't roll back: {e}"))
+        if on_done:
+            call_in_ui(on_done)
+
+    # A rollback changes the environment, so it waits for other changes to it
+    submit_job(f"Roll back {snapshot_id}", roll_back, env_path, mutating=True)
 
-    # Check for the presence of 'bin/activate' (Linux/Mac) or 'Scripts/activate' (Windows)
-    activate_script = os.path.join(path, "bin", "activate") if os.name != 'nt' else os.path.join(path, "Scripts",
-                                                                                                 "activate")
-    return os.path.exists(activate_script)
+
+def report_failure(env_path, snapshot_id, message):
+    """Shows an error on the UI thread and offers to roll back to the snapshot taken before the operation."""
+    if snapshot_id is None:
+        messagebox.showerror("Error", message)
+    elif messagebox.askyesno("Error", f"{message}\n\nRoll back to the state before?", icon=messagebox.ERROR):
+        roll_back_snapshot(env_path, snapshot_id)
 
 
 def create_virtualenv():
@@ -67,44 +362,51 @@ def create_virtualenv():
         messagebox.showerror("Error", "No path provided!")
         return
 
-    if is_valid_virtualenv(env_path):
+    if core.is_valid_virtualenv(env_path):
         messagebox.showerror("Error", "A valid virtual environment already exists at this path!")
         return
 
-    def create():
+    def create(job):
         """
         Handles the virtual environment creation process.
 
-        Runs in a separate thread to prevent UI freezing and updates the UI with progress information.
+        Runs on the job scheduler to prevent UI freezing and updates the UI with progress information.
         """
-        global virtualenv_path
-        result_text.config(state=tk.NORMAL)
-        result_text.delete(1.0, tk.END)
+        clear_output()
 
         try:
             # Notify user that the virtual environment is being created
-            result_text.insert(tk.END, f"Creating virtual environment at {env_path}...\n")
+            write_output(f"Creating virtual environment at {env_path}...\n")
 
-            # Run the command to create a virtual environment
-            subprocess.check_call([sys.executable, "-m", "venv", env_path])
-            virtualenv_path = env_path
+            # Clone the cached template environment (or fall back to `python -m venv`)
+            core.create_virtualenv(env_path, VENV_CREATION_MODE, VENV_BASE_PACKAGES, write_output)
 
             success_message = f"Virtual environment created and activated at {env_path}"
-            result_text.insert(tk.END, success_message + "\n")
+            write_output(success_message + "\n")
 
-            # Display success message in the main window
-            result_text.winfo_toplevel().after(0, lambda: messagebox.showinfo("Success", success_message))
+            # Remember the environment so it can be picked from the Environments window later
+            registry.register_environment(env_path)
 
-        except subprocess.CalledProcessError as e:
+            # Activate the new environment and display the success message on the main thread
+            call_in_ui(lambda: set_virtualenv_path(env_path))
+            call_in_ui(lambda: messagebox.showinfo("Success", success_message))
+
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
             # Handle errors during virtual environment creation
             error_message = f"Error creating virtual environment: {str(e)}"
-            result_text.insert(tk.END, error_message + "\n")
-            result_text.winfo_toplevel().after(0, lambda: messagebox.showerror("Error", error_message))
+            write_output(error_message + "\n")
+            call_in_ui(lambda: messagebox.showerror("Error", error_message))
 
-        result_text.config(state=tk.DISABLED)
+    # Run the virtual environment creation process on the job scheduler
+    submit_job(f"Create virtualenv {env_path}", create, env_path, mutating=True)
 
-    # Run the virtual environment creation process in a separate thread
-    threading.Thread(target=create, daemon=True).start()
+
+def set_virtualenv_path(env_path):
+    """Sets the active virtual environment. Must be called on the main thread."""
+    global virtualenv_path
+    virtualenv_path = env_path
+    # Start the environment's pip worker now, so the first operation doesn't wait for pip to import
+    pip_worker.warm_up(get_pip_command())
 
 
 def activate_virtualenv():
@@ -122,29 +424,16 @@ def activate_virtualenv():
         messagebox.showerror("Error", "No path provided!")  # Show an error if no path is entered
         return
 
-    if not is_valid_virtualenv(env_path):
+    if not core.is_valid_virtualenv(env_path):
         messagebox.showerror("Error", "Invalid virtual environment path!")  # Show an error if the path is invalid
         return
 
-    def activate():
-        """Activates the virtual environment and updates the UI."""
-        global virtualenv_path
-
-        result_text.config(state=tk.NORMAL)  # Enable text widget for modification
-        result_text.delete(1.0, tk.END)  # Clear previous output
-
-        virtualenv_path = env_path  # Store the virtual environment path
-        result_text.insert(tk.END, f"Virtual environment activated: {virtualenv_path}\n")
-
-        # Show confirmation message asynchronously
-        result_text.after(0, lambda: messagebox.showinfo(
-            "Info", f"Virtual environment activated: {virtualenv_path}"
-        ))
-
-        result_text.config(state=tk.DISABLED)  # Disable text widget after update
-
-    # Run activation in a separate thread to keep the UI responsive
-    threading.Thread(target=activate).start()
+    # Activation only swaps the active path, so it runs directly on the main thread
+    registry.register_environment(env_path)  # Remember it for the Environments window
+    clear_output()  # Clear previous output
+    set_virtualenv_path(env_path)  # Store the virtual environment path
+    write_output(f"Virtual environment activated: {virtualenv_path}\n")
+    messagebox.showinfo("Info", f"Virtual environment activated: {virtualenv_path}")
 
 
 def deactivate_virtualenv():
@@ -157,27 +446,11 @@ def deactivate_virtualenv():
         messagebox.showerror("Error", "No virtual environment is currently active!")
         return
 
-    def deactivate():
-        """Deactivates the virtual environment and updates the UI."""
-        global virtualenv_path
-
-        result_text.config(state=tk.NORMAL)  # Enable text widget for modification
-        result_text.delete(1.0, tk.END)  # Clear previous output
-
-        virtualenv_path = None  # Reset the virtual environment path
-        result_text.insert(
-            tk.END, "Virtual environment deactivated. Using global environment now.\n"
-        )
-
-        # Show confirmation message asynchronously
-        result_text.after(0, lambda: messagebox.showinfo(
-            "Info", "Virtual environment deactivated. Using global environment now."
-        ))
-
-        result_text.config(state=tk.DISABLED)  # Disable text widget after update
-
-    # Run deactivation in a separate thread to keep the UI responsive
-    threading.Thread(target=deactivate).start()
+    # Deactivation only resets the active path, so it runs directly on the main thread
+    clear_output()  # Clear previous output
+    set_virtualenv_path(None)  # Reset the virtual environment path
+    write_output("Virtual environment deactivated. Using global environment now.\n")
+    messagebox.showinfo("Info", "Virtual environment deactivated. Using global environment now.")
 
 
 def get_pip_command():
@@ -186,12 +459,20 @@ def get_pip_command():
 
     If no virtual environment is active, returns the system-wide pip command.
     """
-    if virtualenv_path:
-        # Construct the pip path based on the operating system
-        pip_path = os.path.join(virtualenv_path, 'bin', 'pip') if os.name != 'nt' else os.path.join(virtualenv_path, 'Scripts', 'pip.exe')
-        return pip_path
-    else:
-        return "pip"  # Return the system-wide pip command if no virtual environment is active
+    return core.get_pip_command(virtualenv_path)
+
+
+def get_package_name():
+    """
+    Returns the package name typed into the entry, or None if it is empty.
+
+    Shows an error message when no name was entered. Must be called on the main thread.
+    """
+    package_name = entry_package_name.get().strip()
+    if not package_name or package_name == "Enter package name...":
+        messagebox.showerror("Error", "Please enter a package name!")
+        return None
+    return package_name
 
 
 def fetch_package_info():
@@ -200,53 +481,35 @@ def fetch_package_info():
 
     If the package name is empty or invalid, an error message is shown.
     """
-    def fetch():
-        """Fetches the package information from PyPI in a separate thread."""
-        result_text.config(state=tk.NORMAL)  # Enable text widget for modification
-        result_text.delete(1.0, tk.END)  # Clear the result text before starting
+    # Check package name input in the main thread
+    package_name = get_package_name()
+    if not package_name:
+        return
 
-        package_name = entry_package_name.get().strip()
+    def fetch(job):
+        """Fetches the package information from PyPI on a worker thread."""
+        clear_output()  # Clear the result text before starting
 
-        # Check if package name is provided
-        if not package_name or package_name == "Enter package name...":
-            # Use after() to run UI updates on the main thread
-            result_text.after(0, lambda: messagebox.showerror("Error", "Please enter a package name!"))
-            return
+        write_output(f"Fetching package information for {package_name}...\n")
+        # Query PyPI through the core API, which uses the shared, connection-pooled session
+        package_info = core.package_info(package_name)[0]
 
-        url = f"https://pypi.org/pypi/{package_name}/json"
-        try:
-            result_text.insert(tk.END, f"Fetching package information for {package_name}...\n")
-            response = rq.get(url, timeout=5)  # Send request to PyPI API
-            response.raise_for_status()  # Check for successful response
-            data = response.json()
-            package_info = data.get("info", {})
-
-            # Extract relevant package information
-            name = package_info.get("name", "Unknown")
-            version = package_info.get("version", "Unknown")
-            summary = package_info.get("summary", "No description available.")
-            author = package_info.get("author", "Unknown")
-            project_urls = package_info.get("project_urls", {})
-            documentation_url = project_urls.get("Documentation", "No documentation available")
-
-            # Display the fetched data in the text widget
-            result_text.insert(tk.END,
-                               f"Package Name: {name}\n"
-                               f"Version: {version}\n"
-                               f"Description: {summary}\n"
-                               f"Author: {author}\n"
-                               f"Documentation: {documentation_url}\n"
-                               f"Source: {url}\n"
-                               )
-
-        except rq.exceptions.RequestException:
+        if "error" in package_info:
             # Handle errors during the fetch operation
-            result_text.insert(tk.END, "Error fetching package details.\n")
+            write_output("Error fetching package details.\n")
+            return
 
-        result_text.config(state=tk.DISABLED)  # Disable text widget after update
+        # Display the fetched data in the text widget
+        write_output(f"Package Name: {package_info['name']}\n"
+                     f"Version: {package_info['version']}\n"
+                     f"Description: {package_info['summary']}\n"
+                     f"Author: {package_info['author']}\n"
+                     f"Documentation: {package_info['documentation']}\n"
+                     f"Source: {package_info['source']}\n"
+                     )
 
-    # Start the fetch operation in a separate thread to avoid UI freeze
-    threading.Thread(target=fetch).start()
+    # Fetching is read-only, so it can run in parallel with other jobs
+    submit_job(f"Fetch info {package_name}", fetch, virtualenv_path)
 
 
 def install_package():
@@ -256,44 +519,51 @@ def install_package():
     Checks if the package is already installed. If not, installs it and updates the UI accordingly.
     """
     # Check package name input in the main thread
-    package_name = entry_package_name.get().strip()
-    if not package_name or package_name == "Enter package name...":
-        messagebox.showerror("Error", "Please enter a package name!")
+    package_name = get_package_name()
+    if not package_name:
+        return
+    # Catch typos before pip spends time resolving a project that doesn't exist
+    if not confirm_package_name(package_name):
         return
 
-    def install():
+    env_path = virtualenv_path
+    pip_command = get_pip_command()  # Get the correct pip command based on the environment
+
+    def install(job):
         """Handles the package installation process."""
-        result_text.config(state=tk.NORMAL)
-        result_text.delete(1.0, tk.END)  # Clear the result text before starting
+        clear_output()  # Clear the result text before starting
+
+        # Check if the package is already installed using the cached inventory instead of `pip show`.
+        # Paths and URLs go to pip as they are; requested extras may still lack their dependencies
+        with tracing.span("pre-check"):
+            requirement = parse_requirement(package_name)
+            installed_version = None
+            if requirement is not None and not requirement.extras:
+                installed_version = inventory.get_installed_version(env_path, requirement_key(requirement))
+        if installed_version and version_satisfies(installed_version, requirement.specifier):
+            write_output(f"{package_name} is already installed.\n")
+            # Display the message on the main thread
+            call_in_ui(lambda: messagebox.showinfo("Info", f"{package_name} is already installed."))
+            return
 
-        pip_command = get_pip_command()  # Get the correct pip command based on the environment
+        snapshot_id = take_snapshot(env_path, [package_name], "install")
         try:
-            # Check if the package is already installed
-            subprocess.check_output([pip_command, "show", package_name])
-            result_text.insert(tk.END, f"{package_name} is already installed.\n")
-            # Use after() to display message on the main thread
-            result_text.after(0, lambda: messagebox.showinfo("Info", f"{package_name} is already installed."))
+            # If not installed, try installing the package
+            write_output(f"Installing {package_name}...\n")
+            process.check_stream_command([pip_command, "install"] + wheel_cache.install_options() + [package_name], write_output,
+                                         cancel_event=job.cancel_event)
+            write_output(f"{package_name} has been installed successfully.\n")
+            # Display the success message on the main thread
+            call_in_ui(lambda: messagebox.showinfo(
+                "Success", f"{package_name} has been installed successfully."
+            ))
         except subprocess.CalledProcessError:
-            try:
-                # If not installed, try installing the package
-                result_text.insert(tk.END, f"Installing {package_name}...\n")
-                subprocess.check_call([pip_command, "install", package_name])
-                result_text.insert(tk.END, f"{package_name} has been installed successfully.\n")
-                # Use after() to display success message on the main thread
-                result_text.after(0, lambda: messagebox.showinfo(
-                    "Success", f"{package_name} has been installed successfully."
-                ))
-            except subprocess.CalledProcessError:
-                result_text.insert(tk.END, f"Couldn't find or install {package_name}.\n")
-                # Use after() to display error message on the main thread
-                result_text.after(0, lambda: messagebox.showerror(
-                    "Error", f"Couldn't find or install {package_name}."
-                ))
-
-        result_text.config(state=tk.DISABLED)
-
-    # Start the install operation in a separate thread to keep the UI responsive
-    threading.Thread(target=install).start()
+            write_output(f"Couldn't find or install {package_name}.\n")
+            # Display the error message on the main thread, offering to undo a partial install
+            call_in_ui(lambda: report_failure(env_path, snapshot_id, f"Couldn't find or install {package_name}."))
+
+    # Installs are serialized with other changes to the same environment
+    submit_job(f"Install {package_name}", install, env_path, mutating=True)
 
 
 def uninstall_package():
@@ -303,132 +573,1002 @@ def uninstall_package():
     Checks if the package is installed. If it is, it uninstalls the package and updates the UI accordingly.
     """
     # Check package name input in the main thread
-    package_name = entry_package_name.get().strip()
-    if not package_name or package_name == "Enter package name...":
-        messagebox.showerror("Error", "Please enter a package name!")
+    package_name = get_package_name()
+    if not package_name:
         return
 
-    def uninstall():
+    # An entry like 'requests>=2' or 'pkg[extra]' names the project to remove
+    requirement = parse_requirement(package_name)
+    if requirement is not None:
+        package_name = requirement.name
+
+    env_path = virtualenv_path
+    pip_command = get_pip_command()  # Get the correct pip command based on the environment
+
+    def uninstall(job):
         """Handles the package uninstallation process."""
-        result_text.config(state=tk.NORMAL)
-        result_text.delete(1.0, tk.END)  # Clear the result text before starting
+        clear_output()  # Clear the result text before starting
+
+        # Check if the package is installed using the cached inventory instead of `pip show`
+        with tracing.span("pre-check"):
+            installed_version = inventory.get_installed_version(env_path, package_name)
+        if not installed_version:
+            write_output(f"{package_name} is not installed.\n")
+            # Display the error message on the main thread
+            call_in_ui(lambda: messagebox.showerror("Error", f"{package_name} is not installed."))
+            return
 
-        pip_command = get_pip_command()  # Get the correct pip command based on the environment
+        # Packages still depending on it, and dependencies nothing else needs once it is gone
+        with tracing.span("dependency graph"):
+            graph = depgraph.get_graph(env_path)
+            dependents = sorted(graph.dependents(package_name))
+            orphans = sorted(graph.orphaned_by([package_name]))
+
+        # Warn before removing a package other packages still depend on
+        if dependents and not ask_in_ui(lambda: messagebox.askyesno(
+            "Uninstall", f"{package_name} is required by {', '.join(dependents)}.\n\nUninstall it anyway?"
+        )):
+            write_output(f"Uninstalling {package_name} was cancelled.\n")
+            return
+
+        snapshot_id = take_snapshot(env_path, [package_name], "uninstall", with_dependencies=False)
         try:
-            # Check if the package is installed
-            subprocess.check_output([pip_command, "show", package_name])
-            result_text.insert(tk.END, f"Uninstalling {package_name}...\n")
+            write_output(f"Uninstalling {package_name}...\n")
             # Uninstall the package
-            subprocess.check_call([pip_command, "uninstall", package_name, "-y"])
-            result_text.insert(tk.END, f"{package_name} has been uninstalled successfully.\n")
-            # Use after() to display success message on the main thread
-            result_text.after(0, lambda: messagebox.showinfo(
+            process.check_stream_command([pip_command, "uninstall", package_name, "-y"], write_output,
+                                         cancel_event=job.cancel_event)
+            write_output(f"{package_name} has been uninstalled successfully.\n")
+            if orphans:
+                write_output(f"No longer required by any package: {', '.join(orphans)}\n")
+            # Display the success message on the main thread
+            call_in_ui(lambda: messagebox.showinfo(
                 "Success", f"{package_name} has been uninstalled successfully."
             ))
         except subprocess.CalledProcessError:
-            result_text.insert(tk.END, f"{package_name} is not installed or an error occurred.\n")
-            # Use after() to display error message on the main thread
-            result_text.after(0, lambda: messagebox.showerror(
-                "Error", f"{package_name} is not installed or an error occurred."
-            ))
-
-        result_text.config(state=tk.DISABLED)
+            write_output(f"An error occurred while uninstalling {package_name}.\n")
+            # Display the error message on the main thread, offering to undo a partial uninstall
+            call_in_ui(lambda: report_failure(env_path, snapshot_id,
+                                              f"An error occurred while uninstalling {package_name}."))
 
-    # Start the uninstall operation in a separate thread to keep the UI responsive
-    threading.Thread(target=uninstall).start()
+    # Uninstalls are serialized with other changes to the same environment
+    submit_job(f"Uninstall {package_name}", uninstall, env_path, mutating=True)
 
 
 def show_installed_packages():
     """
-    Displays a list of installed packages using pip.
+    Displays the installed packages of the active environment in a sortable, filterable table.
 
-    Fetches the list of installed packages and shows the output in the result_text widget.
+    Reads the installed distributions from site-packages on a worker thread, then fills in
+    the size of each package once it has been computed.
     """
-    def fetch_packages():
-        """Fetches the installed packages in a separate thread."""
-        result_text.config(state=tk.NORMAL)  # Enable text widget for modification
-        result_text.delete(1.0, tk.END)  # Clear the result text before starting
+    env_path = virtualenv_path
+
+    window = tk.Toplevel()
+    window.title(f"Installed Packages - {env_path or 'global environment'}")
+    window.geometry("760x580")
+    window.config(bg="#f7f7f7")
+    table = PackageTable(window, bg="#f7f7f7")
+    table.pack(fill=tk.BOTH, expand=True)
+
+    # Dependencies of the selected package, answered from the environment's dependency graph
+    details_label = tk.Label(window, text="Select a package to see its dependencies.", font=("Arial", 10),
+                             fg="#333", bg="#f7f7f7", justify=tk.LEFT, anchor="w", wraplength=720)
+    details_label.pack(fill=tk.X, padx=10, pady=(0, 5))
+    graph = {}
+
+    def show_dependencies(event=None):
+        """Shows what the selected package requires and what requires it."""
+        selection = table.tree.selection()
+        if not selection or "graph" not in graph:
+            return
+        key = selection[0]
+        requires = ", ".join(sorted(graph["graph"].dependencies(key))) or "nothing"
+        required_by = ", ".join(sorted(graph["graph"].dependents(key))) or "nothing (top-level package)"
+        details_label.config(text=f"{table.model.rows[key].name} requires: {requires}\nRequired by: {required_by}")
+
+    table.tree.bind("<<TreeviewSelect>>", show_dependencies)
+
+    def check_conflicts():
+        """Lists unsatisfied and missing dependencies of the environment, like `pip check`."""
+        if "graph" not in graph:
+            return
+        clear_output()
+        conflicts = graph["graph"].conflicts()
+        missing = graph["graph"].missing()
+        for dependent, requirement, distribution in conflicts:
+            write_output(f"{dependent} requires {requirement}, but {distribution.version} is installed.\n")
+        for dependent, requirement in missing:
+            write_output(f"{dependent} requires {requirement}, which is not installed.\n")
+        if not conflicts and not missing:
+            write_output("No broken requirements found.\n")
+
+    tk.Button(window, text="Check Conflicts", command=check_conflicts, bg="#007BFF", fg="white",
+              font=("Arial", 10, "bold"), relief="flat", width=16).pack(pady=(0, 10))
+
+    def fetch_packages(job):
+        """Fetches the installed packages and their sizes on a worker thread."""
+        clear_output()  # Clear the result text before starting
 
-        pip_command = get_pip_command()  # Get the correct pip command based on the environment
         try:
-            result_text.insert(tk.END, "Fetching installed packages...\n")
-            # Get the list of installed packages
-            installed_packages = subprocess.check_output([pip_command, "list"])
-            result_text.insert(tk.END, installed_packages.decode("utf-8"))
-        except subprocess.CalledProcessError as e:
-            result_text.insert(tk.END, f"Error fetching installed packages: {str(e)}\n")
+            write_output("Fetching installed packages...\n")
+            # Read the installed packages from the environment's metadata instead of `pip list`
+            installed_packages = inventory.get_inventory(env_path)
+        except OSError as e:
+            write_output(f"Error fetching installed packages: {str(e)}\n")
+            return
+
+        distributions = list(installed_packages.values())
+        write_output(f"{len(distributions)} packages installed.\n")
+        call_in_ui(lambda: table.winfo_exists() and table.load(distributions))
 
-        result_text.config(state=tk.DISABLED)  # Disable text widget after the update
+        # The graph is updated incrementally, so only changed packages are re-read
+        dependency_graph = depgraph.get_graph(env_path)
+        call_in_ui(lambda: graph.update(graph=dependency_graph))
 
-    # Start the fetch operation in a separate thread to keep the UI responsive
-    threading.Thread(target=fetch_packages).start()
+        # Sizes are measured on disk, which takes longer the first time, so they are filled in afterwards
+        usages, _ = disk_usage.environment_usage(env_path, job.cancel_event)
+        if job.cancelled:
+            return
+        sizes = {inventory.normalize_name(usage.name): usage.size for usage in usages}
+        call_in_ui(lambda: table.winfo_exists() and table.set_sizes(sizes))
+
+    # Listing is read-only, so it can run in parallel with other jobs
+    submit_job("Show installed packages", fetch_packages, env_path)
 
 
 def upgrade_package():
     """
-    Upgrades a package using pip in a separate thread.
+    Upgrades a package using pip on the job scheduler.
 
     Checks if the package is provided and upgrades it, showing the result in the result_text widget.
     """
-    def upgrade():
+    # Check package name input in the main thread
+    package_name = get_package_name()
+    if not package_name:
+        return
+
+    env_path = virtualenv_path
+    pip_command = get_pip_command()  # Get the correct pip command based on the environment
+
+    def upgrade(job):
         """Handles the package upgrade process."""
-        result_text.config(state=tk.NORMAL)  # Enable text widget for modification
-        result_text.delete(1.0, tk.END)  # Clear the result text before starting
+        clear_output()  # Clear the result text before starting
+
+        snapshot_id = take_snapshot(env_path, [package_name], "upgrade")
+        try:
+            write_output(f"Upgrading {package_name}...\n")
+            # Attempt to upgrade the package
+            process.check_stream_command([pip_command, "install", "--upgrade"] + wheel_cache.install_options() + [package_name], write_output,
+                                         cancel_event=job.cancel_event)
+            write_output(f"{package_name} has been upgraded successfully.\n")
+            # Show success message in the main thread
+            call_in_ui(lambda: messagebox.showinfo("Success", f"{package_name} has been upgraded successfully."))
+        except subprocess.CalledProcessError:
+            write_output(f"Error upgrading {package_name}.\n")
+            # Show error message in the main thread, offering to undo a partial upgrade
+            call_in_ui(lambda: report_failure(env_path, snapshot_id, f"Error upgrading {package_name}."))
 
-        package_name = entry_package_name.get().strip()
+    # Upgrades are serialized with other changes to the same environment
+    submit_job(f"Upgrade {package_name}", upgrade, env_path, mutating=True)
 
-        # Check if the package name is provided
-        if not package_name or package_name == "Enter package name...":
-            messagebox.showerror("Error", "Please enter a package name!")
+
+def check_for_updates():
+    """
+    Opens a window listing the installed packages that have newer releases on PyPI.
+
+    All packages are looked up concurrently and the list fills in as the answers arrive.
+    The selected (or all) outdated packages can then be upgraded in a single pip run.
+    """
+    env_path = virtualenv_path
+    pip_command = get_pip_command()  # Get the correct pip command based on the environment
+
+    window = tk.Toplevel()
+    window.title(f"Updates - {env_path or 'global environment'}")
+    window.config(bg="#f7f7f7")
+
+    status_label = tk.Label(window, text="Checking for updates...", font=("Arial", 11), fg="#333", bg="#f7f7f7")
+    status_label.pack(padx=10, pady=(10, 5), anchor="w")
+    update_list = tk.Listbox(window, width=70, height=15, font=("Courier New", 11), bd=2, relief="solid",
+                             selectmode=tk.EXTENDED)
+    update_list.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+    shown_updates = []
+    progress = {"checked": 0, "failed": 0, "total": "?"}
+
+    def add_result(name, installed_version, newer_version, error):
+        """Adds a finished lookup to the window (runs on the main thread)."""
+        if not window.winfo_exists():
+            return
+        progress["checked"] += 1
+        if error is not None:
+            progress["failed"] += 1
+        elif newer_version:
+            shown_updates.append(name)
+            update_list.insert(tk.END, f"{name:<35} {installed_version:>14} -> {newer_version}")
+        status_label.config(text=f"Checked {progress['checked']} of {progress['total']} packages, "
+                                 f"{len(shown_updates)} outdated"
+                                 + (f", {progress['failed']} lookups failed" if progress["failed"] else ""))
+
+    def run_check(job):
+        """Looks up every installed package on PyPI concurrently."""
+        installed = inventory.get_inventory(env_path)
+        progress["total"] = len(installed)
+        python_version = outdated.environment_python_version(env_path)
+        outdated.check_outdated(
+            installed, python_version,
+            lambda *result: call_in_ui(lambda: add_result(*result)),
+            cancel_event=job.cancel_event,
+        )
+
+    def upgrade(names):
+        """Upgrades the given packages with a single pip run."""
+        if not names:
+            messagebox.showerror("Error", "Please select at least one package!", parent=window)
             return
 
+        def run_upgrade(job):
+            """Runs the batch upgrade on a worker thread."""
+            clear_output()
+            write_output(f"Upgrading {len(names)} package(s)...\n")
+
+            def report(name, status, detail):
+                """Writes the result of a single package as soon as it is known."""
+                write_output(f"{name}: {status}" + (f" ({detail})" if detail else "") + "\n")
+
+            succeeded = batch.run_batch(batch.UPGRADE, names, env_path, pip_command, report, write_output,
+                                        job.cancel_event)
+            write_output("Upgrade finished" + ("." if succeeded else " with errors.") + "\n")
+
+        # Upgrades are serialized with other changes to the same environment
+        submit_job(f"Upgrade {len(names)} outdated package(s)", run_upgrade, env_path, mutating=True)
+
+    button_frame = tk.Frame(window, bg="#f7f7f7")
+    button_frame.pack(padx=10, pady=10)
+    button_style = {"font": ("Arial", 10, "bold"), "width": 16, "relief": "flat", "fg": "white"}
+    tk.Button(button_frame, text="Upgrade Selected", bg="#28A745", **button_style,
+              command=lambda: upgrade([shown_updates[index] for index in update_list.curselection()])
+              ).grid(row=0, column=0, padx=5)
+    tk.Button(button_frame, text="Upgrade All", bg="#28A745", **button_style,
+              command=lambda: upgrade(list(shown_updates))).grid(row=0, column=1, padx=5)
+
+    # Lookups are read-only, so they run in parallel with other jobs
+    submit_job("Check for updates", run_check, env_path)
+
+
+def open_batch_window():
+    """
+    Opens a window for installing, upgrading or uninstalling many packages at once.
+
+    Specs can be pasted (one per line or separated by spaces) or loaded from a requirements file.
+    Each operation runs a single pip invocation and reports the result of every package as it arrives.
+    """
+    window = tk.Toplevel()
+    window.title("Batch Operations")
+    window.config(bg="#f7f7f7")
+
+    tk.Label(window, text="Package specs (one per line or a requirements file):", font=("Arial", 11),
+             fg="#333", bg="#f7f7f7").pack(padx=10, pady=(10, 5), anchor="w")
+
+    specs_text = tk.Text(window, height=12, width=50, font=("Courier New", 12), bd=2, relief="solid",
+                         bg="#fff", fg="#333")
+    specs_text.pack(padx=10, pady=5)
+
+    def load_requirements():
+        """Loads the specs of a requirements file into the text box."""
+        path = filedialog.askopenfilename(
+            parent=window, title="Select requirements file",
+            filetypes=[("Requirements files", "*.txt"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            specs = batch.read_requirements_file(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Couldn't read requirements file: {str(e)}", parent=window)
+            return
+        specs_text.delete(1.0, tk.END)
+        specs_text.insert(tk.END, "\n".join(specs) + "\n")
+
+    def run(operation):
+        """Starts the batch operation for the specs entered in the text box."""
+        specs = batch.parse_specs(specs_text.get(1.0, tk.END))
+        if not specs:
+            messagebox.showerror("Error", "Please enter at least one package!", parent=window)
+            return
+
+        env_path = virtualenv_path
         pip_command = get_pip_command()  # Get the correct pip command based on the environment
+
+        def run_operation(job):
+            """Runs the batch operation on a worker thread and reports each package result."""
+            clear_output()  # Clear the result text before starting
+            write_output(f"Running batch {operation} for {len(specs)} package(s)...\n")
+
+            def report(name, status, detail):
+                """Writes the result of a single package as soon as it is known."""
+                write_output(f"{name}: {status}" + (f" ({detail})" if detail else "") + "\n")
+
+            try:
+                succeeded = batch.run_batch(operation, specs, env_path, pip_command, report, write_output,
+                                            job.cancel_event)
+            except OSError as e:
+                succeeded = False
+                write_output(f"Error running pip: {str(e)}\n")
+
+            summary = f"Batch {operation} finished" + ("." if succeeded else " with errors.")
+            write_output(summary + "\n")
+            # Display the summary on the main thread
+            call_in_ui(lambda: (messagebox.showinfo if succeeded else messagebox.showerror)(
+                "Batch", summary
+            ))
+
+        # Batch operations are serialized with other changes to the same environment
+        submit_job(f"Batch {operation} ({len(specs)} packages)", run_operation, env_path, mutating=True)
+
+    button_frame = tk.Frame(window, bg="#f7f7f7")
+    button_frame.pack(padx=10, pady=10)
+
+    button_style = {"font": ("Arial", 10, "bold"), "width": 14, "relief": "flat", "fg": "white"}
+    tk.Button(button_frame, text="Load File", command=load_requirements, bg="#6C757D", **button_style).grid(row=0, column=0, padx=5)
+    tk.Button(button_frame, text="Install All", command=lambda: run(batch.INSTALL), bg="#28A745", **button_style).grid(row=0, column=1, padx=5)
+    tk.Button(button_frame, text="Upgrade All", command=lambda: run(batch.UPGRADE), bg="#28A745", **button_style).grid(row=0, column=2, padx=5)
+    tk.Button(button_frame, text="Uninstall All", command=lambda: run(batch.UNINSTALL), bg="#DC3545", **button_style).grid(row=0, column=3, padx=5)
+
+
+def export_lockfile():
+    """
+    Exports the active environment to a lockfile with pinned versions and hashes.
+
+    The hashes of every installed release are looked up on PyPI concurrently on a worker thread.
+    """
+    path = filedialog.asksaveasfilename(title="Export lockfile", defaultextension=".txt",
+                                        initialfile="requirements.lock.txt",
+                                        filetypes=[("Lockfiles", "*.txt"), ("All files", "*.*")])
+    if not path:
+        return
+    env_path = virtualenv_path
+
+    def export(job):
+        """Writes the lockfile."""
+        clear_output()
+        write_output("Looking up package hashes...\n")
         try:
-            result_text.insert(tk.END, f"Upgrading {package_name}...\n")
-            # Attempt to upgrade the package
-            subprocess.check_call([pip_command, "install", "--upgrade", package_name])
-            result_text.insert(tk.END, f"{package_name} has been upgraded successfully.\n")
-            # Show success message in the main thread
-            messagebox.showinfo("Success", f"{package_name} has been upgraded successfully.")
+            count = lockfile.export_lockfile(
+                path, env_path,
+                on_missing=lambda name, version, reason: write_output(
+                    f"No hashes for {name} {version} ({reason}); locked without hashes.\n"
+                ),
+            )
+        except OSError as e:
+            write_output(f"Error writing lockfile: {str(e)}\n")
+            return
+        write_output(f"Locked {count} packages to {path}.\n")
+
+    # Exporting only reads the environment, so it can run in parallel with other jobs
+    submit_job("Export lockfile", export, env_path)
+
+
+def sync_lockfile():
+    """
+    Makes the active environment match a lockfile.
+
+    Only the packages that differ are uninstalled or installed, so syncing an environment that
+    already matches the lockfile returns immediately without running pip.
+    """
+    path = filedialog.askopenfilename(title="Sync from lockfile",
+                                      filetypes=[("Lockfiles", "*.txt"), ("All files", "*.*")])
+    if not path:
+        return
+    env_path = virtualenv_path
+    pip_command = get_pip_command()  # Get the correct pip command based on the environment
+    # Without an active virtualenv the sync removes every system package the lockfile doesn't list
+    if env_path is None and not messagebox.askyesno(
+        "Sync Lockfile", "No virtual environment is active. Syncing the global environment uninstalls "
+                         "every package the lockfile doesn't list.\n\nSync it anyway?", icon=messagebox.WARNING
+    ):
+        return
+
+    def sync(job):
+        """Applies the difference between the lockfile and the environment."""
+        clear_output()
+        try:
+            to_install, to_remove = lockfile.sync(path, env_path, pip_command, write_output,
+                                                  cancel_event=job.cancel_event, allow_global=True)
+        except (OSError, ValueError) as e:
+            write_output(f"Error reading lockfile: {str(e)}\n")
+            return
         except subprocess.CalledProcessError:
-            result_text.insert(tk.END, f"Error upgrading {package_name}.\n")
-            # Show error message in the main thread
-            messagebox.showerror("Error", f"Error upgrading {package_name}.")
+            write_output("Sync failed; see the pip output above.\n")
+            call_in_ui(lambda: messagebox.showerror("Error", "Sync failed."))
+            return
 
-        result_text.config(state=tk.DISABLED)  # Disable text widget after the update
+        if not to_install and not to_remove:
+            write_output("Environment already matches the lockfile.\n")
+        else:
+            write_output(f"Synced: {len(to_install)} installed, {len(to_remove)} removed.\n")
 
-    # Start the upgrade operation in a separate thread to keep the UI responsive
-    threading.Thread(target=upgrade).start()
+    # Syncing is serialized with other changes to the same environment
+    submit_job("Sync from lockfile", sync, env_path, mutating=True)
 
 
 def clear_cache():
     """
-    Clears the pip cache in a separate thread.
+    Clears the pip cache on the job scheduler.
 
     Clears the pip cache and shows the result in the result_text widget.
     """
-    def clear():
+    env_path = virtualenv_path
+
+    def clear(job):
         """Handles the pip cache clearing process."""
-        result_text.config(state=tk.NORMAL)  # Enable text widget for modification
-        result_text.delete(1.0, tk.END)  # Clear the result text before starting
+        clear_output()  # Clear the result text before starting
 
-        pip_command = get_pip_command()  # Get the correct pip command based on the environment
         try:
-            result_text.insert(tk.END, "Clearing pip cache...\n")
+            write_output("Clearing pip cache...\n")
             # Clear the pip cache
-            subprocess.check_call([pip_command, "cache", "purge"])
-            result_text.insert(tk.END, "Pip cache has been cleared successfully.\n")
+            core.clear_cache(env_path, write_output, job.cancel_event)
+            write_output("Pip cache has been cleared successfully.\n")
             # Show success message in the main thread
-            messagebox.showinfo("Success", "Pip cache has been cleared successfully.")
+            call_in_ui(lambda: messagebox.showinfo("Success", "Pip cache has been cleared successfully."))
         except subprocess.CalledProcessError as e:
-            result_text.insert(tk.END, f"Error clearing pip cache: {str(e)}\n")
+            write_output(f"Error clearing pip cache: {str(e)}\n")
             # Show error message in the main thread
-            messagebox.showerror("Error", f"Error clearing pip cache: {str(e)}")
+            call_in_ui(lambda: messagebox.showerror("Error", f"Error clearing pip cache: {str(e)}"))
+
+    # Purging the cache is serialized with installs that might be reading from it
+    submit_job("Clear pip cache", clear, env_path, mutating=True)
 
-        result_text.config(state=tk.DISABLED)  # Disable text widget after the update
 
-    # Start the cache clearing operation in a separate thread to keep the UI responsive
-    threading.Thread(target=clear).start()
+def show_cache_manager():
+    """
+    Opens a window showing what pip's cache holds, grouped by project and version.
+
+    Instead of purging everything, the cache can be pruned to its size cap in least-recently-used
+    order, keeping pinned projects. A wheelhouse can be pre-warmed from a requirements file and
+    used for offline installs.
+    """
+    window = tk.Toplevel()
+    window.title("Pip Cache")
+    window.config(bg="#f7f7f7")
+
+    status_label = tk.Label(window, text="Scanning pip cache...", font=("Arial", 11), fg="#333", bg="#f7f7f7")
+    status_label.pack(padx=10, pady=(10, 5), anchor="w")
+
+    usage_list = tk.Listbox(window, width=70, height=15, font=("Courier New", 11), bd=2, relief="solid")
+    usage_list.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+    shown_usage = []
+    env_path = virtualenv_path
+
+    def show_usage(entries, pins):
+        """Fills the list with the cache usage of every project (runs on the main thread)."""
+        if not window.winfo_exists():
+            return
+        shown_usage[:] = wheel_cache.usage_by_project(entries)
+        usage_list.delete(0, tk.END)
+        for project, version, total, count in shown_usage:
+            pinned = project is not None and (project in pins or f"{project}=={version}" in pins)
+            label = f"{project} {version}" if project else "(index pages and other files)"
+            usage_list.insert(tk.END, f"{'[pinned] ' if pinned else ''}{label:<45} {inventory.format_size(total):>10}"
+                                      f" {count:>4} file(s)")
+        total = sum(entry.size for entry in entries)
+        status_label.config(text=f"{wheel_cache.pip_cache_dir()}: {inventory.format_size(total)} "
+                                 f"(cap {inventory.format_size(wheel_cache.MAX_CACHE_BYTES)})")
+
+    def refresh():
+        """Rescans the cache on a worker thread."""
+        def scan(job):
+            """Indexes pip's cache and shows the result."""
+            entries = wheel_cache.scan_cache()
+            pins = wheel_cache.load_pins()
+            call_in_ui(lambda: show_usage(entries, pins))
+
+        submit_job("Scan pip cache", scan, None)
+
+    def toggle_pin():
+        """Pins the selected project version, or unpins it if it is pinned already."""
+        selection = usage_list.curselection()
+        if not selection or shown_usage[selection[0]][0] is None:
+            messagebox.showerror("Error", "Please select a package!", parent=window)
+            return
+        project, version = shown_usage[selection[0]][:2]
+        pins = wheel_cache.load_pins()
+        if project in pins:
+            wheel_cache.unpin(project)
+        elif f"{project}=={version}" in pins:
+            wheel_cache.unpin(project, version)
+        else:
+            wheel_cache.pin(project, version)
+        refresh()
+
+    def prune():
+        """Prunes the cache to its size cap on a worker thread."""
+        def run_prune(job):
+            """Removes the least recently used unpinned files."""
+            clear_output()
+            removed = wheel_cache.prune()
+            freed = sum(entry.size for entry in removed)
+            write_output(f"Removed {len(removed)} file(s) from the pip cache, freeing {inventory.format_size(freed)}.\n")
+            call_in_ui(lambda: window.winfo_exists() and refresh())
+
+        # Pruning is serialized with installs that might be reading from the cache
+        submit_job("Prune pip cache", run_prune, env_path, mutating=True)
+
+    def prewarm():
+        """Downloads the packages of a requirements file into the wheelhouse."""
+        path = filedialog.askopenfilename(
+            parent=window, title="Select requirements file",
+            filetypes=[("Requirements files", "*.txt"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        pip_command = get_pip_command()  # Download for the interpreter of the active environment
+
+        def run_prewarm(job):
+            """Runs pip download into the wheelhouse."""
+            clear_output()
+            write_output(f"Downloading into {wheel_cache.wheelhouse_dir()}...\n")
+            try:
+                wheel_cache.prewarm([], pip_command, write_output, [path], job.cancel_event)
+                write_output("Wheelhouse is ready.\n")
+            except subprocess.CalledProcessError as e:
+                write_output(f"Error downloading packages: {str(e)}\n")
+
+        submit_job("Pre-warm wheelhouse", run_prewarm, env_path)
+
+    def purge():
+        """Purges the whole cache after asking for confirmation."""
+        if messagebox.askyesno("Purge", "Delete everything in the pip cache?", parent=window):
+            clear_cache()
+
+    offline_var = tk.BooleanVar(value=wheel_cache.offline_install)
+
+    def toggle_offline():
+        """Switches installs between the package index and the wheelhouse."""
+        wheel_cache.offline_install = offline_var.get()
+
+    tk.Checkbutton(window, text="Install from the wheelhouse only (offline)", variable=offline_var,
+                   command=toggle_offline, font=("Arial", 10), bg="#f7f7f7").pack(padx=10, anchor="w")
+
+    button_frame = tk.Frame(window, bg="#f7f7f7")
+    button_frame.pack(padx=10, pady=10)
+    button_style = {"font": ("Arial", 10, "bold"), "width": 14, "relief": "flat", "fg": "white"}
+    tk.Button(button_frame, text="Pin / Unpin", command=toggle_pin, bg="#007BFF", **button_style).grid(row=0, column=0, padx=5)
+    tk.Button(button_frame, text="Prune to Cap", command=prune, bg="#28A745", **button_style).grid(row=0, column=1, padx=5)
+    tk.Button(button_frame, text="Pre-warm...", command=prewarm, bg="#6C757D", **button_style).grid(row=0, column=2, padx=5)
+    tk.Button(button_frame, text="Purge All", command=purge, bg="#DC3545", **button_style).grid(row=0, column=3, padx=5)
+    refresh()
+
+
+def show_jobs():
+    """
+    Opens a window listing queued, running and finished jobs.
+
+    The list refreshes itself while the window is open, and the selected job can be cancelled.
+    """
+    window = tk.Toplevel()
+    window.title("Jobs")
+    window.config(bg="#f7f7f7")
+
+    job_list = tk.Listbox(window, width=70, height=15, font=("Courier New", 11), bd=2, relief="solid")
+    job_list.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+    shown_jobs = []
+
+    def refresh():
+        """Redraws the job list, keeping the selection, until the window is closed."""
+        if not window.winfo_exists():
+            return
+        selection = job_list.curselection()
+        selected_id = shown_jobs[selection[0]].id if selection and selection[0] < len(shown_jobs) else None
+
+        shown_jobs[:] = list(reversed(job_scheduler.jobs()))  # Newest first
+        job_list.delete(0, tk.END)
+        for index, job in enumerate(shown_jobs):
+            job_list.insert(tk.END, job.describe())
+            if job.id == selected_id:
+                job_list.selection_set(index)
+        window.after(JOB_LIST_REFRESH_MS, refresh)
+
+    def cancel_selected():
+        """Cancels the selected job."""
+        selection = job_list.curselection()
+        if not selection or selection[0] >= len(shown_jobs):
+            messagebox.showerror("Error", "Please select a job!", parent=window)
+            return
+        job = shown_jobs[selection[0]]
+        if not job_scheduler.cancel(job.id):
+            messagebox.showinfo("Info", f"Job #{job.id} has already finished.", parent=window)
+
+    tk.Button(window, text="Cancel Selected Job", command=cancel_selected, bg="#DC3545", fg="white",
+              font=("Arial", 10, "bold"), relief="flat", width=20).pack(pady=(0, 10))
+    refresh()
+
+
+def show_metrics():
+    """
+    Opens a window summarizing the recorded operation timings.
+
+    Spans are grouped by operation with their count, latency distribution, subprocess CPU time
+    and bytes downloaded. The raw spans can be exported as JSON or as a Chrome trace.
+    """
+    window = tk.Toplevel()
+    window.title("Metrics")
+    window.geometry("860x420")
+    window.config(bg="#f7f7f7")
+
+    columns = (("category", "Category", 90), ("name", "Operation", 200), ("count", "Count", 60),
+               ("mean", "Mean", 80), ("p50", "p50", 80), ("p95", "p95", 80), ("max", "Max", 80),
+               ("cpu", "CPU", 70), ("bytes_downloaded", "Downloaded", 90))
+    table_frame = tk.Frame(window)
+    table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    tree = ttk.Treeview(table_frame, columns=[column for column, _, _ in columns], show="headings")
+    for column, heading, width in columns:
+        tree.heading(column, text=heading)
+        tree.column(column, width=width, anchor=tk.W if column in ("category", "name") else tk.E)
+    scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
+    tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    def format_seconds(seconds):
+        """Formats a duration for the table, e.g. '12.3 ms' or '4.56 s'."""
+        return f"{seconds * 1000:.1f} ms" if seconds < 1 else f"{seconds:.2f} s"
+
+    def refresh():
+        """Redraws the summary until the window is closed."""
+        if not window.winfo_exists():
+            return
+        tree.delete(*tree.get_children())
+        for row in tracing.summary():
+            tree.insert("", tk.END, values=(
+                row["category"], row["name"], row["count"], format_seconds(row["mean"]),
+                format_seconds(row["p50"]), format_seconds(row["p95"]), format_seconds(row["max"]),
+                f"{row['cpu']:.2f} s" if row["cpu"] else "", inventory.format_size(row["bytes_downloaded"] or None),
+            ))
+        window.after(METRICS_REFRESH_MS, refresh)
+
+    def export(chrome_trace):
+        """Exports the recorded spans to a file."""
+        path = filedialog.asksaveasfilename(
+            parent=window, title="Export trace", defaultextension=".json",
+            initialfile="pipmate-trace.json" if chrome_trace else "pipmate-spans.json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            (tracing.export_chrome_trace if chrome_trace else tracing.export_json)(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Couldn't write trace: {str(e)}", parent=window)
+
+    button_frame = tk.Frame(window, bg="#f7f7f7")
+    button_frame.pack(padx=10, pady=(0, 10))
+    button_style = {"font": ("Arial", 10, "bold"), "width": 18, "relief": "flat", "fg": "white"}
+    tk.Button(button_frame, text="Export JSON", command=lambda: export(False), bg="#007BFF", **button_style).grid(row=0, column=0, padx=5)
+    tk.Button(button_frame, text="Export Chrome Trace", command=lambda: export(True), bg="#007BFF", **button_style).grid(row=0, column=1, padx=5)
+    tk.Button(button_frame, text="Clear", command=tracing.clear, bg="#DC3545", **button_style).grid(row=0, column=2, padx=5)
+    refresh()
+
+
+def show_disk_usage():
+    """
+    Opens a window listing the disk space each package of the active environment takes.
+
+    Files are mapped to packages through their RECORD files and hardlinked files are counted
+    once. Results are cached per package, so reopening the window only rescans packages that
+    changed; "Rescan All" drops the cache.
+    """
+    env_path = virtualenv_path
+
+    window = tk.Toplevel()
+    window.title(f"Disk Usage - {env_path or 'global environment'}")
+    window.geometry("640x480")
+    window.config(bg="#f7f7f7")
+
+    status_label = tk.Label(window, text="Measuring...", font=("Arial", 11), fg="#333", bg="#f7f7f7", anchor="w")
+    status_label.pack(fill=tk.X, padx=10, pady=(10, 0))
+
+    columns = (("name", "Package", 200), ("version", "Version", 100), ("files", "Files", 70),
+               ("size", "Size", 90), ("share", "Share", 60), ("shared", "Hardlinked", 90))
+    table_frame = tk.Frame(window)
+    table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    tree = ttk.Treeview(table_frame, columns=[column for column, _, _ in columns], show="headings")
+    for column, heading, width in columns:
+        tree.heading(column, text=heading)
+        tree.column(column, width=width, anchor=tk.W if column in ("name", "version") else tk.E)
+    scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
+    tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    def show_usage(usages, total):
+        """Fills the table, largest package first."""
+        if not window.winfo_exists():
+            return
+        tree.delete(*tree.get_children())
+        for usage in usages:
+            share = f"{usage.size / total:.1%}" if usage.size and total else ""
+            tree.insert("", tk.END, values=(
+                usage.name, usage.version, usage.files or "", inventory.format_size(usage.size) or "no RECORD",
+                share, inventory.format_size(usage.shared or None),
+            ))
+        status_label.config(text=f"{len(usages)} packages, {inventory.format_size(total)} on disk")
+
+    def refresh(rescan=False):
+        """Measures the environment on a worker thread."""
+        status_label.config(text="Measuring...")
+
+        def measure(job):
+            """Walks the changed packages (or all of them) and reports the usage."""
+            if rescan:
+                disk_usage.clear_cache()
+            usages, total = disk_usage.environment_usage(env_path, job.cancel_event)
+            if not job.cancelled:
+                call_in_ui(lambda: show_usage(usages, total))
+
+        # Measuring is read-only, so it can run in parallel with other jobs
+        submit_job("Measure disk usage", measure, env_path)
+
+    button_frame = tk.Frame(window, bg="#f7f7f7")
+    button_frame.pack(padx=10, pady=(0, 10))
+    button_style = {"font": ("Arial", 10, "bold"), "width": 16, "relief": "flat", "fg": "white"}
+    tk.Button(button_frame, text="Refresh", command=refresh, bg="#007BFF", **button_style).grid(row=0, column=0, padx=5)
+    tk.Button(button_frame, text="Rescan All", command=lambda: refresh(rescan=True), bg="#6C757D", **button_style).grid(row=0, column=1, padx=5)
+    refresh()
+
+
+def show_snapshots():
+    """
+    Opens a window listing the snapshots of the active environment.
+
+    A snapshot is taken before every install, upgrade, uninstall, batch and lockfile sync.
+    Rolling back restores the packages it saved and removes the ones installed after it.
+    """
+    env_path = virtualenv_path
+
+    window = tk.Toplevel()
+    window.title(f"Snapshots - {env_path or 'global environment'}")
+    window.geometry("720x360")
+    window.config(bg="#f7f7f7")
+
+    columns = (("created", "Taken", 150), ("label", "Operation", 100), ("packages", "Saved Packages", 440))
+    table_frame = tk.Frame(window)
+    table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    tree = ttk.Treeview(table_frame, columns=[column for column, _, _ in columns], show="headings",
+                        selectmode="browse")
+    for column, heading, width in columns:
+        tree.heading(column, text=heading)
+        tree.column(column, width=width, anchor=tk.W)
+    scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
+    tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    def refresh():
+        """Lists the stored snapshots, newest first; the item ids are the snapshot ids."""
+        if not window.winfo_exists():
+            return
+        tree.delete(*tree.get_children())
+        for snapshot in snapshots.list_snapshots(env_path):
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot.created))
+            tree.insert("", tk.END, iid=snapshot.id,
+                        values=(created, snapshot.label, ", ".join(snapshot.packages) or "-"))
+
+    def roll_back():
+        """Restores the selected snapshot after confirmation."""
+        selection = tree.selection()
+        if not selection:
+            return
+        created, label, _ = tree.item(selection[0], "values")
+        if messagebox.askyesno("Roll Back", f"Undo the {label} and everything after it, back to {created}?",
+                               parent=window):
+            roll_back_snapshot(env_path, selection[0], on_done=refresh)
+
+    def delete():
+        """Removes the selected snapshot."""
+        selection = tree.selection()
+        if selection:
+            snapshots.delete(env_path, selection[0])
+            refresh()
+
+    button_frame = tk.Frame(window, bg="#f7f7f7")
+    button_frame.pack(padx=10, pady=(0, 10))
+    button_style = {"font": ("Arial", 10, "bold"), "width": 16, "relief": "flat", "fg": "white"}
+    tk.Button(button_frame, text="Roll Back", command=roll_back, bg="#28A745", **button_style).grid(row=0, column=0, padx=5)
+    tk.Button(button_frame, text="Delete", command=delete, bg="#DC3545", **button_style).grid(row=0, column=1, padx=5)
+    tk.Button(button_frame, text="Refresh", command=refresh, bg="#6C757D", **button_style).grid(row=0, column=2, padx=5)
+    refresh()
+
+
+def show_audit():
+    """
+    Opens a window auditing the active environment against known advisories and a license policy.
+
+    Advisories come from an OSV export imported into a local database, so an audit needs no
+    network access. Licenses are checked against the comma separated list of disallowed ones.
+    """
+    env_path = virtualenv_path
+
+    window = tk.Toplevel()
+    window.title(f"Audit - {env_path or 'global environment'}")
+    window.geometry("860x480")
+    window.config(bg="#f7f7f7")
+
+    policy_frame = tk.Frame(window, bg="#f7f7f7")
+    policy_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+    tk.Label(policy_frame, text="Disallowed licenses:", font=("Arial", 11), fg="#333", bg="#f7f7f7").pack(side=tk.LEFT)
+    policy_entry = tk.Entry(policy_frame, font=("Arial", 11))
+    policy_entry.insert(0, ", ".join(audit.DISALLOWED_LICENSES))
+    policy_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+
+    status_label = tk.Label(window, text="Auditing...", font=("Arial", 11), fg="#333", bg="#f7f7f7", anchor="w")
+    status_label.pack(fill=tk.X, padx=10, pady=(5, 0))
+
+    columns = (("name", "Package", 140), ("version", "Version", 80), ("issue", "Issue", 150),
+               ("severity", "Severity", 80), ("fix", "Fixed In", 80), ("detail", "Details", 300))
+    table_frame = tk.Frame(window)
+    table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    tree = ttk.Treeview(table_frame, columns=[column for column, _, _ in columns], show="headings")
+    for column, heading, width in columns:
+        tree.heading(column, text=heading)
+        tree.column(column, width=width, anchor=tk.W)
+    scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
+    tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    def show_report(report):
+        """Lists the advisories, then the packages with disallowed licenses."""
+        if not window.winfo_exists():
+            return
+        tree.delete(*tree.get_children())
+        for vulnerability in report.vulnerabilities:
+            issue = ", ".join([vulnerability.id] + vulnerability.aliases[:1])
+            tree.insert("", tk.END, values=(vulnerability.name, vulnerability.version, issue,
+                                            vulnerability.severity or "", vulnerability.fixed_in or "none",
+                                            vulnerability.summary))
+        disallowed = [check for check in report.licenses if check.status == audit.LICENSE_DISALLOWED]
+        for check in disallowed:
+            tree.insert("", tk.END, values=(check.name, check.version, "Disallowed license", "", "",
+                                            check.license))
+        unknown = sum(check.status == audit.LICENSE_UNKNOWN for check in report.licenses)
+        if report.database is None:
+            source = "no advisory database imported, only licenses checked"
+        else:
+            imported = time.strftime("%Y-%m-%d", time.localtime(report.database["imported_at"]))
+            source = f"{report.database['advisories']} advisories imported {imported}"
+        status_label.config(text=f"{report.packages} packages: {len(report.vulnerabilities)} advisories, "
+                                 f"{len(disallowed)} disallowed and {unknown} unknown licenses ({source})")
+
+    def run_audit():
+        """Audits the environment on a worker thread."""
+        status_label.config(text="Auditing...")
+        disallowed = [entry.strip() for entry in policy_entry.get().split(",") if entry.strip()]
+
+        def run(job):
+            """Matches the installed packages against the database and the policy."""
+            report = audit.audit(env_path, disallowed)
+            call_in_ui(lambda: show_report(report))
+
+        # Auditing is read-only and offline, so it can run in parallel with other jobs
+        submit_job("Audit", run, env_path)
+
+    def import_advisories(source):
+        """Imports an OSV export (a file, or the osv.dev download) and audits again."""
+        status_label.config(text=f"Importing advisories from {source}...")
+
+        def run(job):
+            """Builds the advisory database from the export."""
+            import requests as rq
+
+            try:
+                audit.import_database(source)
+            except (OSError, ValueError, rq.exceptions.RequestException) as e:
+                call_in_ui(lambda: messagebox.showerror("Error", f"Couldn't import advisories: {e}", parent=window))
+                return
+            call_in_ui(lambda: window.winfo_exists() and run_audit())
+
+        submit_job("Import advisories", run, None)
+
+    def import_file():
+        """Asks for an OSV export file to import."""
+        path = filedialog.askopenfilename(parent=window, title="OSV export",
+                                          filetypes=[("OSV export", "*.zip *.json"), ("All files", "*.*")])
+        if path:
+            import_advisories(path)
+
+    button_frame = tk.Frame(window, bg="#f7f7f7")
+    button_frame.pack(padx=10, pady=(0, 10))
+    button_style = {"font": ("Arial", 10, "bold"), "width": 16, "relief": "flat", "fg": "white"}
+    tk.Button(button_frame, text="Run Audit", command=run_audit, bg="#007BFF", **button_style).grid(row=0, column=0, padx=5)
+    tk.Button(button_frame, text="Import Export...", command=import_file, bg="#6C757D", **button_style).grid(row=0, column=1, padx=5)
+    tk.Button(button_frame, text="Download Advisories", command=lambda: import_advisories(audit.OSV_PYPI_URL),
+              bg="#28A745", **button_style).grid(row=0, column=2, padx=5)
+    run_audit()
+
+
+def show_environments():
+    """
+    Opens a window listing the registered virtual environments.
+
+    Environments can be activated without retyping their path, discovered under root
+    directories, and queried all at once (e.g. "which environments have requests<2.31").
+    """
+    window = tk.Toplevel()
+    window.title("Environments")
+    window.config(bg="#f7f7f7")
+
+    env_list = tk.Listbox(window, width=70, height=12, font=("Courier New", 11), bd=2, relief="solid")
+    env_list.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+    shown_envs = []
+
+    def refresh():
+        """Reloads the list of registered environments."""
+        shown_envs[:] = registry.list_environments()
+        env_list.delete(0, tk.END)
+        for env_path in shown_envs:
+            marker = "* " if virtualenv_path and os.path.abspath(virtualenv_path) == env_path else "  "
+            env_list.insert(tk.END, marker + env_path)
+
+    def activate_selected():
+        """Activates the selected environment."""
+        selection = env_list.curselection()
+        if not selection:
+            messagebox.showerror("Error", "Please select an environment!", parent=window)
+            return
+        env_path = shown_envs[selection[0]]
+        if not core.is_valid_virtualenv(env_path):
+            messagebox.showerror("Error", "Invalid virtual environment path!", parent=window)
+            return
+        clear_output()
+        set_virtualenv_path(env_path)
+        write_output(f"Virtual environment activated: {env_path}\n")
+        refresh()
+
+    def add_root():
+        """Adds a directory to search for environments and discovers the ones below it."""
+        root_dir = filedialog.askdirectory(parent=window, title="Select a directory containing environments")
+        if not root_dir:
+            return
+        registry.add_root(root_dir)
+        discover()
+
+    def discover():
+        """Discovers environments under the configured roots on a worker thread."""
+        def run_discovery(job):
+            """Scans the root directories for new environments."""
+            added = registry.discover()
+            write_output(f"Discovered {len(added)} new environment(s).\n")
+            call_in_ui(lambda: window.winfo_exists() and refresh())
+
+        submit_job("Discover environments", run_discovery, None)
+
+    def query():
+        """Lists the environments that have a package matching a requirement spec."""
+        spec = simpledialog.askstring("Query Environments", "Requirement (e.g. requests<2.31):", parent=window)
+        if not spec:
+            return
+
+        def run_query(job):
+            """Answers the query from the cached inventories of all environments."""
+            clear_output()
+            try:
+                matches = registry.find_package(spec)
+            except ValueError as e:
+                write_output(f"{str(e)}\n")
+                return
+            write_output(f"{len(matches)} environment(s) have {spec}:\n")
+            for env_path, distribution in matches:
+                write_output(f"  {env_path}: {distribution.name} {distribution.version}\n")
+
+        submit_job(f"Query environments for {spec}", run_query, None)
+
+    button_frame = tk.Frame(window, bg="#f7f7f7")
+    button_frame.pack(padx=10, pady=(0, 10))
+    button_style = {"font": ("Arial", 10, "bold"), "width": 14, "relief": "flat", "fg": "white"}
+    tk.Button(button_frame, text="Activate", command=activate_selected, bg="#28A745", **button_style).grid(row=0, column=0, padx=5)
+    tk.Button(button_frame, text="Add Root...", command=add_root, bg="#6C757D", **button_style).grid(row=0, column=1, padx=5)
+    tk.Button(button_frame, text="Discover", command=discover, bg="#6C757D", **button_style).grid(row=0, column=2, padx=5)
+    tk.Button(button_frame, text="Query...", command=query, bg="#007BFF", **button_style).grid(row=0, column=3, padx=5)
+    refresh()
 
 
 def create_gui():
@@ -438,11 +1578,11 @@ def create_gui():
     This function sets up the main window, input fields, buttons, and the result display.
     It includes configuration for buttons, labels, and layout for the PIPMATE app.
     """
-    global entry_package_name, result_text
+    global entry_package_name, result_text, completion_list, name_completer
 
     root = tk.Tk()
     root.title("PIPMATE")
-    root.geometry("700x650")  # Increased window size for more space
+    root.geometry("700x740")  # Increased window size for more space
     root.config(bg="#f7f7f7")  # Lighter background color
 
     # Header Label
@@ -454,8 +1594,29 @@ def create_gui():
     entry_package_name.insert(0, "Enter package name...")  # Add placeholder text
     entry_package_name.bind("<FocusIn>", on_entry_click)  # Bind click event to clear placeholder
     entry_package_name.bind("<FocusOut>", on_focus_out)  # Bind focus out event to restore placeholder
+    entry_package_name.bind("<KeyRelease>", on_name_typed)  # Complete package names while typing
+    entry_package_name.bind("<Down>", lambda event: move_completion(1))
+    entry_package_name.bind("<Up>", lambda event: move_completion(-1))
+    entry_package_name.bind("<Return>", accept_completion)
+    entry_package_name.bind("<Escape>", hide_completions)
     entry_package_name.pack(pady=10)
 
+    # Dropdown of completions, placed under the entry while there are any
+    completion_list = tk.Listbox(root, font=("Arial", 12), bd=1, relief="solid", activestyle="none",
+                                 takefocus=0, exportselection=False)
+    completion_list.bind("<ButtonRelease-1>", accept_completion)
+    name_completer = name_index.Completer(
+        lambda text, names: call_in_ui(lambda: show_completions(text, names)), limit=COMPLETION_ROWS
+    )
+
+    def load_names(job):
+        """Loads the project names used for completion, refreshing them when they are stale."""
+        name_index.load()
+
+    # Read-only and slow on the first start (the whole project list is downloaded), so in the background
+    submit_job("Load package names", load_names, None)
+    pip_worker.warm_up(get_pip_command())  # The global environment's pip, until one is activated
+
     # Button Frame with rounded buttons and shadows
     button_frame = tk.Frame(root, bg="#f7f7f7")
     button_frame.pack(pady=10)
@@ -474,12 +1635,29 @@ def create_gui():
 
     # Second column (right side)
     tk.Button(button_frame, text="Uninstall Package", command=uninstall_package, bg="#DC3545", fg="white", **button_style).grid(row=0, column=1, padx=10, pady=5)
-    tk.Button(button_frame, text="Clear Pip Cache", command=clear_cache, bg="#DC3545", fg="white", **button_style).grid(row=1, column=1, padx=10, pady=5)
+    tk.Button(button_frame, text="Manage Pip Cache", command=show_cache_manager, bg="#DC3545", fg="white", **button_style).grid(row=1, column=1, padx=10, pady=5)
     tk.Button(button_frame, text="Deactivate Virtualenv", command=deactivate_virtualenv, bg="#DC3545", fg="white", **button_style).grid(row=2, column=1, padx=10, pady=5)
     tk.Button(button_frame, text="Fetch Package Info", command=fetch_package_info, bg="#007BFF", fg="white", **button_style).grid(row=3, column=1, padx=10, pady=5)
 
-    # Create Virtualenv button at the bottom of the window
-    tk.Button(root, text="Create Virtualenv", command=create_virtualenv, bg="#6C757D", fg="white", font=("Arial", 11, "bold"), width=25, height=2).pack(pady=5)
+    # Create Virtualenv and Batch Operations buttons at the bottom of the window
+    bottom_frame = tk.Frame(root, bg="#f7f7f7")
+    bottom_frame.pack(pady=5)
+    tk.Button(bottom_frame, text="Create Virtualenv", command=create_virtualenv, bg="#6C757D", fg="white", font=("Arial", 11, "bold"), width=20, height=2).grid(row=0, column=0, padx=10)
+    tk.Button(bottom_frame, text="Batch Operations", command=open_batch_window, bg="#6C757D", fg="white", font=("Arial", 11, "bold"), width=20, height=2).grid(row=0, column=1, padx=10)
+
+    # Smaller tool buttons opening their own windows
+    tools_frame = tk.Frame(root, bg="#f7f7f7")
+    tools_frame.pack(pady=5)
+    tool_style = {"bg": "#6C757D", "fg": "white", "font": ("Arial", 10, "bold"), "width": 14, "relief": "flat"}
+    tk.Button(tools_frame, text="Jobs", command=show_jobs, **tool_style).grid(row=0, column=0, padx=5)
+    tk.Button(tools_frame, text="Environments", command=show_environments, **tool_style).grid(row=0, column=1, padx=5)
+    tk.Button(tools_frame, text="Check for Updates", command=check_for_updates, **tool_style).grid(row=0, column=2, padx=5)
+    tk.Button(tools_frame, text="Export Lockfile", command=export_lockfile, **tool_style).grid(row=1, column=0, padx=5, pady=5)
+    tk.Button(tools_frame, text="Sync Lockfile", command=sync_lockfile, **tool_style).grid(row=1, column=1, padx=5, pady=5)
+    tk.Button(tools_frame, text="Metrics", command=show_metrics, **tool_style).grid(row=1, column=2, padx=5, pady=5)
+    tk.Button(tools_frame, text="Disk Usage", command=show_disk_usage, **tool_style).grid(row=2, column=0, padx=5)
+    tk.Button(tools_frame, text="Snapshots", command=show_snapshots, **tool_style).grid(row=2, column=1, padx=5)
+    tk.Button(tools_frame, text="Audit", command=show_audit, **tool_style).grid(row=2, column=2, padx=5)
 
     # Result Text Box with Scrollbar
     result_frame = tk.Frame(root)
@@ -493,11 +1671,27 @@ def create_gui():
     scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
     result_text.config(yscrollcommand=scrollbar.set)
 
+    # Drain output queued by worker threads into the result text box
+    result_text.after(OUTPUT_POLL_MS, drain_output)
+
     # Run the GUI
     root.mainloop()
 
+    # Stop running pip processes once the window is closed
+    job_scheduler.shutdown()
+
+    if TRACE_FILE:
+        tracing.export_chrome_trace(TRACE_FILE)
+
+
+def print_banner():
+    """
+    Prints the PIPMATE banner to the terminal with a random color for each character.
+
+    The whole banner is written at once so it doesn't delay the start of the GUI.
+    """
+    from colorama import Fore, init  # Only needed for the banner, so imported lazily
 
-if __name__ == "__main__":
     init(autoreset=True)  # Initialize colorama for automatic color reset
 
     # ASCII text to be displayed with random colors
@@ -521,11 +1715,11 @@ if __name__ == "__main__":
         Fore.LIGHTBLUE_EX,
     ]
 
-    # Loop through each character and print with a random color
-    for char in text:
-        random_color = sample(colors, 1)[0]
-        sys.stdout.write(random_color + char)
-        sys.stdout.flush()
-        sleep(0.01)  # Add a delay for a typing effect
+    # Give each character a random color and print the banner in a single write
+    sys.stdout.write("".join(sample(colors, 1)[0] + char for char in text))
+    sys.stdout.flush()
 
+
+if __name__ == "__main__":
+    print_banner()
     create_gui()
@@ -0,0 +1,436 @@
+"""
+Compact local index of every project name on the package index, for completion and validation.
+
+The names listed by the simple index (PEP 503 HTML or PEP 691 JSON) are normalized, sorted and
+stored compressed in the cache directory. In memory they are one newline separated string
+plus an array of offsets, so the ~1M names on PyPI take a few dozen megabytes less than a list
+of strings would; prefix lookups are a binary search and fuzzy lookups probe a sorted array of
+name hashes with every single-character edit of the query. Refreshes use PyPI's changelog when the last
+serial is known and a conditional request otherwise.
+"""
+import bisect
+import difflib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from array import array
+from collections import namedtuple
+
+import tracing
+from inventory import normalize_name
+from paths import user_cache_dir
+from specs import parse_requirement
+
+
+# The simple index pip installs from; its project list is what completion offers
+SIMPLE_INDEX_URL = os.environ.get("PIP_INDEX_URL", "https://pypi.org/simple/").rstrip("/") + "/"
+MAX_AGE_SECONDS = int(os.environ.get("PIPMATE_NAME_INDEX_TTL", 24 * 3600))  # Refreshed when older
+DOWNLOAD_TIMEOUT = (5, 60)  # Seconds to connect / per read; the PyPI project list is ~40 MB
+MAX_CHANGELOG_EVENTS = 50000  # Larger gaps are cheaper to close with a full download
+FORMAT_VERSION = 1
+
+# Results of check_spec()
+NAME_OK = "ok"
+NAME_INVALID = "invalid"
+NAME_UNKNOWN = "unknown"
+NAME_UNCHECKED = "unchecked"  # No index loaded yet, or a path / URL rather than a project name
+
+# Result of check_spec(): one of the NAME_* statuses, the project name and close matches
+NameCheck = namedtuple("NameCheck", ["status", "name", "suggestions"])
+
+_anchor_re = re.compile(r"<a\s[^>]*>([^<]+)</a>", re.IGNORECASE)
+_completable_re = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789-"  # Characters of normalized names
+
+_index = None  # The loaded NameIndex, shared by completion and validation
+_index_lock = threading.Lock()
+
+
+class NameIndex:
+    """A sorted, immutable set of normalized project names with prefix and fuzzy lookups."""
+
+    def __init__(self, names):
+        # names must be sorted, unique and normalized; they are packed into one string
+        self._blob = "\n".join(names) + "\n" if names else ""
+        self._offsets = array("L", [0])
+        position = 0
+        for name in names:
+            position += len(name) + 1
+            self._offsets.append(position)
+        self._hashes = None
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def name_at(self, position):
+        """Returns the name at a position of the sorted index."""
+        return self._blob[self._offsets[position]:self._offsets[position + 1] - 1]
+
+    def names(self):
+        """Returns every name as a list, in sorted order."""
+        return self._blob.split("\n")[:-1]
+
+    def _lower_bound(self, key):
+        """Returns the position of the first name that is >= key."""
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.name_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __contains__(self, name):
+        key = normalize_name(name)
+        position = self._lower_bound(key)
+        return position < len(self) and self.name_at(position) == key
+
+    def complete(self, prefix, limit=10):
+        """Returns up to limit names starting with prefix, shortest first so exact hits lead."""
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        matches = []
+        position = self._lower_bound(key)
+        # Look a little further than limit so short names further down the range can win
+        while position < len(self) and len(matches) < limit * 20:
+            name = self.name_at(position)
+            if not name.startswith(key):
+                break
+            matches.append(name)
+            position += 1
+        return sorted(matches, key=lambda name: (len(name), name))[:limit]
+
+    def build_lookup(self):
+        """
+        Builds the sorted array of name hashes used by fuzzy lookups.
+
+        Takes a fraction of a second for PyPI, so it runs when the index is loaded in the
+        background rather than on the first keystroke.
+        """
+        self._hashes = array("q", sorted(hash(self.name_at(position)) for position in range(len(self))))
+
+    def _might_contain(self, name):
+        """Checks a name against the hash array; false positives are possible, misses are not."""
+        name_hash = hash(name)
+        position = bisect.bisect_left(self._hashes, name_hash)
+        return position < len(self._hashes) and self._hashes[position] == name_hash
+
+    def fuzzy(self, query, limit=5):
+        """
+        Returns up to limit names one typo away from query, most similar first.
+
+        Every insertion, deletion, substitution and transposition of a character of the query
+        is looked up in the hash array, so a lookup takes about a millisecond even for PyPI.
+        """
+        key = normalize_name(query)
+        if not key:
+            return []
+        if self._hashes is None:
+            self.build_lookup()
+
+        matches = [name for name in _edits(key) if self._might_contain(name) and name in self]
+        matcher = difflib.SequenceMatcher(b=key)
+        scored = []
+        for name in matches:
+            matcher.set_seq1(name)
+            # Swapped letters are the most common typo, so those matches come first
+            swapped = sorted(name) == sorted(key)
+            scored.append((not swapped, -matcher.ratio(), name))
+        return [name for _, _, name in sorted(scored)[:limit]]
+
+    def suggest(self, text, limit=10):
+        """Returns completions of text, topped up with fuzzy matches when there are few."""
+        matches = self.complete(text, limit)
+        if len(matches) < limit:
+            matches += [name for name in self.fuzzy(text, limit - len(matches)) if name not in matches]
+        return matches
+
+    def updated(self, added=(), removed=()):
+        """Returns a new index with names added and removed."""
+        names = set(self.names())
+        names.difference_update(normalize_name(name) for name in removed)
+        names.update(normalize_name(name) for name in added)
+        return NameIndex(sorted(names))
+
+
+def _edits(word):
+    """Returns every string one insertion, deletion, substitution or transposition away from word."""
+    splits = [(word[:cut], word[cut:]) for cut in range(len(word) + 1)]
+    edits = {head + tail[1:] for head, tail in splits if tail}
+    edits.update(head + tail[1] + tail[0] + tail[2:] for head, tail in splits if len(tail) > 1)
+    edits.update(head + char + tail[1:] for head, tail in splits if tail for char in _ALPHABET)
+    edits.update(head + char + tail for head, tail in splits for char in _ALPHABET)
+    edits.discard(word)
+    return edits
+
+
+def index_path():
+    """Returns the path of the stored name index."""
+    return os.path.join(user_cache_dir(), "project-names.idx")
+
+
+def _read():
+    """Returns (header dict, NameIndex) of the stored index, or (None, None) if it can't be read."""
+    try:
+        with open(index_path(), "rb") as index_file:
+            header = json.loads(index_file.readline())
+            body = zlib.decompress(index_file.read()).decode("utf-8")
+    except (OSError, ValueError, zlib.error):
+        return None, None
+    if header.get("format") != FORMAT_VERSION:
+        return None, None
+    names = body.split("\n") if body else []
+    return header, NameIndex(names)
+
+
+def _write(header, index):
+    """Stores the index with its header atomically."""
+    header = dict(header, format=FORMAT_VERSION, count=len(index), updated_at=time.time())
+    temporary_path = index_path() + ".tmp"
+    with open(temporary_path, "wb") as index_file:
+        index_file.write(json.dumps(header).encode("utf-8") + b"\n")
+        index_file.write(zlib.compress("\n".join(index.names()).encode("utf-8"), 6))
+    os.replace(temporary_path, index_path())
+    return header
+
+
+def parse_project_list(content_type, body):
+    """Extracts the sorted, normalized project names from a simple index root page."""
+    if "json" in content_type:
+        names = {normalize_name(project["name"]) for project in json.loads(body).get("projects", [])}
+    else:
+        names = {normalize_name(name.strip()) for name in _anchor_re.findall(body.decode("utf-8", "replace"))}
+    names.discard("")
+    return sorted(names)
+
+
+def _download(header):
+    """
+    Downloads the project list unless the server confirms the stored one is current.
+
+    Returns (header, names), with names None when the server answered 304 Not Modified.
+    """
+    import pypi
+
+    headers = {"Accept": "application/vnd.pypi.simple.v1+json, text/html;q=0.1"}
+    if header and header.get("index_url") == SIMPLE_INDEX_URL:
+        if header.get("etag"):
+            headers["If-None-Match"] = header["etag"]
+        if header.get("last_modified"):
+            headers["If-Modified-Since"] = header["last_modified"]
+
+    response = pypi.get_session().get(SIMPLE_INDEX_URL, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+    tracing.annotate(status=response.status_code)
+    tracing.add("bytes_downloaded", len(response.content))
+    if response.status_code == 304:
+        return header, None
+    response.raise_for_status()
+
+    serial = response.headers.get("X-PyPI-Last-Serial")
+    new_header = {
+        "index_url": SIMPLE_INDEX_URL,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "serial": int(serial) if serial and serial.isdigit() else None,
+    }
+    return new_header, parse_project_list(response.headers.get("Content-Type", ""), response.content)
+
+
+def _changelog_delta(serial):
+    """
+    Returns (added, removed, last serial) from PyPI's changelog since a serial, or None.
+
+    Only PyPI (and mirrors of its API) report serials, so other indexes never get here. None
+    means the changelog couldn't be used and the list has to be downloaded again.
+    """
+    import xmlrpc.client
+    from xml.parsers.expat import ExpatError
+
+    import pypi
+    import requests as rq
+
+    # Sent through the pooled session, so the call gets the same timeouts and retries
+    request = xmlrpc.client.dumps((serial,), "changelog_since_serial")
+    try:
+        response = pypi.get_session().post(pypi.PYPI_URL, data=request.encode("utf-8"),
+                                           headers={"Content-Type": "text/xml"}, timeout=pypi.DEFAULT_TIMEOUT)
+        tracing.add("bytes_downloaded", len(response.content))
+        response.raise_for_status()
+        (events,), _ = xmlrpc.client.loads(response.content)
+    except (rq.exceptions.RequestException, xmlrpc.client.Error, ExpatError, ValueError):
+        return None
+    if len(events) > MAX_CHANGELOG_EVENTS:
+        return None
+
+    added, removed = set(), set()
+    for name, _version, _timestamp, action, _serial in events:
+        key = normalize_name(name)
+        if action == "create":
+            added.add(key)
+            removed.discard(key)
+        elif action == "remove project":
+            removed.add(key)
+            added.discard(key)
+    last_serial = max((event[4] for event in events), default=serial)
+    return added, removed, last_serial
+
+
+def refresh(force=False):
+    """
+    Brings the stored index up to date and loads it. Returns the NameIndex.
+
+    Uses the changelog when the last serial is known, a conditional request when the index
+    sent validators, and a full download otherwise (or with force).
+    Raises requests.exceptions.RequestException if the index can't be reached and nothing is stored.
+    """
+    import requests as rq
+
+    with tracing.span("name index refresh", category="network", index_url=SIMPLE_INDEX_URL):
+        header, index = (None, None) if force else _read()
+        if header and header.get("index_url") != SIMPLE_INDEX_URL:
+            header, index = None, None  # Stored for another index
+
+        try:
+            delta = _changelog_delta(header["serial"]) if index is not None and header.get("serial") else None
+            if delta is not None:
+                added, removed, serial = delta
+                tracing.annotate(mode="changelog", added=len(added), removed=len(removed))
+                if added or removed:
+                    index = index.updated(added, removed)
+                header = _write(dict(header, serial=serial), index)
+            else:
+                new_header, names = _download(header if index is not None else None)
+                if names is None:
+                    tracing.annotate(mode="not modified")
+                    header = _write(header, index)  # Only marks it as checked
+                else:
+                    tracing.annotate(mode="full")
+                    index = NameIndex(names)
+                    header = _write(new_header, index)
+        except rq.exceptions.RequestException:
+            if index is None:
+                raise
+            tracing.annotate(mode="stale")  # Keep using the stored names while offline
+
+        index.build_lookup()
+        _set_index(index)
+        return index
+
+
+def load(max_age=MAX_AGE_SECONDS):
+    """
+    Loads the stored index, refreshing it first when it is missing or older than max_age.
+
+    Meant for a background thread at startup. Returns the NameIndex, or None if there is no
+    stored index and the package index can't be reached (or offline mode is on).
+    """
+    import pypi
+    import requests as rq
+
+    header, index = _read()
+    if header and header.get("index_url") != SIMPLE_INDEX_URL:
+        header, index = None, None
+    stale = index is None or time.time() - header.get("updated_at", 0) > max_age
+    if stale and not pypi.offline:
+        try:
+            return refresh()
+        except rq.exceptions.RequestException:
+            pass
+    if index is not None:
+        index.build_lookup()
+        _set_index(index)
+    return index
+
+
+def _set_index(index):
+    """Makes index the one used by completion and validation."""
+    global _index
+    with _index_lock:
+        _index = index
+
+
+def get_index():
+    """Returns the loaded NameIndex, or None while it hasn't been loaded."""
+    with _index_lock:
+        return _index
+
+
+def is_project_name(text):
+    """Checks whether text could be (the start of) a project name, i.e. is worth completing."""
+    return bool(_completable_re.match(text))
+
+
+def _is_path_or_url(spec):
+    """Checks whether a spec is a local path, archive or URL, which the index doesn't list."""
+    return ("://" in spec or "/" in spec or os.sep in spec or spec.startswith(".")
+            or spec.endswith((".whl", ".zip", ".tar.gz", ".tar.bz2")))
+
+
+def check_spec(spec, index=None):
+    """
+    Validates a requirement spec without running pip.
+
+    Returns a NameCheck: NAME_INVALID for specs pip can't parse, NAME_UNKNOWN with close
+    matches for projects the index doesn't list, NAME_OK otherwise, and NAME_UNCHECKED when no
+    index is loaded or the spec is a path or URL.
+    """
+    spec = spec.strip()
+    if _is_path_or_url(spec):
+        return NameCheck(NAME_UNCHECKED, spec, [])
+    requirement = parse_requirement(spec)
+    if requirement is None:
+        return NameCheck(NAME_INVALID, spec, [])
+    if requirement.url:
+        return NameCheck(NAME_UNCHECKED, requirement.name, [])
+
+    index = index or get_index()
+    if index is None:
+        return NameCheck(NAME_UNCHECKED, requirement.name, [])
+    if requirement.name in index:
+        return NameCheck(NAME_OK, requirement.name, [])
+    return NameCheck(NAME_UNKNOWN, requirement.name, index.fuzzy(requirement.name))
+
+
+class Completer:
+    """
+    Looks up completions on a background thread, so typing never waits for a lookup.
+
+    Only the most recent request is served: requests made while a lookup runs replace each
+    other, and on_results(text, names) is called from the worker thread for each lookup.
+    """
+
+    def __init__(self, on_results, limit=10):
+        self.on_results = on_results
+        self.limit = limit
+        self._pending = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="name-completion", daemon=True)
+        self._thread.start()
+
+    def request(self, text):
+        """Asks for the completions of text, replacing any request that hasn't started yet."""
+        with self._condition:
+            self._pending = text
+            self._condition.notify()
+
+    def _run(self):
+        """Serves the latest request until the program exits."""
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                text, self._pending = self._pending, None
+
+            index = get_index()
+            if index is None or not is_project_name(text):
+                names = []
+            else:
+                with tracing.span("complete name", category="ui", length=len(text)):
+                    names = index.suggest(text, self.limit)
+            self.on_results(text, names)
@@ -0,0 +1,101 @@
+"""
+Concurrent detection of installed packages that have newer releases on PyPI.
+
+Every installed distribution is looked up through the pooled, cached PyPI client at once, with
+a bounded number of requests in flight, and results are reported as they arrive instead of
+after the slowest lookup.
+"""
+import os
+import platform
+from collections import namedtuple
+
+import inventory
+import pypi
+from specs import parse_specifier, parse_version
+
+
+MAX_WORKERS = 16  # Concurrent lookups; PyPI serves small JSON documents quickly
+
+# An installed package with a newer release available
+OutdatedPackage = namedtuple("OutdatedPackage", ["name", "installed", "latest"])
+
+
+def environment_python_version(env_path=None):
+    """
+    Returns the Python version of an environment (e.g. '3.11.7') as recorded in pyvenv.cfg.
+
+    Falls back to the running interpreter for the global environment or an unreadable config.
+    """
+    if env_path:
+        try:
+            with open(os.path.join(env_path, "pyvenv.cfg"), encoding="utf-8") as config_file:
+                for line in config_file:
+                    key, sep, value = line.partition("=")
+                    if sep and key.strip() in ("version", "version_info"):
+                        # virtualenv writes version_info = 3.11.7.final.0
+                        return ".".join(value.strip().split(".")[:3])
+        except OSError:
+            pass
+    return platform.python_version()
+
+
+def latest_version(data, python_version=None, include_prereleases=False):
+    """
+    Returns the newest installable version in a project's JSON metadata, or None.
+
+    Releases that are yanked, have no files, or whose Requires-Python excludes the
+    environment's interpreter are skipped. Falls back to info.version if releases are missing.
+    """
+    releases = data.get("releases")
+    if not releases:
+        return (data.get("info") or {}).get("version")
+
+    python = parse_version(python_version or platform.python_version())
+    best = None
+    for version_string, files in releases.items():
+        version = parse_version(version_string)
+        if version is None or (version.is_prerelease and not include_prereleases):
+            continue
+        if best is not None and version <= best[0]:
+            continue
+        files = [file_info for file_info in files if not file_info.get("yanked")]
+        if not files:
+            continue
+        requires_python = parse_specifier(files[0].get("requires_python") or "")
+        if python is not None and requires_python is not None and not requires_python.contains(
+                python, prereleases=True):
+            continue
+        best = (version, version_string)
+    return best[1] if best else None
+
+
+def check_outdated(installed, python_version=None, on_result=None, max_workers=MAX_WORKERS, cancel_event=None):
+    """
+    Looks up every distribution of an inventory (normalized name -> Distribution) on PyPI.
+
+    on_result(name, installed_version, newer_version, error) is called as each lookup finishes,
+    in completion order; newer_version is None when the package is up to date. Pre-releases
+    are only offered for packages installed as pre-releases, like pip does.
+    Returns the list of OutdatedPackage sorted by name.
+    """
+    outdated = []
+    lookups = pypi.fetch_many(list(installed), max_workers)
+    try:
+        for key, data, error in lookups:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            distribution = installed[key]
+            newer = None
+            if data is not None:
+                current = parse_version(distribution.version)
+                include_prereleases = current is not None and current.is_prerelease
+                latest = latest_version(data, python_version, include_prereleases)
+                latest_parsed = parse_version(latest) if latest else None
+                if latest_parsed is not None and (current is None or latest_parsed > current):
+                    newer = latest
+                    outdated.append(OutdatedPackage(distribution.name, distribution.version, latest))
+            if on_result:
+                on_result(distribution.name, distribution.version, newer, error)
+    finally:
+        lookups.close()  # Cancels the lookups that haven't started yet
+    return sorted(outdated, key=lambda package: inventory.normalize_name(package.name))
@@ -0,0 +1,265 @@
+"""
+Sortable, filterable table of installed distributions built on ttk.Treeview.
+
+Rows are inserted in pages from the Tk main loop so large environments never freeze the UI.
+Filtering uses a sorted prefix index and sorting uses precomputed keys; both are done by
+PackageTableModel, which needs no display. The view then only detaches the rows that were
+hidden and moves the rows that were shown or changed position, instead of rebuilding the tree.
+"""
+import bisect
+import tkinter as tk
+from tkinter import ttk
+
+from inventory import format_size, normalize_name
+from specs import parse_version
+
+
+PAGE_SIZE = 200  # Rows inserted per main loop iteration
+FILTER_DELAY_MS = 80  # Debounce delay between a keystroke and re-filtering
+
+COLUMNS = (
+    ("name", "Package", 220),
+    ("version", "Version", 110),
+    ("location", "Location", 300),
+    ("size", "Size", 90),
+)
+
+
+class PackageTableModel:
+    """
+    The rows of the package table with their sort order and filter, independent of Tk.
+
+    Item ids are normalized distribution names.
+    """
+
+    def __init__(self):
+        self.rows = {}  # item id -> Distribution
+        self.sizes = {}  # item id -> size in bytes
+        self.order = []  # item ids in the current sort order
+        self.sort_column = "name"
+        self.sort_reverse = False
+        self.prefix_index = []  # sorted item ids, for prefix matching
+        self.filter_text = ""
+
+    def load(self, distributions):
+        """Replaces the rows with the given distributions, keeping the sort column and filter."""
+        self.rows = {normalize_name(dist.name): dist for dist in distributions}
+        self.sizes = {}
+        self.prefix_index = sorted(self.rows)
+        self.order = list(self.prefix_index)
+        self._sort_order()
+
+    def set_sizes(self, sizes):
+        """
+        Records sizes from a mapping of item id to bytes, ignoring unknown ids.
+
+        Returns the item ids whose size was set.
+        """
+        updated = [item_id for item_id in sizes if item_id in self.rows]
+        for item_id in updated:
+            self.sizes[item_id] = sizes[item_id]
+        if updated and self.sort_column == "size":
+            self._sort_order()
+        return updated
+
+    def matching_ids(self, text=None):
+        """Returns the item ids whose name starts with the text (by default the current filter)."""
+        prefix = normalize_name((self.filter_text if text is None else text).strip())
+        if not prefix:
+            return set(self.rows)
+        # All names sharing the prefix form one contiguous run of the sorted index
+        start = bisect.bisect_left(self.prefix_index, prefix)
+        end = bisect.bisect_left(self.prefix_index, prefix + "\uffff")
+        return set(self.prefix_index[start:end])
+
+    def visible_order(self, available=None):
+        """Returns the matching item ids in sort order, limited to the available ones if given."""
+        matches = self.matching_ids()
+        if available is not None:
+            matches &= available
+        return [item_id for item_id in self.order if item_id in matches]
+
+    def sort_by(self, column):
+        """Sorts by the given column; sorting by the same column again reverses the order."""
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+            self.order.reverse()  # No need to sort again, just flip the order
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+            self._sort_order()
+
+    def _sort_key(self, item_id):
+        """Returns the sort key of a row for the current sort column."""
+        dist = self.rows[item_id]
+        if self.sort_column == "version":
+            version = parse_version(dist.version)
+            # Unparseable versions sort after all valid ones
+            return (0, version, item_id) if version is not None else (1, dist.version, item_id)
+        if self.sort_column == "location":
+            return (dist.location, item_id)
+        if self.sort_column == "size":
+            return (self.sizes.get(item_id) or 0, item_id)
+        return item_id
+
+    def _sort_order(self):
+        """Sorts the item ids by the current sort column, computing each key only once."""
+        keys = {item_id: self._sort_key(item_id) for item_id in self.order}
+        self.order.sort(key=keys.__getitem__, reverse=self.sort_reverse)
+
+
+def plan_reorder(displayed, target):
+    """
+    Plans the fewest tree changes that turn the displayed rows into the target rows.
+
+    Returns (to_detach, to_move): the displayed rows to take out of the tree, either because
+    they are hidden now or out of place, and the rows to (re)insert at their target position.
+    The rows that stay form the longest run of displayed rows already in target order.
+    """
+    position = {item_id: index for index, item_id in enumerate(target)}
+    kept = [item_id for item_id in displayed if item_id in position]
+
+    # Longest increasing subsequence of target positions, in O(n log n)
+    tails = []  # tails[k]: smallest target position ending an increasing run of length k + 1
+    tail_ids = []
+    previous = {}
+    for item_id in kept:
+        k = bisect.bisect_left(tails, position[item_id])
+        previous[item_id] = tail_ids[k - 1] if k else None
+        if k == len(tails):
+            tails.append(position[item_id])
+            tail_ids.append(item_id)
+        else:
+            tails[k] = position[item_id]
+            tail_ids[k] = item_id
+    stable = set()
+    item_id = tail_ids[-1] if tail_ids else None
+    while item_id is not None:
+        stable.add(item_id)
+        item_id = previous[item_id]
+
+    to_detach = [item_id for item_id in displayed if item_id not in stable]
+    to_move = [item_id for item_id in target if item_id not in stable]
+    return to_detach, to_move
+
+
+class PackageTable(tk.Frame):
+    """
+    A frame holding a type-to-filter entry above a sortable table of distributions.
+
+    Call load() with Distribution tuples from the Tk main thread, and set_sizes() once the
+    sizes have been computed (e.g. by a background job). The rows, order and filter are kept
+    in self.model.
+    """
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+
+        filter_frame = tk.Frame(self, bg=self["bg"])
+        filter_frame.pack(fill=tk.X, padx=5, pady=5)
+        tk.Label(filter_frame, text="Filter:", font=("Arial", 11), bg=self["bg"], fg="#333").pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        filter_entry = tk.Entry(filter_frame, textvariable=self.filter_var, font=("Arial", 12), bd=2, relief="solid")
+        filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.status_label = tk.Label(filter_frame, text="", font=("Arial", 10), bg=self["bg"], fg="#666")
+        self.status_label.pack(side=tk.RIGHT)
+
+        table_frame = tk.Frame(self)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.tree = ttk.Treeview(table_frame, columns=[column for column, _, _ in COLUMNS], show="headings")
+        for column, heading, width in COLUMNS:
+            self.tree.heading(column, text=heading, command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=width, anchor=tk.E if column == "size" else tk.W)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.model = PackageTableModel()
+        self.inserted = set()  # item ids already inserted into the tree
+        self.displayed = []  # item ids attached to the tree, in tree order
+        self._filter_job = None
+        self._load_generation = 0
+
+        self.filter_var.trace_add("write", lambda *_: self._schedule_filter())
+
+    def load(self, distributions):
+        """
+        Replaces the table content with the given distributions.
+
+        Rows are inserted PAGE_SIZE at a time so the main loop stays responsive.
+        """
+        self._load_generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.inserted = set()
+        self.displayed = []
+        self.model.load(distributions)
+        self._insert_page(list(self.model.order), 0, self._load_generation)
+
+    def _insert_page(self, item_ids, start, generation):
+        """Inserts the next page of rows and schedules the following one."""
+        if generation != self._load_generation or not self.winfo_exists():
+            return  # A newer load replaced this one
+
+        matches = self.model.matching_ids()
+        hidden = []
+        for item_id in item_ids[start:start + PAGE_SIZE]:
+            dist = self.model.rows[item_id]
+            self.tree.insert("", tk.END, iid=item_id, values=(
+                dist.name, dist.version, dist.location, format_size(self.model.sizes.get(item_id))
+            ))
+            self.inserted.add(item_id)
+            if item_id in matches:
+                self.displayed.append(item_id)
+            else:
+                hidden.append(item_id)
+        if hidden:
+            self.tree.detach(*hidden)
+
+        if start + PAGE_SIZE < len(item_ids):
+            self.after(1, self._insert_page, item_ids, start + PAGE_SIZE, generation)
+        else:
+            self._reattach()  # Puts rows in order if the user sorted while pages were loading
+
+    def set_sizes(self, sizes):
+        """Fills in the size column from a mapping of normalized name to size in bytes."""
+        for item_id in self.model.set_sizes(sizes):
+            if item_id in self.inserted:
+                self.tree.set(item_id, "size", format_size(self.model.sizes[item_id]))
+        if self.model.sort_column == "size":
+            self._reattach()
+
+    def _schedule_filter(self):
+        """Re-filters shortly after the last keystroke instead of on every key."""
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        """Shows only the rows whose name starts with the filter text."""
+        self._filter_job = None
+        self.model.filter_text = self.filter_var.get()
+        self._reattach()
+
+    def _reattach(self):
+        """Brings the tree in line with the model, touching only rows that were hidden, shown or moved."""
+        target = self.model.visible_order(self.inserted)
+        to_detach, to_move = plan_reorder(self.displayed, target)
+        if to_detach:
+            self.tree.detach(*to_detach)
+        # The rows left in the tree are in target order, so each row is moved after the ones before it
+        moving = set(to_move)
+        for index, item_id in enumerate(target):
+            if item_id in moving:
+                self.tree.move(item_id, "", index)
+        self.displayed = target
+        self._update_status()
+
+    def sort_by(self, column):
+        """Sorts by the given column; clicking the same column again reverses the order."""
+        self.model.sort_by(column)
+        self._reattach()
+
+    def _update_status(self):
+        """Shows how many rows match the filter."""
+        self.status_label.config(text=f"{len(self.displayed)} of {len(self.model.rows)} packages")
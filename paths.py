@@ -0,0 +1,47 @@
+"""
+Locations of the per-user directories PIP-MATE stores its caches and settings in.
+"""
+import os
+import sys
+
+
+def user_cache_dir():
+    """
+    Returns (and creates) the per-user cache directory of PIP-MATE.
+
+    Follows the platform conventions: %LOCALAPPDATA% on Windows, ~/Library/Caches on macOS
+    and $XDG_CACHE_HOME (or ~/.cache) elsewhere. PIPMATE_CACHE_DIR overrides the location.
+    """
+    path = os.environ.get("PIPMATE_CACHE_DIR")
+    if not path:
+        if os.name == 'nt':
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(os.path.join("~", "AppData", "Local"))
+        elif sys.platform == "darwin":
+            base = os.path.expanduser(os.path.join("~", "Library", "Caches"))
+        else:
+            base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache"))
+        path = os.path.join(base, "pip-mate")
+
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def user_config_dir():
+    """
+    Returns (and creates) the per-user configuration directory of PIP-MATE.
+
+    Uses %APPDATA% on Windows, ~/Library/Application Support on macOS and $XDG_CONFIG_HOME
+    (or ~/.config) elsewhere. PIPMATE_CONFIG_DIR overrides the location.
+    """
+    path = os.environ.get("PIPMATE_CONFIG_DIR")
+    if not path:
+        if os.name == 'nt':
+            base = os.environ.get("APPDATA") or os.path.expanduser(os.path.join("~", "AppData", "Roaming"))
+        elif sys.platform == "darwin":
+            base = os.path.expanduser(os.path.join("~", "Library", "Application Support"))
+        else:
+            base = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser(os.path.join("~", ".config"))
+        path = os.path.join(base, "pip-mate")
+
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,352 @@
+"""
+Persistent pip processes, one per environment, that run pip commands without a new interpreter.
+
+A pip subprocess spends several hundred milliseconds starting Python and importing pip before it
+does any work. A worker (pip_worker_server.py) is started once with the environment's own
+interpreter, keeps pip imported and its index session open, and runs the commands it receives
+over a pipe in-process, streaming their output back as JSON lines. Workers are restarted when
+they crash, and replaced when the environment changed under a pip that caches the installed
+distributions (the pkg_resources backend); they exit by themselves after IDLE_TIMEOUT seconds
+without work.
+
+process.stream_command() hands pip commands to run() first; when no worker can serve one (e.g.
+the environment's worker is busy with another command) it runs pip as a subprocess as before.
+"""
+import atexit
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+import tracing
+
+
+DEFAULT_IDLE_TIMEOUT = 300.0
+
+
+def _idle_timeout():
+    """Returns PIPMATE_PIP_WORKER_IDLE, or DEFAULT_IDLE_TIMEOUT if it isn't a positive number."""
+    try:
+        timeout = float(os.environ.get("PIPMATE_PIP_WORKER_IDLE", DEFAULT_IDLE_TIMEOUT))
+    except ValueError:
+        return DEFAULT_IDLE_TIMEOUT
+    return timeout if 0 < timeout < float("inf") else DEFAULT_IDLE_TIMEOUT
+
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pip_worker_server.py")
+IDLE_TIMEOUT = _idle_timeout()  # Seconds before an idle worker exits
+MAX_COMMANDS = 100  # Commands served before a worker is replaced, bounding its memory growth
+START_TIMEOUT = 30  # Seconds a new worker may take to import pip
+CANCEL_POLL_SECONDS = 0.1  # How often a running command checks its cancel event
+RETRY_SECONDS = 30  # Wait after a failed start before the interpreter's worker is tried again
+MAX_RETRY_SECONDS = 30 * 60  # Cap of that wait, which doubles with each failure in a row
+# Set PIPMATE_PIP_WORKER=0 to run every pip command as its own subprocess
+enabled = os.environ.get("PIPMATE_PIP_WORKER", "1") not in ("", "0")
+
+_PIP_SCRIPT = re.compile(r"pip(\d+(\.\d+)?)?(\.exe)?$", re.IGNORECASE)
+
+_workers = {}  # interpreter -> PipWorker
+_unavailable = {}  # interpreter -> (time of its worker's last failed start, failures in a row)
+_workers_lock = threading.Lock()
+
+
+class WorkerUnavailable(Exception):
+    """Raised when a worker can't be started, before it has run anything."""
+
+
+def _may_start(python):
+    """Checks whether a worker may be started for an interpreter; call with _workers_lock held."""
+    failure = _unavailable.get(python)
+    if failure is None:
+        return True
+    failed_at, failures = failure
+    return time.monotonic() - failed_at >= min(RETRY_SECONDS * 2 ** (failures - 1), MAX_RETRY_SECONDS)
+
+
+def _record_start(python, failed):
+    """
+    Records whether starting the worker of an interpreter failed.
+
+    Commands use subprocesses for a while after a failure, e.g. a start that timed out on a busy
+    machine or an environment whose pip can't run in-process, and try the worker again later.
+    """
+    with _workers_lock:
+        if not failed:
+            _unavailable.pop(python, None)
+            return
+        _, failures = _unavailable.get(python, (0, 0))
+        _unavailable[python] = (time.monotonic(), failures + 1)
+
+
+def interpreter_for(pip_command):
+    """
+    Returns the Python interpreter that runs a pip executable, or None if it can't be told.
+
+    That is the interpreter named in the script's shebang line, or the python next to it.
+    """
+    path = pip_command if os.path.dirname(pip_command) else shutil.which(pip_command)
+    if not path or not os.path.isfile(path):
+        return None
+    scripts_dir = os.path.dirname(os.path.abspath(path))
+    if os.name == 'nt':
+        candidates = [os.path.join(scripts_dir, "python.exe"), os.path.join(os.path.dirname(scripts_dir), "python.exe")]
+    else:
+        candidates = [os.path.join(scripts_dir, "python")]
+        try:
+            with open(path, "rb") as script:
+                first_line = script.readline(1024).decode("utf-8", "replace").strip()
+            # `#!/usr/bin/env python3` and shell wrappers can't be attributed to one interpreter
+            if first_line.startswith("#!") and " " not in first_line[2:].strip():
+                candidates.insert(0, first_line[2:].strip())
+        except OSError:
+            pass
+    return next((candidate for candidate in candidates if os.path.isfile(candidate)), None)
+
+
+class PipWorker:
+    """A pip worker process of one interpreter; run() serves one command at a time."""
+
+    def __init__(self, python):
+        self.python = python
+        self.busy = threading.Lock()  # Held while a command runs
+        self.process = None
+        self.info = None  # The worker's ready message: pid, pip and Python version
+        self._messages = None
+        self._environ = None  # os.environ the worker was started with
+        self._on_line = None  # Receives stray stderr output of the current command
+
+    def alive(self):
+        """Checks whether the worker process is running."""
+        return self.process is not None and self.process.poll() is None
+
+    def _read_messages(self, stream, messages):
+        """Parses the worker's protocol messages until EOF, which is marked with None."""
+        with stream:
+            for line in stream:
+                try:
+                    messages.put(json.loads(line))
+                except ValueError:
+                    messages.put({"type": "line", "text": line})  # Never expected, but not lost either
+        messages.put(None)
+
+    def _read_stderr(self, stream):
+        """Forwards what the worker writes to stderr outside of pip's streams, e.g. from C code."""
+        with stream:
+            for line in stream:
+                on_line = self._on_line
+                if on_line is not None:
+                    on_line(line)
+
+    def start(self):
+        """Starts the worker and waits until pip is imported. Raises WorkerUnavailable on failure."""
+        self.stop()
+        with tracing.span("start pip worker", category="subprocess", python=self.python):
+            env = dict(os.environ)
+            env["PYTHONUNBUFFERED"] = "1"
+            try:
+                self.process = subprocess.Popen(
+                    [self.python, SERVER_SCRIPT, str(IDLE_TIMEOUT), str(MAX_COMMANDS)],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    encoding="utf-8",
+                    errors="replace",
+                    bufsize=1,
+                    env=env,
+                )
+            except OSError as e:
+                raise WorkerUnavailable(str(e))
+            self._environ = dict(os.environ)
+            self._messages = queue.Queue()
+            threading.Thread(target=self._read_messages, args=(self.process.stdout, self._messages),
+                             daemon=True).start()
+            threading.Thread(target=self._read_stderr, args=(self.process.stderr,), daemon=True).start()
+
+            try:
+                message = self._messages.get(timeout=START_TIMEOUT)
+            except queue.Empty:
+                message = {"type": "error", "error": f"no answer within {START_TIMEOUT} seconds"}
+            if message is None:
+                message = {"type": "error", "error": f"exited with code {self.process.wait()}"}
+            if message.get("type") != "ready":
+                self.stop()
+                raise WorkerUnavailable(message.get("error", "unexpected answer"))
+            self.info = message
+
+    def stop(self):
+        """Asks the worker to exit by closing its stdin, and kills it if it doesn't."""
+        process, self.process = self.process, None
+        if process is None or process.poll() is not None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+
+    def run(self, args, on_line, cancel_event=None, span=None):
+        """
+        Runs pip with args in the worker, starting it first if needed, and returns the exit code.
+
+        If cancel_event is set while the command runs, the worker is terminated. Raises
+        WorkerUnavailable if the worker can't be started; the command hasn't run then.
+        """
+        for _ in range(2):
+            if not self.alive() or self._environ != os.environ:
+                self.start()  # Settings pip reads from the environment may have changed
+                if span is not None:
+                    span.set(worker_started=True)
+            if span is not None:
+                span.set(worker_pid=self.info["pid"])
+
+            self._on_line = on_line
+            try:
+                self.process.stdin.write(json.dumps({"args": list(args), "cwd": os.getcwd()}) + "\n")
+                self.process.stdin.flush()
+                returncode = self._collect(on_line, cancel_event, span)
+            except OSError:
+                returncode = None  # Exited before it could read the command
+            finally:
+                self._on_line = None
+            if returncode is not None:
+                return returncode
+            self.stop()
+        raise WorkerUnavailable("the worker exited before running the command")
+
+    def _collect(self, on_line, cancel_event, span):
+        """
+        Forwards the output of the running command and returns its exit code.
+
+        Returns None if the worker exited without starting it (it went idle just as the
+        command was sent), so the command can be sent to a new worker.
+        """
+        terminated = False
+        started = False
+        while True:
+            try:
+                message = self._messages.get(timeout=CANCEL_POLL_SECONDS)
+            except queue.Empty:
+                if cancel_event is not None and cancel_event.is_set() and not terminated:
+                    self.process.terminate()  # pip can't be stopped in-process; a new worker takes over
+                    terminated = True
+                continue
+
+            if message is None:  # The worker exited
+                returncode = self.process.wait()
+                self.process = None
+                if span is not None:
+                    span.set(returncode=returncode, cancelled=terminated)
+                if terminated:
+                    return returncode
+                if not started and returncode == 0:
+                    return None
+                on_line(f"The pip worker exited unexpectedly (exit code {returncode}).\n")
+                return returncode or 1
+
+            started = True
+            if message.get("type") == "line":
+                on_line(message["text"])
+            elif message.get("type") == "done":
+                if span is not None:
+                    span.set(returncode=message["returncode"], cancelled=terminated)
+                    if "cpu_user" in message:
+                        span.add("cpu_user", message["cpu_user"])
+                        span.add("cpu_system", message["cpu_system"])
+                        span.set(max_rss_kb=message["max_rss_kb"])
+                if message.get("restart"):
+                    self.process.wait()  # Its pip was replaced or it served MAX_COMMANDS
+                    self.process = None
+                return message["returncode"]
+
+
+def is_pip_command(command):
+    """Checks whether a command line runs a pip executable (pip, pip3, pip3.11, pip.exe)."""
+    return bool(command) and bool(_PIP_SCRIPT.match(os.path.basename(command[0])))
+
+
+def run(command, on_line, cancel_event=None, span=None):
+    """
+    Runs a pip command line in the worker of its interpreter and returns the exit code.
+
+    Returns None, without having run anything, when no worker can serve the command: workers
+    are disabled, the interpreter can't be told, its worker can't start (e.g. pip can't be
+    imported in-process) or failed to start recently, or the worker is busy with another command.
+    """
+    if not enabled or not is_pip_command(command):
+        return None
+    python = interpreter_for(command[0])
+    if python is None:
+        return None
+    with _workers_lock:
+        if not _may_start(python):
+            return None
+        worker = _workers.setdefault(python, PipWorker(python))
+    if not worker.busy.acquire(blocking=False):
+        return None  # Busy with a read-only command running in parallel; use a subprocess
+    try:
+        if span is not None:
+            span.set(worker=True)
+        returncode = worker.run(command[1:], on_line, cancel_event, span)
+        _record_start(python, failed=False)
+        return returncode
+    except WorkerUnavailable as e:
+        _record_start(python, failed=True)
+        if span is not None:
+            span.set(worker=False, worker_error=str(e))
+        return None
+    finally:
+        worker.busy.release()
+
+
+def warm_up(pip_command):
+    """Starts the worker of a pip executable in the background, so the first command finds it ready."""
+    if not enabled:
+        return
+    python = interpreter_for(pip_command)
+    if python is None:
+        return
+
+    def start():
+        """Starts the worker unless it is running or a command is starting it already."""
+        with _workers_lock:
+            if not _may_start(python):
+                return
+            worker = _workers.setdefault(python, PipWorker(python))
+        if not worker.busy.acquire(blocking=False):
+            return
+        try:
+            if not worker.alive():
+                worker.start()
+            _record_start(python, failed=False)
+        except WorkerUnavailable:
+            _record_start(python, failed=True)
+        finally:
+            worker.busy.release()
+
+    threading.Thread(target=start, name="pip-worker-warm-up", daemon=True).start()
+
+
+def release(pip_command):
+    """Stops the worker of a pip executable, e.g. before its environment is moved or deleted."""
+    python = interpreter_for(pip_command)
+    with _workers_lock:
+        worker = _workers.pop(python, None)
+    if worker is not None:
+        with worker.busy:
+            worker.stop()
+
+
+@atexit.register
+def shutdown():
+    """Stops every worker."""
+    with _workers_lock:
+        workers = list(_workers.values())
+        _workers.clear()
+    for worker in workers:
+        worker.stop()
@@ -0,0 +1,253 @@
+"""
+Long-lived pip process, started by pip_worker.py with the interpreter of an environment.
+
+Reads one JSON request per line from stdin ({"args", "cwd"}) and runs pip in-process, so
+pip's modules are imported once and its HTTP sessions (with their open connections) are reused
+across commands. The output of a command is streamed back on the original stdout as
+{"type": "line"} messages, followed by a {"type": "done"} message with the exit code.
+
+This runs inside the managed environment rather than PIP-MATE's own, so only the standard
+library and pip may be imported here.
+"""
+import importlib
+import json
+import os
+import queue
+import sys
+import threading
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Options that change how pip builds its HTTP session; commands agreeing on all of them share one
+_SESSION_OPTIONS = ("cache_dir", "retries", "timeout", "trusted_hosts", "cert", "client_cert", "proxy",
+                    "no_input", "keyring_provider", "features_enabled", "index_url", "extra_index_urls",
+                    "no_index")
+
+
+class _Channel:
+    """Writes protocol messages as JSON lines; safe to call from pip's threads."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        """Sends a message, exiting if PIP-MATE has gone away."""
+        with self._lock:
+            try:
+                self._stream.write(json.dumps(message) + "\n")
+                self._stream.flush()
+            except (OSError, ValueError):
+                os._exit(1)  # Nobody is reading anymore
+
+
+class _LineWriter:
+    """
+    Stands in for sys.stdout and sys.stderr while pip runs and sends what it writes line by line.
+
+    Carriage returns end a line, like the universal newlines of a pip subprocess pipe.
+    """
+
+    encoding = "utf-8"
+    errors = "replace"
+
+    def __init__(self, channel):
+        self._channel = channel
+        self._pending = ""
+
+    def write(self, text):
+        self._pending += text.replace("\r\n", "\n").replace("\r", "\n")
+        *lines, self._pending = self._pending.split("\n")
+        for line in lines:
+            self._channel.send({"type": "line", "text": line + "\n"})
+        return len(text)
+
+    def flush(self):
+        """Lines are sent as soon as they are complete, so there is nothing to flush."""
+
+    def close_line(self):
+        """Sends an unterminated last line, like the end of a subprocess' output."""
+        if self._pending:
+            self._channel.send({"type": "line", "text": self._pending})
+            self._pending = ""
+
+    def isatty(self):
+        return False
+
+    def writable(self):
+        return True
+
+
+def _keep_sessions_warm():
+    """
+    Makes pip reuse its HTTP session across commands, so connections to the index stay open.
+
+    pip builds a session per command and closes it at the end; the shared sessions ignore close().
+    """
+    try:
+        from pip._internal.cli.req_command import SessionCommandMixin
+    except ImportError:
+        return  # Another pip layout: every command builds its own session
+    build_session = SessionCommandMixin._build_session
+    sessions = {}
+
+    def build_shared_session(self, options, *args, **kwargs):
+        """Returns the session of an earlier command with the same network options."""
+        key = repr(([getattr(options, name, None) for name in _SESSION_OPTIONS], args, sorted(kwargs.items())))
+        if key not in sessions:
+            session = build_session(self, options, *args, **kwargs)
+            session.close = lambda: None
+            sessions[key] = session
+        return sessions[key]
+
+    SessionCommandMixin._build_session = build_shared_session
+
+
+def _pip_replaced(loaded_version):
+    """Checks whether a command upgraded or removed the pip this process has imported."""
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:  # Python 3.7
+        return False
+    try:
+        return version("pip") != loaded_version
+    except PackageNotFoundError:
+        return True
+
+
+def _caches_installed_distributions():
+    """
+    Checks whether pip reads installed distributions through pkg_resources (its default before
+    Python 3.11), which builds the working set once per process and never notices later changes.
+    """
+    try:
+        from pip._internal.metadata import select_backend
+    except ImportError:
+        return True  # pip before 22 only has pkg_resources
+    return select_backend().__name__.endswith("pkg_resources")
+
+
+def _path_stamp():
+    """Returns the modification times of the sys.path directories, which change on every (un)install."""
+    stamp = []
+    for entry in sys.path:
+        try:
+            stamp.append(os.stat(entry or os.curdir).st_mtime_ns)
+        except OSError:
+            stamp.append(None)
+    return stamp
+
+
+def _usage():
+    """Returns the CPU time (user, system) of this process and its children, or None."""
+    if resource is None:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + children.ru_utime, own.ru_stime + children.ru_stime
+
+
+def _run(pip_main, request, channel):
+    """Runs one pip command in-process and returns its exit code."""
+    writer = _LineWriter(channel)
+    saved_streams = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = writer
+    try:
+        os.chdir(request.get("cwd") or os.getcwd())
+        importlib.invalidate_caches()  # Earlier commands changed site-packages
+        returncode = pip_main(request["args"])
+    except SystemExit as e:
+        returncode = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except Exception:
+        traceback.print_exc(file=writer)
+        returncode = 1
+    finally:
+        writer.close_line()
+        sys.stdout, sys.stderr = saved_streams
+    return returncode
+
+
+def _read_requests(stream):
+    """Returns a queue filled with the requests read from stream; None marks its end."""
+    requests = queue.Queue()
+
+    def read():
+        """Parses one request per line until PIP-MATE closes the pipe."""
+        for line in stream:
+            if line.strip():
+                requests.put(json.loads(line))
+        requests.put(None)
+
+    threading.Thread(target=read, daemon=True).start()
+    return requests
+
+
+def main():
+    """Serves requests until stdin closes, the worker idles for too long or has served enough."""
+    idle_timeout = float(sys.argv[1]) if len(sys.argv) > 1 else 300.0
+    max_commands = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    # pip must see the packages of the environment only, not PIP-MATE's modules
+    if sys.path and os.path.abspath(sys.path[0] or os.curdir) == os.path.dirname(os.path.abspath(__file__)):
+        del sys.path[0]
+
+    # The protocol keeps the real stdout; anything else writing to file descriptor 1 (e.g. a
+    # C extension) ends up on stderr, which PIP-MATE forwards as plain output
+    channel = _Channel(os.fdopen(os.dup(1), "w", encoding="utf-8"))
+    os.dup2(2, 1)
+
+    try:
+        import pip
+        from pip._internal.cli.main import main as pip_main
+    except Exception as e:
+        channel.send({"type": "error", "error": f"{type(e).__name__}: {e}"})
+        return 1
+    _keep_sessions_warm()
+    channel.send({"type": "ready", "pid": os.getpid(), "pip": pip.__version__,
+                  "python": sys.version.split()[0]})
+
+    requests = _read_requests(sys.stdin)
+    # Import the commands PIP-MATE runs most while nothing is waiting for them yet
+    try:
+        from pip._internal.commands import create_command
+        for name in ("install", "uninstall", "list"):
+            create_command(name)
+    except Exception:
+        pass  # Imported on first use instead
+    caching = _caches_installed_distributions()
+    stamp = _path_stamp()
+    for count in range(1, max_commands + 1):
+        try:
+            request = requests.get(timeout=idle_timeout)
+        except queue.Empty:
+            return 0  # Idle; PIP-MATE starts a new worker when it needs one
+        if request is None:
+            return 0  # PIP-MATE closed the pipe
+        if caching and _path_stamp() != stamp:
+            # pip would act on the packages installed when this process started. Exiting without
+            # an answer makes PIP-MATE send the command again to a new worker
+            return 0
+
+        usage_before = _usage()
+        returncode = _run(pip_main, request, channel)
+        # A new pip can't be used from the modules of the old one, and memory grows over many commands
+        restart = count == max_commands or _pip_replaced(pip.__version__)
+        done = {"type": "done", "returncode": returncode, "restart": restart}
+        if usage_before is not None:
+            usage_after = _usage()
+            done["cpu_user"] = usage_after[0] - usage_before[0]
+            done["cpu_system"] = usage_after[1] - usage_before[1]
+            done["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        channel.send(done)
+        if restart:
+            return 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Subprocess runner that streams the output of a command line by line while it runs.
+"""
+import os
+import subprocess
+import threading
+
+import pip_worker
+import tracing
+
+
+CANCEL_POLL_SECONDS = 0.1  # How often a running command checks its cancel event
+
+
+def _pump(stream, on_line):
+    """Reads lines from a pipe until EOF and hands each of them to the callback."""
+    with stream:
+        for line in stream:
+            on_line(line)
+
+
+def stream_command(command, on_line, env=None, cancel_event=None):
+    """
+    Runs a command and passes every line it writes to stdout or stderr to on_line as it arrives.
+
+    Both pipes are read by their own thread, so on_line must be thread-safe (e.g. a queue put).
+    Carriage return progress updates are delivered as separate lines.
+    If cancel_event is set while the command runs, the command is terminated.
+    pip commands run in the environment's persistent pip worker when one is free (see
+    pip_worker.py) unless a custom env is given. Returns the exit code of the command.
+    """
+    with tracing.span(_describe(command), category="subprocess", command=" ".join(command)) as span:
+        def handle_line(line):
+            """Counts the downloads pip announces and forwards the line."""
+            downloaded = tracing.pip_download_bytes(line)
+            if downloaded:
+                span.add("bytes_downloaded", downloaded)
+            on_line(line)
+
+        if env is None:
+            returncode = pip_worker.run(command, handle_line, cancel_event, span)
+            if returncode is not None:
+                return returncode
+
+        env = dict(os.environ if env is None else env)
+        env.setdefault("PYTHONUNBUFFERED", "1")  # Make pip flush each line instead of 4 KiB blocks
+
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            errors="replace",
+            bufsize=1,
+            env=env,
+        )
+
+        readers = [
+            threading.Thread(target=_pump, args=(process.stdout, handle_line), daemon=True),
+            threading.Thread(target=_pump, args=(process.stderr, handle_line), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+
+        terminated = False
+        for reader in readers:
+            while reader.is_alive():
+                reader.join(CANCEL_POLL_SECONDS)
+                if cancel_event is not None and cancel_event.is_set() and not terminated:
+                    process.terminate()  # The readers finish once the process closes its pipes
+                    terminated = True
+
+        returncode, usage = _wait(process)
+        span.set(returncode=returncode, cancelled=terminated)
+        if usage is not None:
+            span.add("cpu_user", usage.ru_utime)
+            span.add("cpu_system", usage.ru_stime)
+            span.set(max_rss_kb=usage.ru_maxrss)
+        return returncode
+
+
+def _describe(command):
+    """Returns a short span name for a command line, e.g. 'pip install' or 'python -m venv'."""
+    name = os.path.basename(command[0])
+    if name.lower().endswith(".exe"):
+        name = name[:-len(".exe")]
+    if len(command) > 2 and command[1] == "-m":
+        return f"{name} -m {command[2]}"
+    # Only subcommands (install, cache, ...) are kept; paths and package names vary per call
+    if len(command) > 1 and command[1].isalpha():
+        return f"{name} {command[1]}"
+    return name
+
+
+def _wait(process):
+    """
+    Waits for a process to exit and returns (exit code, resource usage or None).
+
+    On POSIX the process is reaped with os.wait4(), which reports the CPU time and peak memory
+    of that process alone, even when several commands run at once.
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        return process.wait(), None  # Already reaped, e.g. by terminate() polling it
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage
+
+
+def check_stream_command(command, on_line, env=None, cancel_event=None):
+    """
+    Streams a command like stream_command() and raises CalledProcessError if it fails.
+
+    This is the streaming counterpart of subprocess.check_call().
+    """
+    returncode = stream_command(command, on_line, env, cancel_event)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
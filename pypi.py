@@ -0,0 +1,189 @@
+"""
+PyPI JSON API client built on a single connection-pooled session.
+
+Metadata for many projects is fetched concurrently with a bounded worker pool,
+automatic retries with exponential backoff and per-request timeouts.
+"""
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests as rq
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import pypi_cache
+import tracing
+
+
+# Base URL of the JSON API; point it at a local stub server with PIPMATE_PYPI_URL
+PYPI_URL = os.environ.get("PIPMATE_PYPI_URL", "https://pypi.org/pypi").rstrip("/")
+
+DEFAULT_MAX_WORKERS = 8  # Default number of concurrent requests
+MAX_POOL_SIZE = 32  # Upper bound for concurrent requests / pooled connections
+DEFAULT_TIMEOUT = 5  # Seconds allowed for connecting and for each read
+DEFAULT_RETRIES = 3  # Retries for connection errors and transient server errors
+BACKOFF_FACTOR = 0.3  # Sleeps 0.3s, 0.6s, 1.2s, ... between retries
+
+# Serve metadata only from the on-disk cache, without touching the network
+offline = os.environ.get("PIPMATE_OFFLINE", "") not in ("", "0")
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the shared requests session used for every PyPI request.
+
+    The session keeps connections alive and pools up to MAX_POOL_SIZE of them per host,
+    retrying connection errors, 429 and 5xx responses with exponential backoff.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=DEFAULT_RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_POOL_SIZE, max_retries=retry)
+            session = rq.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept": "application/json", "User-Agent": "PIP-MATE"})
+            _session = session
+        return _session
+
+
+def project_url(package_name, version=None, base_url=None):
+    """Returns the JSON API URL of a project, or of a single release if a version is given."""
+    base_url = (base_url or PYPI_URL).rstrip("/")
+    if version:
+        return f"{base_url}/{package_name}/{version}/json"
+    return f"{base_url}/{package_name}/json"
+
+
+def fetch_project(package_name, version=None, timeout=DEFAULT_TIMEOUT, base_url=None, use_cache=True):
+    """
+    Fetches the JSON metadata of a project (or of one of its releases) from PyPI.
+
+    Documents are kept in the on-disk cache: fresh entries are served without a request, stale
+    ones are revalidated with If-None-Match / If-Modified-Since, and when the network is down
+    (or offline mode is on) any cached entry is served as is.
+    Raises requests.exceptions.RequestException if the request fails and nothing is cached.
+    """
+    with tracing.span("pypi fetch", category="network", package=package_name, version=version):
+        return _fetch_project(package_name, version, timeout, base_url, use_cache)
+
+
+def _fetch_project(package_name, version, timeout, base_url, use_cache):
+    """Implements fetch_project(), annotating the current span with how the cache was used."""
+    base_url = (base_url or PYPI_URL).rstrip("/")
+    key = pypi_cache.cache_key(package_name, version)
+    try:
+        entry = pypi_cache.get(base_url, key) if use_cache else None
+    except sqlite3.Error:
+        # A locked or corrupt cache must not break lookups; go to the network without it
+        tracing.annotate(cache="error")
+        entry, use_cache = None, False
+
+    if entry and (entry["fresh"] or offline):
+        tracing.annotate(cache="fresh")
+        return entry["data"]
+    if offline:
+        raise rq.exceptions.ConnectionError(f"{package_name} is not cached and offline mode is enabled")
+
+    # Ask the server to confirm the cached copy instead of sending the full document again
+    headers = {}
+    if entry and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response = get_session().get(project_url(package_name, version, base_url), headers=headers,
+                                     timeout=timeout)
+        tracing.annotate(status=response.status_code)
+        tracing.add("bytes_downloaded", len(response.content))
+        if response.status_code == 304 and entry:
+            try:
+                pypi_cache.mark_revalidated(base_url, key)
+            except sqlite3.Error:
+                pass  # The entry is simply revalidated again next time
+            tracing.annotate(cache="revalidated")
+            return entry["data"]
+        response.raise_for_status()
+        data = response.json()
+    except (rq.exceptions.ConnectionError, rq.exceptions.Timeout):
+        if entry:
+            tracing.annotate(cache="stale")
+            return entry["data"]  # Serve the stale copy when PyPI can't be reached
+        raise
+    except rq.exceptions.HTTPError:
+        if entry and response.status_code >= 500:
+            tracing.annotate(cache="stale")
+            return entry["data"]  # Serve the stale copy while PyPI is having trouble
+        raise
+
+    if not use_cache:
+        return data
+
+    data = pypi_cache.compact_project_json(data)
+    try:
+        pypi_cache.put(base_url, key, data, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    except sqlite3.Error:
+        tracing.annotate(cache="error")  # Still hand out the document, it just isn't stored
+    return data
+
+
+def fetch_many(package_names, max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT, base_url=None,
+               use_cache=True):
+    """
+    Fetches the JSON metadata of many projects concurrently.
+
+    Yields (package_name, data, error) tuples in completion order; exactly one of data and error
+    is None. The number of requests in flight never exceeds max_workers (capped at MAX_POOL_SIZE).
+    """
+    package_names = list(dict.fromkeys(package_names))  # Drop duplicates but keep the order
+    if not package_names:
+        return
+
+    max_workers = max(1, min(max_workers, MAX_POOL_SIZE, len(package_names)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pypi-fetch") as executor:
+        futures = {
+            # Bound to the caller's span so the fetches (and their bytes) show up under it
+            executor.submit(tracing.bind(fetch_project), name, None, timeout, base_url, use_cache): name
+            for name in package_names
+        }
+        try:
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    yield name, future.result(), None
+                except (rq.exceptions.RequestException, ValueError) as e:
+                    yield name, None, e
+        finally:
+            # Closing the generator early drops the requests that haven't started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def summarize(data):
+    """
+    Extracts the fields shown in the UI from a project's JSON metadata.
+
+    Missing fields are replaced with human readable defaults.
+    """
+    package_info = data.get("info") or {}
+    project_urls = package_info.get("project_urls") or {}
+    return {
+        "name": package_info.get("name") or "Unknown",
+        "version": package_info.get("version") or "Unknown",
+        "summary": package_info.get("summary") or "No description available.",
+        "author": package_info.get("author") or "Unknown",
+        "documentation": project_urls.get("Documentation", "No documentation available"),
+    }
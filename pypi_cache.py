@@ -0,0 +1,186 @@
+"""
+Persistent SQLite cache of PyPI JSON metadata.
+
+Entries are keyed by index URL and normalized project name (optionally with a release version),
+keep the ETag / Last-Modified validators for conditional requests, and are evicted by age
+and by total size in least-recently-used order.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from inventory import normalize_name
+from paths import user_cache_dir
+
+
+DEFAULT_FRESH_SECONDS = 3600  # Entries younger than this are served without revalidation
+MAX_AGE_SECONDS = 30 * 24 * 3600  # Entries not refreshed for this long are evicted
+MAX_CACHE_BYTES = 64 * 1024 * 1024  # Upper bound of the stored (compressed) documents
+
+
+
+def _fresh_seconds():
+    """Reads the freshness window from PIPMATE_CACHE_TTL, falling back to the default on bad values."""
+    try:
+        seconds = int(os.environ.get("PIPMATE_CACHE_TTL", DEFAULT_FRESH_SECONDS))
+    except ValueError:
+        return DEFAULT_FRESH_SECONDS
+    return seconds if seconds >= 0 else DEFAULT_FRESH_SECONDS
+
+
+FRESH_SECONDS = _fresh_seconds()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    index_url TEXT NOT NULL,
+    key TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (index_url, key)
+);
+CREATE INDEX IF NOT EXISTS projects_accessed ON projects (accessed_at);
+"""
+
+_connection = None
+_lock = threading.Lock()
+
+
+def cache_path():
+    """Returns the path of the SQLite database holding the cache."""
+    return os.path.join(user_cache_dir(), "pypi-metadata.sqlite3")
+
+
+def _connect():
+    """Returns the shared database connection, creating the database on first use."""
+    global _connection
+
+    if _connection is None:
+        _connection = sqlite3.connect(cache_path(), check_same_thread=False, isolation_level=None)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.executescript(_SCHEMA)
+    return _connection
+
+
+def cache_key(package_name, version=None):
+    """Returns the cache key of a project, or of one of its releases if a version is given."""
+    key = normalize_name(package_name)
+    return f"{key}/{version}" if version else key
+
+
+def compact_project_json(data):
+    """
+    Strips a JSON API document down to the fields PIP-MATE uses.
+
+    The long description and most per-file fields are dropped, which shrinks documents of
+    popular projects from megabytes to a few kilobytes.
+    """
+    def compact_file(file_info):
+        """Keeps only the fields of a release file needed for hashes and compatibility checks."""
+        return {
+            "filename": file_info.get("filename"),
+            "packagetype": file_info.get("packagetype"),
+            "requires_python": file_info.get("requires_python"),
+            "yanked": file_info.get("yanked", False),
+            "digests": {"sha256": (file_info.get("digests") or {}).get("sha256")},
+            "url": file_info.get("url"),
+        }
+
+    info = dict(data.get("info") or {})
+    info.pop("description", None)
+
+    compact = {"info": info, "urls": [compact_file(file_info) for file_info in data.get("urls") or []]}
+    if "releases" in data:
+        compact["releases"] = {
+            version: [compact_file(file_info) for file_info in files]
+            for version, files in (data.get("releases") or {}).items()
+        }
+    if "vulnerabilities" in data:
+        compact["vulnerabilities"] = data["vulnerabilities"]
+    return compact
+
+
+def get(index_url, key):
+    """
+    Returns the cached entry for the key as a dict, or None if it is not cached.
+
+    The entry holds the decoded 'data', its 'etag' / 'last_modified' validators, the
+    'fetched_at' timestamp and a 'fresh' flag telling whether it can be served without revalidation.
+    """
+    with _lock:
+        row = _connect().execute(
+            "SELECT etag, last_modified, body, fetched_at FROM projects WHERE index_url = ? AND key = ?",
+            (index_url, key),
+        ).fetchone()
+        if row is None:
+            return None
+        _connect().execute(
+            "UPDATE projects SET accessed_at = ? WHERE index_url = ? AND key = ?",
+            (time.time(), index_url, key),
+        )
+
+    etag, last_modified, body, fetched_at = row
+    try:
+        data = json.loads(zlib.decompress(body))
+    except (zlib.error, ValueError):
+        return None
+    return {
+        "data": data,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": fetched_at,
+        "fresh": time.time() - fetched_at < FRESH_SECONDS,
+    }
+
+
+def put(index_url, key, data, etag=None, last_modified=None):
+    """Stores a document with its validators and evicts old entries if the cache grew too large."""
+    body = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+    now = time.time()
+    with _lock:
+        _connect().execute(
+            "INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (index_url, key, etag, last_modified, body, len(body), now, now),
+        )
+        _evict()
+
+
+def mark_revalidated(index_url, key):
+    """Marks an entry as fresh again after the server answered 304 Not Modified."""
+    now = time.time()
+    with _lock:
+        _connect().execute(
+            "UPDATE projects SET fetched_at = ?, accessed_at = ? WHERE index_url = ? AND key = ?",
+            (now, now, index_url, key),
+        )
+
+
+def _evict():
+    """Drops expired entries, then the least recently used ones until the size bound holds."""
+    connection = _connect()
+    connection.execute("DELETE FROM projects WHERE fetched_at < ?", (time.time() - MAX_AGE_SECONDS,))
+
+    total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM projects").fetchone()[0]
+    if total <= MAX_CACHE_BYTES:
+        return
+
+    rows = connection.execute("SELECT index_url, key, size FROM projects ORDER BY accessed_at").fetchall()
+    stale = []
+    for index_url, key, size in rows:
+        if total <= MAX_CACHE_BYTES:
+            break
+        stale.append((index_url, key))
+        total -= size
+    connection.executemany("DELETE FROM projects WHERE index_url = ? AND key = ?", stale)
+
+
+def clear():
+    """Removes every cached document."""
+    with _lock:
+        _connect().execute("DELETE FROM projects")
@@ -0,0 +1,181 @@
+"""
+Persistent registry of known virtual environments.
+
+Environments are discovered under configured root directories, validated once and remembered
+in a JSON file under the user config directory. Queries across every registered environment
+are answered from the cached per-environment inventories, scanned in parallel.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import core
+import inventory
+from paths import user_config_dir
+
+
+MAX_SCAN_WORKERS = 8  # Environments scanned concurrently
+MAX_DISCOVERY_DEPTH = 3  # How deep below a root directory environments are looked for
+SKIPPED_DIRS = {".git", "node_modules", "__pycache__", "site-packages"}
+
+_registry_lock = threading.Lock()
+
+
+def registry_path():
+    """Returns the path of the JSON file holding the registry."""
+    return os.path.join(user_config_dir(), "environments.json")
+
+
+def load_registry():
+    """
+    Loads the registry from disk.
+
+    Returns a dict with 'roots' (directories to discover environments in) and 'environments'
+    (environment path -> {'name', 'validated_at'}).
+    """
+    try:
+        with open(registry_path(), encoding="utf-8") as registry_file:
+            data = json.load(registry_file)
+    except (OSError, ValueError):
+        data = {}
+    data.setdefault("roots", [])
+    data.setdefault("environments", {})
+    return data
+
+
+def save_registry(data):
+    """Writes the registry to disk atomically."""
+    path = registry_path()
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as registry_file:
+        json.dump(data, registry_file, indent=2, sort_keys=True)
+    os.replace(temporary_path, path)
+
+
+def register_environment(env_path, name=None):
+    """
+    Adds an environment to the registry after validating it.
+
+    Returns False if the path is not a valid virtual environment.
+    """
+    env_path = os.path.abspath(env_path)
+    if not core.is_valid_virtualenv(env_path):
+        return False
+
+    with _registry_lock:
+        data = load_registry()
+        data["environments"][env_path] = {
+            "name": name or os.path.basename(env_path.rstrip(os.sep)),
+            "validated_at": time.time(),
+        }
+        save_registry(data)
+    return True
+
+
+def unregister_environment(env_path):
+    """Removes an environment from the registry."""
+    with _registry_lock:
+        data = load_registry()
+        data["environments"].pop(os.path.abspath(env_path), None)
+        save_registry(data)
+
+
+def add_root(root):
+    """Adds a directory that discover() searches for environments."""
+    root = os.path.abspath(root)
+    with _registry_lock:
+        data = load_registry()
+        if root not in data["roots"]:
+            data["roots"].append(root)
+            save_registry(data)
+
+
+def list_environments():
+    """Returns the registered environment paths, sorted."""
+    return sorted(load_registry()["environments"])
+
+
+def _find_environments(root, depth=0):
+    """Yields the virtual environments found below a directory, without descending into them."""
+    if os.path.isfile(os.path.join(root, "pyvenv.cfg")):
+        yield root
+        return
+    if depth >= MAX_DISCOVERY_DEPTH:
+        return
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False) and entry.name not in SKIPPED_DIRS:
+            yield from _find_environments(entry.path, depth + 1)
+
+
+def discover(roots=None):
+    """
+    Looks for virtual environments below the configured roots (or the given ones).
+
+    New environments are validated once and registered; registered environments that no
+    longer exist are dropped. Returns the list of newly registered paths.
+    """
+    with _registry_lock:
+        data = load_registry()
+        roots = roots if roots is not None else data["roots"]
+
+        # Walk the roots in parallel; each root is an independent directory tree
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_SCAN_WORKERS, len(roots)))) as executor:
+            found = [path for paths in executor.map(lambda root: list(_find_environments(root)), roots)
+                     for path in paths]
+
+        added = []
+        now = time.time()
+        for env_path in found:
+            env_path = os.path.abspath(env_path)
+            if env_path not in data["environments"] and core.is_valid_virtualenv(env_path):
+                data["environments"][env_path] = {"name": os.path.basename(env_path), "validated_at": now}
+                added.append(env_path)
+
+        for env_path in list(data["environments"]):
+            if not os.path.isdir(env_path):
+                del data["environments"][env_path]
+
+        save_registry(data)
+    return added
+
+
+def scan_all(env_paths=None, max_workers=MAX_SCAN_WORKERS):
+    """
+    Returns the inventories of the registered (or given) environments, scanned in parallel.
+
+    Inventories are cached per environment and only rescanned when site-packages changed,
+    so repeated fleet-wide queries are cheap. Returns env path -> inventory.
+    """
+    env_paths = list(env_paths if env_paths is not None else list_environments())
+    if not env_paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(env_paths)))) as executor:
+        return dict(zip(env_paths, executor.map(inventory.get_inventory, env_paths)))
+
+
+def find_package(requirement_spec, env_paths=None):
+    """
+    Answers queries such as "which environments have requests<2.31".
+
+    Returns a list of (env path, Distribution) for every environment whose installed version
+    of the package satisfies the requirement spec. Raises ValueError for an invalid spec.
+    """
+    from specs import parse_requirement, requirement_key, version_satisfies
+
+    requirement = parse_requirement(requirement_spec)
+    if requirement is None:
+        raise ValueError(f"Invalid requirement: {requirement_spec}")
+
+    key = requirement_key(requirement)
+    matches = []
+    for env_path, installed in sorted(scan_all(env_paths).items()):
+        distribution = installed.get(key)
+        if distribution and version_satisfies(distribution.version, requirement.specifier):
+            matches.append((env_path, distribution))
+    return matches
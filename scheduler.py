@@ -0,0 +1,174 @@
+"""
+Job scheduler that runs PIP-MATE operations on a shared worker pool.
+
+Mutating operations (install, uninstall, upgrade, ...) on the same environment run one at a time
+in submission order, while read-only queries run in parallel. Queued jobs can be cancelled and
+running jobs receive a cancel event they can use to stop their subprocess.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+MAX_FINISHED_JOBS = 100  # Finished jobs kept around for the job list
+
+
+class Job:
+    """
+    A unit of work submitted to the scheduler.
+
+    The job function receives the Job itself and should check `cancel_event` (or pass it on to
+    process.stream_command) to stop early when the job is cancelled.
+    """
+
+    def __init__(self, job_id, name, func, env_key, mutating):
+        self.id = job_id
+        self.name = name
+        self.func = func
+        self.env_key = env_key
+        self.mutating = mutating
+        self.status = QUEUED
+        self.error = None
+        self.result = None
+        self.cancel_event = threading.Event()
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def cancelled(self):
+        """Whether cancellation of the job was requested."""
+        return self.cancel_event.is_set()
+
+    @property
+    def finished(self):
+        """Whether the job has stopped running for good."""
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def describe(self):
+        """Returns a one-line description of the job for the job list."""
+        if self.finished and self.started_at:
+            elapsed = f" ({self.finished_at - self.started_at:.1f}s)"
+        elif self.status == RUNNING:
+            elapsed = f" ({time.time() - self.started_at:.1f}s)"
+        else:
+            elapsed = ""
+        return f"#{self.id} [{self.status}] {self.name}{elapsed}"
+
+
+class JobScheduler:
+    """
+    Runs jobs on a bounded thread pool.
+
+    Mutating jobs are chained per environment key, so only one of them touches an environment
+    at a time; read-only jobs are handed to the pool right away.
+    """
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipmate-job")
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs = []
+        self._env_queues = {}  # env key -> deque of mutating jobs waiting for that environment
+        self._busy_envs = set()  # env keys with a mutating job currently running
+
+    def submit(self, name, func, env_key=None, mutating=False):
+        """
+        Queues func(job) and returns the Job.
+
+        Mutating jobs with the same env_key never overlap and run in submission order.
+        """
+        with self._lock:
+            job = Job(next(self._ids), name, func, env_key, mutating)
+            self._jobs.append(job)
+            self._trim_finished()
+
+            if not mutating:
+                self._executor.submit(self._run, job)
+            elif env_key in self._busy_envs:
+                self._env_queues.setdefault(env_key, deque()).append(job)
+            else:
+                self._busy_envs.add(env_key)
+                self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        """Runs a job on a worker thread and starts the next job waiting for its environment."""
+        try:
+            if job.cancelled:
+                job.status = CANCELLED
+                return
+
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = job.func(job)
+                job.status = CANCELLED if job.cancelled else DONE
+            except Exception as e:  # Keep the worker alive whatever the job raises
+                job.error = e
+                job.status = CANCELLED if job.cancelled else FAILED
+        finally:
+            job.finished_at = time.time()
+            if job.mutating:
+                self._start_next(job.env_key)
+
+    def _start_next(self, env_key):
+        """Hands the next queued mutating job of the environment to the pool."""
+        with self._lock:
+            waiting = self._env_queues.get(env_key)
+            while waiting:
+                job = waiting.popleft()
+                if job.cancelled:
+                    job.status = CANCELLED
+                    job.finished_at = time.time()
+                    continue
+                self._executor.submit(self._run, job)
+                return
+            self._env_queues.pop(env_key, None)
+            self._busy_envs.discard(env_key)
+
+    def cancel(self, job_id):
+        """
+        Requests cancellation of a job.
+
+        Queued jobs are dropped before they start; running jobs get their cancel_event set.
+        Returns False if the job does not exist or has already finished.
+        """
+        with self._lock:
+            for job in self._jobs:
+                if job.id == job_id and not job.finished:
+                    job.cancel_event.set()
+                    return True
+        return False
+
+    def jobs(self):
+        """Returns a snapshot of the known jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs)
+
+    def is_busy(self, env_key):
+        """Whether a mutating job is currently running or waiting for the environment."""
+        with self._lock:
+            return env_key in self._busy_envs
+
+    def _trim_finished(self):
+        """Forgets the oldest finished jobs once more than MAX_FINISHED_JOBS are kept."""
+        finished = [job for job in self._jobs if job.finished]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            self._jobs.remove(job)
+
+    def shutdown(self, cancel_running=True):
+        """Stops accepting jobs, optionally cancelling everything queued or running."""
+        if cancel_running:
+            for job in self.jobs():
+                job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,326 @@
+"""
+Pre-change snapshots of the distributions an operation may touch, for fast rollback.
+
+Before a mutating operation, the files of the affected distributions (the named packages and
+their installed dependency closure; for uninstalls only the named packages) are hardlinked
+into a snapshot directory, falling back to copies across filesystems. pip never writes into an installed file (it unlinks or renames it
+first), so the links keep the old content. The snapshot also records every dist-info present,
+so a rollback removes distributions installed afterwards and links the saved files back,
+which takes a fraction of the time of a reinstall.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import time
+from collections import namedtuple
+
+import depgraph
+import inventory
+import tracing
+from paths import user_cache_dir
+from specs import marker_applies, parse_requirement, requirement_key
+
+
+SNAPSHOTS_DIR_NAME = ".pipmate-snapshots"
+DEFAULT_SNAPSHOT_KEEP = 5
+
+
+def _snapshot_keep():
+    """Returns PIPMATE_SNAPSHOT_KEEP, or DEFAULT_SNAPSHOT_KEEP if it isn't a positive whole number."""
+    try:
+        keep = int(os.environ.get("PIPMATE_SNAPSHOT_KEEP", DEFAULT_SNAPSHOT_KEEP))
+    except ValueError:
+        return DEFAULT_SNAPSHOT_KEEP
+    return keep if keep > 0 else DEFAULT_SNAPSHOT_KEEP
+
+
+MAX_SNAPSHOTS = _snapshot_keep()  # Kept per environment, newest first
+# Set PIPMATE_SNAPSHOTS=0 to change environments without taking snapshots
+enabled = os.environ.get("PIPMATE_SNAPSHOTS", "1") not in ("", "0")
+
+# A stored snapshot as listed for the user
+Snapshot = namedtuple("Snapshot", ["id", "label", "created", "packages", "path"])
+
+
+def snapshots_dir(env_path=None):
+    """
+    Returns the directory holding the snapshots of an environment.
+
+    Virtual environments keep them inside the environment, which puts them on the same
+    filesystem so the files can be hardlinked; the global environment uses the cache directory.
+    """
+    if env_path:
+        return os.path.join(os.path.realpath(env_path), SNAPSHOTS_DIR_NAME)
+    return os.path.join(user_cache_dir(), "snapshots", "global")
+
+
+def _new_id():
+    """Returns a snapshot id that sorts by creation time, e.g. '20240131-174502-123456789'."""
+    now = time.time_ns()
+    return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now // 10 ** 9))}-{now % 10 ** 9:09d}"
+
+
+def _record_files(distribution):
+    """Returns the absolute paths of the files a distribution's RECORD lists."""
+    return [os.path.normpath(os.path.join(distribution.location, path))
+            for path, _ in inventory.read_record(distribution)]
+
+
+def _cached_requires_dist(project_name):
+    """
+    Returns the requirements of a project's latest release as far as the PyPI metadata cache
+    knows them, or None. The network is never used: snapshots are taken before every change
+    and must stay cheap.
+    """
+    import pypi
+    import pypi_cache
+
+    try:
+        entry = pypi_cache.get(pypi.PYPI_URL, pypi_cache.cache_key(project_name))
+    except sqlite3.Error:
+        return None  # A locked or broken cache only makes the snapshot smaller
+    if entry is None:
+        return None
+    return (entry["data"].get("info") or {}).get("requires_dist") or []
+
+
+def affected_distributions(env_path, specs, with_dependencies=True):
+    """
+    Returns the normalized names of the installed distributions an operation on specs may change.
+
+    That is every named package that is installed plus its installed dependency closure. For
+    packages that aren't installed yet, the dependencies of their latest release are followed
+    instead if the PyPI metadata cache has it, since installing them may upgrade those. Specs
+    that aren't requirements (paths, URLs) contribute nothing.
+
+    With with_dependencies=False (uninstalls, which never touch dependencies) only the named
+    packages that are installed are returned.
+    """
+    return _affected(depgraph.get_graph(env_path), specs, with_dependencies)
+
+
+def _affected(graph, specs, with_dependencies):
+    """Implements affected_distributions() on a dependency graph."""
+    installed = graph.distributions
+    affected = set()
+
+    def add_with_dependencies(key):
+        """Adds an installed distribution and everything it depends on."""
+        affected.add(key)
+        affected.update(dependency for dependency in graph.dependencies(key, recursive=True)
+                        if dependency in installed)
+
+    for spec in specs:
+        requirement = parse_requirement(spec)
+        if requirement is None:
+            continue
+        key = requirement_key(requirement)
+        if key in installed:
+            if with_dependencies:
+                add_with_dependencies(key)
+            else:
+                affected.add(key)
+            continue
+        if not with_dependencies:
+            continue
+
+        for requires in _cached_requires_dist(requirement.name) or []:
+            dependency = parse_requirement(requires)
+            if dependency is not None and marker_applies(dependency, requirement.extras, graph.environment):
+                dependency_key = requirement_key(dependency)
+                if dependency_key in installed:
+                    add_with_dependencies(dependency_key)
+    return affected
+
+
+def _stash(source, target, can_link):
+    """Links source to target, or copies it when linking isn't possible. Returns can_link."""
+    if can_link:
+        try:
+            os.link(source, target)
+            return True
+        except OSError:
+            pass  # Different filesystem or no hardlink support
+    shutil.copy2(source, target)
+    return False
+
+
+def take(env_path, specs, label, with_dependencies=True):
+    """
+    Snapshots the distributions an operation on specs may change. Returns the snapshot id.
+
+    with_dependencies=False saves only the named packages, for operations that can't change
+    anything else (see affected_distributions()). Returns None when snapshots are disabled.
+    Old snapshots beyond MAX_SNAPSHOTS are removed.
+    """
+    if not enabled:
+        return None
+
+    with tracing.span("snapshot", category="io", label=label) as span:
+        # The affected names and the saved distributions come from the same inventory read
+        graph = depgraph.get_graph(env_path)
+        installed = graph.distributions
+        affected = _affected(graph, specs, with_dependencies)
+
+        snapshot_id = _new_id()
+        path = os.path.join(snapshots_dir(env_path), snapshot_id)
+        files_dir = os.path.join(path, "files")
+        os.makedirs(files_dir)
+
+        can_link = True
+        saved = []
+        file_count = 0
+        for key in sorted(affected):
+            distribution = installed[key]
+            files = []
+            for original in _record_files(distribution):
+                if not os.path.isfile(original):
+                    continue  # Listed but never written (or already gone), e.g. bytecode
+                stashed = str(file_count)
+                can_link = _stash(original, os.path.join(files_dir, stashed), can_link)
+                files.append([original, stashed])
+                file_count += 1
+            saved.append({"name": distribution.name, "version": distribution.version,
+                          "metadata_path": distribution.metadata_path, "files": files})
+
+        manifest = {
+            "id": snapshot_id,
+            "label": label,
+            "created": time.time(),
+            "env_path": os.path.realpath(env_path) if env_path else None,
+            # Every distribution present, so a rollback knows which ones are new
+            "present": {dist.metadata_path: [dist.name, dist.version] for dist in installed.values()},
+            "saved": saved,
+        }
+        with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+        span.set(distributions=len(saved), files=file_count, linked=can_link)
+
+    _prune(env_path)
+    return snapshot_id
+
+
+def _read_manifest(path):
+    """Reads the manifest of a snapshot directory, or returns None if it is incomplete."""
+    try:
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+
+def list_snapshots(env_path=None):
+    """Returns the snapshots of an environment, newest first."""
+    directory = snapshots_dir(env_path)
+    try:
+        names = sorted(os.listdir(directory), reverse=True)
+    except OSError:
+        return []
+    snapshots = []
+    for name in names:
+        manifest = _read_manifest(os.path.join(directory, name))
+        if manifest is None:
+            continue
+        packages = [f"{saved['name']} {saved['version']}" for saved in manifest["saved"]]
+        snapshots.append(Snapshot(manifest["id"], manifest["label"], manifest["created"], packages,
+                                  os.path.join(directory, name)))
+    return snapshots
+
+
+def delete(env_path, snapshot_id):
+    """Removes a snapshot."""
+    shutil.rmtree(os.path.join(snapshots_dir(env_path), snapshot_id), ignore_errors=True)
+
+
+def _prune(env_path):
+    """Removes the oldest snapshots beyond MAX_SNAPSHOTS, and leftovers of interrupted ones."""
+    directory = snapshots_dir(env_path)
+    complete = {snapshot.id for snapshot in list_snapshots(env_path)[:MAX_SNAPSHOTS]}
+    for name in os.listdir(directory):
+        if name not in complete:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def _remove_files(paths, stop_dirs):
+    """Deletes files, then the directories they leave empty (never one of stop_dirs)."""
+    directories = set()
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        directories.add(os.path.dirname(path))
+    # Deepest first, so parents become empty before they are tried
+    for directory in sorted(directories, key=len, reverse=True):
+        while directory not in stop_dirs and os.path.basename(directory):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break  # Not empty (or gone)
+            directory = os.path.dirname(directory)
+
+
+def rollback(env_path, snapshot_id, on_line=None):
+    """
+    Restores the distributions saved in a snapshot.
+
+    Distributions installed after the snapshot are removed, the saved ones are put back in
+    place of whatever version is installed now, and packages that were removed since but
+    weren't saved are reported through on_line. Returns (restored names, removed names).
+    Raises ValueError if the snapshot doesn't exist.
+    """
+    path = os.path.join(snapshots_dir(env_path), snapshot_id)
+    manifest = _read_manifest(path)
+    if manifest is None:
+        raise ValueError(f"No snapshot {snapshot_id} for this environment")
+    report = on_line or (lambda line: None)
+
+    with tracing.span("rollback", category="io", snapshot=snapshot_id) as span:
+        installed = inventory.get_inventory(env_path)
+        stop_dirs = set(inventory.site_packages_dirs(env_path))
+        if env_path:
+            stop_dirs.add(os.path.realpath(env_path))
+        saved_paths = {saved["metadata_path"] for saved in manifest["saved"]}
+        saved_keys = {inventory.normalize_name(saved["name"]) for saved in manifest["saved"]}
+
+        # Remove what was installed since, and the current files of every saved distribution
+        removed = []
+        for key, distribution in sorted(installed.items()):
+            if distribution.metadata_path in manifest["present"] and distribution.metadata_path not in saved_paths:
+                continue  # Untouched since the snapshot
+            if distribution.metadata_path not in manifest["present"] or key in saved_keys:
+                files = _record_files(distribution)
+                if not files:
+                    report(f"Can't remove {distribution.name} {distribution.version}: it has no RECORD file.\n")
+                    continue
+                _remove_files(files, stop_dirs)
+                shutil.rmtree(distribution.metadata_path, ignore_errors=True)
+                if key not in saved_keys:
+                    removed.append(distribution.name)
+                    report(f"Removed {distribution.name} {distribution.version}\n")
+
+        files_dir = os.path.join(path, "files")
+        can_link = True
+        restored = []
+        for saved in manifest["saved"]:
+            for original, stashed in saved["files"]:
+                os.makedirs(os.path.dirname(original), exist_ok=True)
+                try:
+                    os.remove(original)
+                except FileNotFoundError:
+                    pass
+                # Linking again keeps the snapshot usable for another rollback
+                can_link = _stash(os.path.join(files_dir, stashed), original, can_link)
+            restored.append(saved["name"])
+            report(f"Restored {saved['name']} {saved['version']}\n")
+
+        # Distributions changed by the operation that the snapshot didn't anticipate
+        current = {dist.metadata_path for dist in installed.values()}
+        for metadata_path, (name, version) in sorted(manifest["present"].items()):
+            if metadata_path not in current and metadata_path not in saved_paths:
+                report(f"Not restored: {name} {version} was changed but not saved in the snapshot.\n")
+
+        inventory.invalidate_inventory(env_path)
+        span.set(restored=len(restored), removed=len(removed))
+    return restored, removed
@@ -0,0 +1,84 @@
+"""
+Helpers for parsing requirement specifiers and comparing versions.
+
+Uses the `packaging` library when it is installed and falls back to the copy vendored inside pip.
+"""
+try:
+    from packaging.markers import default_environment
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.specifiers import InvalidSpecifier, SpecifierSet
+    from packaging.version import InvalidVersion, Version
+except ImportError:
+    # pip always ships a vendored copy of packaging, so this works in any environment with pip
+    from pip._vendor.packaging.markers import default_environment
+    from pip._vendor.packaging.requirements import InvalidRequirement, Requirement
+    from pip._vendor.packaging.specifiers import InvalidSpecifier, SpecifierSet
+    from pip._vendor.packaging.version import InvalidVersion, Version
+
+from inventory import normalize_name
+
+
+def parse_requirement(spec):
+    """
+    Parses a single requirement specifier such as 'requests>=2.31'.
+
+    Returns a Requirement object, or None if the specifier is not valid.
+    """
+    try:
+        return Requirement(spec.strip())
+    except InvalidRequirement:
+        return None
+
+
+def parse_version(version):
+    """Parses a version string, returning None if it is not a valid PEP 440 version."""
+    try:
+        return Version(version)
+    except (InvalidVersion, TypeError):
+        return None
+
+
+def parse_specifier(specifier):
+    """Parses a specifier set such as '<2.31,>=2.0', returning None if it is not valid."""
+    try:
+        return SpecifierSet(specifier)
+    except InvalidSpecifier:
+        return None
+
+
+def version_satisfies(version, specifier):
+    """
+    Checks whether the given version string satisfies a specifier set.
+
+    Pre-releases are accepted when they are explicitly installed, since they are already present.
+    Versions that cannot be parsed never satisfy a non-empty specifier.
+    """
+    if not str(specifier):
+        return True
+    parsed = parse_version(version)
+    if parsed is None:
+        return False
+    return specifier.contains(parsed, prereleases=True)
+
+
+def marker_applies(requirement, extras=(), environment=None):
+    """
+    Evaluates the environment marker of a requirement.
+
+    environment is the marker environment of the target interpreter (see
+    inventory.marker_environment()); by default the running interpreter's is used.
+    Requirements guarded by an extra only apply when that extra is requested.
+    """
+    if requirement.marker is None:
+        return True
+    environment = dict(environment or default_environment())
+    for extra in extras or ("",):
+        environment["extra"] = extra
+        if requirement.marker.evaluate(environment):
+            return True
+    return False
+
+
+def requirement_key(requirement):
+    """Returns the normalized project name of a Requirement."""
+    return normalize_name(requirement.name)
@@ -0,0 +1,78 @@
+"""
+Shared fixtures of the PIP-MATE test suite.
+
+The modules live at the top of the repository, so it is put on sys.path; every test gets its
+own cache and settings directories, so nothing touches the user's.
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import inventory  # noqa: E402
+import pypi_cache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_dirs(tmp_path, monkeypatch):
+    """
+    Points PIPMATE_CACHE_DIR and PIPMATE_CONFIG_DIR at temporary directories, and makes the
+    PyPI metadata cache open its database there.
+    """
+    monkeypatch.setenv("PIPMATE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("PIPMATE_CONFIG_DIR", str(tmp_path / "config"))
+    monkeypatch.setattr(pypi_cache, "_connection", None)
+    yield
+    if pypi_cache._connection is not None:
+        pypi_cache._connection.close()
+
+
+class FakeEnvironment:
+    """A directory laid out like a virtual environment whose packages are bare dist-info directories."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.site_packages = path / "lib" / f"python{sys.version_info.major}.{sys.version_info.minor}" / "site-packages"
+        self.site_packages.mkdir(parents=True)
+
+    def add(self, name, version, requires=(), files=None):
+        """
+        Adds an installed distribution declaring the given Requires-Dist specs.
+
+        files maps paths relative to site-packages to their text; they are written and listed
+        in RECORD like pip does. Returns the dist-info directory.
+        """
+        dist_info = self.site_packages / f"{name.replace('-', '_')}-{version}.dist-info"
+        dist_info.mkdir()
+        headers = [f"Name: {name}", f"Version: {version}"] + [f"Requires-Dist: {spec}" for spec in requires]
+        (dist_info / "METADATA").write_text("\n".join(headers) + "\n\n", encoding="utf-8")
+        record = [f"{dist_info.name}/METADATA,,"]
+        for relative_path, text in (files or {}).items():
+            path = self.site_packages / relative_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding="utf-8")
+            record.append(f"{relative_path},,{path.stat().st_size}")
+        record.append(f"{dist_info.name}/RECORD,,")
+        (dist_info / "RECORD").write_text("\n".join(record) + "\n", encoding="utf-8")
+        inventory.invalidate_inventory(self.path)
+        return dist_info
+
+    def remove(self, name):
+        """Deletes the files and the dist-info directory of a distribution, like `pip uninstall`."""
+        distribution = inventory.get_distribution(self.path, name)
+        for relative_path, _ in inventory.read_record(distribution):
+            path = os.path.join(distribution.location, relative_path)
+            if os.path.isfile(path):
+                os.remove(path)
+        shutil.rmtree(distribution.metadata_path, ignore_errors=True)
+        inventory.invalidate_inventory(self.path)
+
+
+@pytest.fixture
+def fake_env(tmp_path):
+    """An empty FakeEnvironment; its inventory is read like that of a real environment."""
+    return FakeEnvironment(tmp_path / "env")
@@ -0,0 +1,196 @@
+"""
+Tests of advisory interval matching and of license expression handling.
+"""
+import json
+import zipfile
+import zlib
+
+import pytest
+
+import audit
+
+
+ADVISORY = {
+    "id": "PYSEC-0000-1",
+    "aliases": ["CVE-0000-1"],
+    "summary": "Example vulnerability",
+    "affected": [{
+        "package": {"ecosystem": "PyPI", "name": "Demo_Pkg"},
+        "ranges": [{"type": "ECOSYSTEM", "events": [
+            {"introduced": "1.0"}, {"fixed": "1.4.2"},
+            {"introduced": "2.0"}, {"last_affected": "2.1"},
+            {"introduced": "3.0rc1"},
+        ]}],
+    }],
+}
+
+
+@pytest.fixture
+def database(tmp_path):
+    """An advisory database imported from a single OSV advisory."""
+    source = tmp_path / "advisory.json"
+    source.write_text(json.dumps(ADVISORY), encoding="utf-8")
+    audit.import_database(str(source))
+    return audit.load_database()
+
+
+@pytest.mark.parametrize("version, fixed_in", [
+    ("1.0", "1.4.2"), ("1.4.1", "1.4.2"), ("2.0.0", None), ("2.1", None), ("3.0rc1", None), ("4.2", None),
+])
+def test_affected_versions(database, version, fixed_in):
+    [vulnerability] = database.check("demo-pkg", version)
+    assert (vulnerability.id, vulnerability.fixed_in) == ("PYSEC-0000-1", fixed_in)
+
+
+@pytest.mark.parametrize("version", ["0.9", "1.4.2", "1.9", "2.1.1", "3.0b1", "not-a-version"])
+def test_unaffected_versions(database, version):
+    assert database.check("demo-pkg", version) == []
+
+
+def test_intervals_follow_version_order():
+    events = [{"fixed": "1.5"}, {"introduced": "0"}, {"introduced": "2.0"}]
+    assert audit._intervals(events) == [["0", "1.5", None], ["2.0", None, None]]
+
+
+@pytest.mark.parametrize("expression, alternatives", [
+    ("MIT", [{"MIT"}]),
+    ("MIT OR Apache-2.0", [{"MIT"}, {"Apache-2.0"}]),
+    ("MIT OR (Apache-2.0 AND BSD-3-Clause)", [{"MIT"}, {"Apache-2.0", "BSD-3-Clause"}]),
+    ("(MIT OR ISC) AND Zlib", [{"MIT", "Zlib"}, {"ISC", "Zlib"}]),
+    ("GPL-2.0-only WITH Classpath-exception-2.0 OR MIT", [{"GPL-2.0-only"}, {"MIT"}]),
+    ("mit or apache-2.0", [{"mit"}, {"apache-2.0"}]),
+])
+def test_parse_spdx(expression, alternatives):
+    assert audit._parse_spdx(expression) == alternatives
+
+
+@pytest.mark.parametrize("expression", ["", "MIT OR", "(MIT", "MIT)", "MIT Apache-2.0", "MIT WITH",
+                                        "MIT WITH OR Apache-2.0", "AND MIT"])
+def test_parse_spdx_rejects_malformed_expressions(expression):
+    with pytest.raises(ValueError):
+        audit._parse_spdx(expression)
+
+
+@pytest.mark.parametrize("headers, status", [
+    ({"license-expression": ["MIT OR GPL-3.0-only"]}, audit.LICENSE_OK),
+    ({"license-expression": ["MIT AND GPL-3.0-or-later"]}, audit.LICENSE_DISALLOWED),
+    ({"classifier": ["License :: OSI Approved :: GNU General Public License v3 (GPLv3)"]}, audit.LICENSE_DISALLOWED),
+    ({"license": ["GPL v3"]}, audit.LICENSE_DISALLOWED),
+    ({"license": ["GNU GPL version 2 or later"]}, audit.LICENSE_UNKNOWN),
+    ({"license": ["LGPL v2.1 or later"]}, audit.LICENSE_OK),
+    ({"license": ["GPLv3+"]}, audit.LICENSE_DISALLOWED),
+    ({"license": ["MIT License"]}, audit.LICENSE_OK),
+    ({"license": ["Dual licensed"]}, audit.LICENSE_UNKNOWN),
+    ({"license": ["UNKNOWN"]}, audit.LICENSE_UNKNOWN),
+])
+def test_check_license(headers, status):
+    assert audit.check_license(headers, ["GPL"])[1] == status
+
+
+@pytest.fixture(autouse=True)
+def fresh_database(monkeypatch):
+    """Forgets the database loaded by earlier tests."""
+    monkeypatch.setattr(audit, "_database", None)
+
+
+def advisory(advisory_id, ranges=(), versions=(), ecosystem="PyPI", **fields):
+    """An OSV advisory affecting the demo project."""
+    return dict({"id": advisory_id, "affected": [{
+        "package": {"ecosystem": ecosystem, "name": "demo"},
+        "ranges": list(ranges),
+        "versions": list(versions),
+    }]}, **fields)
+
+
+def test_compact_advisory_skips_what_pip_cant_install():
+    assert audit.compact_advisory(advisory("A", withdrawn="2024-01-01T00:00:00Z")) == {}
+    assert audit.compact_advisory(advisory("A", ecosystem="npm")) == {}
+    git_only = advisory("A", [{"type": "GIT", "events": [{"introduced": "abc"}, {"fixed": "def"}]}], ["1.0"])
+    assert audit.compact_advisory(git_only)["demo"]["versions"] == ["1.0"]  # No usable ranges, so versions count
+
+    ranged = advisory("A", [{"type": "ECOSYSTEM", "events": [{"introduced": "0"}, {"fixed": "2.0"}]}],
+                      ["1.0", "1.5"], details="First line\nSecond line", severity=[{"score": "CVSS:3.1/AV:N"}])
+    entry = audit.compact_advisory(ranged)["demo"]
+    assert entry["ranges"] == [["0", "2.0", None]] and entry["versions"] == []
+    assert entry["summary"] == "First line" and entry["severity"] == "CVSS:3.1/AV:N"
+    ranged["database_specific"] = {"severity": "HIGH"}
+    assert audit.compact_advisory(ranged)["demo"]["severity"] == "HIGH"
+
+
+def test_intervals_with_unusual_events():
+    # Unparseable versions keep the export order; limit and unmatched fixed events are ignored
+    events = [{"fixed": "0.5"}, {"introduced": "weird"}, {"limit": "9"}, {"introduced": "1.0"}, {"fixed": "2.0"}]
+    assert audit._intervals(events) == [["weird", "2.0", None]]
+    assert audit._intervals([]) == []
+
+
+def test_database_lookups_and_unparseable_bounds(tmp_path):
+    ranges = [{"type": "ECOSYSTEM", "events": [{"introduced": "1.0"}, {"fixed": "2.0"}]},
+              {"type": "ECOSYSTEM", "events": [{"introduced": "3.0"}, {"fixed": "3.1"}]}]
+    source = tmp_path / "advisories.json"
+    source.write_text(json.dumps([advisory("A", ranges), advisory("B", versions=["legacy-1"])]))
+    header = audit.import_database(str(source))
+    assert (header["advisories"], header["projects"]) == (2, 1)
+    database = audit.load_database()
+    assert [(found.id, found.fixed_in) for found in database.check("Demo", "1.5")] == [("A", "2.0")]
+    assert [found.id for found in database.check("demo", "legacy-1")] == ["B"]  # Listed explicitly
+    assert database.check("demo", "2.5") == [] and database.check("other", "1.5") == []
+    assert not audit._in_interval(audit._version("1.5"), ["not a version", None, None])
+    assert audit._in_interval(audit._version("1.5"), ["1.0", "not a version", None])
+
+
+def test_import_from_a_zip_or_directory(tmp_path):
+    directory = tmp_path / "export"
+    (directory / "nested").mkdir(parents=True)
+    (directory / "nested" / "A.json").write_text(json.dumps(ADVISORY))
+    (directory / "README.txt").write_text("not an advisory")
+    assert audit.import_database(str(directory))["advisories"] == 1
+
+    archive_path = tmp_path / "export.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("A.json", json.dumps(ADVISORY))
+        archive.writestr("B.json", json.dumps(advisory("B", versions=["1.0"])))
+    assert audit.import_database(str(archive_path))["projects"] == 2
+
+
+def test_import_and_load_errors(tmp_path):
+    with pytest.raises(OSError):
+        audit.import_database(str(tmp_path / "missing.json"))
+    (tmp_path / "broken.json").write_text("{")
+    with pytest.raises(ValueError):
+        audit.import_database(str(tmp_path / "broken.json"))
+    assert audit.load_database() is None  # A failed import leaves no database behind
+
+    with open(audit.database_path(), "wb") as database_file:
+        database_file.write(b'{"format": 1}\nnot zlib data')
+    assert audit.load_database() is None
+    with open(audit.database_path(), "wb") as database_file:
+        database_file.write(b'{"format": 999}\n' + zlib.compress(b"{}"))
+    assert audit.load_database() is None
+
+
+def test_malformed_license_expressions_fall_back_to_classifiers():
+    headers = {"license-expression": ["MIT WITH"], "classifier": ["License :: OSI Approved :: MIT License"]}
+    assert audit.check_license(headers, ["GPL"]) == ("MIT", audit.LICENSE_OK)
+    assert audit.check_license({"license-expression": ["(MIT"]}, ["GPL"]) == ("", audit.LICENSE_UNKNOWN)
+    assert audit.check_license({}, []) == ("", audit.LICENSE_UNKNOWN)
+
+
+def test_audit_an_environment(fake_env, database):
+    fake_env.add("demo-pkg", "1.2")
+    dist_info = fake_env.add("copyleft", "1.0")
+    (dist_info / "METADATA").write_text("Name: copyleft\nVersion: 1.0\nLicense-Expression: GPL-3.0-only\n\n")
+    fake_env.add("bare", "0.1")
+
+    report = audit.audit(fake_env.path, ["GPL"])
+    assert report.packages == 3
+    assert [(found.name, found.fixed_in) for found in report.vulnerabilities] == [("demo-pkg", "1.4.2")]
+    assert {check.name: check.status for check in report.licenses} == {
+        "bare": audit.LICENSE_UNKNOWN, "copyleft": audit.LICENSE_DISALLOWED, "demo-pkg": audit.LICENSE_UNKNOWN}
+    assert report.database["advisories"] == 1
+
+
+def test_audit_without_a_database(fake_env):
+    fake_env.add("demo-pkg", "1.2")
+    report = audit.audit(fake_env.path, [])
+    assert report.vulnerabilities == [] and report.database is None
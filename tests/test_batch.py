@@ -0,0 +1,62 @@
+"""
+Tests of batch spec parsing and of the pre-filtering against the installed inventory.
+"""
+import batch
+import inventory
+
+
+def test_parse_specs():
+    text = (
+        "# Web stack\n"
+        "requests>=2.31  # HTTP\n"
+        "\n"
+        "-r base.txt\n"
+        "--index-url https://example.org/simple\n"
+        "numpy pandas, scipy\n"
+        'importlib-metadata; python_version < "3.10"\n'
+    )
+    assert batch.parse_specs(text) == [
+        "requests>=2.31", "numpy", "pandas", "scipy", 'importlib-metadata; python_version < "3.10"']
+
+
+def test_parse_specs_joins_continuations_and_drops_options():
+    text = (
+        "requests==2.31.0 \\\n"
+        "    --hash=sha256:aaa \\\n"
+        "    --hash=sha256:bbb\n"
+        "idna==3.4 --hash=sha256:ccc\n"
+        "urllib3[socks]\\\n"
+        "==2.0.7\n"
+    )
+    assert batch.parse_specs(text) == ["requests==2.31.0", "idna==3.4", "urllib3[socks] ==2.0.7"]
+
+
+def test_filter_specs_install(fake_env):
+    fake_env.add("requests", "2.31.0")
+    fake_env.add("idna", "3.4")
+    installed = inventory.get_inventory(fake_env.path)
+    pending, skipped = batch.filter_specs(
+        batch.INSTALL, ["Requests>=2", "idna>=3.5", "requests", "urllib3", "./local-dir"], installed)
+    assert pending == ["idna>=3.5", "urllib3", "./local-dir"]
+    assert skipped == [("Requests>=2", batch.STATUS_SATISFIED, "2.31.0"),
+                       ("requests", batch.STATUS_SKIPPED, "duplicate entry")]
+
+
+def test_filter_specs_keeps_extras(fake_env):
+    fake_env.add("requests", "2.31.0")
+    installed = inventory.get_inventory(fake_env.path)
+    for operation in (batch.INSTALL, batch.UPGRADE):
+        pending, skipped = batch.filter_specs(operation, ["requests[socks]==2.31.0"], installed)
+        assert (pending, skipped) == (["requests[socks]==2.31.0"], [])
+
+
+def test_filter_specs_upgrade_and_uninstall(fake_env):
+    fake_env.add("requests", "2.31.0")
+    installed = inventory.get_inventory(fake_env.path)
+    pending, skipped = batch.filter_specs(batch.UPGRADE, ["requests==2.31", "requests-toolbelt"], installed)
+    assert pending == ["requests-toolbelt"]
+    assert skipped == [("requests==2.31", batch.STATUS_SATISFIED, "2.31.0")]
+
+    pending, skipped = batch.filter_specs(batch.UNINSTALL, ["requests>=2", "idna"], installed)
+    assert pending == ["requests"]
+    assert skipped == [("idna", batch.STATUS_SKIPPED, "not installed")]
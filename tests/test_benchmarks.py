@@ -0,0 +1,121 @@
+"""
+Tests of the benchmark harness: the stub index, the statistics and the baseline comparison.
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from conftest import REPO_DIR
+
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+
+import pypi  # noqa: E402
+import run as benchmark_run  # noqa: E402
+from stub_index import StubIndex, build_wheel, project_name  # noqa: E402
+
+
+def record_hash(content):
+    """Returns the RECORD style hash of file content."""
+    return "sha256=" + base64.urlsafe_b64encode(hashlib.sha256(content).digest()).rstrip(b"=").decode("ascii")
+
+
+def test_build_wheel_has_a_consistent_record():
+    filename, data = build_wheel("demo-pkg", "2.0", payload_size=64, requires=["idna>=3"])
+    assert filename == "demo_pkg-2.0-py3-none-any.whl"
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        metadata = archive.read("demo_pkg-2.0.dist-info/METADATA").decode("utf-8")
+        assert "Name: demo-pkg\nVersion: 2.0\n" in metadata and "Requires-Dist: idna>=3\n" in metadata
+        for line in archive.read("demo_pkg-2.0.dist-info/RECORD").decode("utf-8").splitlines():
+            path, digest, size = line.split(",")
+            if path.endswith("RECORD"):
+                assert digest == size == ""
+                continue
+            content = archive.read(path)
+            assert int(size) == len(content)
+            assert digest == record_hash(content)
+
+
+def test_stub_index_routes():
+    with StubIndex(2, payload_size=16) as index:
+        name = project_name(1)
+        filename, data, sha256 = index.projects[name]
+
+        status, content_type, body = index.respond("/simple/")
+        assert status == 200 and f'href="/simple/{name}/"'.encode() in body
+        status, _, body = index.respond(f"/simple/{name}/?format=html")
+        assert status == 200 and f"#sha256={sha256}".encode() in body
+        assert index.respond(f"/files/{filename}") == (200, "application/octet-stream", data)
+        status, _, body = index.respond(f"/pypi/{name}/1.0.0/json")
+        document = json.loads(body)
+        assert document["releases"]["1.0.0"][0]["url"] == f"{index.base_url}/files/{filename}"
+
+        for path in ("/simple/unknown/", "/files/unknown.whl", "/pypi/unknown/json", "/pypi/", "/other"):
+            assert index.respond(path)[0] == 404
+        assert index.request_count == 9
+
+
+def test_stub_index_serves_the_pypi_client(monkeypatch):
+    monkeypatch.setattr(pypi, "_session", None)
+    monkeypatch.setattr(pypi, "offline", False)
+    with StubIndex(3, payload_size=16) as index:
+        results = {name: error for name, _, error in pypi.fetch_many(
+            [project_name(0), project_name(2), "missing"], base_url=index.json_url, use_cache=False)}
+    pypi._session.close()
+    assert results[project_name(0)] is None and results[project_name(2)] is None
+    assert results["missing"].response.status_code == 404
+
+
+def test_measure_excludes_warmup_and_setup():
+    calls = []
+    result = benchmark_run.measure(lambda state: calls.append(("run", state)), repeat=3, warmup=2,
+                                   setup=lambda iteration: iteration, items=10)
+    assert calls == [("run", iteration) for iteration in range(5)]
+    assert result["samples"] == 3 and result["items"] == 10
+
+    single = benchmark_run.describe([0.5], items=5)
+    assert single["stdev"] == 0.0 and single["p95"] == 0.5 and single["throughput"] == 10.0
+    assert benchmark_run.describe([0.0, 0.0], items=1)["throughput"] == 0.0
+
+
+def test_compare_with_baseline():
+    results = {name: {"p50": p50} for name, p50 in
+               (("slower", 1.5), ("faster", 0.5), ("same", 1.1), ("new", 1.0), ("was_zero", 1.0))}
+    baseline = {"results": {name: {"p50": p50} for name, p50 in
+                            (("slower", 1.0), ("faster", 1.0), ("same", 1.0), ("was_zero", 0.0))}}
+    rows, regressed = benchmark_run.compare(results, baseline, 0.2)
+    verdicts = {name: verdict for name, _, _, _, verdict in rows}
+    assert verdicts == {"slower": "REGRESSION", "faster": "faster", "same": "unchanged", "new": "new",
+                        "was_zero": "REGRESSION"}
+    assert regressed
+    assert benchmark_run.compare({"same": {"p50": 1.0}}, {}, 0.2) == ([("same", None, 1.0, None, "new")], False)
+
+
+def test_harness_fails_on_a_regression(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"packages": 2, "results": {"info_warm": {"p50": 1e-9}}}))
+    output = tmp_path / "results.json"
+    completed = subprocess.run(
+        [sys.executable, os.path.join(REPO_DIR, "benchmarks", "run.py"), "--packages", "2", "--repeat", "2",
+         "--warmup", "0", "--only", "info_cold", "--only", "info_warm", "--compare", str(baseline),
+         "--fail-on-regression", "--output", str(output)],
+        capture_output=True, text=True, timeout=300,
+    )
+    assert completed.returncode == 1, completed.stderr
+    assert "REGRESSION" in completed.stdout
+    report = json.loads(output.read_text())
+    assert sorted(report["results"]) == ["info_cold", "info_warm"]
+    assert report["results"]["info_warm"]["samples"] == 2
+
+
+@pytest.mark.parametrize("argv", [["--only", "nothing"], ["--repeat", "many"]])
+def test_harness_rejects_bad_arguments(argv):
+    with pytest.raises(SystemExit) as info:
+        benchmark_run.main(argv)
+    assert info.value.code == 2
@@ -0,0 +1,76 @@
+"""
+Tests of the headless CLI and the core API behind it, against a fake environment.
+"""
+import json
+import os
+
+import pytest
+
+import cli
+import core
+
+
+@pytest.fixture
+def venv(fake_env):
+    """A fake environment that passes core.is_valid_virtualenv() but has no pip."""
+    scripts = os.path.join(fake_env.path, "Scripts" if os.name == 'nt' else "bin")
+    os.makedirs(scripts, exist_ok=True)
+    open(os.path.join(scripts, "activate"), "w").close()
+    return fake_env
+
+
+def test_install_of_satisfied_specs_does_not_run_pip(venv, capsys):
+    venv.add("requests", "2.31.0")
+    assert cli.main(["--json", "--env", venv.path, "install", "requests>=2"]) == 0
+    outcome = json.loads(capsys.readouterr().out)
+    assert outcome["ok"]
+    assert outcome["results"] == [{"name": "requests>=2", "status": "already satisfied", "detail": "2.31.0"}]
+
+
+def test_uninstall_of_missing_packages_is_skipped(venv, capsys):
+    assert cli.main(["--env", venv.path, "uninstall", "not-installed"]) == 0
+    assert capsys.readouterr().out == "not-installed: skipped (not installed)\n"
+
+
+def test_batch_reports_a_missing_pip(venv, capsys):
+    assert cli.main(["--env", venv.path, "install", "requests"]) == 1
+    captured = capsys.readouterr()
+    assert captured.err.startswith("Error: ")
+    assert "Traceback" not in captured.err
+
+
+def test_batch_argument_errors(venv, tmp_path, capsys):
+    assert cli.main(["--env", venv.path, "install"]) == 2
+    assert "no packages given" in capsys.readouterr().err
+    assert cli.main(["--env", venv.path, "install", "-r", str(tmp_path / "missing.txt")]) == 2
+    assert "Error reading requirements file" in capsys.readouterr().err
+
+
+def test_invalid_env_is_rejected(tmp_path, capsys):
+    assert cli.main(["--env", str(tmp_path / "nowhere"), "list"]) == 2
+    assert "invalid virtual environment path" in capsys.readouterr().err
+
+
+def test_list_installed(venv, capsys):
+    venv.add("requests", "2.31.0")
+    venv.add("Idna", "3.4")
+    assert [package["name"] for package in core.list_installed(venv.path)] == ["Idna", "requests"]
+    assert cli.main(["--json", "--env", venv.path, "list"]) == 0
+    assert [package["version"] for package in json.loads(capsys.readouterr().out)] == ["3.4", "2.31.0"]
+
+
+def test_create_virtualenv_refuses_an_existing_environment(venv, capsys):
+    with pytest.raises(ValueError):
+        core.create_virtualenv(venv.path)
+    assert cli.main(["create-venv", venv.path]) == 1
+    assert "already exists" in capsys.readouterr().err
+
+
+def test_sync_of_the_global_environment_needs_allow_global(tmp_path, capsys):
+    assert cli.main(["lock", "sync", str(tmp_path / "requirements.lock")]) == 2
+    assert "--allow-global" in capsys.readouterr().err
+
+
+def test_sync_reports_a_missing_lockfile(venv, tmp_path, capsys):
+    assert cli.main(["--env", venv.path, "lock", "sync", str(tmp_path / "missing.lock")]) == 2
+    assert "Error reading lockfile" in capsys.readouterr().err
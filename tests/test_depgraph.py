@@ -0,0 +1,87 @@
+"""
+Tests of the dependency graph built from installed metadata.
+"""
+import depgraph
+import inventory
+from specs import default_environment
+
+
+def build_graph(fake_env):
+    """Returns the graph of a fake environment with a small web stack installed."""
+    fake_env.add("requests", "2.31.0", ["urllib3<3,>=1.21.1", "idna<4,>=2.5", "PySocks!=1.5.7; extra == \"socks\""])
+    fake_env.add("urllib3", "2.0.7")
+    fake_env.add("idna", "3.4")
+    fake_env.add("httpie", "3.2.2", ["requests[socks]>=2.22"])
+    fake_env.add("PySocks", "1.7.1")
+    fake_env.add("Flask", "3.0.0", ["Werkzeug>=3.0", "importlib-metadata>=3.6; python_version < \"3.10\""])
+    fake_env.add("Werkzeug", "2.3.0")
+    fake_env.add("importlib-metadata", "6.8.0")
+    return depgraph.get_graph(fake_env.path)
+
+
+def test_dependents(fake_env):
+    graph = build_graph(fake_env)
+    assert graph.dependents("urllib3") == {"requests"}
+    assert graph.dependents("urllib3", recursive=True) == {"requests", "httpie"}
+    assert graph.dependents("Requests") == {"httpie"}
+    assert graph.dependents("httpie") == set()
+
+
+def test_extras_requested_by_dependents(fake_env):
+    graph = build_graph(fake_env)
+    assert graph.dependents("pysocks") == {"requests"}
+    assert graph.dependencies("httpie", recursive=True) == {"requests", "urllib3", "idna", "pysocks"}
+
+
+def test_orphaned_by(fake_env):
+    graph = build_graph(fake_env)
+    assert graph.orphaned_by(["httpie"]) == {"requests", "urllib3", "idna", "pysocks"}
+    assert graph.orphaned_by(["requests"]) == {"urllib3", "idna", "pysocks"}
+    assert graph.orphaned_by(["idna"]) == set()
+
+
+def test_conflicts_and_missing(fake_env):
+    fake_env.add("needs-missing", "1.0", ["not-installed>=1"])
+    graph = build_graph(fake_env)
+    conflicts = [(dependent, distribution.name) for dependent, _, distribution in graph.conflicts()]
+    assert conflicts == [("flask", "Werkzeug")]
+    assert [(dependent, requirement.name) for dependent, requirement in graph.missing()] == [
+        ("needs-missing", "not-installed")]
+
+
+def test_update_after_uninstall(fake_env):
+    graph = build_graph(fake_env)
+    for dist_info in fake_env.site_packages.glob("httpie-*.dist-info"):
+        for path in dist_info.iterdir():
+            path.unlink()
+        dist_info.rmdir()
+    inventory.invalidate_inventory(fake_env.path)
+    graph = depgraph.get_graph(fake_env.path)
+    assert graph.dependents("requests") == set()
+    assert graph.dependents("pysocks") == set()  # Nothing requests the socks extra anymore
+
+
+def test_markers_use_the_environment_interpreter(fake_env):
+    build_graph(fake_env)
+    installed = inventory.get_inventory(fake_env.path)
+
+    old_python = dict(default_environment(), python_version="3.8", python_full_version="3.8.18")
+    graph = depgraph.DependencyGraph(old_python)
+    graph.update(installed)
+    assert "importlib-metadata" in graph.dependencies("flask")
+
+    graph = depgraph.DependencyGraph(dict(old_python, python_version="3.12", python_full_version="3.12.0"))
+    graph.update(installed)
+    assert "importlib-metadata" not in graph.dependencies("flask")
+
+
+def test_returned_graph_is_not_changed_by_later_updates(fake_env):
+    graph = build_graph(fake_env)
+    assert depgraph.get_graph(fake_env.path) is graph  # Unchanged inventory, same copy
+
+    fake_env.add("requests-toolbelt", "1.0.0", ["requests>=2.0.1"])
+    updated = depgraph.get_graph(fake_env.path)
+    assert updated is not graph
+    assert updated.dependents("requests") == {"httpie", "requests-toolbelt"}
+    assert graph.dependents("requests") == {"httpie"}
+    assert "requests-toolbelt" not in graph.distributions
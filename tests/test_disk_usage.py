@@ -0,0 +1,119 @@
+"""
+Tests of the per-distribution disk usage and its cache.
+"""
+import os
+import threading
+
+import pytest
+
+import disk_usage
+
+PAYLOAD = "x" * 20000
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """Starts every test without an in-memory cache; the file cache lives in the test's cache dir."""
+    monkeypatch.setattr(disk_usage, "_cache", None)
+
+
+@pytest.fixture
+def measured(monkeypatch):
+    """Records the names of the distributions each call of _measure() walks."""
+    calls = []
+    measure = disk_usage._measure
+
+    def recording_measure(distributions, *args, **kwargs):
+        calls.append(sorted(distribution.name for distribution in distributions))
+        return measure(distributions, *args, **kwargs)
+
+    monkeypatch.setattr(disk_usage, "_measure", recording_measure)
+    return calls
+
+
+def by_name(usages):
+    """Returns {name: PackageUsage}."""
+    return {usage.name: usage for usage in usages}
+
+
+def test_hardlinked_files_are_counted_once(fake_env):
+    fake_env.add("alpha", "1.0", files={"alpha/data.txt": PAYLOAD})
+    fake_env.add("beta", "1.0", files={"beta/data.txt": "y"})
+    fake_env.add("gamma", "1.0", files={"gamma/data.txt": PAYLOAD})
+    beta_data = fake_env.site_packages / "beta" / "data.txt"
+    beta_data.unlink()
+    os.link(fake_env.site_packages / "alpha" / "data.txt", beta_data)
+    payload_size = disk_usage.allocated_size(os.stat(beta_data))
+
+    usages, total = disk_usage.environment_usage(fake_env.path)
+    usages = by_name(usages)
+    # The first package owning the inode is charged for it, the second one isn't
+    assert usages["alpha"].shared == payload_size
+    assert usages["beta"].shared == 0
+    assert usages["gamma"].shared == 0
+    assert usages["alpha"].size - usages["beta"].size == payload_size
+    assert total == sum(usage.size for usage in usages.values())
+    assert total < sum(disk_usage.allocated_size(os.stat(path)) for path, _ in disk_usage.walk(
+        [str(fake_env.site_packages)]))
+
+
+def test_package_without_record(fake_env):
+    dist_info = fake_env.add("legacy", "0.1")
+    (dist_info / "RECORD").unlink()
+    usage = by_name(disk_usage.environment_usage(fake_env.path)[0])["legacy"]
+    assert (usage.files, usage.size) == (0, None)
+
+
+def test_only_changed_distributions_are_walked_again(fake_env, measured):
+    fake_env.add("alpha", "1.0", files={"alpha/data.txt": PAYLOAD})
+    fake_env.add("beta", "1.0", files={"beta/data.txt": "y"})
+    disk_usage.environment_usage(fake_env.path)
+    disk_usage.environment_usage(fake_env.path)
+    assert measured == [["alpha", "beta"]]
+
+    fake_env.remove("beta")
+    fake_env.add("beta", "2.0", files={"beta/data.txt": PAYLOAD})
+    usages = by_name(disk_usage.environment_usage(fake_env.path)[0])
+    assert measured[-1] == ["beta"]
+    assert usages["beta"].version == "2.0" and usages["beta"].size >= len(PAYLOAD)
+
+
+def test_cache_is_persisted_and_cleared(fake_env, measured, monkeypatch):
+    fake_env.add("alpha", "1.0", files={"alpha/data.txt": PAYLOAD})
+    first = disk_usage.environment_usage(fake_env.path)
+
+    monkeypatch.setattr(disk_usage, "_cache", None)  # As in a new process
+    assert disk_usage.environment_usage(fake_env.path) == first
+    assert len(measured) == 1
+
+    disk_usage.clear_cache()
+    assert not os.path.exists(disk_usage.cache_path())
+    assert disk_usage.environment_usage(fake_env.path) == first
+    assert len(measured) == 2
+
+
+def test_clear_cache_while_walking(fake_env, monkeypatch):
+    fake_env.add("alpha", "1.0", files={"alpha/data.txt": PAYLOAD})
+    fake_env.add("beta", "1.0", files={"beta/data.txt": "y"})
+    disk_usage.environment_usage(fake_env.path)
+    fake_env.remove("beta")
+    fake_env.add("beta", "2.0", files={"beta/data.txt": "z"})
+
+    measure = disk_usage._measure
+
+    def measure_and_clear(*args, **kwargs):
+        disk_usage.clear_cache()
+        return measure(*args, **kwargs)
+
+    monkeypatch.setattr(disk_usage, "_measure", measure_and_clear)
+    usages = by_name(disk_usage.environment_usage(fake_env.path)[0])
+    assert set(usages) == {"alpha", "beta"}
+    # Only what was measured after the clear is kept
+    assert list(disk_usage._load_cache()) == [str(fake_env.site_packages / "beta-2.0.dist-info")]
+
+
+def test_cancelled_walk(fake_env):
+    fake_env.add("alpha", "1.0", files={"alpha/data.txt": PAYLOAD})
+    cancel_event = threading.Event()
+    cancel_event.set()
+    assert disk_usage.environment_usage(fake_env.path, cancel_event) == ([], 0)
@@ -0,0 +1,21 @@
+"""
+Tests of the installed-distribution inventory.
+"""
+import inventory
+from conftest import FakeEnvironment
+
+
+def test_global_dirs_come_from_the_pip_interpreter(tmp_path, monkeypatch):
+    global_env = FakeEnvironment(tmp_path / "global")
+    user_env = FakeEnvironment(tmp_path / "user")
+    global_env.add("shadowed", "1.0")
+    user_env.add("shadowed", "2.0")
+    python = tmp_path / "python3"
+    python.write_text("")
+    monkeypatch.setattr(inventory, "environment_python", lambda env_path=None: str(python))
+    monkeypatch.setattr(inventory, "interpreter_info", lambda _: {
+        "markers": {}, "site_packages": [str(global_env.site_packages)], "user_site": str(user_env.site_packages)})
+
+    assert inventory.site_packages_dirs() == [str(user_env.site_packages), str(global_env.site_packages)]
+    # The user site shadows the global site-packages, like on sys.path
+    assert inventory.get_installed_version(None, "Shadowed") == "2.0"
@@ -0,0 +1,203 @@
+"""
+Tests of lockfile export and parsing, and of the changes a sync applies.
+"""
+import os
+import subprocess
+
+import pytest
+import requests as rq
+
+import inventory
+import lockfile
+import pypi
+from specs import default_environment
+
+
+def write(tmp_path, content):
+    """Writes a lockfile and returns its path."""
+    path = tmp_path / "requirements.lock.txt"
+    path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+def test_read_lockfile_keeps_hashes_extras_and_markers(tmp_path):
+    path = write(tmp_path, (
+        "# Generated by PIP-MATE\n"
+        "Requests[socks,security]==2.31.0 \\\n"
+        "    --hash=sha256:aaa \\\n"
+        "    --hash=sha256:bbb\n"
+        'importlib-metadata==6.8.0 ; python_version < "3.10" --hash=sha256:ccc\n'
+        "idna==3.4  # via requests\n"
+    ))
+    old_python = dict(default_environment(), python_version="3.8")
+    entries = lockfile.read_lockfile(path, old_python)
+    assert entries["requests"] == lockfile.LockEntry("Requests", "2.31.0", ("sha256:aaa", "sha256:bbb"),
+                                                     ("security", "socks"))
+    assert entries["importlib-metadata"].hashes == ("sha256:ccc",)
+    assert entries["idna"] == lockfile.LockEntry("idna", "3.4", ())
+
+    new_python = dict(default_environment(), python_version="3.12")
+    assert "importlib-metadata" not in lockfile.read_lockfile(path, new_python)
+
+
+@pytest.mark.parametrize("line", ["requests>=2.31", "requests==2.*", "requests==2.31,<3", "-e ./src"])
+def test_read_lockfile_rejects_unpinned_lines(tmp_path, line):
+    with pytest.raises(ValueError):
+        lockfile.read_lockfile(write(tmp_path, line + "\n"))
+
+
+def test_format_round_trip(tmp_path):
+    entries = [lockfile.LockEntry("demo", "1.0", ("sha256:abc",), ("cli",)), lockfile.LockEntry("other", "2.0", ())]
+    path = write(tmp_path, lockfile.format_lockfile(entries, "3.11.7"))
+    assert list(lockfile.read_lockfile(path).values()) == entries
+
+
+def test_diff(fake_env):
+    fake_env.add("same", "1.0.0")
+    fake_env.add("older", "1.0")
+    fake_env.add("extra", "0.1")
+    fake_env.add("pip", "23.2.1")
+    locked = {
+        "same": lockfile.LockEntry("same", "1.0", ()),  # Equal to 1.0.0 for pip
+        "older": lockfile.LockEntry("older", "2.0", ()),
+        "missing": lockfile.LockEntry("missing", "3.0", ()),
+    }
+    to_install, to_remove = lockfile.diff(locked, inventory.get_inventory(fake_env.path))
+    assert [entry.name for entry in to_install] == ["missing", "older"]
+    assert to_remove == ["extra"]  # pip is never removed
+
+
+def test_sync_refuses_the_global_environment(tmp_path, monkeypatch):
+    fake_inventory = {"requests": inventory.Distribution("requests", "2.31.0", str(tmp_path), str(tmp_path))}
+    monkeypatch.setattr(inventory, "get_inventory", lambda env_path=None: fake_inventory)
+    path = write(tmp_path, "idna==3.4\n")
+
+    with pytest.raises(ValueError):
+        lockfile.sync(path, None, "pip", print)
+    # A dry run only reports the difference
+    to_install, to_remove = lockfile.sync(path, None, "pip", print, dry_run=True)
+    assert ([entry.name for entry in to_install], to_remove) == (["idna"], ["requests"])
+
+
+@pytest.fixture
+def pip_runs(monkeypatch):
+    """Records the pip command lines a sync runs, with the content of the requirements file it passes."""
+    runs = []
+
+    def check_stream_command(command, on_line, env=None, cancel_event=None):
+        delta = None
+        if "-r" in command:
+            with open(command[command.index("-r") + 1], encoding="utf-8") as delta_file:
+                delta = delta_file.read()
+        runs.append((command, delta))
+
+    monkeypatch.setattr(lockfile.process, "check_stream_command", check_stream_command)
+    return runs
+
+
+def test_sync_with_nothing_to_do_runs_no_pip(fake_env, tmp_path, pip_runs):
+    fake_env.add("idna", "3.4")
+    fake_env.add("pip", "23.2.1")
+    path = write(tmp_path, "idna==3.4.0\npip==24.0\n")  # pip is never touched
+    assert lockfile.sync(path, fake_env.path, "pip", print) == ([], [])
+    assert pip_runs == []
+
+
+def test_sync_installs_only_the_delta_with_hashes(fake_env, tmp_path, pip_runs, monkeypatch):
+    snapshots_taken = []
+    monkeypatch.setattr(lockfile.snapshots, "take", lambda env_path, specs, operation, with_dependencies:
+                        snapshots_taken.append((sorted(specs), with_dependencies)))
+    fake_env.add("idna", "3.4")
+    fake_env.add("requests", "2.28.0")
+    fake_env.add("extra", "0.1")
+    path = write(tmp_path, (
+        "idna==3.4 --hash=sha256:aaa\n"
+        "requests==2.31.0 --hash=sha256:bbb --hash=sha256:ccc\n"
+        "urllib3==2.0.7 --hash=sha256:ddd\n"
+    ))
+
+    lines = []
+    to_install, to_remove = lockfile.sync(path, fake_env.path, "pip", lines.append)
+    assert [entry.name for entry in to_install] == ["requests", "urllib3"] and to_remove == ["extra"]
+    assert snapshots_taken == [(["extra", "requests"], False)]  # urllib3 isn't installed yet
+
+    (uninstall, _), (install, delta) = pip_runs
+    assert uninstall == ["pip", "uninstall", "-y", "extra"]
+    assert install[:3] == ["pip", "install", "--no-deps"]
+    assert lockfile.read_lockfile(write(tmp_path, delta)) == {
+        "requests": lockfile.LockEntry("requests", "2.31.0", ("sha256:bbb", "sha256:ccc")),
+        "urllib3": lockfile.LockEntry("urllib3", "2.0.7", ("sha256:ddd",)),
+    }
+    assert not os.path.exists(install[-1])  # The delta file is removed afterwards
+
+
+def test_sync_drops_all_hashes_when_some_are_missing(fake_env, tmp_path, pip_runs):
+    path = write(tmp_path, "idna==3.4 --hash=sha256:aaa\nlocal-pkg==0.1\n")
+    lines = []
+    lockfile.sync(path, fake_env.path, "pip", lines.append)
+    [(_, delta)] = pip_runs
+    assert "--hash" not in delta
+    assert any("installing without hash checking" in line for line in lines)
+
+
+def test_sync_continues_without_a_snapshot_and_reports_pip_failures(fake_env, tmp_path, monkeypatch):
+    def take(*args, **kwargs):
+        raise OSError("disk full")
+
+    delta_files = []
+
+    def failing_pip(command, on_line, env=None, cancel_event=None):
+        delta_files.append(command[-1])
+        raise subprocess.CalledProcessError(1, command)
+
+    monkeypatch.setattr(lockfile.snapshots, "take", take)
+    monkeypatch.setattr(lockfile.process, "check_stream_command", failing_pip)
+    fake_env.add("idna", "3.3")
+    lines = []
+    with pytest.raises(subprocess.CalledProcessError):
+        lockfile.sync(write(tmp_path, "idna==3.4\n"), fake_env.path, "pip", lines.append)
+    assert lines[0] == "Couldn't take a snapshot before the sync: disk full\n"
+    assert not os.path.exists(delta_files[0])
+
+
+def test_sync_of_the_global_environment_with_allow_global(tmp_path, monkeypatch, pip_runs):
+    fake_inventory = {"requests": inventory.Distribution("requests", "2.31.0", str(tmp_path), str(tmp_path))}
+    monkeypatch.setattr(inventory, "get_inventory", lambda env_path=None: fake_inventory)
+    monkeypatch.setattr(lockfile.snapshots, "take", lambda *args, **kwargs: None)
+    lockfile.sync(write(tmp_path, "requests==2.31.0\nidna==3.4\n"), None, "pip", print, allow_global=True)
+    assert [command[:2] for command, _ in pip_runs] == [["pip", "install"]]
+
+
+def test_sync_reports_an_invalid_lockfile(fake_env, tmp_path, pip_runs):
+    with pytest.raises(ValueError, match=":2: not an exact pin"):
+        lockfile.sync(write(tmp_path, "idna==3.4\nrequests>=2\n"), fake_env.path, "pip", print)
+    with pytest.raises(OSError):
+        lockfile.sync(str(tmp_path / "missing.lock"), fake_env.path, "pip", print)
+    assert pip_runs == []
+
+
+def test_lock_environment_looks_up_hashes(fake_env, monkeypatch):
+    fake_env.add("demo", "1.0")
+    fake_env.add("local-pkg", "0.1")
+    fake_env.add("offline-pkg", "2.0")
+    fake_env.add("pip", "24.0")
+    documents = {
+        # The index spells the version 1.0.0; yanked state doesn't matter for hashes
+        "demo": {"releases": {"1.0.0": [{"digests": {"sha256": "bbb"}}, {"digests": {"sha256": "aaa"}},
+                                        {"digests": {}}]}},
+        "local-pkg": {"releases": {}},
+        "offline-pkg": rq.exceptions.ConnectionError("offline"),
+    }
+
+    def fetch_many(names):
+        for name in names:
+            value = documents[name]
+            yield (name, None, value) if isinstance(value, Exception) else (name, value, None)
+
+    monkeypatch.setattr(pypi, "fetch_many", fetch_many)
+    missing = []
+    entries = lockfile.lock_environment(fake_env.path, on_missing=lambda *args: missing.append(args))
+    assert entries == [lockfile.LockEntry("demo", "1.0", ("sha256:aaa", "sha256:bbb")),
+                       lockfile.LockEntry("local-pkg", "0.1", ()), lockfile.LockEntry("offline-pkg", "2.0", ())]
+    assert missing == [("local-pkg", "0.1", "no files on the index"), ("offline-pkg", "2.0", "offline")]
+    assert [entry.hashes for entry in lockfile.lock_environment(fake_env.path, with_hashes=False)] == [(), (), ()]
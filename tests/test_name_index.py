@@ -0,0 +1,79 @@
+"""
+Tests of the local project name index.
+"""
+import json
+
+import pytest
+
+import name_index
+
+
+NAMES = ["django", "django-rest-framework", "flask", "numpy", "pandas", "requests", "requests-oauthlib",
+         "scipy", "six"]
+
+
+@pytest.fixture
+def index():
+    """A small index of well-known project names."""
+    return name_index.NameIndex(NAMES)
+
+
+def test_membership(index):
+    assert len(index) == len(NAMES)
+    assert index.names() == NAMES
+    assert "Requests" in index
+    assert "Django_Rest.Framework" in index
+    assert "request" not in index
+    assert "zzz" not in index
+    assert "" not in name_index.NameIndex([])
+
+
+def test_complete(index):
+    assert index.complete("req") == ["requests", "requests-oauthlib"]
+    assert index.complete("Django", limit=1) == ["django"]
+    assert index.complete("x") == []
+    assert index.complete("") == []
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("reqeusts", ["requests"]),  # Transposition
+    ("requets", ["requests"]),  # Deletion
+    ("nunpy", ["numpy"]),  # Substitution
+    ("flassk", ["flask"]),  # Insertion
+    ("sixx", ["six"]),
+    ("completely-different", []),
+])
+def test_fuzzy(index, query, expected):
+    assert index.fuzzy(query) == expected
+
+
+def test_suggest_tops_up_with_fuzzy_matches(index):
+    assert index.suggest("scipi") == ["scipy"]
+    assert index.suggest("requests") == ["requests", "requests-oauthlib"]
+
+
+def test_updated(index):
+    updated = index.updated(added=["New_Project"], removed=["Six"])
+    assert "new-project" in updated and "six" not in updated
+    assert "six" in index  # The original stays unchanged
+
+
+def test_parse_project_list():
+    html = b'<html><body><a href="/simple/Foo-Bar/">Foo_Bar</a><a href="/simple/baz/">baz</a></body></html>'
+    assert name_index.parse_project_list("text/html", html) == ["baz", "foo-bar"]
+    body = json.dumps({"projects": [{"name": "Zope.Interface"}, {"name": "attrs"}]}).encode()
+    assert name_index.parse_project_list("application/vnd.pypi.simple.v1+json", body) == ["attrs", "zope-interface"]
+
+
+@pytest.mark.parametrize("spec, status", [
+    ("requests>=2", name_index.NAME_OK),
+    ("reqeusts", name_index.NAME_UNKNOWN),
+    ("requests[", name_index.NAME_INVALID),
+    ("./local/project", name_index.NAME_UNCHECKED),
+    ("demo @ https://example.org/demo-1.0.tar.gz", name_index.NAME_UNCHECKED),
+])
+def test_check_spec(index, spec, status):
+    check = name_index.check_spec(spec, index)
+    assert check.status == status
+    if status == name_index.NAME_UNKNOWN:
+        assert check.suggestions == ["requests"]
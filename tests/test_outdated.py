@@ -0,0 +1,107 @@
+"""
+Tests of outdated-package detection with the PyPI lookups replaced by canned documents.
+"""
+import platform
+import threading
+
+import pytest
+import requests as rq
+
+import inventory
+import outdated
+import pypi
+
+
+def release(requires_python=None, yanked=False):
+    """The file list of one release in PyPI's JSON."""
+    return [{"filename": "pkg.whl", "requires_python": requires_python, "yanked": yanked}]
+
+
+def project(**releases):
+    """A project's JSON metadata with the given version -> file list."""
+    return {"info": {"version": "ignored"}, "releases": {version.replace("_", "."): files
+                                                         for version, files in releases.items()}}
+
+
+def test_latest_version_skips_unusable_releases():
+    data = project(**{"1_0": release(), "1_1": release(), "2_0": release(yanked=True), "1_5": [],
+                      "1_4": release(">=3.99"), "3_0b1": release(), "bad version": release()})
+    assert outdated.latest_version(data, "3.11.7") == "1.1"
+    assert outdated.latest_version(data, "3.11.7", include_prereleases=True) == "3.0b1"
+    assert outdated.latest_version({"info": {"version": "4.2"}}) == "4.2"
+    assert outdated.latest_version(project(**{"1_0": release(yanked=True)})) is None
+
+
+def test_requires_python_is_checked_against_the_environment():
+    data = project(**{"1_0": release(), "2_0": release(">=3.12")})
+    assert outdated.latest_version(data, "3.11.7") == "1.0"
+    assert outdated.latest_version(data, "3.12.1") == "2.0"
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Serves fetch_many() from a dict of name -> document or exception, recording closes."""
+    documents = {}
+    closed = []
+
+    def fetch_many(names, max_workers=None):
+        try:
+            for name in names:
+                value = documents[name]
+                if isinstance(value, Exception):
+                    yield name, None, value
+                else:
+                    yield name, value, None
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(pypi, "fetch_many", fetch_many)
+    return documents, closed
+
+
+def test_check_outdated_reports_every_lookup(fake_env, lookups):
+    documents, closed = lookups
+    fake_env.add("Requests", "2.28.0")
+    fake_env.add("idna", "3.4")
+    fake_env.add("beta-pkg", "2.0b1")
+    fake_env.add("legacy", "not-a-version")
+    fake_env.add("gone", "1.0")
+    documents.update({
+        "requests": project(**{"2_28_0": release(), "2_31_0": release()}),
+        "idna": project(**{"3_4": release(), "4_0a1": release()}),
+        "beta-pkg": project(**{"2_0b1": release(), "2_0b2": release()}),
+        "legacy": project(**{"1_0": release()}),
+        "gone": rq.exceptions.HTTPError("404 Not Found"),
+    })
+
+    results = {}
+    packages = outdated.check_outdated(inventory.get_inventory(fake_env.path), "3.11.7",
+                                       lambda name, installed, newer, error: results.update({name: (newer, error)}))
+    assert packages == [
+        outdated.OutdatedPackage("beta-pkg", "2.0b1", "2.0b2"),
+        outdated.OutdatedPackage("legacy", "not-a-version", "1.0"),
+        outdated.OutdatedPackage("Requests", "2.28.0", "2.31.0"),
+    ]
+    assert results["idna"] == (None, None)  # Pre-releases aren't offered for stable installs
+    assert results["gone"][0] is None and isinstance(results["gone"][1], rq.exceptions.HTTPError)
+    assert closed == [True]
+
+
+def test_check_outdated_stops_when_cancelled(fake_env, lookups):
+    documents, closed = lookups
+    for name in ("aaa", "bbb", "ccc"):
+        fake_env.add(name, "1.0")
+        documents[name] = project(**{"2_0": release()})
+    cancel = threading.Event()
+    cancel.set()
+    assert outdated.check_outdated(inventory.get_inventory(fake_env.path), cancel_event=cancel) == []
+    assert closed == [True]
+
+
+def test_environment_python_version(tmp_path):
+    (tmp_path / "pyvenv.cfg").write_text("home = /usr/bin\nversion_info = 3.9.18.final.0\n")
+    assert outdated.environment_python_version(str(tmp_path)) == "3.9.18"
+    (tmp_path / "pyvenv.cfg").write_text("home = /usr/bin\nversion = 3.10.4\n")
+    assert outdated.environment_python_version(str(tmp_path)) == "3.10.4"
+    assert outdated.environment_python_version(str(tmp_path / "missing")) == platform.python_version()
+    assert outdated.environment_python_version(None) == platform.python_version()
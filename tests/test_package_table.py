@@ -0,0 +1,100 @@
+"""
+Tests of the package table's filter and sort model and of its row reordering plan; no display needed.
+"""
+import random
+
+import pytest
+
+from inventory import Distribution
+from package_table import PackageTableModel, plan_reorder
+
+
+def dist(name, version="1.0", location="/site-packages"):
+    return Distribution(name, version, location, f"/site-packages/{name}-{version}.dist-info")
+
+
+@pytest.fixture
+def model():
+    model = PackageTableModel()
+    model.load([dist("requests", "2.31.0"), dist("Requests-OAuthlib", "1.3.1"), dist("numpy", "1.26.4"),
+                dist("idna", "3.4", "/other"), dist("weird", "not-a-version")])
+    return model
+
+
+def apply_plan(displayed, target):
+    """Replays a plan like ttk.Treeview would and returns the resulting rows and the number of moves."""
+    to_detach, to_move = plan_reorder(displayed, target)
+    children = [item_id for item_id in displayed if item_id not in set(to_detach)]
+    moving = set(to_move)
+    for index, item_id in enumerate(target):
+        if item_id in moving:
+            children.insert(index, item_id)
+    return children, len(to_move)
+
+
+def test_filter_matches_normalized_prefixes(model):
+    assert model.matching_ids("req") == {"requests", "requests-oauthlib"}
+    assert model.matching_ids("Requests_O") == {"requests-oauthlib"}
+    assert model.matching_ids("  ") == set(model.rows)
+    assert model.matching_ids("zzz") == set()
+
+    model.filter_text = "re"
+    assert model.visible_order() == ["requests", "requests-oauthlib"]
+    assert model.visible_order(available={"requests-oauthlib", "numpy"}) == ["requests-oauthlib"]
+
+
+def test_sort_by_version_puts_unparseable_versions_last(model):
+    model.sort_by("version")
+    assert model.order == ["requests-oauthlib", "numpy", "requests", "idna", "weird"]
+    model.sort_by("version")  # The same column again reverses
+    assert model.order == ["weird", "idna", "requests", "numpy", "requests-oauthlib"]
+
+
+def test_sort_by_location_and_size(model):
+    model.sort_by("location")
+    assert model.order[0] == "idna"
+
+    model.sort_by("size")
+    assert model.set_sizes({"numpy": 50, "idna": 10, "unknown": 99}) == ["numpy", "idna"]
+    assert "unknown" not in model.sizes
+    # Rows without a size sort first, by name
+    assert model.order == ["requests", "requests-oauthlib", "weird", "idna", "numpy"]
+
+
+def test_load_keeps_sort_and_filter(model):
+    model.sort_by("version")
+    model.filter_text = "n"
+    model.load([dist("numpy", "2.0"), dist("nose", "1.3.7"), dist("pip", "24.0")])
+    assert model.visible_order() == ["nose", "numpy"]
+    assert model.sizes == {}
+
+
+def test_narrowing_the_filter_moves_nothing():
+    displayed = ["a", "b", "c", "d", "e"]
+    result, moves = apply_plan(displayed, ["b", "d"])
+    assert result == ["b", "d"] and moves == 0
+    assert plan_reorder(displayed, ["b", "d"])[0] == ["a", "c", "e"]
+
+
+def test_widening_the_filter_moves_only_the_shown_rows():
+    result, moves = apply_plan(["b", "d"], ["a", "b", "c", "d", "e"])
+    assert result == ["a", "b", "c", "d", "e"] and moves == 3
+
+
+def test_unchanged_order_moves_nothing():
+    rows = [f"pkg{index:04d}" for index in range(1000)]
+    assert plan_reorder(rows, rows) == ([], [])
+
+
+def test_one_row_changing_position_moves_one_row():
+    result, moves = apply_plan(["a", "b", "c", "d"], ["a", "c", "d", "b"])
+    assert result == ["a", "c", "d", "b"] and moves == 1
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_any_plan_produces_the_target(seed):
+    rng = random.Random(seed)
+    rows = [f"pkg{index}" for index in range(rng.randint(0, 40))]
+    displayed = rng.sample(rows, rng.randint(0, len(rows)))
+    target = rng.sample(rows, rng.randint(0, len(rows)))
+    assert apply_plan(displayed, target)[0] == target
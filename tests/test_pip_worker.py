@@ -0,0 +1,126 @@
+"""
+Tests of the persistent pip worker against a real environment and locally built wheels.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_DIR
+
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+
+import pip_worker  # noqa: E402
+from stub_index import build_wheel  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def venv(tmp_path_factory):
+    """An environment with pip and a directory of demo-pkg 1.0.0 and 2.0.0 wheels."""
+    root = tmp_path_factory.mktemp("worker")
+    env_path = root / "env"
+    subprocess.check_call([sys.executable, "-m", "venv", str(env_path)])
+    wheels = root / "wheels"
+    wheels.mkdir()
+    for version in ("1.0.0", "2.0.0"):
+        filename, data = build_wheel("demo-pkg", version, payload_size=16)
+        (wheels / filename).write_bytes(data)
+    pip = str(env_path / ("Scripts" if os.name == 'nt' else "bin") / "pip")
+    return pip, str(wheels)
+
+
+@pytest.fixture(autouse=True)
+def fresh_workers():
+    """Stops the workers of each test, so every test starts with a new one."""
+    yield
+    pip_worker.shutdown()
+
+
+def run(pip, *args):
+    """Runs pip in its worker and returns (exit code, output)."""
+    lines = []
+    returncode = pip_worker.run([pip, *args], lines.append)
+    assert returncode is not None, "the worker didn't serve the command"
+    return returncode, "".join(lines)
+
+
+@pytest.mark.parametrize("use_importlib", ["1", "0"], ids=["importlib", "pkg_resources"])
+def test_install_upgrade_show_in_one_worker(venv, monkeypatch, use_importlib):
+    pip, wheels = venv
+    # pip's pkg_resources backend (the default before Python 3.11) caches the working set
+    monkeypatch.setenv("_PIP_USE_IMPORTLIB_METADATA", use_importlib)
+    options = ["--no-index", "--find-links", wheels, "--disable-pip-version-check"]
+
+    returncode, output = run(pip, "install", *options, "demo-pkg==1.0.0")
+    assert returncode == 0, output
+    returncode, output = run(pip, "install", *options, "--upgrade", "demo-pkg")
+    assert returncode == 0, output
+    assert "Successfully installed demo-pkg-2.0.0" in output
+
+    returncode, output = run(pip, "show", "demo-pkg")
+    assert returncode == 0, output
+    assert "Version: 2.0.0" in output
+    site_packages = output.split("Location: ")[1].split("\n")[0].strip()
+    assert sorted(name for name in os.listdir(site_packages) if name.startswith("demo_pkg-")) == [
+        "demo_pkg-2.0.0.dist-info"]
+
+    returncode, output = run(pip, "install", *options, "demo-pkg")
+    assert "Requirement already satisfied" in output
+
+    returncode, output = run(pip, "uninstall", "-y", "demo-pkg")
+    assert returncode == 0, output
+    returncode, output = run(pip, "show", "demo-pkg")
+    assert returncode != 0
+
+
+def test_cancel_restarts_worker(venv):
+    pip, _ = venv
+    assert run(pip, "list")[0] == 0
+    worker = pip_worker._workers[pip_worker.interpreter_for(pip)]
+    first_pid = worker.info["pid"]
+    worker.stop()
+    assert run(pip, "list")[0] == 0
+    assert worker.info["pid"] != first_pid
+
+
+def test_failed_start_is_retried_after_a_backoff(venv, tmp_path, monkeypatch):
+    pip, _ = venv
+    missing = str(tmp_path / "missing-python")
+    interpreter = [missing]
+    now = [1000.0]
+    attempts = []
+    start = pip_worker.PipWorker.start
+
+    def counting_start(worker):
+        attempts.append(worker.python)
+        return start(worker)
+
+    monkeypatch.setattr(pip_worker, "_unavailable", {})
+    monkeypatch.setattr(pip_worker, "interpreter_for", lambda command: interpreter[0])
+    monkeypatch.setattr(pip_worker.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(pip_worker.PipWorker, "start", counting_start)
+
+    assert pip_worker.run([pip, "list"], print) is None
+    assert pip_worker.run([pip, "list"], print) is None
+    assert len(attempts) == 1  # Not retried right away
+
+    now[0] += pip_worker.RETRY_SECONDS
+    assert pip_worker.run([pip, "list"], print) is None
+    assert len(attempts) == 2
+    now[0] += pip_worker.RETRY_SECONDS  # The wait doubled after the second failure
+    assert pip_worker.run([pip, "list"], print) is None
+    assert len(attempts) == 2
+
+    # Once the interpreter works again its worker is used, and the failures are forgotten
+    now[0] += pip_worker.RETRY_SECONDS
+    pip_worker._workers[missing].python = os.path.join(os.path.dirname(pip), "python")
+    assert run(pip, "list")[0] == 0
+    assert missing not in pip_worker._unavailable
+
+
+@pytest.mark.parametrize("value, timeout", [("60", 60.0), ("2.5", 2.5), ("soon", 300.0), ("0", 300.0),
+                                            ("-1", 300.0), ("inf", 300.0), ("nan", 300.0)])
+def test_idle_timeout_setting(monkeypatch, value, timeout):
+    monkeypatch.setenv("PIPMATE_PIP_WORKER_IDLE", value)
+    assert pip_worker._idle_timeout() == timeout
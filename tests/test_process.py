@@ -0,0 +1,169 @@
+"""
+Tests of the streaming subprocess runner and of the output queue feeding the result pane.
+"""
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import process
+import tracing
+
+
+def python(code):
+    """A command line running a Python snippet."""
+    return [sys.executable, "-c", code]
+
+
+def test_lines_arrive_while_the_command_runs(tmp_path):
+    flag = tmp_path / "seen"
+    lines = []
+
+    def on_line(line):
+        lines.append(line)
+        flag.write_text("seen")
+
+    # The command only prints its second line after the first one reached on_line
+    code = ("import os, sys, time\n"
+            "print('first')\n"
+            "for _ in range(500):\n"
+            "    if os.path.exists(sys.argv[1]): break\n"
+            "    time.sleep(0.01)\n"
+            "print('second' if os.path.exists(sys.argv[1]) else 'timed out')\n")
+    assert process.stream_command(python(code) + [str(flag)], on_line, env={}) == 0
+    assert lines == ["first\n", "second\n"]
+
+
+def test_stderr_carriage_returns_and_exit_code():
+    lines = []
+    code = "import sys; sys.stderr.write('warn\\n'); sys.stdout.write('10%\\r20%\\rdone\\n'); sys.exit(3)"
+    assert process.stream_command(python(code), lines.append, env={}) == 3
+    # Progress updates ending in a carriage return come through as lines of their own
+    assert sorted(lines) == sorted(["warn\n", "10%\n", "20%\n", "done\n"])
+
+
+def test_cancel_terminates_the_command():
+    cancel = threading.Event()
+    lines = []
+
+    def on_line(line):
+        lines.append(line)
+        cancel.set()
+
+    started = time.monotonic()
+    code = "import time; print('started', flush=True); time.sleep(30)"
+    returncode = process.stream_command(python(code), on_line, env={}, cancel_event=cancel)
+    assert returncode != 0
+    assert time.monotonic() - started < 10
+    assert lines == ["started\n"]
+
+
+def test_check_stream_command_raises_on_failure():
+    process.check_stream_command(python("pass"), lambda line: None, env={})
+    with pytest.raises(subprocess.CalledProcessError) as info:
+        process.check_stream_command(python("raise SystemExit(2)"), lambda line: None, env={})
+    assert info.value.returncode == 2
+
+
+def test_missing_executable_raises_oserror(tmp_path):
+    with pytest.raises(OSError):
+        process.stream_command([str(tmp_path / "no-such-command")], lambda line: None, env={})
+
+
+def test_commands_are_recorded_as_spans():
+    tracing.clear()
+    process.stream_command(python("print('hi')"), lambda line: None, env={})
+    [span] = [span for span in tracing.finished_spans() if span.category == "subprocess"]
+    assert span.attrs["returncode"] == 0 and not span.attrs["cancelled"]
+
+
+@pytest.mark.parametrize("command, name", [
+    (["/env/bin/pip", "install", "requests"], "pip install"),
+    (["pip3.exe", "list"], "pip3 list"),
+    (["python3", "-m", "venv", "/tmp/env"], "python3 -m venv"),
+    (["pip", "--version"], "pip"),
+    (["pip"], "pip"),
+])
+def test_span_names(command, name):
+    assert process._describe(command) == name
+
+
+class FakeText:
+    """Records what main's output drain does to the result_text widget."""
+
+    def __init__(self):
+        self.text = ""
+        self.callbacks = []
+
+    def config(self, **options):
+        pass
+
+    def delete(self, start, end):
+        self.text = ""
+
+    def insert(self, index, text):
+        self.text += text
+
+    def see(self, index):
+        pass
+
+    def after(self, delay, callback):
+        self.callbacks.append(callback)
+
+
+@pytest.fixture
+def output(monkeypatch):
+    """main's output queue, small enough to fill, draining into a FakeText."""
+    import main
+
+    widget = FakeText()
+    monkeypatch.setattr(main, "result_text", widget, raising=False)
+    monkeypatch.setattr(main, "output_queue", main.queue.Queue(maxsize=3))
+    monkeypatch.setattr(main, "OUTPUT_BATCH_SIZE", 2)
+    return main, widget
+
+
+def test_main_thread_writes_never_block_on_a_full_queue(output):
+    main, widget = output
+    for index in range(10):
+        main.write_output(f"{index}\n")  # Would deadlock if the main thread waited for room
+    while not main.output_queue.empty():
+        main._drain_queue()
+    assert widget.text == "".join(f"{index}\n" for index in range(10))
+
+
+def test_clear_and_callbacks_follow_the_output_order(output):
+    main, widget = output
+    main.write_output("old\n")
+    main.clear_output()
+    main.write_output("new\n")
+    main._drain_queue()
+    main.call_in_ui(lambda: widget.text)
+    main._drain_queue()
+    assert widget.text == "new\n"
+    assert [callback() for callback in widget.callbacks] == ["new\n"]
+
+
+def test_worker_threads_wait_for_room_and_answers(output):
+    main, widget = output
+    answers = []
+
+    def worker():
+        for index in range(6):
+            main.write_output(f"{index}\n")
+        answers.append(main.ask_in_ui(lambda: "yes"))
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while thread.is_alive() and time.monotonic() < deadline:
+        main._drain_queue()
+        for callback in widget.callbacks:
+            callback()
+        widget.callbacks.clear()
+        time.sleep(0.01)
+    thread.join(1)
+    assert answers == ["yes"]
+    assert widget.text == "".join(f"{index}\n" for index in range(6))
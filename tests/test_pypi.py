@@ -0,0 +1,298 @@
+"""
+Tests of the PyPI client: its pooled session, concurrent fetches and use of the metadata cache.
+"""
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests as rq
+
+import pypi
+import pypi_cache
+
+
+DOCUMENT = {"info": {"name": "demo", "version": "1.0", "summary": "Demo", "requires_dist": None},
+            "releases": {"1.0": []}}
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = headers or {}
+        self.content = b"{}" if data is not None else b""
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise rq.exceptions.HTTPError(f"{self.status_code} error", response=self)
+
+
+class FakeSession:
+    """Answers GET requests with queued responses and records the headers it was sent."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, dict(headers or {})))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """Installs a FakeSession; tests queue responses with session.responses.append()."""
+    fake = FakeSession()
+    monkeypatch.setattr(pypi, "get_session", lambda: fake)
+    monkeypatch.setattr(pypi, "offline", False)
+    return fake
+
+
+def expire(key):
+    """Makes a cached entry stale so the next fetch revalidates it."""
+    pypi_cache._connect().execute("UPDATE projects SET fetched_at = ? WHERE key = ?",
+                                  (time.time() - pypi_cache.FRESH_SECONDS - 1, key))
+
+
+def test_fresh_entries_are_served_without_a_request(session):
+    session.responses.append(FakeResponse(200, DOCUMENT, {"ETag": '"v1"'}))
+    assert pypi.fetch_project("demo")["info"]["version"] == "1.0"
+    assert pypi.fetch_project("Demo")["info"]["version"] == "1.0"
+    assert len(session.requests) == 1
+
+
+def test_stale_entries_are_revalidated_with_their_etag(session):
+    session.responses.append(FakeResponse(200, DOCUMENT, {"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024"}))
+    pypi.fetch_project("demo")
+    expire("demo")
+
+    session.responses.append(FakeResponse(304))
+    assert pypi.fetch_project("demo")["info"]["version"] == "1.0"
+    assert session.requests[1][1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024"}
+    # A 304 makes the entry fresh again
+    assert pypi_cache.get(pypi.PYPI_URL, "demo")["fresh"]
+    pypi.fetch_project("demo")
+    assert len(session.requests) == 2
+
+
+def test_changed_documents_replace_the_cached_entry(session):
+    session.responses.append(FakeResponse(200, DOCUMENT, {"ETag": '"v1"'}))
+    pypi.fetch_project("demo")
+    expire("demo")
+
+    newer = {"info": dict(DOCUMENT["info"], version="2.0"), "releases": {"1.0": [], "2.0": []}}
+    session.responses.append(FakeResponse(200, newer, {"ETag": '"v2"'}))
+    assert pypi.fetch_project("demo")["info"]["version"] == "2.0"
+    assert pypi_cache.get(pypi.PYPI_URL, "demo")["etag"] == '"v2"'
+
+
+def test_stale_entries_are_served_when_pypi_is_unreachable(session):
+    session.responses.append(FakeResponse(200, DOCUMENT))
+    pypi.fetch_project("demo")
+    expire("demo")
+
+    session.responses.append(rq.exceptions.ConnectionError("down"))
+    assert pypi.fetch_project("demo")["info"]["version"] == "1.0"
+    session.responses.append(FakeResponse(503))
+    assert pypi.fetch_project("demo")["info"]["version"] == "1.0"
+
+    session.responses.append(rq.exceptions.ConnectionError("down"))
+    with pytest.raises(rq.exceptions.ConnectionError):
+        pypi.fetch_project("uncached")
+
+
+def test_missing_projects_raise(session):
+    session.responses.append(FakeResponse(404))
+    with pytest.raises(rq.exceptions.HTTPError):
+        pypi.fetch_project("missing")
+
+
+def test_offline_mode_serves_only_cached_entries(session, monkeypatch):
+    session.responses.append(FakeResponse(200, DOCUMENT))
+    pypi.fetch_project("demo")
+    expire("demo")
+
+    monkeypatch.setattr(pypi, "offline", True)
+    assert pypi.fetch_project("demo")["info"]["version"] == "1.0"
+    with pytest.raises(rq.exceptions.ConnectionError):
+        pypi.fetch_project("uncached")
+    assert len(session.requests) == 1
+
+
+def test_a_broken_cache_falls_back_to_the_network(session, monkeypatch):
+    def broken(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(pypi_cache, "get", broken)
+    monkeypatch.setattr(pypi_cache, "put", broken)
+    session.responses.append(FakeResponse(200, DOCUMENT))
+    assert pypi.fetch_project("demo")["info"]["version"] == "1.0"
+
+    session.responses.append(FakeResponse(200, DOCUMENT))
+    assert [(name, error) for name, _, error in pypi.fetch_many(["demo"])] == [("demo", None)]
+
+
+def test_a_failed_revalidation_update_still_serves_the_entry(session, monkeypatch):
+    session.responses.append(FakeResponse(200, DOCUMENT, {"ETag": '"v1"'}))
+    pypi.fetch_project("demo")
+    expire("demo")
+
+    def broken(*args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(pypi_cache, "mark_revalidated", broken)
+    session.responses.append(FakeResponse(304))
+    assert pypi.fetch_project("demo")["info"]["version"] == "1.0"
+
+
+def test_fetch_many_reports_errors_per_project(session):
+    session.responses.extend([FakeResponse(200, DOCUMENT), FakeResponse(404)])
+    results = {name: (data, error) for name, data, error in pypi.fetch_many(["demo", "demo", "missing"],
+                                                                             max_workers=1)}
+    assert results["demo"][0]["info"]["name"] == "demo" and results["demo"][1] is None
+    assert results["missing"][0] is None and isinstance(results["missing"][1], rq.exceptions.HTTPError)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("120", 120), ("0", 0), ("1h", pypi_cache.DEFAULT_FRESH_SECONDS), ("-5", pypi_cache.DEFAULT_FRESH_SECONDS),
+])
+def test_cache_ttl_setting(monkeypatch, value, expected):
+    monkeypatch.setenv("PIPMATE_CACHE_TTL", value)
+    assert pypi_cache._fresh_seconds() == expected
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves DOCUMENT for every project, failing the first `failures` requests with a 503."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, so pooled connections are reused
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.client_address[1]))
+            fail = server.failures > 0
+            server.failures -= fail
+        body = b"{}" if fail else json.dumps(DOCUMENT).encode("utf-8")
+        self.send_response(503 if fail else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """A local JSON API server, with a new shared session for the test."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.failures = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(pypi, "_session", None)
+    monkeypatch.setattr(pypi, "BACKOFF_FACTOR", 0)
+    monkeypatch.setattr(pypi, "offline", False)
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/pypi"
+    server.shutdown()
+    server.server_close()
+    if pypi._session is not None:
+        pypi._session.close()
+
+
+def test_session_is_shared_and_pooled(monkeypatch):
+    monkeypatch.setattr(pypi, "_session", None)
+    sessions = []
+    threads = [threading.Thread(target=lambda: sessions.append(pypi.get_session())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, sessions))) == 1
+
+    adapter = sessions[0].get_adapter("https://pypi.org/pypi")
+    assert adapter._pool_maxsize == pypi.MAX_POOL_SIZE
+    assert adapter.max_retries.total == pypi.DEFAULT_RETRIES
+    assert 503 in adapter.max_retries.status_forcelist
+    assert sessions[0].headers["Accept"] == "application/json"
+    sessions[0].close()
+
+
+def test_connections_are_reused(stub_server):
+    server, url = stub_server
+    for name in ("demo", "other", "third"):
+        pypi.fetch_project(name, base_url=url, use_cache=False)
+    assert [path for path, _ in server.requests] == ["/pypi/demo/json", "/pypi/other/json", "/pypi/third/json"]
+    assert len({port for _, port in server.requests}) == 1
+
+
+def test_transient_server_errors_are_retried(stub_server):
+    server, url = stub_server
+    server.failures = 2
+    assert pypi.fetch_project("demo", base_url=url, use_cache=False)["info"]["name"] == "demo"
+    assert len(server.requests) == 3
+
+    server.failures = pypi.DEFAULT_RETRIES + 1
+    with pytest.raises(rq.exceptions.HTTPError):
+        pypi.fetch_project("demo", base_url=url, use_cache=False)
+
+
+def test_fetch_many_bounds_the_requests_in_flight(monkeypatch):
+    lock = threading.Lock()
+    in_flight = [0, 0]  # current, highest
+
+    class SlowSession:
+        def get(self, url, headers=None, timeout=None):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return FakeResponse(200, DOCUMENT)
+
+    monkeypatch.setattr(pypi, "get_session", SlowSession)
+    monkeypatch.setattr(pypi, "offline", False)
+    names = [f"pkg{index}" for index in range(12)]
+    results = list(pypi.fetch_many(names + names[:3], max_workers=3, use_cache=False))
+    assert sorted(name for name, _, _ in results) == sorted(names)
+    assert 1 < in_flight[1] <= 3
+
+
+def test_closing_fetch_many_drops_pending_requests(session):
+    session.responses.extend(FakeResponse(200, DOCUMENT) for _ in range(20))
+    results = pypi.fetch_many([f"pkg{index}" for index in range(20)], max_workers=1, use_cache=False)
+    next(results)
+    results.close()
+    time.sleep(0.05)
+    assert len(session.requests) < 20
+
+
+def test_fetch_many_reports_invalid_json(session):
+    class BadJson(FakeResponse):
+        def json(self):
+            raise ValueError("Expecting value")
+
+    session.responses.append(BadJson(200, {}))
+    [(name, data, error)] = list(pypi.fetch_many(["demo"], use_cache=False))
+    assert data is None and isinstance(error, ValueError)
+    assert list(pypi.fetch_many([])) == []
+
+
+def test_project_url_and_summary():
+    assert pypi.project_url("demo", base_url="http://stub/pypi/") == "http://stub/pypi/demo/json"
+    assert pypi.project_url("demo", "1.0", "http://stub/pypi") == "http://stub/pypi/demo/1.0/json"
+    summary = pypi.summarize({"info": {"name": "demo", "project_urls": None}})
+    assert summary["version"] == "Unknown"
+    assert summary["documentation"] == "No documentation available"
+    assert pypi.summarize({})["name"] == "Unknown"
@@ -0,0 +1,96 @@
+"""
+Tests of the environment registry: discovery, persistence and fleet-wide queries.
+"""
+import os
+import shutil
+
+import pytest
+
+import cli
+import registry
+from conftest import FakeEnvironment
+
+
+def make_venv(path):
+    """A FakeEnvironment that looks like a virtual environment to discovery and validation."""
+    env = FakeEnvironment(path)
+    scripts = os.path.join(env.path, "Scripts" if os.name == 'nt' else "bin")
+    os.makedirs(scripts, exist_ok=True)
+    open(os.path.join(scripts, "activate"), "w").close()
+    with open(os.path.join(env.path, "pyvenv.cfg"), "w") as config:
+        config.write("home = /usr/bin\n")
+    return env
+
+
+def test_register_and_unregister(tmp_path):
+    env = make_venv(tmp_path / "project" / ".venv")
+    assert not registry.register_environment(str(tmp_path / "project"))
+    assert registry.register_environment(env.path, "project")
+    assert registry.list_environments() == [env.path]
+    assert registry.load_registry()["environments"][env.path]["name"] == "project"
+
+    registry.unregister_environment(env.path)
+    registry.unregister_environment(env.path)  # Unknown paths are ignored
+    assert registry.list_environments() == []
+
+
+def test_a_corrupt_registry_starts_empty(tmp_path):
+    os.makedirs(os.path.dirname(registry.registry_path()), exist_ok=True)
+    with open(registry.registry_path(), "w") as registry_file:
+        registry_file.write("{not json")
+    assert registry.load_registry() == {"roots": [], "environments": {}}
+
+    env = make_venv(tmp_path / "env")
+    assert registry.register_environment(env.path)
+    assert registry.list_environments() == [env.path]
+    assert not os.path.exists(registry.registry_path() + ".tmp")
+
+
+def test_discover_finds_environments_below_the_roots(tmp_path):
+    root = tmp_path / "projects"
+    first = make_venv(root / "one" / ".venv")
+    second = make_venv(root / "two" / "env")
+    make_venv(root / "node_modules" / "env")  # Skipped directory
+    make_venv(root / "a" / "b" / "c" / "env")  # Deeper than MAX_DISCOVERY_DEPTH
+    make_venv(root / "one" / ".venv" / "nested")  # Inside an environment
+    (root / "broken").mkdir()
+    (root / "broken" / "pyvenv.cfg").write_text("")  # No activate script
+
+    registry.add_root(str(root))
+    registry.add_root(str(root))
+    assert registry.load_registry()["roots"] == [str(root)]
+    assert sorted(registry.discover()) == sorted([first.path, second.path])
+    assert registry.discover() == []  # Already registered
+
+    # Roots that can't be read are skipped; environments that disappeared are dropped
+    assert registry.discover([str(tmp_path / "missing")]) == []
+    shutil.rmtree(second.path)
+    registry.discover()
+    assert registry.list_environments() == [first.path]
+
+
+def test_find_package_across_environments(tmp_path):
+    old = make_venv(tmp_path / "old")
+    new = make_venv(tmp_path / "new")
+    bare = make_venv(tmp_path / "bare")
+    old.add("requests", "2.28.0")
+    new.add("Requests", "2.31.0")
+    for env in (old, new, bare):
+        registry.register_environment(env.path)
+
+    assert sorted(registry.scan_all()) == sorted([old.path, new.path, bare.path])
+    assert [(path, dist.version) for path, dist in registry.find_package("requests<2.31")] == [
+        (old.path, "2.28.0")]
+    assert [path for path, _ in registry.find_package("REQUESTS")] == sorted([old.path, new.path])
+    assert registry.find_package("requests", env_paths=[bare.path]) == []
+    assert registry.scan_all([]) == {}
+    with pytest.raises(ValueError):
+        registry.find_package("requests<<2")
+
+
+def test_cli_query_errors(capsys):
+    assert cli.main(["envs", "query"]) == 2
+    assert "exactly one requirement" in capsys.readouterr().err
+    assert cli.main(["envs", "query", "requests<<2"]) == 2
+    assert capsys.readouterr().err.startswith("Error: ")
+    assert cli.main(["envs", "add", "/no/such/env"]) == 1
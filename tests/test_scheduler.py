@@ -0,0 +1,102 @@
+"""
+Tests of the job scheduler's per-environment serialization and cancellation.
+"""
+import threading
+import time
+
+import pytest
+
+from scheduler import CANCELLED, DONE, FAILED, JobScheduler
+
+TIMEOUT = 5  # Seconds any test waits for a job
+
+
+@pytest.fixture
+def scheduler():
+    """A scheduler with enough workers to run unrelated jobs side by side."""
+    job_scheduler = JobScheduler(max_workers=4)
+    yield job_scheduler
+    job_scheduler.shutdown()
+
+
+def wait_for(jobs):
+    """Waits until every job has finished."""
+    deadline = time.monotonic() + TIMEOUT
+    while not all(job.finished for job in jobs):
+        assert time.monotonic() < deadline, "jobs didn't finish in time"
+        time.sleep(0.01)
+
+
+def test_mutating_jobs_on_one_environment_run_in_order(scheduler):
+    running = []
+    overlaps = []
+    order = []
+    lock = threading.Lock()
+
+    def work(job):
+        with lock:
+            if running:
+                overlaps.append((running[0], job.name))
+            running.append(job.name)
+        time.sleep(0.02)
+        with lock:
+            running.remove(job.name)
+            order.append(job.name)
+
+    jobs = [scheduler.submit(f"change {number}", work, env_key="env", mutating=True) for number in range(5)]
+    wait_for(jobs)
+    assert overlaps == []
+    assert order == [f"change {number}" for number in range(5)]
+    assert all(job.status == DONE for job in jobs)
+    assert not scheduler.is_busy("env")
+
+
+def test_other_environments_and_queries_run_in_parallel(scheduler):
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def blocking(job):
+        started.release()
+        assert release.wait(TIMEOUT)
+
+    jobs = [scheduler.submit("change a", blocking, env_key="a", mutating=True),
+            scheduler.submit("change b", blocking, env_key="b", mutating=True),
+            scheduler.submit("query a", blocking, env_key="a")]
+    # All three start although "change a" is still running
+    for _ in jobs:
+        assert started.acquire(timeout=TIMEOUT)
+    assert scheduler.is_busy("a") and scheduler.is_busy("b")
+    release.set()
+    wait_for(jobs)
+
+
+def test_cancel_queued_and_running_jobs(scheduler):
+    ran = []
+
+    def first(job):
+        assert job.cancel_event.wait(TIMEOUT)  # Stops once cancelled, like a pip subprocess would
+
+    def second(job):
+        ran.append(job.name)
+
+    running = scheduler.submit("running", first, env_key="env", mutating=True)
+    queued = scheduler.submit("queued", second, env_key="env", mutating=True)
+    after = scheduler.submit("after", second, env_key="env", mutating=True)
+    assert scheduler.cancel(queued.id)
+    assert scheduler.cancel(running.id)
+    wait_for([running, queued, after])
+
+    assert (running.status, queued.status, after.status) == (CANCELLED, CANCELLED, DONE)
+    assert ran == ["after"]
+    assert not scheduler.cancel(after.id)  # Already finished
+
+
+def test_failing_job_releases_its_environment(scheduler):
+    def fail(job):
+        raise RuntimeError("pip exploded")
+
+    failed = scheduler.submit("fail", fail, env_key="env", mutating=True)
+    following = scheduler.submit("follow", lambda job: "ok", env_key="env", mutating=True)
+    wait_for([failed, following])
+    assert failed.status == FAILED and str(failed.error) == "pip exploded"
+    assert (following.status, following.result) == (DONE, "ok")
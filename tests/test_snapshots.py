@@ -0,0 +1,117 @@
+"""
+Tests of pre-change snapshots and rollback against a fake environment.
+"""
+import os
+import sqlite3
+
+import pytest
+
+import inventory
+import pypi
+import pypi_cache
+import snapshots
+
+
+@pytest.fixture
+def demo_env(fake_env):
+    """A fake environment with demo 1.0, which depends on helper, and an unrelated package."""
+    fake_env.add("demo", "1.0", ["helper>=1"], {"demo/__init__.py": "version = 1\n"})
+    fake_env.add("helper", "1.0", files={"helper.py": "HELP = 1\n"})
+    fake_env.add("other", "3.0", files={"other.py": "OTHER = 3\n"})
+    return fake_env
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    """Fails any PyPI request; snapshots must work from the local caches only."""
+    def fetch_project(*args, **kwargs):
+        raise AssertionError("snapshots must not use the network")
+
+    monkeypatch.setattr(pypi, "fetch_project", fetch_project)
+
+
+def test_affected_distributions(demo_env):
+    assert snapshots.affected_distributions(demo_env.path, ["demo>=1"]) == {"demo", "helper"}
+    assert snapshots.affected_distributions(demo_env.path, ["demo"], with_dependencies=False) == {"demo"}
+    assert snapshots.affected_distributions(demo_env.path, ["./local", "not-installed"]) == set()
+
+
+def test_affected_distributions_of_new_packages_use_the_metadata_cache(demo_env, monkeypatch):
+    pypi_cache.put(pypi.PYPI_URL, pypi_cache.cache_key("newpkg"),
+                   {"info": {"requires_dist": ["helper>=1", "other; extra == 'full'"]}})
+    assert snapshots.affected_distributions(demo_env.path, ["newpkg"]) == {"helper"}
+    assert snapshots.affected_distributions(demo_env.path, ["newpkg[full]"]) == {"helper", "other"}
+
+    def broken_cache(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(pypi_cache, "get", broken_cache)
+    assert snapshots.affected_distributions(demo_env.path, ["newpkg", "demo"]) == {"demo", "helper"}
+
+
+def test_rollback_restores_an_upgrade(demo_env):
+    snapshot_id = snapshots.take(demo_env.path, ["demo"], "upgrade")
+
+    # What pip does for an upgrade that also pulls in a new dependency
+    demo_env.remove("demo")
+    demo_env.add("demo", "2.0", ["helper>=1", "newdep"], {"demo/__init__.py": "version = 2\n"})
+    demo_env.add("newdep", "0.1", files={"newdep/__init__.py": ""})
+
+    lines = []
+    restored, removed = snapshots.rollback(demo_env.path, snapshot_id, lines.append)
+    assert (restored, removed) == (["demo", "helper"], ["newdep"])
+
+    installed = inventory.get_inventory(demo_env.path)
+    assert {key: dist.version for key, dist in installed.items()} == {"demo": "1.0", "helper": "1.0", "other": "3.0"}
+    assert (demo_env.site_packages / "demo" / "__init__.py").read_text() == "version = 1\n"
+    assert not (demo_env.site_packages / "newdep").exists()
+    assert (demo_env.site_packages / "other.py").exists()
+
+
+def test_rollback_restores_an_uninstall(demo_env):
+    snapshot_id = snapshots.take(demo_env.path, ["demo"], "uninstall", with_dependencies=False)
+    demo_env.remove("demo")
+
+    assert snapshots.rollback(demo_env.path, snapshot_id) == (["demo"], [])
+    assert inventory.get_installed_version(demo_env.path, "demo") == "1.0"
+    # A snapshot can be used again, since rolling back links its files instead of moving them
+    demo_env.remove("demo")
+    assert snapshots.rollback(demo_env.path, snapshot_id) == (["demo"], [])
+
+
+def test_rollback_reports_what_it_did_not_save(demo_env):
+    snapshot_id = snapshots.take(demo_env.path, ["demo"], "uninstall", with_dependencies=False)
+    demo_env.remove("other")
+    lines = []
+    snapshots.rollback(demo_env.path, snapshot_id, lines.append)
+    assert "Not restored: other 3.0 was changed but not saved in the snapshot.\n" in lines
+
+
+def test_rollback_of_an_unknown_snapshot(demo_env):
+    with pytest.raises(ValueError):
+        snapshots.rollback(demo_env.path, "20000101-000000-000000000")
+
+
+def test_prune_keeps_the_newest_snapshots(demo_env, monkeypatch):
+    monkeypatch.setattr(snapshots, "MAX_SNAPSHOTS", 2)
+    leftover = os.path.join(snapshots.snapshots_dir(demo_env.path), "interrupted")
+    os.makedirs(leftover)
+
+    ids = [snapshots.take(demo_env.path, ["other"], f"change {number}") for number in range(3)]
+    listed = snapshots.list_snapshots(demo_env.path)
+    assert [snapshot.id for snapshot in listed] == ids[:0:-1]
+    assert [snapshot.label for snapshot in listed] == ["change 2", "change 1"]
+    assert listed[0].packages == ["other 3.0"]
+    assert not os.path.exists(leftover)
+
+
+def test_take_when_disabled(demo_env, monkeypatch):
+    monkeypatch.setattr(snapshots, "enabled", False)
+    assert snapshots.take(demo_env.path, ["demo"], "install") is None
+    assert snapshots.list_snapshots(demo_env.path) == []
+
+
+@pytest.mark.parametrize("value, keep", [("3", 3), ("abc", 5), ("0", 5), ("-2", 5), ("", 5)])
+def test_snapshot_keep_setting(monkeypatch, value, keep):
+    monkeypatch.setenv("PIPMATE_SNAPSHOT_KEEP", value)
+    assert snapshots._snapshot_keep() == keep
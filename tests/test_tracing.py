@@ -0,0 +1,127 @@
+"""
+Tests of span nesting, counters, summaries and trace export.
+"""
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import cli
+import tracing
+
+
+@pytest.fixture(autouse=True)
+def no_spans():
+    """Starts every test without finished spans."""
+    tracing.clear()
+    yield
+    tracing.clear()
+
+
+def by_name():
+    return {span.name: span for span in tracing.finished_spans()}
+
+
+def test_nested_spans_roll_up_counters():
+    with tracing.span("job", operation="install") as job:
+        with tracing.span("pip", category="subprocess") as pip:
+            pip.add("bytes_downloaded", 100)
+            tracing.add("bytes_downloaded", 50)
+            tracing.annotate(returncode=0)
+        assert tracing.current_span() is job
+    assert tracing.current_span() is None
+
+    spans = by_name()
+    assert spans["pip"].parent is spans["job"]
+    assert spans["pip"].attrs == {"bytes_downloaded": 150, "returncode": 0}
+    assert spans["job"].attrs == {"operation": "install", "bytes_downloaded": 150}
+    assert spans["job"].duration >= spans["pip"].duration
+
+
+def test_errors_are_recorded_and_reraised():
+    with pytest.raises(KeyError):
+        with tracing.span("outer"):
+            with tracing.span("inner"):
+                raise KeyError("missing")
+    spans = by_name()
+    assert spans["inner"].attrs["error"] == "KeyError"
+    assert spans["outer"].attrs["error"] == "KeyError"
+    assert tracing.current_span() is None
+
+
+def test_without_a_span_counters_are_dropped():
+    tracing.add("bytes_downloaded", 10)
+    tracing.annotate(ignored=True)
+    assert tracing.finished_spans() == []
+
+
+def test_bound_functions_run_under_the_callers_span():
+    with tracing.span("fetch all") as parent:
+        def fetch(name):
+            with tracing.span("fetch", package=name) as child:
+                child.add("bytes_downloaded", 1)
+            return tracing.current_span()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            inner = list(executor.map(tracing.bind(fetch), ["a", "b", "c"]))
+            # The pool thread gets its own stack back once the bound call returns
+            assert executor.submit(tracing.current_span).result() is None
+    assert inner == [parent] * 3
+    assert parent.attrs["bytes_downloaded"] == 3
+    assert {span.thread_name for span in tracing.finished_spans() if span.name == "fetch"} != {"MainThread"}
+
+
+def test_finished_spans_are_bounded(monkeypatch):
+    monkeypatch.setattr(tracing, "_finished", deque(maxlen=3))
+    for index in range(5):
+        with tracing.span(f"span {index}"):
+            pass
+    assert [span.name for span in tracing.finished_spans()] == ["span 2", "span 3", "span 4"]
+
+
+@pytest.mark.parametrize("line, size", [
+    ("Downloading https://files/six-1.16.0-py2.py3-none-any.whl (11 kB)\n", 11000),
+    ("  Downloading numpy.whl (18.2 MB)\n", 18200000),
+    ("Downloading tiny.tar.gz (512 bytes)\n", 512),
+    ("Collecting requests\n", 0),
+    ("Downloading something (unknown size)\n", 0),
+])
+def test_pip_download_bytes(line, size):
+    assert tracing.pip_download_bytes(line) == size
+
+
+def test_summary_groups_by_operation():
+    for index in range(20):
+        tracing.record("job", "job", 0.0, index + 1.0, operation="install", cpu_user=0.5, cpu_system=0.25)
+    tracing.record("job", "job", 0.0, 0.5, operation="uninstall")
+    rows = {row["name"]: row for row in tracing.summary()}
+    assert rows["install"]["count"] == 20
+    assert rows["install"]["p50"] == 10.0 and rows["install"]["p95"] == 19.0 and rows["install"]["max"] == 20.0
+    assert rows["install"]["cpu"] == 15.0
+    assert rows["uninstall"]["mean"] == 0.5
+    assert [row["name"] for row in tracing.summary()] == ["install", "uninstall"]
+    assert tracing.summary([]) == []
+
+
+def test_export_json_and_chrome_trace(tmp_path):
+    with tracing.span("job", operation="install"):
+        with tracing.span("pip", category="subprocess"):
+            pass
+    tracing.export_json(tmp_path / "trace.json")
+    spans = json.loads((tmp_path / "trace.json").read_text())
+    assert [(span["name"], span["parent"] is None) for span in spans] == [("pip", False), ("job", True)]
+
+    tracing.export_chrome_trace(tmp_path / "trace.chrome.json")
+    events = json.loads((tmp_path / "trace.chrome.json").read_text())["traceEvents"]
+    complete = [event for event in events if event["ph"] == "X"]
+    assert [event["name"] for event in complete] == ["pip", "job"]
+    assert all(event["dur"] >= 0 for event in complete)
+    assert [event["args"]["name"] for event in events if event["ph"] == "M"] == ["MainThread"]
+
+
+def test_cli_writes_the_trace_when_the_command_fails(tmp_path):
+    path = tmp_path / "trace.json"
+    assert cli.main(["--trace", str(path), "--trace-format", "chrome", "install"]) == 2
+    events = json.loads(path.read_text())["traceEvents"]
+    assert [event["name"] for event in events if event["ph"] == "X"] == ["install"]
@@ -0,0 +1,97 @@
+"""
+Tests of template cloning, environment path rewriting and the shared pip.
+"""
+import errno
+import os
+import subprocess
+import sys
+
+import pytest
+
+import venv_templates
+
+
+@pytest.fixture
+def template(tmp_path):
+    """A fake template environment: a library file, a script and pyvenv.cfg embedding its path."""
+    path = tmp_path / "template"
+    site_packages = path / "lib" / "site-packages"
+    site_packages.mkdir(parents=True)
+    (site_packages / "module.py").write_text("VALUE = 1\n")
+    (path / "bin").mkdir()
+    (path / "bin" / "activate").write_text(f'VIRTUAL_ENV="{path}"\n')
+    (path / "bin" / "tool").write_text(f"#!{path}/bin/python\n")
+    (path / "bin" / "tool").chmod(0o755)
+    (path / "pyvenv.cfg").write_text(f"home = /usr/bin\ncommand = python -m venv {path}\n")
+    (path / venv_templates.TEMPLATE_MARKER).write_text(sys.executable + "\n")
+    if os.name != 'nt':
+        (path / "lib64").symlink_to("lib")
+    return path
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="template cloning is not used on Windows")
+def test_clone_links_files_and_rewrites_the_env_path(template, tmp_path):
+    env_path = tmp_path / "env"
+    assert venv_templates.clone_template(str(template), str(env_path)) == 1
+
+    module = env_path / "lib" / "site-packages" / "module.py"
+    assert os.path.samefile(module, template / "lib" / "site-packages" / "module.py")
+    assert os.readlink(env_path / "lib64") == "lib"
+    assert not (env_path / venv_templates.TEMPLATE_MARKER).exists()
+
+    assert (env_path / "bin" / "activate").read_text() == f'VIRTUAL_ENV="{env_path}"\n'
+    assert (env_path / "bin" / "tool").read_text() == f"#!{env_path}/bin/python\n"
+    assert os.access(env_path / "bin" / "tool", os.X_OK)
+    assert str(env_path) in (env_path / "pyvenv.cfg").read_text()
+    # The template keeps its own path
+    assert (template / "bin" / "activate").read_text() == f'VIRTUAL_ENV="{template}"\n'
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="template cloning is not used on Windows")
+def test_clone_copies_where_hardlinks_are_not_supported(template, tmp_path, monkeypatch):
+    def link(source, target):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", link)
+    env_path = tmp_path / "env"
+    assert venv_templates.clone_template(str(template), str(env_path)) == 0
+    module = env_path / "lib" / "site-packages" / "module.py"
+    assert module.read_text() == "VALUE = 1\n"
+    assert not os.path.samefile(module, template / "lib" / "site-packages" / "module.py")
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="template cloning is not used on Windows")
+def test_clone_reports_other_link_errors(template, tmp_path):
+    env_path = tmp_path / "env"
+    (env_path / "lib" / "site-packages").mkdir(parents=True)
+    (env_path / "lib" / "site-packages" / "module.py").write_text("in the way\n")
+    with pytest.raises(FileExistsError):
+        venv_templates.clone_template(str(template), str(env_path))
+
+
+def test_plain_venv_is_the_default(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(venv_templates.process, "check_stream_command",
+                        lambda command, on_line: commands.append(command))
+    venv_templates.create_environment(str(tmp_path / "env"))
+    assert commands == [[sys.executable, "-m", "venv", str(tmp_path / "env")]]
+    assert not os.path.exists(venv_templates.templates_dir())
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="template cloning is not used on Windows")
+def test_template_and_shared_pip_environments_work(tmp_path):
+    lines = []
+    cloned = tmp_path / "cloned"
+    venv_templates.create_environment(str(cloned), venv_templates.MODE_TEMPLATE, on_line=lines.append)
+    assert any("Cloned template environment" in line for line in lines)
+    prefix = subprocess.check_output([str(cloned / "bin" / "python"), "-c", "import sys; print(sys.prefix)"],
+                                     text=True).strip()
+    assert prefix == str(cloned)
+    output = subprocess.check_output([str(cloned / "bin" / "pip"), "--version"], text=True)
+    assert str(cloned) in output
+
+    shared = tmp_path / "shared"
+    venv_templates.create_environment(str(shared), venv_templates.MODE_WITHOUT_PIP, on_line=lines.append)
+    output = subprocess.check_output([str(shared / "bin" / "pip"), "--version"], text=True)
+    assert venv_templates.shared_pip_dir() in output
+    assert not list((shared / "lib").glob("python*/site-packages/pip"))
@@ -0,0 +1,170 @@
+"""
+Tests of pip cache indexing, LRU pruning, pins and the wheelhouse.
+"""
+import io
+import os
+import zipfile
+
+import pytest
+
+import wheel_cache
+
+
+@pytest.fixture
+def pip_cache(tmp_path, monkeypatch):
+    """An empty pip cache directory, used through PIP_CACHE_DIR, with a fresh cache index."""
+    cache_dir = tmp_path / "pip-cache"
+    cache_dir.mkdir()
+    monkeypatch.setenv("PIP_CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(wheel_cache, "_index", None)
+    return cache_dir
+
+
+def wheel_bytes(name, version):
+    """Returns a minimal wheel holding only its METADATA."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr(f"{name}-{version}.dist-info/METADATA", f"Name: {name}\nVersion: {version}\n\n")
+    return buffer.getvalue()
+
+
+def add_wheel(cache_dir, name, version, size, last_used):
+    """Adds a locally built wheel of about size bytes, last used at the given timestamp."""
+    directory = cache_dir / "wheels" / "ab" / "cd"
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}-{version}-py3-none-any.whl"
+    path.write_bytes(b"\0" * size)
+    os.utime(path, (last_used, last_used))
+    return str(path)
+
+
+def add_download(cache_dir, name, version, last_used):
+    """Adds an http-v2 cached download of a wheel: a hashed .body file with its headers file."""
+    directory = cache_dir / "http-v2" / "1" / "2"
+    directory.mkdir(parents=True, exist_ok=True)
+    body = directory / f"{name}{version}hash.body"
+    # pip writes a serialization header in front of the body, which zipfile tolerates
+    body.write_bytes(b"cc=4,headers" + wheel_bytes(name, version))
+    (directory / f"{name}{version}hash").write_bytes(b"headers")
+    os.utime(body, (last_used, last_used))
+    return str(body)
+
+
+def test_scan_cache_identifies_wheels_and_downloads(pip_cache):
+    add_wheel(pip_cache, "Demo_Pkg", "1.0", 100, 1000)
+    add_download(pip_cache, "requests", "2.31.0", 2000)
+    (pip_cache / "wheels" / "ab" / "cd" / "origin.json").write_text("{}")
+
+    entries = sorted(wheel_cache.scan_cache(), key=lambda entry: entry.last_used)
+    assert [(entry.kind, entry.project, entry.version) for entry in entries] == [
+        (wheel_cache.KIND_WHEEL, "demo-pkg", "1.0"), (wheel_cache.KIND_HTTP, "requests", "2.31.0")]
+    assert os.path.exists(wheel_cache.index_path())
+
+
+def test_scan_cache_reuses_the_index(pip_cache, monkeypatch):
+    add_download(pip_cache, "requests", "2.31.0", 2000)
+    wheel_cache.scan_cache()
+
+    def identify(path):
+        raise AssertionError("unchanged files must not be opened again")
+
+    monkeypatch.setattr(wheel_cache, "_identify_download", identify)
+    assert [entry.project for entry in wheel_cache.scan_cache()] == ["requests"]
+
+
+def test_prune_removes_least_recently_used_first(pip_cache):
+    oldest = add_wheel(pip_cache, "old", "1.0", 400, 1000)
+    middle = add_download(pip_cache, "middle", "1.0", 2000)
+    newest = add_wheel(pip_cache, "new", "1.0", 400, 3000)
+    middle_size = os.path.getsize(middle)
+
+    assert [entry.path for entry in wheel_cache.prune(500, dry_run=True)] == [oldest, middle]
+    assert os.path.exists(oldest)
+
+    removed = wheel_cache.prune(400 + middle_size)
+    assert [entry.path for entry in removed] == [oldest]
+    assert not os.path.exists(oldest) and os.path.exists(middle) and os.path.exists(newest)
+
+    removed = wheel_cache.prune(400)
+    assert [entry.path for entry in removed] == [middle]
+    assert not os.path.exists(middle[:-len(".body")])  # The headers go with the body
+
+
+def test_prune_keeps_pinned_projects(pip_cache):
+    pinned = add_wheel(pip_cache, "keep", "1.0", 400, 1000)
+    pinned_version = add_wheel(pip_cache, "versioned", "2.0", 400, 1500)
+    other_version = add_wheel(pip_cache, "versioned", "1.0", 400, 1600)
+    unpinned = add_wheel(pip_cache, "drop", "1.0", 400, 2000)
+    wheel_cache.pin("Keep")
+    wheel_cache.pin("versioned", "2.0")
+    assert wheel_cache.load_pins() == {"keep", "versioned==2.0"}
+
+    removed = wheel_cache.prune(0)
+    assert sorted(entry.path for entry in removed) == sorted([other_version, unpinned])
+    assert os.path.exists(pinned) and os.path.exists(pinned_version)
+
+    wheel_cache.unpin("keep")
+    assert [entry.path for entry in wheel_cache.prune(0)] == [pinned]
+
+
+def test_prune_skips_files_it_cannot_remove(pip_cache, monkeypatch):
+    add_wheel(pip_cache, "locked", "1.0", 400, 1000)
+    add_wheel(pip_cache, "free", "1.0", 400, 2000)
+    remove = os.remove
+
+    def remove_unless_locked(path):
+        if "locked" in os.path.basename(path):
+            raise PermissionError(path)
+        remove(path)
+
+    monkeypatch.setattr(wheel_cache.os, "remove", remove_unless_locked)
+    assert [entry.project for entry in wheel_cache.prune(0)] == ["free"]
+
+
+def test_wheelhouse(tmp_path, monkeypatch):
+    wheelhouse = tmp_path / "wheelhouse"
+    monkeypatch.setenv("PIPMATE_WHEELHOUSE", str(wheelhouse))
+    assert wheel_cache.wheelhouse_dir() == str(wheelhouse) and wheelhouse.is_dir()
+    (wheelhouse / "demo_pkg-1.0-py3-none-any.whl").write_bytes(b"wheel")
+    (wheelhouse / "legacy-0.1.tar.gz").write_bytes(b"sdist")
+    (wheelhouse / "subdir").mkdir()
+
+    entries = sorted(wheel_cache.scan_wheelhouse(), key=lambda entry: entry.project)
+    assert [(entry.project, entry.version, entry.size) for entry in entries] == [
+        ("demo-pkg", "1.0", 5), ("legacy", "0.1", 5)]
+    assert wheel_cache.usage_by_project(entries)[0][2] == 5
+
+    monkeypatch.setattr(wheel_cache, "offline_install", False)
+    assert wheel_cache.install_options() == []
+    monkeypatch.setattr(wheel_cache, "offline_install", True)
+    assert wheel_cache.install_options() == ["--no-index", "--find-links", str(wheelhouse)]
+
+
+def test_prewarm_downloads_into_the_wheelhouse(tmp_path, monkeypatch):
+    monkeypatch.setenv("PIPMATE_WHEELHOUSE", str(tmp_path / "wheelhouse"))
+    commands = []
+    monkeypatch.setattr(wheel_cache.process, "check_stream_command",
+                        lambda command, on_line, cancel_event=None: commands.append(command))
+    wheel_cache.prewarm(["requests"], "pip", print, ["requirements.txt"])
+    assert commands == [["pip", "download", "--prefer-binary", "--dest", str(tmp_path / "wheelhouse"),
+                         "-r", "requirements.txt", "requests"]]
+
+
+@pytest.mark.parametrize("filename, expected", [
+    ("Demo_Pkg-1.0-py3-none-any.whl", ("demo-pkg", "1.0")),
+    ("demo-pkg-1.0.tar.gz", ("demo-pkg", "1.0")),
+    ("broken.whl", (None, None)),
+    ("notes.txt", (None, None)),
+])
+def test_parse_wheel_filename(filename, expected):
+    assert wheel_cache.parse_wheel_filename(filename) == expected
+
+
+@pytest.mark.parametrize("value, size", [
+    ("1073741824", 1073741824), ("500M", 500 * 1024 ** 2), ("2G", 2 * 1024 ** 3), ("1.5 GiB", 3 * 1024 ** 3 // 2),
+    ("10kb", 10240), ("", wheel_cache.DEFAULT_MAX_CACHE_BYTES), ("2X", wheel_cache.DEFAULT_MAX_CACHE_BYTES),
+    ("-1", wheel_cache.DEFAULT_MAX_CACHE_BYTES),
+])
+def test_max_cache_bytes_setting(monkeypatch, value, size):
+    monkeypatch.setenv("PIPMATE_WHEEL_CACHE_MAX", value)
+    assert wheel_cache._max_cache_bytes() == size
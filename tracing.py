@@ -0,0 +1,258 @@
+"""
+Span based timing instrumentation of PIP-MATE operations.
+
+Operations open nested spans (job -> pre-check -> pip subprocess, PyPI fetches, ...) that record
+their wall time plus counters such as subprocess CPU time and bytes downloaded; counters roll
+up into the enclosing spans. Finished spans are kept in a bounded buffer, summarized for the
+metrics panel and exported as JSON or in the Chrome trace event format (chrome://tracing,
+Perfetto).
+"""
+import itertools
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+MAX_SPANS = 10000  # Finished spans kept in memory; the oldest are dropped first
+
+_finished = deque(maxlen=MAX_SPANS)
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_local = threading.local()
+_epoch = time.perf_counter()  # Trace timestamps are relative to the start of the program
+
+# pip prints e.g. "Downloading https://.../six-1.16.0-py2.py3-none-any.whl (11 kB)"
+_pip_download_re = re.compile(r"^\s*Downloading \S+ \(([\d.]+) (bytes|kB|MB|GB)\)")
+_size_units = {"bytes": 1, "kB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3}
+
+
+class Span:
+    """A timed region of an operation with its attributes and counters."""
+
+    def __init__(self, name, category, parent, attrs):
+        self.id = next(_ids)
+        self.name = name
+        self.category = category
+        self.parent = parent
+        self.attrs = dict(attrs)
+        self.thread_name = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration(self):
+        """Returns the wall time of the span in seconds (so far, if it is still open)."""
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attrs):
+        """Sets attributes of this span."""
+        with _lock:
+            self.attrs.update(attrs)
+
+    def add(self, key, amount):
+        """Adds to a counter of this span and of every span enclosing it."""
+        with _lock:
+            span = self
+            while span is not None:
+                span.attrs[key] = span.attrs.get(key, 0) + amount
+                span = span.parent
+
+    def to_dict(self):
+        """Returns the span as a JSON serializable dict."""
+        with _lock:
+            attrs = dict(self.attrs)
+        return {
+            "id": self.id,
+            "parent": self.parent.id if self.parent else None,
+            "name": self.name,
+            "category": self.category,
+            "thread": self.thread_name,
+            "start": self.start - _epoch,
+            "duration": self.duration,
+            "attrs": attrs,
+        }
+
+
+def _stack():
+    """Returns the stack of open spans of the current thread."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current_span():
+    """Returns the innermost open span of the current thread, or None."""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def span(name, category="operation", **attrs):
+    """
+    Times the enclosed block as a span nested in the current one.
+
+    Yields the Span so the block can set attributes and counters on it. Exceptions are
+    recorded in the 'error' attribute and re-raised.
+    """
+    stack = _stack()
+    current = Span(name, category, stack[-1] if stack else None, attrs)
+    stack.append(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.end = time.perf_counter()
+        stack.pop()
+        with _lock:
+            _finished.append(current)
+
+
+def record(name, category, start, end, **attrs):
+    """
+    Adds an already finished span, timed with time.perf_counter().
+
+    Used for frequent work that is only worth recording when it was slow.
+    """
+    finished = Span(name, category, current_span(), attrs)
+    finished.start, finished.end = start, end
+    with _lock:
+        _finished.append(finished)
+
+
+def bind(func):
+    """
+    Returns a wrapper of func that runs it inside the span open at the time bind() was called.
+
+    Used for work handed to other threads (thread pools), which don't share the span stack.
+    """
+    parent = current_span()
+
+    def run_in_parent(*args, **kwargs):
+        """Runs func with the captured span as the root of this thread's span stack."""
+        stack = _stack()
+        saved = list(stack)
+        stack[:] = [parent] if parent is not None else []
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stack[:] = saved
+
+    return run_in_parent
+
+
+def add(key, amount):
+    """Adds to a counter of the current span (and its parents), if there is one."""
+    current = current_span()
+    if current is not None:
+        current.add(key, amount)
+
+
+def annotate(**attrs):
+    """Sets attributes of the current span, if there is one."""
+    current = current_span()
+    if current is not None:
+        current.set(**attrs)
+
+
+def pip_download_bytes(line):
+    """Returns the size of the download announced by a line of pip output, or 0."""
+    match = _pip_download_re.match(line)
+    if not match:
+        return 0
+    return int(float(match.group(1)) * _size_units[match.group(2)])
+
+
+def finished_spans():
+    """Returns the finished spans, oldest first."""
+    with _lock:
+        return list(_finished)
+
+
+def clear():
+    """Drops every finished span."""
+    with _lock:
+        _finished.clear()
+
+
+def _percentile(sorted_values, fraction):
+    """Returns the nearest-rank percentile of an ascending list."""
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summary(spans=None):
+    """
+    Aggregates finished spans by category and operation.
+
+    Returns a list of dicts with 'category', 'name', 'count', 'total', 'mean', 'p50', 'p95',
+    'max' (seconds) and the summed 'cpu' seconds and 'bytes_downloaded', slowest total first.
+    Spans are grouped by their 'operation' attribute when they have one, else by name.
+    """
+    groups = {}
+    for finished in finished_spans() if spans is None else spans:
+        key = (finished.category, finished.attrs.get("operation", finished.name))
+        groups.setdefault(key, []).append(finished)
+
+    rows = []
+    for (category, name), members in groups.items():
+        durations = sorted(member.duration for member in members)
+        rows.append({
+            "category": category,
+            "name": name,
+            "count": len(members),
+            "total": sum(durations),
+            "mean": sum(durations) / len(durations),
+            "p50": _percentile(durations, 0.5),
+            "p95": _percentile(durations, 0.95),
+            "max": durations[-1],
+            "cpu": sum(member.attrs.get("cpu_user", 0) + member.attrs.get("cpu_system", 0) for member in members),
+            "bytes_downloaded": sum(member.attrs.get("bytes_downloaded", 0) for member in members),
+        })
+    return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+
+def export_json(path, spans=None):
+    """Writes the finished spans to path as a JSON list."""
+    spans = finished_spans() if spans is None else spans
+    with open(path, "w", encoding="utf-8") as trace_file:
+        json.dump([finished.to_dict() for finished in spans], trace_file, indent=1)
+
+
+def export_chrome_trace(path, spans=None):
+    """
+    Writes the finished spans to path in the Chrome trace event format.
+
+    Each span becomes a complete ('X') event on the row of the thread it ran on; open the
+    file in chrome://tracing or https://ui.perfetto.dev.
+    """
+    spans = finished_spans() if spans is None else spans
+    thread_ids = {}
+    events = []
+    for finished in spans:
+        tid = thread_ids.setdefault(finished.thread_name, len(thread_ids) + 1)
+        event = finished.to_dict()
+        events.append({
+            "name": finished.name,
+            "cat": finished.category,
+            "ph": "X",
+            "ts": event["start"] * 1e6,
+            "dur": event["duration"] * 1e6,
+            "pid": os.getpid(),
+            "tid": tid,
+            "args": event["attrs"],
+        })
+    events.extend(
+        {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": thread_name}}
+        for thread_name, tid in thread_ids.items()
+    )
+    with open(path, "w", encoding="utf-8") as trace_file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
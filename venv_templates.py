@@ -0,0 +1,270 @@
+"""
+Fast virtual environment creation from cached template environments.
+
+A template environment is prepared once per interpreter (with pip and any base packages) and
+new environments are cloned from it with hardlinks, rewriting only the few files that embed
+the environment path. A --without-pip mode points new environments at a shared copy of pip.
+"""
+import errno
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+import pip_worker
+import process
+import tracing
+from paths import user_cache_dir
+
+
+# Creation modes
+MODE_TEMPLATE = "template"  # Hardlink clone of a prepared template environment
+MODE_WITHOUT_PIP = "without-pip"  # `venv --without-pip` plus a .pth pointing at a shared pip
+MODE_VENV = "venv"  # Plain `python -m venv`
+
+TEMPLATE_MARKER = ".pipmate-template"  # Written last, so half-built templates are never used
+SHARED_PIP_PTH = "_pipmate_shared_pip.pth"
+MAX_REWRITE_SIZE = 1024 * 1024  # Larger files in bin/ are never scripts that embed the path
+# Errors of os.link() meaning the filesystem can't hardlink there, so the files are copied instead
+_NO_HARDLINK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK}
+
+_template_lock = threading.Lock()
+
+
+def interpreter_key(python=None):
+    """
+    Returns a short key identifying an interpreter build.
+
+    The key changes when the interpreter is replaced or upgraded, which invalidates its template.
+    """
+    python = os.path.realpath(python or sys.executable)
+    stat = os.stat(python)
+    digest = hashlib.sha256(f"{python}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+def templates_dir():
+    """Returns the directory holding the template environments."""
+    return os.path.join(user_cache_dir(), "venv-templates")
+
+
+def template_path(python=None, base_packages=()):
+    """Returns the path of the template for an interpreter and a set of base packages."""
+    key = interpreter_key(python)
+    if base_packages:
+        packages = "\n".join(sorted(base_packages))
+        key += "-" + hashlib.sha256(packages.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(templates_dir(), key)
+
+
+def _site_packages(env_path):
+    """Returns the site-packages directory of a freshly created environment."""
+    if os.name == 'nt':
+        return os.path.join(env_path, "Lib", "site-packages")
+    version = f"python{sys.version_info.major}.{sys.version_info.minor}"
+    return os.path.join(env_path, "lib", version, "site-packages")
+
+
+def _scripts_dir(env_path):
+    """Returns the directory holding the scripts (activate, pip, ...) of an environment."""
+    return os.path.join(env_path, "Scripts" if os.name == 'nt' else "bin")
+
+
+def ensure_template(python=None, base_packages=(), on_line=None):
+    """
+    Returns the path of the template environment, building it first if needed.
+
+    The template is built in a temporary directory and renamed into place once complete,
+    so an interrupted build never leaves a broken template behind.
+    """
+    python = python or sys.executable
+    on_line = on_line or (lambda line: None)
+    path = template_path(python, base_packages)
+
+    with _template_lock:
+        if os.path.exists(os.path.join(path, TEMPLATE_MARKER)):
+            return path
+
+        os.makedirs(templates_dir(), exist_ok=True)
+        shutil.rmtree(path, ignore_errors=True)  # Leftover of an interrupted build
+        build_path = tempfile.mkdtemp(prefix=".build-", dir=templates_dir())
+
+        try:
+            on_line("Preparing template environment (only needed once per interpreter)...\n")
+            process.check_stream_command([python, "-m", "venv", build_path], on_line)
+            if base_packages:
+                pip = os.path.join(_scripts_dir(build_path), "pip.exe" if os.name == 'nt' else "pip")
+                process.check_stream_command([pip, "install"] + list(base_packages), on_line)
+                pip_worker.release(pip)  # Its interpreter must not keep running from the build directory
+
+            # Scripts and pyvenv.cfg embed the build path, so build in place and rename afterwards
+            _rewrite_env_path(build_path, build_path, path)
+            os.rename(build_path, path)
+        except (OSError, subprocess.CalledProcessError):
+            shutil.rmtree(build_path, ignore_errors=True)
+            raise
+
+        with open(os.path.join(path, TEMPLATE_MARKER), "w", encoding="utf-8") as marker:
+            marker.write(os.path.realpath(python) + "\n")
+        return path
+
+
+def _needs_rewrite(relative_path):
+    """Checks whether a file of an environment may embed the absolute environment path."""
+    parts = relative_path.split(os.sep)
+    return relative_path == "pyvenv.cfg" or parts[0] in ("bin", "Scripts")
+
+
+def _rewrite_env_path(env_path, old_path, new_path):
+    """Replaces old_path with new_path in pyvenv.cfg and the scripts of an environment."""
+    old_bytes = os.fsencode(old_path)
+    new_bytes = os.fsencode(new_path)
+
+    candidates = [os.path.join(env_path, "pyvenv.cfg")]
+    scripts_dir = _scripts_dir(env_path)
+    if os.path.isdir(scripts_dir):
+        candidates.extend(os.path.join(scripts_dir, name) for name in os.listdir(scripts_dir))
+
+    for path in candidates:
+        if os.path.islink(path) or not os.path.isfile(path) or os.path.getsize(path) > MAX_REWRITE_SIZE:
+            continue
+        with open(path, "rb") as source:
+            content = source.read()
+        if old_bytes not in content:
+            continue
+
+        # Write a new file instead of modifying it in place, in case it is hardlinked elsewhere
+        stat = os.stat(path)
+        temporary_path = path + ".pipmate-tmp"
+        with open(temporary_path, "wb") as target:
+            target.write(content.replace(old_bytes, new_bytes))
+        os.chmod(temporary_path, stat.st_mode)
+        os.replace(temporary_path, path)
+
+
+def clone_template(template, env_path):
+    """
+    Clones a template environment to env_path.
+
+    Regular files are hardlinked (falling back to copies across filesystems), symlinks are
+    recreated as is, and the files embedding the environment path are rewritten.
+    Returns the number of files that could be hardlinked.
+    """
+    env_path = os.path.abspath(env_path)
+    linked = 0
+    can_link = True
+
+    for directory, dirnames, filenames in os.walk(template):
+        relative_dir = os.path.relpath(directory, template)
+        target_dir = env_path if relative_dir == "." else os.path.join(env_path, relative_dir)
+        os.makedirs(target_dir, exist_ok=True)
+
+        for name in dirnames + filenames:
+            source = os.path.join(directory, name)
+            target = os.path.join(target_dir, name)
+            relative_path = os.path.normpath(os.path.join(relative_dir, name))
+
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), target)
+                if name in dirnames:
+                    dirnames.remove(name)  # Don't descend into symlinked directories (lib64)
+                continue
+            if name in dirnames or relative_path == TEMPLATE_MARKER:
+                continue
+
+            if can_link and not _needs_rewrite(relative_path):
+                try:
+                    os.link(source, target)
+                    linked += 1
+                    continue
+                except OSError as e:
+                    if e.errno not in _NO_HARDLINK_ERRNOS:
+                        raise
+                    # Different filesystem or no hardlink support; a full link count only affects this file
+                    can_link = e.errno == errno.EMLINK
+            shutil.copy2(source, target)
+
+    _rewrite_env_path(env_path, template, env_path)
+    return linked
+
+
+def shared_pip_dir(python=None, on_line=None):
+    """
+    Returns a directory holding a copy of pip shared by environments created without pip.
+
+    The copy is taken from the interpreter's template environment.
+    """
+    path = os.path.join(user_cache_dir(), "shared-pip", interpreter_key(python))
+    if os.path.isdir(path):
+        return path
+
+    template_site_packages = _site_packages(ensure_template(python, on_line=on_line))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    build_path = tempfile.mkdtemp(prefix=".build-", dir=os.path.dirname(path))
+
+    for name in os.listdir(template_site_packages):
+        if name == "pip" or (name.startswith("pip-") and name.endswith(".dist-info")):
+            shutil.copytree(os.path.join(template_site_packages, name), os.path.join(build_path, name))
+    try:
+        os.rename(build_path, path)
+    except OSError:
+        shutil.rmtree(build_path, ignore_errors=True)  # Another thread finished first
+    return path
+
+
+def create_without_pip(env_path, python=None, on_line=None):
+    """
+    Creates an environment with `venv --without-pip` and points it at the shared copy of pip.
+
+    A .pth file adds the shared pip to sys.path and a small `pip` script is written to bin/.
+    """
+    python = python or sys.executable
+    env_path = os.path.abspath(env_path)
+    pip_dir = shared_pip_dir(python, on_line)
+
+    process.check_stream_command([python, "-m", "venv", "--without-pip", env_path], on_line or (lambda line: None))
+
+    with open(os.path.join(_site_packages(env_path), SHARED_PIP_PTH), "w", encoding="utf-8") as pth_file:
+        pth_file.write(pip_dir + "\n")
+
+    if os.name != 'nt':
+        pip_script = os.path.join(_scripts_dir(env_path), "pip")
+        with open(pip_script, "w", encoding="utf-8") as script:
+            script.write(
+                f"#!{os.path.join(_scripts_dir(env_path), 'python')}\n"
+                "import sys\n"
+                "from pip._internal.cli.main import main\n"
+                "sys.exit(main())\n"
+            )
+        os.chmod(pip_script, 0o755)
+
+
+def create_environment(env_path, mode=MODE_VENV, python=None, base_packages=(), on_line=None):
+    """
+    Creates a virtual environment at env_path using the requested mode.
+
+    A plain `python -m venv` is the default; template cloning and the shared pip are opt-in.
+    Template cloning relies on symlinked interpreters and shebang scripts, so on Windows
+    it falls back to a plain `python -m venv`.
+    """
+    python = python or sys.executable
+    on_line = on_line or (lambda line: None)
+
+    if mode == MODE_TEMPLATE and os.name != 'nt':
+        with tracing.span("prepare template", category="io"):
+            template = ensure_template(python, base_packages, on_line)
+        with tracing.span("clone template", category="io") as span:
+            linked = clone_template(template, env_path)
+            span.set(hardlinked=linked)
+        on_line(f"Cloned template environment ({linked} files hardlinked).\n")
+    elif mode == MODE_WITHOUT_PIP:
+        create_without_pip(env_path, python, on_line)
+        on_line("Created environment using the shared pip.\n")
+    else:
+        process.check_stream_command([python, "-m", "venv", env_path], on_line)
+        if base_packages:
+            pip = os.path.join(_scripts_dir(env_path), "pip.exe" if os.name == 'nt' else "pip")
+            process.check_stream_command([pip, "install"] + list(base_packages), on_line)
@@ -0,0 +1,333 @@
+"""
+Index, pruning and offline mirror support for pip's download and wheel caches.
+
+pip's HTTP cache and locally built wheels are indexed by project, version and size so the cache
+can be pruned to a size cap in least-recently-used order instead of being purged completely.
+Pinned projects are never pruned. A separate wheelhouse can be pre-warmed with `pip download`
+and used for installs with `--no-index --find-links`, so they only read from local disk.
+"""
+import io
+import json
+import os
+import re
+import sys
+import threading
+import zipfile
+from collections import namedtuple
+
+import process
+from inventory import normalize_name, parse_metadata_headers
+from paths import user_cache_dir, user_config_dir
+
+
+# Kinds of cache entries
+KIND_WHEEL = "wheel"  # Wheel built locally by pip (<cache>/wheels)
+KIND_HTTP = "http"  # Cached download (<cache>/http and <cache>/http-v2)
+
+DEFAULT_MAX_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+_size_re = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$", re.IGNORECASE)
+
+
+def parse_size(text):
+    """
+    Parses a size such as '1073741824', '500M', '2G' or '1.5 GiB' into bytes.
+
+    Units are binary (K is 1024 bytes). Raises ValueError if text isn't a size.
+    """
+    match = _size_re.match(text)
+    if not match:
+        raise ValueError(f"not a size: {text!r}")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.lower()])
+
+
+def _max_cache_bytes():
+    """Returns PIPMATE_WHEEL_CACHE_MAX in bytes, or DEFAULT_MAX_CACHE_BYTES if it isn't a size."""
+    try:
+        return parse_size(os.environ.get("PIPMATE_WHEEL_CACHE_MAX") or str(DEFAULT_MAX_CACHE_BYTES))
+    except ValueError:
+        return DEFAULT_MAX_CACHE_BYTES
+
+
+# Size the pip cache is pruned to, in bytes (PIPMATE_WHEEL_CACHE_MAX, default 2 GiB)
+MAX_CACHE_BYTES = _max_cache_bytes()
+
+# Install and upgrade only from the wheelhouse, without contacting any index
+offline_install = os.environ.get("PIPMATE_OFFLINE_INSTALL", "") not in ("", "0")
+
+CacheEntry = namedtuple("CacheEntry", ["path", "kind", "project", "version", "size", "last_used"])
+
+_index = None  # path -> [size, mtime_ns, project, version], persisted between runs
+_index_lock = threading.Lock()
+
+
+def pip_cache_dir():
+    """
+    Returns pip's cache directory.
+
+    Mirrors pip's own lookup: PIP_CACHE_DIR, then the platform cache directory. A cache_dir set
+    in pip.conf is not read, so point PIP_CACHE_DIR at it in that case.
+    """
+    path = os.environ.get("PIP_CACHE_DIR")
+    if path:
+        return os.path.expanduser(path)
+    if os.name == 'nt':
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(os.path.join("~", "AppData", "Local"))
+        return os.path.join(base, "pip", "Cache")
+    if sys.platform == "darwin":
+        return os.path.expanduser(os.path.join("~", "Library", "Caches", "pip"))
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache"))
+    return os.path.join(base, "pip")
+
+
+def wheelhouse_dir():
+    """Returns (and creates) the wheelhouse used as a local offline mirror."""
+    path = os.environ.get("PIPMATE_WHEELHOUSE") or os.path.join(user_cache_dir(), "wheelhouse")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def index_path():
+    """Returns the path of the JSON file holding the cache index."""
+    return os.path.join(user_cache_dir(), "wheel-cache-index.json")
+
+
+def pins_path():
+    """Returns the path of the JSON file holding the pinned projects."""
+    return os.path.join(user_config_dir(), "pinned-wheels.json")
+
+
+def _load_json(path, default):
+    """Reads a JSON file, returning default if it is missing or broken."""
+    try:
+        with open(path, encoding="utf-8") as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return default
+
+
+def _save_json(path, data):
+    """Writes a JSON file atomically."""
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as json_file:
+        json.dump(data, json_file)
+    os.replace(temporary_path, path)
+
+
+def parse_wheel_filename(filename):
+    """Returns (project, version) of a wheel or sdist file name, or (None, None)."""
+    if filename.endswith(".whl"):
+        parts = filename[:-4].split("-")
+        if len(parts) >= 5:
+            return normalize_name(parts[0]), parts[1]
+        return None, None
+    for extension in (".tar.gz", ".zip", ".tar.bz2"):
+        if filename.endswith(extension):
+            name, _, version = filename[:-len(extension)].rpartition("-")
+            if name:
+                return normalize_name(name), version
+    return None, None
+
+
+def _identify_download(path):
+    """
+    Returns (project, version) of a cached download, or (None, None) if it isn't a wheel.
+
+    pip stores downloads under hashed names, so the wheel's METADATA is read instead.
+    zipfile tolerates the serialization header pip writes in front of the body.
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                parts = name.split("/")
+                if len(parts) == 2 and parts[0].endswith(".dist-info") and parts[1] == "METADATA":
+                    with io.TextIOWrapper(archive.open(name), encoding="utf-8", errors="replace") as metadata:
+                        headers = parse_metadata_headers(metadata)
+                    project = headers.get("name", [None])[0]
+                    return (normalize_name(project) if project else None), headers.get("version", [None])[0]
+    except (OSError, zipfile.BadZipFile, ValueError, KeyError):
+        pass
+    return None, None
+
+
+def _cache_files(cache_dir):
+    """Yields (path, kind) for every file of pip's HTTP and wheel caches."""
+    for subdir, kind in (("wheels", KIND_WHEEL), ("http", KIND_HTTP), ("http-v2", KIND_HTTP)):
+        root = os.path.join(cache_dir, subdir)
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if subdir == "http-v2" and not filename.endswith(".body"):
+                    continue  # Response headers, removed together with their .body file
+                if kind == KIND_WHEEL and not filename.endswith(".whl"):
+                    continue  # origin.json and friends
+                yield os.path.join(directory, filename), kind
+
+
+def scan_cache(cache_dir=None):
+    """
+    Returns a CacheEntry for every file of pip's HTTP and wheel caches.
+
+    Project and version of a file are looked up once and remembered in the index until the
+    file's size or mtime changes, so rescanning a large cache only costs stat() calls.
+    """
+    global _index
+
+    cache_dir = cache_dir or pip_cache_dir()
+    with _index_lock:
+        if _index is None:
+            _index = _load_json(index_path(), {})
+        entries = []
+        new_index = {}
+
+        for path, kind in _cache_files(cache_dir):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # Removed by pip in the meantime
+
+            known = _index.get(path)
+            if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+                project, version = known[2], known[3]
+            elif kind == KIND_WHEEL:
+                project, version = parse_wheel_filename(os.path.basename(path))
+            else:
+                project, version = _identify_download(path)
+                try:
+                    # Reading the file mustn't make it look recently used to prune()
+                    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                except OSError:
+                    pass
+
+            new_index[path] = [stat.st_size, stat.st_mtime_ns, project, version]
+            # pip doesn't touch cached files when using them, so rely on atime where it is kept
+            entries.append(CacheEntry(path, kind, project, version, stat.st_size,
+                                      max(stat.st_atime, stat.st_mtime)))
+
+        if new_index != _index:
+            _index = new_index
+            _save_json(index_path(), _index)
+    return entries
+
+
+def scan_wheelhouse():
+    """Returns a CacheEntry for every file of the wheelhouse."""
+    entries = []
+    for entry in os.scandir(wheelhouse_dir()):
+        if not entry.is_file():
+            continue
+        project, version = parse_wheel_filename(entry.name)
+        stat = entry.stat()
+        entries.append(CacheEntry(entry.path, "wheelhouse", project, version, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def usage_by_project(entries):
+    """
+    Groups cache entries by project and version.
+
+    Returns a list of (project, version, total size, number of files), largest first.
+    Files that aren't wheels (index pages, sdists) are grouped under project None.
+    """
+    usage = {}
+    for entry in entries:
+        total, count = usage.get((entry.project, entry.version), (0, 0))
+        usage[(entry.project, entry.version)] = (total + entry.size, count + 1)
+    return sorted(((project, version, total, count) for (project, version), (total, count) in usage.items()),
+                  key=lambda item: item[2], reverse=True)
+
+
+def load_pins():
+    """Returns the set of pinned projects ('name' or 'name==version')."""
+    return set(_load_json(pins_path(), []))
+
+
+def _pin_key(project, version=None):
+    """Returns the key a project (or one of its versions) is pinned under."""
+    return normalize_name(project) + (f"=={version}" if version else "")
+
+
+def pin(project, version=None):
+    """Protects a project, or a single version of it, from pruning."""
+    pins = load_pins()
+    pins.add(_pin_key(project, version))
+    _save_json(pins_path(), sorted(pins))
+
+
+def unpin(project, version=None):
+    """Removes a pin added by pin()."""
+    pins = load_pins()
+    pins.discard(_pin_key(project, version))
+    _save_json(pins_path(), sorted(pins))
+
+
+def is_pinned(entry, pins):
+    """Checks whether a cache entry is protected by one of the pins."""
+    if entry.project is None:
+        return False
+    return entry.project in pins or _pin_key(entry.project, entry.version) in pins
+
+
+def _remove_entry(entry):
+    """Deletes the file(s) of a cache entry, returning False if it couldn't be removed."""
+    try:
+        os.remove(entry.path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return False
+    if entry.path.endswith(".body"):
+        try:
+            os.remove(entry.path[:-len(".body")])  # The matching response headers (http-v2)
+        except OSError:
+            pass
+    return True
+
+
+def prune(max_bytes=None, cache_dir=None, dry_run=False):
+    """
+    Shrinks pip's cache to max_bytes by deleting the least recently used unpinned files.
+
+    Returns the list of removed (or, with dry_run, removable) entries.
+    """
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = scan_cache(cache_dir)
+    pins = load_pins()
+    total = sum(entry.size for entry in entries)
+
+    removed = []
+    for entry in sorted(entries, key=lambda entry: entry.last_used):
+        if total <= max_bytes:
+            break
+        if is_pinned(entry, pins):
+            continue
+        if dry_run or _remove_entry(entry):
+            total -= entry.size
+            removed.append(entry)
+    return removed
+
+
+def prewarm(specs, pip_command, on_line, requirements_files=(), cancel_event=None):
+    """
+    Downloads the given specs and their dependencies into the wheelhouse.
+
+    Wheels are preferred over sdists so later offline installs don't need to build anything.
+    Raises CalledProcessError if pip fails.
+    """
+    command = [pip_command, "download", "--prefer-binary", "--dest", wheelhouse_dir()]
+    for path in requirements_files:
+        command.extend(["-r", path])
+    process.check_stream_command(command + list(specs), on_line, cancel_event=cancel_event)
+
+
+def install_options():
+    """
+    Returns the extra `pip install` options for the current install mode.
+
+    With offline_install set, pip resolves everything from the wheelhouse and never contacts
+    an index.
+    """
+    if offline_install:
+        return ["--no-index", "--find-links", wheelhouse_dir()]
+    return []